@@ -0,0 +1,565 @@
+"""
+End-to-end benchmark over the bundled Clover examples.
+
+Drives every example in ``examples/`` through a matrix of input scales
+(data.txt repeated N times), split sizes and reducer counts against a master
+with N workers, and writes one JSON report:
+
+    python benchmark.py run --workers 4 --output bench.json
+    python benchmark.py run --baseline bench.json          # run, then compare
+    python benchmark.py compare bench.json new.json        # compare two reports
+    python benchmark.py chunks --rows 1000000              # chunk mode vs line-based
+
+Clusters (--cluster):
+  local     master and workers as local processes (built with `gradle installDist`
+            and `cmake --build Poneglyph/build`); no Redis, MQTT or S3
+  compose   `docker compose up` of master + N workers from docker-compose.yml
+  external  an already running master (--master)
+
+Per case (example x scale x split size x reducers) it records jobs/s and
+shuffled records/s over `--jobs` concurrent jobs, per-phase latency
+percentiles (map, shuffle, reduce, total; from /api/jobs/debug), master heap
+(sampled from /api/metrics) and the bytes each phase moved. `compare` flags
+every metric that got worse by more than --threshold.
+
+`chunks` runs the numeric examples (clover.aggregate chunk mode) and their
+line-based versions in ``examples/<name>/lines`` on synthetic input with
+clover.local.LocalRunner, and reports map throughput and shuffled records
+of both, and whether their results agree.
+"""
+import argparse
+import asyncio
+import json
+import math
+import os
+import platform
+import random
+import re
+import shutil
+import signal
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+import uuid
+
+from clover import aggregate
+from clover.client import Client, example_job
+from clover.local import LocalRunner
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(HERE)
+EXAMPLES = os.path.join(HERE, "examples")
+MASTER_CMD = os.path.join(ROOT, "Road-Poneglyph", "build", "install", "road-poneglyph", "bin", "road-poneglyph")
+WORKER_BIN = os.path.join(ROOT, "Poneglyph", "build", "Poneglyph")
+
+# Base input for examples that ship an empty data.txt.
+SYNTHETIC = {
+    "ciencia-datos": lambda rng: "".join(f"{rng.gauss(50, 15):.4f}\n" for _ in range(200)),
+}
+
+# Synthetic inputs of n rows for `chunks`.
+NUMERIC = {
+    "monte-carlo": lambda rng, n: "".join(f"{rng.random():.6f} {rng.random():.6f}\n" for _ in range(n)),
+    "ciencia-datos": lambda rng, n: "".join(f"{rng.gauss(50, 15):.4f}\n" for _ in range(n)),
+    "regresion-lineal": lambda rng, n: "".join(
+        f"{x:.3f} {2.5 * x + 1 + rng.gauss(0, 1):.4f}\n" for x in (rng.uniform(0, 100) for _ in range(n))),
+    "regresion-lineal-compleja": lambda rng, n: "".join(
+        f"{rng.choice(('ventas_publicidad', 'temperatura_energia', 'precio_demanda'))} "
+        f"{x:.2f} {3 * x + rng.gauss(0, 2):.3f}\n" for x in (rng.uniform(0, 50) for _ in range(n))),
+}
+
+# Metric direction for compare: +1 higher is better, -1 lower is better.
+# Differences below the floor (same unit as the metric) are noise.
+METRICS = {
+    "jobs_per_s": (+1, 0.0),
+    "records_per_s": (+1, 0.0),
+    "latency_ms.map.p50": (-1, 5.0),
+    "latency_ms.map.p95": (-1, 5.0),
+    "latency_ms.shuffle.p50": (-1, 5.0),
+    "latency_ms.shuffle.p95": (-1, 5.0),
+    "latency_ms.reduce.p50": (-1, 5.0),
+    "latency_ms.reduce.p95": (-1, 5.0),
+    "latency_ms.total.p50": (-1, 5.0),
+    "latency_ms.total.p95": (-1, 5.0),
+    "master_heap_mb.peak": (-1, 8.0),
+    "bytes.map_output": (-1, 0.0),
+    "bytes.reduce_input": (-1, 0.0),
+}
+
+
+def percentile(values, p):
+    """Nearest-rank percentile; None for no values."""
+    values = sorted(v for v in values if v is not None)
+    if not values:
+        return None
+    k = max(0, math.ceil(p / 100.0 * len(values)) - 1)
+    return values[k]
+
+
+def summarize(values):
+    return {"p50": percentile(values, 50), "p95": percentile(values, 95),
+            "p99": percentile(values, 99), "max": percentile(values, 100)}
+
+
+def wait_http(url, timeout, proc=None):
+    """Wait until `url` answers; fails early if `proc` exits meanwhile."""
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if proc is not None and proc.poll() is not None:
+            raise RuntimeError(f"process exited with status {proc.returncode}")
+        try:
+            with urllib.request.urlopen(url, timeout=2):
+                return
+        except OSError:
+            time.sleep(0.25)
+    raise TimeoutError(f"{url} not reachable after {timeout}s")
+
+
+def wait_workers(master, n, timeout):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            with urllib.request.urlopen(master + "/api/metrics", timeout=2) as resp:
+                if json.loads(resp.read()).get("workers", 0) >= n:
+                    return
+        except (OSError, ValueError):
+            pass
+        time.sleep(0.5)
+    raise TimeoutError(f"fewer than {n} workers registered after {timeout}s")
+
+
+class LocalCluster:
+    """Master and workers as child processes sharing a scratch directory."""
+
+    def __init__(self, workers, master_cmd=MASTER_CMD, worker_bin=WORKER_BIN, grpc=True, slots=0):
+        self.workers = workers
+        self.master_cmd = master_cmd
+        self.worker_bin = worker_bin
+        self.grpc = grpc
+        self.slots = slots
+        self.master = "http://127.0.0.1:8080"
+        self.dir = None
+        self.procs = []
+
+    def start(self):
+        for path, how in ((self.master_cmd, "gradle installDist in Road-Poneglyph"),
+                          (self.worker_bin, "cmake -S Poneglyph -B Poneglyph/build && cmake --build Poneglyph/build")):
+            if not os.path.exists(path):
+                raise FileNotFoundError(f"{path} not found (build it with: {how})")
+        self.dir = tempfile.mkdtemp(prefix="clover-bench-")
+        env = dict(os.environ, INPUT_DIR=os.path.join(self.dir, "input"),
+                   RESULT_DIR=os.path.join(self.dir, "out"), SHUFFLE_SPILL_DIR=os.path.join(self.dir, "shuffle"),
+                   GRPC_PORT="50051", MQTT_BROKER="", REDIS_URL="", AWS_S3_BUCKET="")
+        master = self._spawn([self.master_cmd], env, "master")
+        wait_http(self.master + "/api/health", 120, master)
+        for i in range(self.workers):
+            wenv = dict(os.environ, PONEGLYPH_MASTER_URL=self.master,
+                        PONEGLYPH_USE_GRPC="1" if self.grpc else "0",
+                        PONEGLYPH_MASTER_GRPC="127.0.0.1:50051",
+                        PONEGLYPH_PY_RUNTIME=os.path.join(HERE, "clover", "runtime.py"),
+                        PONEGLYPH_SLOTS=str(self.slots),
+                        PONEGLYPH_WORK_DIR=os.path.join(self.dir, f"worker-{i}"),
+                        MQTT_BROKER="")
+            self._spawn([self.worker_bin], wenv, f"worker-{i}")
+        wait_workers(self.master, self.workers, 60)
+
+    def _spawn(self, cmd, env, name):
+        log = open(os.path.join(self.dir, f"{name}.log"), "wb")
+        proc = subprocess.Popen(cmd, env=env, cwd=self.dir, stdout=log, stderr=subprocess.STDOUT,
+                                start_new_session=True)
+        self.procs.append((proc, log))
+        return proc
+
+    def stop(self):
+        for proc, _ in reversed(self.procs):
+            if proc.poll() is None:
+                os.killpg(proc.pid, signal.SIGTERM)
+        for proc, log in self.procs:
+            try:
+                proc.wait(10)
+            except subprocess.TimeoutExpired:
+                os.killpg(proc.pid, signal.SIGKILL)
+            log.close()
+        self.procs = []
+        if self.dir:
+            shutil.rmtree(self.dir, ignore_errors=True)
+
+
+class ComposeCluster:
+    """docker-compose.yml's master plus `workers` replicas of the worker,
+    pointed at that master instead of the addresses in the file."""
+
+    OVERRIDE = """services:
+  worker:
+    ports: !reset []
+    environment:
+      PONEGLYPH_MASTER_URL: http://master:8080
+      PONEGLYPH_MASTER_GRPC: master:50051
+      MQTT_BROKER: ""
+"""
+
+    def __init__(self, workers, compose_file=os.path.join(ROOT, "docker-compose.yml"), master=None):
+        self.workers = workers
+        self.compose_file = compose_file
+        self.master = master or f"http://localhost:{os.getenv('MASTER_HTTP_PORT', '8080')}"
+        self.override = None
+
+    def _compose(self, *args):
+        cmd = ["docker", "compose", "-f", self.compose_file, "-f", self.override, *args]
+        subprocess.run(cmd, check=True, cwd=os.path.dirname(self.compose_file))
+
+    def start(self):
+        fd, self.override = tempfile.mkstemp(prefix="clover-bench-", suffix=".yml")
+        with os.fdopen(fd, "w") as f:
+            f.write(self.OVERRIDE)
+        self._compose("up", "-d", "--build", "--scale", f"worker={self.workers}", "master", "worker")
+        wait_http(self.master + "/api/health", 300)
+        wait_workers(self.master, self.workers, 120)
+
+    def stop(self):
+        if self.override:
+            self._compose("stop", "master", "worker")
+            os.unlink(self.override)
+            self.override = None
+
+
+class ExternalCluster:
+    def __init__(self, master):
+        self.master = master
+
+    def start(self):
+        wait_http(self.master + "/api/health", 30)
+
+    def stop(self):
+        pass
+
+
+def example_input(name, scratch):
+    """data.txt of the example, or a synthetic one when it ships empty."""
+    path = os.path.join(EXAMPLES, name, "data.txt")
+    if os.path.getsize(path) > 0 or name not in SYNTHETIC:
+        return path
+    path = os.path.join(scratch, f"{name}.txt")
+    with open(path, "w") as f:
+        f.write(SYNTHETIC[name](random.Random(42)))
+    return path
+
+
+async def sample_heap(client, samples, stop):
+    while not stop.is_set():
+        try:
+            m = await client.request_json("GET", "/api/metrics")
+            samples.append(m["heap_used_bytes"])
+        except Exception:
+            pass
+        try:
+            await asyncio.wait_for(stop.wait(), 0.25)
+        except asyncio.TimeoutError:
+            pass
+
+
+async def run_case(client, example, data_path, repeat, split_size, reducers, jobs, timeout):
+    specs = [example_job(os.path.join(EXAMPLES, example), split_size=split_size, reducers=reducers,
+                         job_id=f"bench-{example}-r{repeat}-s{split_size}-p{reducers}-{i}-{uuid.uuid4().hex[:6]}")
+             for i in range(jobs)]
+
+    # Inputs are uploaded first; a job's input is deleted when it finishes.
+    t = time.perf_counter()
+    uploads = await asyncio.gather(*(client.upload_input(data_path, repeat=repeat) for _ in specs))
+    upload_s = time.perf_counter() - t
+    for spec, up in zip(specs, uploads):
+        spec["input_id"] = up["input_id"]
+
+    heap, stop = [], asyncio.Event()
+    sampler = asyncio.ensure_future(sample_heap(client, heap, stop))
+    t = time.perf_counter()
+    await asyncio.gather(*(client.submit(spec) for spec in specs))
+    states = [st["state"] async for st in client.as_completed([s["job_id"] for s in specs], timeout)]
+    wall = time.perf_counter() - t
+    stop.set()
+    await sampler
+
+    phases = [(await client.request_json("GET", f"/api/jobs/debug?job_id={s['job_id']}"))["phases"] for s in specs]
+    ms = lambda key: [p["ms"].get(key) for p in phases]
+    shuffle = [(p["ms"].get("shuffle_ingest") or 0) + (p["ms"].get("shuffle_merge") or 0) for p in phases]
+    records = sum(p["records"] for p in phases)
+    total_bytes = {k: sum(p["bytes"][k] for p in phases) for k in phases[0]["bytes"]}
+    return {
+        "example": example,
+        "repeat": repeat,
+        "split_size": split_size,
+        "reducers": reducers,
+        "jobs": jobs,
+        "failed": sum(1 for s in states if s != "SUCCEEDED"),
+        "maps_per_job": phases[0]["maps"],
+        "upload_s": round(upload_s, 4),
+        "wall_s": round(wall, 4),
+        "jobs_per_s": round(jobs / wall, 3),
+        "records_per_s": round(records / wall, 1),
+        "latency_ms": {
+            "map": summarize(ms("map")),
+            "shuffle": summarize(shuffle),
+            "reduce": summarize(ms("reduce")),
+            "total": summarize(ms("total")),
+        },
+        "master_heap_mb": {
+            "peak": round(max(heap) / 2 ** 20, 1) if heap else None,
+            "end": round(heap[-1] / 2 ** 20, 1) if heap else None,
+        },
+        "bytes": total_bytes,
+    }
+
+
+def case_key(case):
+    return f"{case['example']} x{case['repeat']} split={case['split_size']} reducers={case['reducers']}"
+
+
+async def run_matrix(args, master):
+    examples = args.examples or sorted(d for d in os.listdir(EXAMPLES)
+                                       if os.path.exists(os.path.join(EXAMPLES, d, "map.py")))
+    scratch = tempfile.mkdtemp(prefix="clover-bench-data-")
+    cases = []
+    try:
+        async with Client(master, connections=args.connections, mqtt_broker=False,
+                          poll_min=0.02, poll_max=0.25) as client:
+            before = await client.request_json("GET", "/api/metrics")
+            for example in examples:
+                data_path = example_input(example, scratch)
+                for repeat in args.scales:
+                    for split_size in args.split_sizes:
+                        for reducers in args.reducers:
+                            for _ in range(args.warmup):
+                                await run_case(client, example, data_path, repeat, split_size, reducers, 1,
+                                               args.timeout)
+                            case = await run_case(client, example, data_path, repeat, split_size, reducers,
+                                                  args.jobs, args.timeout)
+                            cases.append(case)
+                            lat = case["latency_ms"]["total"]
+                            print(f"{case_key(case):60s} {case['jobs_per_s']:8.2f} jobs/s "
+                                  f"{case['records_per_s']:12.0f} rec/s  p50 {lat['p50']}ms p95 {lat['p95']}ms"
+                                  + (f"  FAILED {case['failed']}" if case["failed"] else ""))
+            after = await client.request_json("GET", "/api/metrics")
+    finally:
+        shutil.rmtree(scratch, ignore_errors=True)
+    return cases, {"gc_count": after["gc_count"] - before["gc_count"], "gc_ms": after["gc_ms"] - before["gc_ms"],
+                   "heap_max_mb": round(after["heap_max_bytes"] / 2 ** 20, 1)}
+
+
+def git_revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def metric(case, path):
+    v = case
+    for part in path.split("."):
+        v = v.get(part) if isinstance(v, dict) else None
+    return v
+
+
+def compare(baseline, current, threshold):
+    """Print the metrics that changed by more than `threshold`; returns the regressions."""
+    base = {case_key(c): c for c in baseline["cases"]}
+    regressions = []
+    for case in current["cases"]:
+        key = case_key(case)
+        old = base.get(key)
+        if old is None:
+            print(f"  new case: {key}")
+            continue
+        for path, (direction, floor) in METRICS.items():
+            a, b = metric(old, path), metric(case, path)
+            if a is None or b is None or abs(b - a) <= floor:
+                continue
+            change = (b - a) / a if a else float("inf")
+            if abs(change) <= threshold:
+                continue
+            worse = change * direction < 0
+            print(f"  {'REGRESSION' if worse else 'improved  '} {key}: {path} {a} -> {b} ({change:+.1%})")
+            if worse:
+                regressions.append((key, path, a, b))
+    missing = set(base) - {case_key(c) for c in current["cases"]}
+    for key in sorted(missing):
+        print(f"  missing case: {key}")
+    print(f"{len(regressions)} regression(s) beyond {threshold:.0%}")
+    return regressions
+
+
+def cmd_run(args):
+    if args.cluster == "local":
+        cluster = LocalCluster(args.workers, args.master_cmd, args.worker_bin, not args.http, args.slots)
+    elif args.cluster == "compose":
+        cluster = ComposeCluster(args.workers, master=args.master)
+    else:
+        cluster = ExternalCluster(args.master or os.getenv("MASTER", "http://localhost:8080"))
+
+    print(f"🚀 Starting {args.cluster} cluster ({args.workers} workers)")
+    cluster.start()
+    try:
+        started = time.time()
+        cases, gc = asyncio.run(run_matrix(args, cluster.master))
+    finally:
+        cluster.stop()
+
+    report = {
+        "meta": {
+            "timestamp": int(started),
+            "revision": git_revision(),
+            "host": platform.node(),
+            "cpus": os.cpu_count(),
+            "cluster": args.cluster,
+            "workers": args.workers,
+            "jobs_per_case": args.jobs,
+            "duration_s": round(time.time() - started, 1),
+            "master_gc": gc,
+        },
+        "cases": cases,
+    }
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"💾 Results written to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        print(f"📊 Comparing with {args.baseline}")
+        if compare(baseline, report, args.threshold):
+            return 1
+    return 1 if any(c["failed"] for c in cases) else 0
+
+
+def cmd_compare(args):
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    with open(args.current) as f:
+        current = json.load(f)
+    return 1 if compare(baseline, current, args.threshold) else 0
+
+
+_NUMBER = re.compile(r"-?\d+\.\d+(?:[eE][-+]?\d+)?")
+
+
+def normalized_output(text):
+    """Result lines, sorted, with floats cut to 9 significant digits
+    (summation order differs between the two modes)."""
+    text = _NUMBER.sub(lambda m: f"{float(m.group()):.9g}", text)
+    return sorted(line for line in text.splitlines() if line)
+
+
+def cmd_chunks(args):
+    runner = LocalRunner(args.processes)
+    cases = []
+    print(f"🧮 Chunk mode vs line-based ({args.rows} rows, split {args.split_size} B, "
+          f"numpy {'yes' if aggregate.np is not None else 'no'})")
+    with tempfile.TemporaryDirectory(prefix="clover-chunks-") as scratch:
+        for name in args.examples or sorted(NUMERIC):
+            path = os.path.join(scratch, f"{name}.txt")
+            with open(path, "w") as f:
+                f.write(NUMERIC[name](random.Random(42), args.rows))
+            size = os.path.getsize(path)
+            case = {"example": name, "rows": args.rows, "input_bytes": size}
+            outputs = {}
+            for mode, example_dir in (("lines", os.path.join(EXAMPLES, name, "lines")),
+                                      ("chunks", os.path.join(EXAMPLES, name))):
+                job = example_job(example_dir, split_size=args.split_size, reducers=args.reducers,
+                                  map_cache=False)
+                runs = [runner.run(job, input_path=path) for _ in range(args.runs)]
+                best = min(runs, key=lambda r: r.timings["map"])
+                outputs[mode] = normalized_output(best.text())
+                case[mode] = {
+                    "map_s": round(best.timings["map"], 4),
+                    "total_s": round(best.timings["total"], 4),
+                    "rows_per_s": round(args.rows / best.timings["map"], 1),
+                    "mb_per_s": round(size / 2 ** 20 / best.timings["map"], 2),
+                    "records": best.records,
+                }
+            case["map_speedup"] = round(case["lines"]["map_s"] / case["chunks"]["map_s"], 2)
+            case["same_result"] = outputs["lines"] == outputs["chunks"]
+            cases.append(case)
+            print(f"  {name:<27} lines {case['lines']['rows_per_s']:>12,.0f} rows/s "
+                  f"({case['lines']['records']} records)  chunks {case['chunks']['rows_per_s']:>12,.0f} rows/s "
+                  f"({case['chunks']['records']} records)  x{case['map_speedup']}"
+                  f"{'' if case['same_result'] else '  ⚠️ results differ'}")
+
+    if args.output:
+        report = {
+            "meta": {
+                "timestamp": int(time.time()),
+                "revision": git_revision(),
+                "host": platform.node(),
+                "cpus": os.cpu_count(),
+                "processes": runner.processes,
+                "numpy": aggregate.np.__version__ if aggregate.np is not None else None,
+                "split_size": args.split_size,
+                "reducers": args.reducers,
+            },
+            "cases": cases,
+        }
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"💾 Results written to {args.output}")
+    return 0 if all(c["same_result"] for c in cases) else 1
+
+
+def int_list(text):
+    return [int(x) for x in text.split(",") if x]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="End-to-end benchmark over the Clover examples")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    run = sub.add_parser("run", help="Run the benchmark matrix and write a JSON report")
+    run.add_argument("--cluster", choices=["local", "compose", "external"], default="local",
+                     help="How to get a master and workers (default: local processes)")
+    run.add_argument("--workers", type=int, default=2, help="Workers to start (default: 2)")
+    run.add_argument("--slots", type=int, default=0, help="Task slots per local worker (default: 0 = one per core)")
+    run.add_argument("--http", action="store_true", help="Local workers pull tasks over HTTP instead of gRPC")
+    run.add_argument("--master", help="Master URL (external cluster, or compose with a non-default port)")
+    run.add_argument("--master-cmd", default=MASTER_CMD, help="Master launcher for --cluster local")
+    run.add_argument("--worker-bin", default=WORKER_BIN, help="Worker binary for --cluster local")
+    run.add_argument("--examples", nargs="*", help="Examples to run (default: all in examples/)")
+    run.add_argument("--scales", type=int_list, default=[100, 1000],
+                     help="Comma-separated input repeat factors (default: 100,1000)")
+    run.add_argument("--split-sizes", type=int_list, default=[2048, 65536],
+                     help="Comma-separated split sizes in bytes (default: 2048,65536)")
+    run.add_argument("--reducers", type=int_list, default=[2, 4],
+                     help="Comma-separated reducer counts (default: 2,4)")
+    run.add_argument("--jobs", type=int, default=5, help="Concurrent jobs per case (default: 5)")
+    run.add_argument("--warmup", type=int, default=1, help="Unmeasured single-job runs before each case (default: 1)")
+    run.add_argument("--connections", type=int, default=16, help="Client connections to the master (default: 16)")
+    run.add_argument("--timeout", type=float, default=600, help="Seconds to wait for one job (default: 600)")
+    run.add_argument("--output", "-o", default="benchmark.json", help="Report file (default: benchmark.json)")
+    run.add_argument("--baseline", help="Compare with this saved report; exit 1 on regressions")
+    run.add_argument("--threshold", type=float, default=0.10, help="Relative change flagged (default: 0.10)")
+    run.set_defaults(func=cmd_run)
+
+    cmp_ = sub.add_parser("compare", help="Compare two saved reports")
+    cmp_.add_argument("baseline")
+    cmp_.add_argument("current")
+    cmp_.add_argument("--threshold", type=float, default=0.10, help="Relative change flagged (default: 0.10)")
+    cmp_.set_defaults(func=cmd_compare)
+
+    chunks = sub.add_parser("chunks", help="Compare chunk-mode numeric examples with their line-based versions")
+    chunks.add_argument("--examples", nargs="*", choices=sorted(NUMERIC),
+                        help="Examples to run (default: all numeric examples)")
+    chunks.add_argument("--rows", type=int, default=200000, help="Synthetic input rows (default: 200000)")
+    chunks.add_argument("--split-size", type=int, default=1 << 20, help="Split size in bytes (default: 1 MiB)")
+    chunks.add_argument("--reducers", type=int, default=1,
+                        help="Reducers (default: 1; the line-based versions need a single reducer)")
+    chunks.add_argument("--runs", type=int, default=3, help="Runs per mode; the fastest map phase counts (default: 3)")
+    chunks.add_argument("--processes", type=int, help="Local pool size (default: CPU count)")
+    chunks.add_argument("--output", "-o", help="Also write the results as JSON")
+    chunks.set_defaults(func=cmd_chunks)
+
+    args = parser.parse_args()
+    sys.exit(args.func(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1 @@
+"""Clover support library shared by the client and the Poneglyph workers."""
@@ -0,0 +1,237 @@
+"""
+Chunk-mode aggregation for numeric Clover jobs.
+
+A line-oriented mapper parses every input line on its own and prints a
+record per value, which the combiner and reducer parse again. A chunk-mode
+mapper instead loads its whole split at once into columns, and declares
+associative aggregates that are computed over all of the split's rows per
+group key. Each split then ships one record per group, and the combiner
+and reducer only merge those partials:
+
+    from clover import aggregate
+
+    # map.py
+    split = aggregate.load(columns=("x", "y"))
+    aggregate.emit(split, ["count", "sum(x)", "sum(y)", "sumsq(x)", "cross(x,y)"])
+
+    # combine.py
+    aggregate.combine()
+
+    # reduce.py
+    for key, acc in aggregate.merged():
+        print(acc["count"], acc["sum(x)"] / acc["count"])
+
+Aggregates are ``count``, ``sum(c)``, ``sumsq(c)``, ``cross(a,b)`` (sum of
+``a*b``), ``min(c)`` and ``max(c)``. With ``load(..., key="name")`` they are
+computed per distinct value of that column, otherwise under a single key.
+
+Columns are NumPy arrays when numpy is installed, and the aggregates are
+computed vectorized. Without it the same scripts run on plain lists, row
+by row. Partials travel as ``key\\tJSON`` text records, so they work with
+every ``intermediate_format``.
+"""
+import io
+import json
+import sys
+import warnings
+
+from clover import records
+
+try:
+    import numpy as np
+except ImportError:  # optional: falls back to row-by-row Python
+    np = None
+
+# Aggregate kind -> number of column arguments.
+KINDS = {"count": 0, "sum": 1, "sumsq": 1, "cross": 2, "min": 1, "max": 1}
+
+
+class Split:
+    """Parsed columns of one split, by name, plus the group keys (or None)."""
+
+    def __init__(self, columns, keys=None):
+        self.columns = columns
+        self.keys = keys
+
+    def __len__(self):
+        if self.keys is not None:
+            return len(self.keys)
+        return len(next(iter(self.columns.values()), ()))
+
+    def __getitem__(self, name):
+        return self.columns[name]
+
+    def derive(self, name, fn, *names):
+        """Add column `name` as fn(*columns) over the named columns.
+
+        With numpy, fn is called once with whole arrays; without it, once per
+        row with floats. Elementwise operators work either way.
+        """
+        args = [self.columns[n] for n in names]
+        if np is not None:
+            col = np.asarray(fn(*args), dtype=np.float64)
+        else:
+            col = [float(fn(*row)) for row in zip(*args)]
+        self.columns[name] = col
+        return col
+
+
+def load(path=None, columns=("x",), key=None, comment="#"):
+    """Parse the task input into a Split of whitespace-separated columns.
+
+    `columns` names the fields of each line in order; `key` names the one
+    holding the group key, the rest are parsed as floats. Text from
+    `comment` to the end of a line is ignored, and blank lines and lines
+    with missing or non-numeric fields are skipped, like the line-based
+    examples do.
+    """
+    if path is None:
+        path = sys.argv[1]
+    with open(path, "rb") as f:
+        text = f.read().decode("utf-8", errors="ignore")
+    names = list(columns)
+    key_at = names.index(key) if key is not None else None
+    if np is not None:
+        split = _load_numpy(text, names, key_at, comment)
+        if split is not None:
+            return split
+    return _load_python(text, names, key_at, comment)
+
+
+def _load_numpy(text, names, key_at, comment):
+    # Bulk parse; returns None when a malformed line needs the tolerant path.
+    try:
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore")  # "input contained no data"
+            table = np.loadtxt(io.StringIO(text), dtype=np.float64 if key_at is None else str,
+                               comments=comment, usecols=range(len(names)), ndmin=2)
+        if table.shape[0] == 0:
+            table = table.reshape(0, len(names))
+        cols = {n: table[:, i] for i, n in enumerate(names) if i != key_at}
+        if key_at is not None:
+            cols = {n: c.astype(np.float64) for n, c in cols.items()}
+    except ValueError:
+        return None
+    return Split(cols, table[:, key_at] if key_at is not None else None)
+
+
+def _load_python(text, names, key_at, comment):
+    width = len(names)
+    rows = []
+    for line in text.splitlines():
+        parts = line.split(comment, 1)[0].split() if comment else line.split()
+        if len(parts) < width:
+            continue
+        try:
+            rows.append([p if i == key_at else float(p) for i, p in enumerate(parts[:width])])
+        except ValueError:
+            continue
+    cols = [list(c) for c in zip(*rows)] or [[] for _ in names]
+    keys = cols[key_at] if key_at is not None else None
+    if np is not None:
+        cols = [c if i == key_at else np.array(c, dtype=np.float64) for i, c in enumerate(cols)]
+        if keys is not None:
+            keys = np.array(keys, dtype=str)
+    return Split({n: cols[i] for i, n in enumerate(names) if i != key_at}, keys)
+
+
+def parse(spec):
+    """Canonical name, kind and column arguments of an aggregate like "cross(x, y)"."""
+    kind, _, rest = spec.replace(" ", "").partition("(")
+    args = tuple(rest[:-1].split(",")) if rest.endswith(")") else ()
+    if KINDS.get(kind) != len(args) or (rest and not all(args)):
+        raise ValueError(f"unknown aggregate {spec!r}")
+    return (f"{kind}({','.join(args)})" if args else kind), kind, args
+
+
+def merge(name, a, b):
+    """Merge two partial values of the aggregate `name`."""
+    if a is None:
+        return b
+    if name.startswith("min("):
+        return min(a, b)
+    if name.startswith("max("):
+        return max(a, b)
+    return a + b
+
+
+def partials(split, aggregates, key="all"):
+    """Compute the aggregates over a Split: {group: {aggregate: value}}."""
+    specs = [parse(a) for a in aggregates]
+    if len(split) == 0:
+        return {}
+    if np is not None:
+        return _partials_numpy(split, specs, key)
+    return _partials_python(split, specs, key)
+
+
+def _partials_numpy(split, specs, key):
+    if split.keys is None:
+        groups, inv = [key], np.zeros(len(split), dtype=np.intp)
+    else:
+        groups, inv = np.unique(split.keys, return_inverse=True)
+    n = len(groups)
+    out = {}
+    for name, kind, args in specs:
+        cols = [split[a] for a in args]
+        if kind == "count":
+            out[name] = np.bincount(inv, minlength=n).tolist()
+        elif kind in ("min", "max"):
+            v = np.full(n, np.inf if kind == "min" else -np.inf)
+            (np.minimum if kind == "min" else np.maximum).at(v, inv, cols[0])
+            out[name] = v.tolist()
+        else:
+            w = cols[0] if kind == "sum" else cols[0] * cols[-1]
+            out[name] = np.bincount(inv, weights=w, minlength=n).tolist()
+    return {str(g): {name: out[name][i] for name, _, _ in specs} for i, g in enumerate(groups)}
+
+
+def _partials_python(split, specs, key):
+    keys = split.keys if split.keys is not None else [key] * len(split)
+    values = []
+    for name, kind, args in specs:
+        cols = [split[a] for a in args]
+        if kind == "count":
+            values.append(None)
+        elif kind in ("sum", "min", "max"):
+            values.append(cols[0])
+        else:
+            values.append([a * b for a, b in zip(cols[0], cols[-1])])
+    acc = {}
+    for i, group in enumerate(keys):
+        row = acc.get(group)
+        if row is None:
+            row = acc[group] = [None] * len(specs)
+        for j, (name, kind, _) in enumerate(specs):
+            row[j] = merge(name, row[j], 1 if kind == "count" else values[j][i])
+    return {g: {name: row[j] for j, (name, _, _) in enumerate(specs)} for g, row in sorted(acc.items())}
+
+
+def _write(key, values):
+    sys.stdout.write(f"{key}\t{json.dumps(values, separators=(',', ':'))}\n")
+
+
+def emit(split, aggregates, key="all"):
+    """Write one partial-aggregate record per group of the split."""
+    for group, values in partials(split, aggregates, key).items():
+        _write(group, values)
+
+
+def merged(path=None):
+    """Yield (key, {aggregate: value}) with the partials of each key merged, in key order."""
+    acc = {}
+    for key, value in records.read(path):
+        part = json.loads(value)
+        cur = acc.get(key)
+        if cur is None:
+            acc[key] = part
+            continue
+        for name, v in part.items():
+            cur[name] = merge(name, cur.get(name), v)
+    yield from sorted(acc.items())
+
+
+def combine(path=None):
+    """Combiner: merge the partials of one map output and write them back."""
+    for key, values in merged(path):
+        _write(key, values)
@@ -0,0 +1,586 @@
+"""
+Asyncio client for the Road-Poneglyph master.
+
+    async with Client("http://master:8080") as client:
+        jobs = [example_job(d) for d in example_dirs]
+        await asyncio.gather(*(client.submit(job, input_path=...) for job in jobs))
+        async for status in client.as_completed(job["job_id"] for job in jobs):
+            async for chunk in client.result(status["job_id"]):
+                ...
+
+Every request goes through a small pool of keep-alive HTTP/1.1 connections
+owned by the client, so hundreds of jobs can be submitted and watched
+concurrently without a new TCP connection per call.
+
+Completion is awaited from the master's MQTT ``gridmr/job/{id}/state``
+events when paho-mqtt is installed and a broker is configured (MQTT_BROKER,
+MQTT_USERNAME, MQTT_PASSWORD, as for the master). Without a broker, status
+is polled with a backoff that restarts whenever the job makes progress.
+With a broker, status is still polled, but rarely, in case an event is lost.
+
+Only the standard library is required.
+"""
+import asyncio
+import base64
+import json
+import mmap
+import os
+import time
+import urllib.parse
+import uuid
+import zlib
+from collections import OrderedDict
+
+from clover import combiners
+
+try:
+    import paho.mqtt.client as mqtt
+except ImportError:  # optional: completion falls back to polling
+    mqtt = None
+
+DEFAULT_MASTER = "http://localhost:8080"
+TERMINAL_STATES = ("SUCCEEDED", "FAILED")
+IDLE_TIMEOUT = 20.0  # seconds an idle pooled connection is trusted
+READ_BLOCK = 64 * 1024
+
+
+class MasterError(Exception):
+    """Non-2xx response from the master."""
+
+    def __init__(self, status, body):
+        super().__init__(f"HTTP {status}: {body}")
+        self.status = status
+        self.body = body
+
+
+def example_job(example_dir, job_id=None, combiner=None, combine_with_reduce=False,
+                split_size=2048, reducers=2, intermediate="text", compression="none",
+                map_cache=True, partitioner="hash", split_hot_keys=False, reduce_preserves_keys=False,
+                cprofile=False):
+    """Job spec (without input) for an example directory with map.py and reduce.py.
+
+    The combiner is taken from `combiner` (a path, or the name of a shared
+    combiner in clover.combiners), else from reduce.py when
+    `combine_with_reduce` is set, else from an optional combine.py in the
+    directory, else from the shared combiner named in its `combiner` file.
+    `split_hot_keys` needs `reduce_preserves_keys`: reduce.py prints
+    ``key\tvalue`` for the keys it reduces and accepts its own output.
+    With `cprofile`, workers run the scripts under cProfile and
+    the job profile (Client.profile) lists their hottest functions.
+    """
+    map_path = os.path.join(example_dir, "map.py")
+    reduce_path = os.path.join(example_dir, "reduce.py")
+    if not job_id:
+        name = os.path.basename(os.path.abspath(example_dir))
+        job_id = f"{name}-{int(time.time())}-{uuid.uuid4().hex[:6]}"
+
+    job = {
+        "job_id": job_id,
+        "split_size": split_size,
+        "reducers": reducers,
+        "format": "text",
+        "map_script_b64": _b64(map_path),
+        "reduce_script_b64": _b64(reduce_path),
+    }
+    combine = _combine_script(example_dir, combiner, reduce_path if combine_with_reduce else None)
+    if combine is not None:
+        job["combine_script_b64"] = base64.b64encode(combine).decode("ascii")
+    if intermediate != "text":
+        job["intermediate_format"] = intermediate
+        job["intermediate_compression"] = compression
+    if not map_cache:
+        job["map_cache"] = False
+    if partitioner != "hash":
+        job["partitioner"] = partitioner
+    if split_hot_keys:
+        job["split_hot_keys"] = True
+    if reduce_preserves_keys:
+        job["reduce_preserves_keys"] = True
+    if cprofile:
+        job["cprofile"] = True
+    return job
+
+
+def stencil_job(name="stencil", job_id=None, generations=1, tile_size=256, rule="B3/S23", wrap=False):
+    """Job spec (without input) of an iterative stencil job: `generations`
+    steps of a Life-like `rule` over a grid, cut into tiles of `tile_size`
+    cells that stay on the workers between generations. The input is a
+    grid ("W H" line, then rows of 0/1); see clover.stencil."""
+    if not job_id:
+        job_id = f"{name}-{int(time.time())}-{uuid.uuid4().hex[:6]}"
+    job = {
+        "job_id": job_id,
+        "mode": "stencil",
+        "generations": generations,
+        "tile_size": tile_size,
+        "rule": rule,
+    }
+    if wrap:
+        job["wrap"] = True
+    return job
+
+
+def _combine_script(example_dir, combiner=None, reduce_path=None):
+    """combine.py source for example_job, or None without a combiner."""
+    if combiner and not os.path.exists(combiner) and combiner in combiners.NAMES:
+        return combiners.script(combiner).encode("utf-8")
+    path = combiner or reduce_path
+    if not path and os.path.exists(os.path.join(example_dir, "combine.py")):
+        path = os.path.join(example_dir, "combine.py")
+    if path:
+        with open(path, "rb") as f:
+            return f.read()
+    named = os.path.join(example_dir, "combiner")
+    if os.path.exists(named):
+        with open(named, encoding="utf-8") as f:
+            return combiners.script(f.read().strip()).encode("utf-8")
+    return None
+
+
+def _b64(path):
+    with open(path, "rb") as f:
+        return base64.b64encode(f.read()).decode("ascii")
+
+
+def iter_blocks(path, block_size=1 << 20, repeat=1):
+    """Yield the file `repeat` times in blocks of `block_size` bytes.
+    The file is memory-mapped, so multi-GB inputs are never read whole."""
+    size = os.path.getsize(path)
+    if size == 0:
+        return
+    with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        for _ in range(repeat):
+            for off in range(0, size, block_size):
+                yield mm[off:off + block_size]
+
+
+def gzip_blocks(blocks, level=6):
+    """Compress a stream of blocks into one gzip stream, block by block"""
+    z = zlib.compressobj(level, zlib.DEFLATED, 31)
+    for block in blocks:
+        out = z.compress(block)
+        if out:
+            yield out
+    yield z.flush()
+
+
+class _Connection:
+    def __init__(self, reader, writer):
+        self.reader = reader
+        self.writer = writer
+        self.idle_since = 0.0
+
+    def close(self):
+        self.writer.close()
+
+
+class _Response:
+    """Status and headers of a response whose body has not been read yet.
+
+    The connection goes back to the pool once the body is fully read, and is
+    closed if the caller stops early.
+    """
+
+    def __init__(self, pool, conn, status, headers, timeout):
+        self.status = status
+        self.headers = headers
+        self._pool = pool
+        self._conn = conn
+        self._timeout = timeout
+        self._done = False
+
+    async def chunks(self, size=READ_BLOCK):
+        reader = self._conn.reader
+        read = lambda coro: asyncio.wait_for(coro, self._timeout)
+        try:
+            if self.headers.get("transfer-encoding", "").lower() == "chunked":
+                while True:
+                    line = await read(reader.readline())
+                    n = int(line.split(b";")[0].strip() or b"0", 16)
+                    if n == 0:
+                        while (await read(reader.readline())) not in (b"\r\n", b"\n", b""):
+                            pass  # trailers
+                        break
+                    while n > 0:
+                        data = await read(reader.readexactly(min(n, size)))
+                        n -= len(data)
+                        yield data
+                    await read(reader.readexactly(2))
+            elif "content-length" in self.headers:
+                n = int(self.headers["content-length"])
+                while n > 0:
+                    data = await read(reader.readexactly(min(n, size)))
+                    n -= len(data)
+                    yield data
+            else:
+                self.headers["connection"] = "close"  # body ends with the connection
+                while True:
+                    data = await read(reader.read(size))
+                    if not data:
+                        break
+                    yield data
+            self._finish(self.headers.get("connection", "").lower() != "close")
+        finally:
+            self._finish(False)
+
+    async def read(self):
+        return b"".join([chunk async for chunk in self.chunks()])
+
+    def _finish(self, reusable):
+        if not self._done:
+            self._done = True
+            self._pool.release(self._conn, reusable)
+
+
+class _Pool:
+    """Keep-alive connections to one master, at most `size` in use at once."""
+
+    def __init__(self, host, port, size, timeout):
+        self.host = host
+        self.port = port
+        self.timeout = timeout
+        self._idle = []  # most recently used last
+        self._slots = asyncio.Semaphore(size)
+
+    async def request(self, method, target, body=None, headers=None):
+        """Send a request and return its _Response once the headers are in.
+
+        `body` is bytes, or a function returning an iterable of bytes blocks
+        (sent chunked; called again if the request has to be replayed). A
+        request on a reused connection that the server closed meanwhile is
+        retried once on a new connection.
+        """
+        await self._slots.acquire()
+        try:
+            conn = self._take_idle()
+            if conn is not None:
+                try:
+                    return await self._exchange(conn, method, target, body, headers)
+                except (ConnectionError, asyncio.IncompleteReadError):
+                    conn.close()
+            conn = await self._connect()
+            try:
+                return await self._exchange(conn, method, target, body, headers)
+            except BaseException:
+                conn.close()
+                raise
+        except BaseException:
+            self._slots.release()
+            raise
+
+    def release(self, conn, reusable):
+        if reusable:
+            conn.idle_since = time.monotonic()
+            self._idle.append(conn)
+        else:
+            conn.close()
+        self._slots.release()
+
+    def close(self):
+        while self._idle:
+            self._idle.pop().close()
+
+    def _take_idle(self):
+        now = time.monotonic()
+        while self._idle:
+            conn = self._idle.pop()
+            if now - conn.idle_since < IDLE_TIMEOUT and not conn.reader.at_eof():
+                return conn
+            conn.close()
+        return None
+
+    async def _connect(self):
+        reader, writer = await asyncio.wait_for(asyncio.open_connection(self.host, self.port), self.timeout)
+        return _Connection(reader, writer)
+
+    async def _exchange(self, conn, method, target, body, headers):
+        head = [f"{method} {target} HTTP/1.1", f"Host: {self.host}:{self.port}"]
+        for k, v in (headers or {}).items():
+            head.append(f"{k}: {v}")
+        chunked = callable(body)
+        if chunked:
+            head.append("Transfer-Encoding: chunked")
+        elif body is not None or method in ("POST", "PUT"):
+            head.append(f"Content-Length: {len(body or b'')}")
+        w = conn.writer
+        w.write(("\r\n".join(head) + "\r\n\r\n").encode("latin-1"))
+        if chunked:
+            for block in body():
+                if block:
+                    w.write(b"%x\r\n" % len(block))
+                    w.write(block)
+                    w.write(b"\r\n")
+                    await asyncio.wait_for(w.drain(), self.timeout)
+            w.write(b"0\r\n\r\n")
+        elif body:
+            w.write(body)
+        await asyncio.wait_for(w.drain(), self.timeout)
+
+        line = await asyncio.wait_for(conn.reader.readline(), self.timeout)
+        if not line:
+            raise ConnectionResetError("connection closed by master")
+        status = int(line.split()[1])
+        headers = {}
+        while True:
+            line = await asyncio.wait_for(conn.reader.readline(), self.timeout)
+            if line in (b"\r\n", b"\n", b""):
+                break
+            k, _, v = line.decode("latin-1").partition(":")
+            headers[k.strip().lower()] = v.strip()
+        return _Response(self, conn, status, headers, self.timeout)
+
+
+class _StateEvents:
+    """Job state events from MQTT, handed from paho's thread to the event loop."""
+
+    TOPIC = "gridmr/job/+/state"
+
+    def __init__(self, loop, broker, username=None, password=None):
+        url = urllib.parse.urlsplit(broker if "://" in broker else "tcp://" + broker)
+        self._loop = loop
+        self._waiters = {}  # job_id -> set of futures
+        self._states = OrderedDict()  # job_id -> (terminal state, monotonic time received)
+        self.connected = False
+        client_id = f"clover-{uuid.uuid4().hex[:12]}"
+        try:
+            self._client = mqtt.Client(mqtt.CallbackAPIVersion.VERSION1, client_id=client_id)
+        except AttributeError:  # paho-mqtt < 2.0
+            self._client = mqtt.Client(client_id=client_id)
+        if username:
+            self._client.username_pw_set(username, password)
+        self._client.on_connect = self._on_connect
+        self._client.on_disconnect = self._on_disconnect
+        self._client.on_message = self._on_message
+        self._client.connect_async(url.hostname, url.port or 1883)
+        self._client.loop_start()
+
+    @classmethod
+    def from_env_or_none(cls, loop, broker=None):
+        broker = broker or os.getenv("MQTT_BROKER", "")
+        if mqtt is None or not broker:
+            return None
+        return cls(loop, broker, os.getenv("MQTT_USERNAME"), os.getenv("MQTT_PASSWORD"))
+
+    async def wait(self, job_id, timeout, since=None):
+        """Terminal state announced for the job within `timeout`, else None.
+
+        A state received before `since` (time.monotonic()) is not returned:
+        it belongs to an earlier run of a job id that has been reused.
+        """
+        cached = self._states.get(job_id)
+        if cached is not None and (since is None or cached[1] >= since):
+            return cached[0]
+        fut = self._loop.create_future()
+        self._waiters.setdefault(job_id, set()).add(fut)
+        try:
+            return await asyncio.wait_for(fut, timeout)
+        except asyncio.TimeoutError:
+            return None
+        finally:
+            waiters = self._waiters.get(job_id)
+            if waiters is not None:
+                waiters.discard(fut)
+                if not waiters:
+                    del self._waiters[job_id]
+
+    def forget(self, job_id):
+        """Drop the cached state of a job id that is about to be reused."""
+        self._states.pop(job_id, None)
+
+    def close(self):
+        self._client.loop_stop()
+        self._client.disconnect()
+
+    def _on_connect(self, client, userdata, flags, rc):
+        if rc == 0:
+            self.connected = True
+            client.subscribe(self.TOPIC)
+
+    def _on_disconnect(self, client, userdata, rc):
+        self.connected = False
+
+    def _on_message(self, client, userdata, msg):
+        parts = msg.topic.split("/")
+        if len(parts) != 4:
+            return
+        try:
+            state = json.loads(msg.payload.decode("utf-8")).get("state")
+        except (ValueError, AttributeError):
+            return
+        if state in TERMINAL_STATES:
+            self._loop.call_soon_threadsafe(self._deliver, parts[2], state)
+
+    def _deliver(self, job_id, state):
+        self._states[job_id] = (state, time.monotonic())
+        self._states.move_to_end(job_id)
+        while len(self._states) > 4096:
+            self._states.popitem(last=False)
+        for fut in self._waiters.get(job_id, ()):
+            if not fut.done():
+                fut.set_result(state)
+
+
+class Client:
+    """Concurrent access to one master; use as ``async with Client(...)``.
+
+    `mqtt_broker` overrides MQTT_BROKER; pass ``mqtt_broker=False`` to always
+    poll. Polling starts every `poll_min` seconds and backs off to `poll_max`
+    while a job makes no progress; with MQTT connected it runs every
+    `event_poll` seconds only as a safety net.
+    """
+
+    def __init__(self, master=None, connections=8, timeout=300.0, mqtt_broker=None,
+                 poll_min=0.25, poll_max=5.0, event_poll=30.0):
+        url = urllib.parse.urlsplit(master or os.getenv("MASTER", DEFAULT_MASTER))
+        self.master = f"{url.scheme}://{url.netloc}"
+        self._pool = _Pool(url.hostname, url.port or 80, max(1, connections), timeout)
+        self._mqtt_broker = mqtt_broker
+        self._events = None
+        self.poll_min = poll_min
+        self.poll_max = poll_max
+        self.event_poll = event_poll
+
+    async def __aenter__(self):
+        if self._mqtt_broker is not False:
+            self._events = _StateEvents.from_env_or_none(asyncio.get_running_loop(), self._mqtt_broker)
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+    @property
+    def events(self):
+        """True while completion is driven by MQTT events."""
+        return self._events is not None and self._events.connected
+
+    async def close(self):
+        if self._events is not None:
+            self._events.close()
+            self._events = None
+        self._pool.close()
+
+    async def request(self, method, path, body=None, headers=None):
+        """Body of a successful request; raises MasterError otherwise."""
+        resp = await self._pool.request(method, path, body, headers)
+        data = await resp.read()
+        if resp.status // 100 != 2:
+            raise MasterError(resp.status, data.decode("utf-8", "replace"))
+        return data
+
+    async def request_json(self, method, path, obj=None):
+        body = None if obj is None else json.dumps(obj).encode("utf-8")
+        headers = {"Content-Type": "application/json"} if body is not None else None
+        return json.loads(await self.request(method, path, body, headers))
+
+    async def upload_input(self, path, repeat=1, compress=False, block_size=1 << 20):
+        """Stream an input file to the master (chunked, optionally gzip).
+        Returns the master's {"input_id", "bytes"}."""
+        headers = {"Content-Type": "application/octet-stream"}
+        if compress:
+            headers["Content-Encoding"] = "gzip"
+
+        def blocks():
+            it = iter_blocks(path, block_size, repeat)
+            return gzip_blocks(it) if compress else it
+
+        return json.loads(await self.request("POST", "/api/jobs/input", blocks, headers))
+
+    async def submit(self, job, input_path=None, repeat=1, compress=False, inline=False):
+        """Submit a job spec (see example_job).
+
+        With `input_path`, the file (sent `repeat` times) is uploaded first
+        and referenced by input_id, or embedded as input_text with `inline`.
+        Returns the master's {"job_id", "maps", "cached_maps"}.
+        """
+        job = dict(job)
+        if input_path is not None:
+            if inline:
+                with open(input_path, "r", encoding="utf-8") as f:
+                    job["input_text"] = f.read() * repeat
+            else:
+                uploaded = await self.upload_input(input_path, repeat=repeat, compress=compress)
+                job["input_id"] = uploaded["input_id"]
+        if self._events is not None and job.get("job_id"):
+            self._events.forget(job["job_id"])  # a previous run's state must not end wait()
+        return await self.request_json("POST", "/api/jobs", job)
+
+    async def status(self, job_id):
+        return await self.request_json("GET", "/api/jobs/status?" + urllib.parse.urlencode({"job_id": job_id}))
+
+    async def profile(self, job_id, trace=False):
+        """Per-phase task timings of a job (percentiles, hot functions, slowest
+        tasks); with `trace`, its timeline in Chrome trace format instead."""
+        params = {"job_id": job_id}
+        if trace:
+            params["format"] = "trace"
+        return await self.request_json("GET", "/api/jobs/profile?" + urllib.parse.urlencode(params))
+
+    async def wait(self, job_id, timeout=None, on_status=None):
+        """Final status of a job once it reaches SUCCEEDED or FAILED.
+
+        `on_status(status)` is called with every status fetched on the way.
+        Raises asyncio.TimeoutError after `timeout` seconds.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        delay = self.poll_min
+        progress = None
+        while True:
+            asked = time.monotonic()
+            st = await self.status(job_id)
+            if on_status is not None:
+                on_status(st)
+            if st["state"] in TERMINAL_STATES:
+                return st
+            now = (st.get("maps_completed"), st.get("reduces_completed"), st.get("steps_completed"))
+            delay = self.poll_min if now != progress else min(delay * 2, self.poll_max)
+            progress = now
+            pause = self.event_poll if self.events else delay
+            if deadline is not None:
+                left = deadline - time.monotonic()
+                if left <= 0:
+                    raise asyncio.TimeoutError(f"job {job_id} still {st['state']} after {timeout}s")
+                pause = min(pause, left)
+            if self._events is not None:
+                # returns early on the state event; older ones predate the status just fetched
+                await self._events.wait(job_id, pause, since=asked)
+            else:
+                await asyncio.sleep(pause)
+
+    async def as_completed(self, job_ids, timeout=None):
+        """Final statuses of the jobs, yielded in completion order."""
+        tasks = [asyncio.ensure_future(self.wait(job_id, timeout)) for job_id in job_ids]
+        try:
+            for done in asyncio.as_completed(tasks):
+                yield await done
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    async def result(self, job_id, partition=None, chunk_size=READ_BLOCK):
+        """The job's result (or one reduce partition) as a stream of bytes chunks."""
+        params = {"job_id": job_id}
+        if partition is not None:
+            params["partition"] = partition
+        resp = await self._pool.request("GET", "/api/jobs/result?" + urllib.parse.urlencode(params))
+        if resp.status // 100 != 2:
+            body = await resp.read()
+            raise MasterError(resp.status, body.decode("utf-8", "replace"))
+        async for chunk in resp.chunks(chunk_size):
+            yield chunk
+
+    async def result_text(self, job_id, partition=None):
+        return b"".join([c async for c in self.result(job_id, partition)]).decode("utf-8")
+
+    async def download(self, job_id, path, partition=None):
+        """Stream the result to a file; returns the number of bytes written."""
+        total = 0
+        with open(path, "wb") as out:
+            async for chunk in self.result(job_id, partition):
+                out.write(chunk)
+                total += len(chunk)
+        return total
+
+    async def run(self, job, **submit_args):
+        """Submit a job and wait for it; returns the final status."""
+        await self.submit(job, **submit_args)
+        return await self.wait(job["job_id"])
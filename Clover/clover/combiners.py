@@ -0,0 +1,50 @@
+"""
+Shared combiners, so examples do not each ship their own combine.py.
+
+An example directory names one in a ``combiner`` file (a single line such
+as ``sum``), and ``submit_job.py --combiner`` takes a name as well as a
+path. The job still carries a combine.py: ``script(name)`` is a two-line
+script that calls the shared function, so workers and LocalRunner run it
+like any other combiner.
+
+- ``sum``: per-key sum of ``key\\tvalue`` numbers. Integers stay integers,
+  so a reducer can keep using ``int(v)``.
+- ``aggregate``: merges the partials of ``clover.aggregate`` mappers.
+"""
+import sys
+from collections import defaultdict
+
+from clover import records
+
+NAMES = ("aggregate", "sum")
+
+
+def sum_by_key(path=None):
+    """Combiner: sum the values of each key of one map output."""
+    sums = defaultdict(int)
+    for key, value in records.read(path):
+        value = value.strip()
+        try:
+            sums[key] += int(value)
+        except ValueError:
+            sums[key] += float(value)
+    for key in sorted(sums):
+        sys.stdout.write(f"{key}\t{sums[key]}\n")
+
+
+def run(name, path=None):
+    """Run the shared combiner `name` over a map output."""
+    if name == "sum":
+        sum_by_key(path)
+    elif name == "aggregate":
+        from clover import aggregate  # numpy is only imported by jobs that use it
+        aggregate.combine(path)
+    else:
+        raise ValueError(f"unknown combiner {name!r} (expected one of {', '.join(NAMES)})")
+
+
+def script(name):
+    """Source of a combine.py that runs the shared combiner `name`."""
+    if name not in NAMES:
+        raise ValueError(f"unknown combiner {name!r} (expected one of {', '.join(NAMES)})")
+    return f"from clover import combiners\ncombiners.run({name!r})\n"
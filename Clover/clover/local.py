@@ -0,0 +1,432 @@
+"""
+Run a Clover job on this machine, without master, workers, Redis or MQTT.
+
+    job = example_job("examples/wordcount")
+    result = LocalRunner().run(job, input_path="examples/wordcount/data.txt", repeat=1000)
+    print(result.text())
+
+The job spec is the one submitted to the master (see clover.client.example_job),
+and the execution follows the master's semantics step by step:
+
+* splits: an uploaded input file is cut into byte ranges extended to the end
+  of their last line (``JobInput.splits``); inline ``input_text`` is cut line
+  by line (``Scheduler.buildMapTasks``);
+* partitions: ``floorMod(String.hashCode(), reducers)``, or with
+  ``partitioner: "range"`` / ``split_hot_keys`` built from the records of the
+  first ``partition_sample`` of map outputs (``Partitioners``);
+* reduce input: the partition's records sorted by key (Java string order,
+  ties in map order), as ``key\\tvalue`` lines or, for
+  ``intermediate_format: "records"``, as a clover.records stream;
+* result: one segment per partition, concatenated in partition order, plus
+  the merge reduce over split hot keys.
+
+Map and reduce tasks run on a process pool through the same warm executor
+as the workers (clover.runtime), and the shuffle stays in memory. The
+result's ``timings`` give a baseline to compare cluster runs with.
+
+Stencil jobs (``"mode": "stencil"``) run every generation over the whole
+grid in this process with clover.stencil; the result has one segment per
+band of ``tile_size`` rows, like the master's.
+"""
+import base64
+import bisect
+import math
+import mmap
+import os
+import shutil
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from clover import records, stencil
+from clover.runtime import ScriptCache, run_script
+
+DEFAULT_SAMPLE_FRACTION = 0.1
+
+
+class LocalJobError(Exception):
+    """A map, combine or reduce script failed, or its output cannot be merged."""
+
+
+def java_hash(s):
+    """Java's String.hashCode: 31-polynomial over UTF-16 code units, as a signed int32."""
+    h = 0
+    if s.isascii():
+        units = s.encode("ascii")
+    else:
+        data = s.encode("utf-16-be")
+        units = [(data[i] << 8) | data[i + 1] for i in range(0, len(data), 2)]
+    for u in units:
+        h = (31 * h + u) & 0xFFFFFFFF
+    return h - (1 << 32) if h & 0x80000000 else h
+
+
+def _java_order(keys):
+    """Sort key giving Java's String.compareTo order (UTF-16 code units)."""
+    if all(k.isascii() for k in keys):
+        return None
+    return lambda k: k.encode("utf-16-be")
+
+
+def _sort_records(recs):
+    order = _java_order({k for k, _ in recs})
+    if order is None:
+        recs.sort(key=lambda r: r[0])
+    else:
+        recs.sort(key=lambda r: order(r[0]))
+    return recs
+
+
+class _Input:
+    """An input file seen `repeat` times back to back, read through mmap."""
+
+    def __init__(self, path, repeat=1):
+        self.path = path
+        self.repeat = max(1, repeat)
+        self.file_size = os.path.getsize(path)
+        self.size = self.file_size * self.repeat
+        self._f = None
+        self._mm = None
+
+    def __enter__(self):
+        if self.file_size:
+            self._f = open(self.path, "rb")
+            self._mm = mmap.mmap(self._f.fileno(), 0, access=mmap.ACCESS_READ)
+        return self
+
+    def __exit__(self, *exc):
+        if self._mm is not None:
+            self._mm.close()
+            self._f.close()
+
+    def read(self, offset, length):
+        out = []
+        end = min(self.size, offset + length)
+        while offset < end:
+            pos = offset % self.file_size
+            n = min(end - offset, self.file_size - pos)
+            out.append(self._mm[pos:pos + n])
+            offset += n
+        return b"".join(out)
+
+    def splits(self, split_size):
+        """(offset, length) ranges of about split_size bytes, each extended
+        to the end of its last line, as JobInput.splits cuts them."""
+        out = []
+        start = 0
+        while start < self.size:
+            end = self._line_end(min(self.size, start + split_size))
+            out.append((start, end - start))
+            start = end
+        return out
+
+    def _line_end(self, pos):
+        at = pos - 1
+        while at < self.size:
+            i = self._mm.find(b"\n", at % self.file_size)
+            if i >= 0:
+                return at - at % self.file_size + i + 1
+            at += self.file_size - at % self.file_size
+        return self.size
+
+
+def text_splits(text, split_size):
+    """Chunks of inline input_text, as Scheduler.buildMapTasks cuts them."""
+    out = []
+    chunk = []
+    current = 0
+    for ln in text.split("\n"):
+        line = ln + "\n"
+        n = _utf16_len(line)
+        if current + n > split_size and current > 0:
+            out.append("".join(chunk))
+            chunk = []
+            current = 0
+        chunk.append(line)
+        current += n
+    if chunk:
+        out.append("".join(chunk))
+    return out
+
+
+def _utf16_len(s):
+    return len(s) if s.isascii() else len(s.encode("utf-16-le")) // 2
+
+
+def parse_output(output):
+    """(key, value) records of a map or combine output, as the master ingests them."""
+    if output.startswith(records.MAGIC):
+        return list(records.decode(output, len(records.MAGIC)))
+    recs = []
+    for line in output.decode("utf-8", errors="replace").split("\n"):
+        key, tab, value = line.partition("\t")
+        if tab and (key.strip() or value.strip()):
+            recs.append((key, value))
+    return recs
+
+
+# ---- process pool side ----------------------------------------------------
+
+_scripts = ScriptCache()
+
+
+def _run(path, data):
+    output, error = run_script(_scripts.load(path), path, data)
+    if error:
+        raise LocalJobError(f"{os.path.basename(path)}: {error}")
+    return output
+
+
+def _map_task(scripts, source, reducers):
+    """Map (and combine) one split. Returns its records, already split by hash
+    partition when `reducers` is given."""
+    kind, arg = source
+    if kind == "file":
+        path, repeat, offset, length = arg
+        with _Input(path, repeat) as inp:
+            chunk = inp.read(offset, length)
+    else:
+        chunk = arg.encode("utf-8")
+
+    output = _run(scripts["map"], chunk)
+    if output and "combine" in scripts:
+        combined = _run(scripts["combine"], output)
+        if combined:  # an empty combine output ships the raw map output, as on the workers
+            output = combined
+    recs = parse_output(output)
+    if reducers is None:
+        return recs
+    parts = [[] for _ in range(reducers)]
+    hashes = {}
+    for rec in recs:
+        h = hashes.get(rec[0])
+        if h is None:
+            h = hashes[rec[0]] = java_hash(rec[0]) % reducers
+        parts[h].append(rec)
+    return parts
+
+
+def _reduce_task(scripts, recs, binary):
+    _sort_records(recs)
+    if binary:
+        data = records.MAGIC + records.encode(recs)
+    else:
+        data = "\n".join(f"{k}\t{v}" for k, v in recs).encode("utf-8")
+    output = _run(scripts["reduce"], data).decode("utf-8", errors="replace")
+    if output and not output.endswith("\n"):
+        output += "\n"
+    return output
+
+
+# ---- partitioners ---------------------------------------------------------
+
+def _range_partitioner(sample, reducers):
+    """Upper bounds chosen so every range holds about 1/reducers of the sampled records."""
+    if reducers <= 1 or not sample:
+        return lambda key: java_hash(key) % reducers
+    order = _java_order(sample) or (lambda k: k)
+    keys = sorted(sample, key=order)
+    total = sum(sample.values())
+    bounds = []
+    seen = 0
+    for key in keys:
+        seen += sample[key]
+        if len(bounds) < reducers - 1 and seen * reducers >= total * (len(bounds) + 1) and key != keys[-1]:
+            bounds.append(order(key))
+    return lambda key: bisect.bisect_left(bounds, order(key))
+
+
+def _split_hot_keys(base, sample, reducers):
+    """Spread keys with more than 1/reducers of the sample round-robin over
+    ceil(share * reducers) partitions. Returns (partitioner, split keys)."""
+    total = sum(sample.values())
+    ways = {}
+    for key, n in sample.items():
+        w = min(reducers, math.ceil(n * reducers / total))
+        if w > 1:
+            ways[key] = w
+    if not ways:
+        return base, set()
+    turns = {}
+
+    def partition(key):
+        w = ways.get(key)
+        if w is None:
+            return base(key)
+        n = turns[key] = turns.get(key, 0) + 1
+        return (base(key) + n % w) % reducers
+
+    return partition, set(ways)
+
+
+class LocalResult:
+    """Output segments of a local run, by partition, plus phase timings in seconds."""
+
+    def __init__(self, job_id, segments, maps, records_shuffled, split_keys, timings):
+        self.job_id = job_id
+        self.segments = segments
+        self.maps = maps
+        self.records = records_shuffled
+        self.split_keys = split_keys
+        self.timings = timings
+
+    def text(self, partition=None):
+        if partition is not None:
+            return self.segments[partition]
+        return "".join(self.segments[p] for p in sorted(self.segments))
+
+    def write(self, path, partition=None):
+        data = self.text(partition).encode("utf-8")
+        with open(path, "wb") as f:
+            f.write(data)
+        return len(data)
+
+
+class LocalRunner:
+    """Executes job specs on a pool of `processes` (default: CPU count)."""
+
+    def __init__(self, processes=None):
+        self.processes = processes or os.cpu_count() or 1
+
+    def run(self, job, input_path=None, repeat=1):
+        """Run a job spec; the input comes from `input_path` (read `repeat`
+        times) or from the spec's input_text."""
+        if job.get("mode") == "stencil":
+            return self._run_stencil(job, input_path)
+        timings = {}
+        started = time.perf_counter()
+        reducers = max(0, int(job.get("reducers") or 0))
+        split_size = max(1, int(job.get("split_size") or 1024))
+        binary = job.get("intermediate_format") == "records"
+        kind = (job.get("partitioner") or "hash").lower()
+        split_hot = bool(job.get("split_hot_keys"))
+        if split_hot and not job.get("reduce_preserves_keys"):
+            raise ValueError("split_hot_keys requires reduce_preserves_keys")
+        sampled = kind == "range" or split_hot
+
+        workdir = tempfile.mkdtemp(prefix="clover-local-")
+        try:
+            scripts = self._stage_scripts(job, workdir)
+            if input_path is not None:
+                with _Input(input_path, repeat) as inp:
+                    sources = [("file", (os.path.abspath(input_path), repeat, off, n))
+                               for off, n in inp.splits(split_size)]
+            else:
+                sources = [("text", chunk) for chunk in text_splits(job.get("input_text") or "", split_size)]
+            timings["split"] = time.perf_counter() - started
+
+            with ProcessPoolExecutor(max_workers=self.processes) as pool:
+                t = time.perf_counter()
+                batch = max(1, len(sources) // (self.processes * 4))
+                outputs = list(pool.map(_map_task, [scripts] * len(sources), sources,
+                                        [None if sampled or not reducers else reducers] * len(sources),
+                                        chunksize=batch))
+                timings["map"] = time.perf_counter() - t
+
+                t = time.perf_counter()
+                parts, split_keys, shuffled = self._shuffle(outputs, reducers, kind, split_hot, job)
+                del outputs
+                timings["shuffle"] = time.perf_counter() - t
+
+                t = time.perf_counter()
+                results = pool.map(_reduce_task, [scripts] * len(parts), parts, [binary] * len(parts))
+                segments = dict(enumerate(results))
+                if split_keys:
+                    merge = self._extract(segments, split_keys)
+                    missing = split_keys - {key for key, _ in merge}
+                    if missing:
+                        raise LocalJobError(f"no partial output for split keys {sorted(missing)} "
+                                            "(reduce.py must print \"key\\tvalue\" for every key it reduces)")
+                    segments[len(segments)] = _reduce_task(scripts, merge, binary)
+                timings["reduce"] = time.perf_counter() - t
+        finally:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+        timings["total"] = time.perf_counter() - started
+        return LocalResult(job.get("job_id"), segments, len(sources), shuffled, split_keys, timings)
+
+    @staticmethod
+    def _run_stencil(job, input_path):
+        started = time.perf_counter()
+        if input_path is not None:
+            with open(input_path, "r", encoding="utf-8", errors="replace") as f:
+                text = f.read()
+        else:
+            text = job.get("input_text") or ""
+        generations = int(job.get("generations", 1))
+        width, height, rows = stencil.run(text, generations, job.get("rule") or stencil.DEFAULT_RULE,
+                                          bool(job.get("wrap")))
+        segments = stencil.bands(width, height, rows, int(job.get("tile_size") or stencil.DEFAULT_TILE))
+        return LocalResult(job.get("job_id"), segments, 0, 0, set(),
+                           {"total": time.perf_counter() - started})
+
+    @staticmethod
+    def _stage_scripts(job, workdir):
+        scripts = {}
+        for name in ("map", "combine", "reduce"):
+            b64 = job.get(f"{name}_script_b64")
+            if not b64:
+                continue
+            # One directory per script, like a worker's task directory.
+            d = os.path.join(workdir, name)
+            os.mkdir(d)
+            path = os.path.join(d, f"{name}.py")
+            with open(path, "wb") as f:
+                f.write(base64.b64decode(b64))
+            scripts[name] = path
+        if "map" not in scripts or "reduce" not in scripts:
+            raise ValueError("job needs map_script_b64 and reduce_script_b64")
+        return scripts
+
+    @staticmethod
+    def _shuffle(outputs, reducers, kind, split_hot, job):
+        if reducers == 0:
+            return [], set(), sum(len(o) for o in outputs)
+        if kind not in ("range", "hash"):
+            print(f"[LOCAL WARN] Unknown partitioner '{kind}', using hash", file=sys.stderr)
+            kind = "hash"
+        if kind == "hash" and not split_hot:
+            parts = [[] for _ in range(reducers)]
+            for per_part in outputs:
+                for p, recs in enumerate(per_part):
+                    parts[p].extend(recs)
+            return parts, set(), sum(len(p) for p in parts)
+
+        fraction = job.get("partition_sample")
+        fraction = DEFAULT_SAMPLE_FRACTION if fraction is None else min(1.0, max(0.0, float(fraction)))
+        sample_outputs = max(1, math.ceil(len(outputs) * fraction))
+        sample = {}
+        for recs in outputs[:sample_outputs]:
+            for key, _ in recs:
+                sample[key] = sample.get(key, 0) + 1
+        if kind == "range":
+            partition = _range_partitioner(sample, reducers)
+        else:
+            partition = lambda key: java_hash(key) % reducers
+        split_keys = set()
+        if split_hot and sample:
+            partition, split_keys = _split_hot_keys(partition, sample, reducers)
+
+        parts = [[] for _ in range(reducers)]
+        for recs in outputs:
+            for rec in recs:
+                parts[partition(rec[0])].append(rec)
+        return parts, split_keys, sum(len(p) for p in parts)
+
+    @staticmethod
+    def _extract(segments, keys):
+        """Move the lines of split keys out of the segments; returns them as records."""
+        removed = []
+        for p in sorted(segments):
+            kept = []
+            before = len(removed)
+            for line in segments[p].split("\n"):
+                key, tab, value = line.partition("\t")
+                if tab and key in keys:
+                    removed.append((key, value))
+                elif line:
+                    kept.append(line + "\n")
+            if len(removed) > before:
+                segments[p] = "".join(kept)
+        return removed
@@ -0,0 +1,106 @@
+"""
+Binary intermediate records for Clover mappers, combiners and reducers.
+
+Jobs submitted with ``intermediate_format`` ``"binary"`` or ``"records"``
+ship map output to the master as length-prefixed records instead of
+``key\\tvalue`` text. Scripts can keep printing text (the worker converts
+it), or use this module to skip text formatting and parsing entirely:
+
+    from clover import records
+
+    # map.py
+    for word in words:
+        records.emit(word, "1")
+
+    # reduce.py (input is sorted by key)
+    for key, values in records.grouped():
+        records.emit(key, str(sum(int(v) for v in values)))
+
+``read``/``grouped`` accept both formats, so the same reducer works for
+text and binary jobs. A stream is ``MAGIC`` followed by records encoded as
+``varint(len(key)) key varint(len(value)) value`` (UTF-8).
+"""
+import itertools
+import sys
+
+MAGIC = b"\x00GMR1\n"
+
+_stream = None
+
+
+def _varint(n):
+    out = bytearray()
+    while n >= 0x80:
+        out.append((n & 0x7F) | 0x80)
+        n >>= 7
+    out.append(n)
+    return bytes(out)
+
+
+def encode_record(key, value):
+    k = key.encode("utf-8") if isinstance(key, str) else key
+    v = value.encode("utf-8") if isinstance(value, str) else value
+    return _varint(len(k)) + k + _varint(len(v)) + v
+
+
+def encode(pairs):
+    """Encode (key, value) pairs into a raw block (without MAGIC)."""
+    return b"".join(encode_record(k, v) for k, v in pairs)
+
+
+def _read_varint(view, pos):
+    n = shift = 0
+    while True:
+        b = view[pos]
+        pos += 1
+        n |= (b & 0x7F) << shift
+        if b < 0x80:
+            return n, pos
+        shift += 7
+
+
+def decode(data, pos=0):
+    """Yield (key, value) strings from a raw block."""
+    view = memoryview(data)
+    end = len(data)
+    while pos < end:
+        n, pos = _read_varint(view, pos)
+        key = bytes(view[pos:pos + n]).decode("utf-8", errors="replace")
+        pos += n
+        n, pos = _read_varint(view, pos)
+        value = bytes(view[pos:pos + n]).decode("utf-8", errors="replace")
+        pos += n
+        yield key, value
+
+
+def emit(key, value):
+    """Write one record to the task output (sys.stdout)."""
+    global _stream
+    out = sys.stdout.buffer
+    if out is not _stream:
+        # New task output (the runtime swaps stdout per chunk): start a new stream.
+        sys.stdout.flush()
+        out.write(MAGIC)
+        _stream = out
+    out.write(encode_record(str(key), str(value)))
+
+
+def read(path=None):
+    """Yield (key, value) pairs from the task input, in records or text format."""
+    if path is None:
+        path = sys.argv[1]
+    with open(path, "rb") as f:
+        data = f.read()
+    if data.startswith(MAGIC):
+        yield from decode(data, len(MAGIC))
+        return
+    for line in data.decode("utf-8", errors="ignore").splitlines():
+        if "\t" in line:
+            key, value = line.split("\t", 1)
+            yield key, value
+
+
+def grouped(path=None):
+    """Yield (key, values) for consecutive runs of equal keys (reduce input is sorted)."""
+    for key, group in itertools.groupby(read(path), key=lambda kv: kv[0]):
+        yield key, [v for _, v in group]
@@ -0,0 +1,276 @@
+#!/usr/bin/env python3
+"""
+Long-lived executor for Clover map/reduce scripts.
+
+A Poneglyph worker starts one runtime process and keeps it warm instead of
+forking ``python3 map.py input.txt`` for every task. Requests and responses
+travel over the process stdin/stdout as length-prefixed frames
+(4-byte big-endian length followed by the payload):
+
+    request:  op ("run" | "profile"), script_path, input
+    response: status ("ok" | "error"), output, message, stats
+
+Scripts are compiled once per content hash and executed in a fresh
+``__main__`` namespace for each chunk. They keep working unchanged: the
+input is visible both as a file in ``sys.argv[1]`` and as ``sys.stdin``,
+and everything printed to ``sys.stdout`` becomes the task output.
+
+``stats`` holds tab-separated lines with the time spent on each step, in
+milliseconds: ``load`` (finding or compiling the script), ``input``
+(exposing the chunk to it) and ``exec`` (the user code). With the
+"profile" op the script runs under cProfile and ``hot`` lines follow, one
+per function with the most self time: ``hot calls self_ms cumulative_ms
+name``.
+"""
+import builtins
+import cProfile
+import hashlib
+import io
+import os
+import pstats
+import struct
+import sys
+import tempfile
+import time
+import traceback
+from collections import OrderedDict
+
+_LEN = struct.Struct(">I")
+MAX_CACHED_SCRIPTS = 32
+PROFILE_TOP = 15
+
+# Make `import clover...` available to user scripts.
+_LIB_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if _LIB_ROOT not in sys.path:
+    sys.path.append(_LIB_ROOT)
+
+
+def read_frame(stream):
+    """Read one frame; returns None on a clean EOF."""
+    header = stream.read(_LEN.size)
+    if not header:
+        return None
+    if len(header) < _LEN.size:
+        raise EOFError("truncated frame header")
+    (size,) = _LEN.unpack(header)
+    data = stream.read(size)
+    if len(data) < size:
+        raise EOFError("truncated frame body")
+    return data
+
+
+def write_frame(stream, data):
+    stream.write(_LEN.pack(len(data)))
+    stream.write(data)
+
+
+class ScriptCache:
+    """Bounded LRU of compiled scripts keyed by content hash (sha256).
+
+    The worker hands every task a hard link to its cached copy of the job's
+    script, ``<script_dir>/<sha256>.py``. A file that shares its inode with
+    one of those is known by that name without reading or hashing it. Any
+    other file is read and hashed: task directories are recreated for every
+    task and inode numbers are reused, so an inode alone proves nothing.
+    """
+
+    def __init__(self, capacity=MAX_CACHED_SCRIPTS, script_dir=None):
+        self.capacity = capacity
+        self.script_dir = script_dir
+        self._codes = OrderedDict()
+        self._links = {}  # (dev, ino) -> file name in script_dir
+
+    def _cached_hash(self, st):
+        """Content hash of a file linked from script_dir, else None."""
+        if not self.script_dir or st.st_nlink < 2:
+            return None
+        inode = (st.st_dev, st.st_ino)
+        for rescan in (False, True):
+            if rescan:
+                self._links = {}
+                try:
+                    with os.scandir(self.script_dir) as entries:
+                        for e in entries:
+                            if e.name.endswith(".py"):
+                                s = e.stat(follow_symlinks=False)
+                                self._links[(s.st_dev, s.st_ino)] = e.name
+                except OSError:
+                    return None
+            name = self._links.get(inode)
+            if name is None:
+                continue
+            # The name must still be that inode: cached files are evicted and inodes reused.
+            try:
+                s = os.stat(os.path.join(self.script_dir, name))
+            except OSError:
+                continue
+            if (s.st_dev, s.st_ino) == inode:
+                return name[:-len(".py")]
+        return None
+
+    def load(self, path):
+        key = self._cached_hash(os.stat(path))
+        code = self._codes.get(key) if key else None
+        if code is not None:
+            self._codes.move_to_end(key)
+            return code
+
+        with open(path, "rb") as f:
+            source = f.read()
+        key = hashlib.sha256(source).hexdigest()
+        code = self._codes.get(key)
+        if code is None:
+            code = compile(source, path, "exec")
+            self._codes[key] = code
+            if len(self._codes) > self.capacity:
+                self._codes.popitem(last=False)
+        else:
+            self._codes.move_to_end(key)
+        return code
+
+
+class _InputFile:
+    """Exposes the chunk as a path for sys.argv[1] without touching the disk."""
+
+    def __init__(self, data):
+        self._fd = None
+        self._tmp = None
+        if hasattr(os, "memfd_create"):
+            self._fd = os.memfd_create("clover-input")
+            os.write(self._fd, data)
+            self.path = f"/proc/self/fd/{self._fd}"
+        else:
+            self._tmp = tempfile.NamedTemporaryFile(prefix="clover-input-", delete=False)
+            self._tmp.write(data)
+            self._tmp.close()
+            self.path = self._tmp.name
+
+    def close(self):
+        if self._fd is not None:
+            os.close(self._fd)
+        if self._tmp is not None:
+            os.unlink(self._tmp.name)
+
+
+def _ms(start):
+    return (time.perf_counter() - start) * 1000.0
+
+
+def run_script(code, script_path, data, profiler=None, timings=None):
+    """Execute a compiled script over ``data``; returns (output_bytes, error_or_None).
+
+    Step durations go into ``timings`` ("input", "exec") when it is given,
+    and the user code runs under ``profiler`` when one is given.
+    """
+    timings = {} if timings is None else timings
+    start = time.perf_counter()
+    inp = _InputFile(data)
+    out = io.BytesIO()
+    stdout = io.TextIOWrapper(out, encoding="utf-8", write_through=True)
+    stdin = io.TextIOWrapper(io.BytesIO(data), encoding="utf-8", errors="ignore")
+    saved = (sys.argv, sys.stdin, sys.stdout, list(sys.path))
+    cwd = os.getcwd()
+    script_dir = os.path.dirname(os.path.abspath(script_path))
+    sys.argv = [script_path, inp.path]
+    sys.stdin, sys.stdout = stdin, stdout
+    sys.path.insert(0, script_dir)
+    # Relative files a script writes land in its own task directory.
+    os.chdir(script_dir)
+    error = None
+    timings["input"] = _ms(start)
+    start = time.perf_counter()
+    try:
+        if profiler is not None:
+            profiler.enable()
+        exec(code, {"__name__": "__main__", "__file__": script_path, "__builtins__": builtins})
+    except SystemExit as e:
+        if e.code not in (None, 0):
+            error = f"script exited with status {e.code}"
+    except BaseException:
+        error = traceback.format_exc()
+    finally:
+        if profiler is not None:
+            profiler.disable()
+        timings["exec"] = _ms(start)
+        try:
+            stdout.flush()
+            stdout.detach()
+        except ValueError:
+            pass  # the script closed or replaced its stdout
+        sys.argv, sys.stdin, sys.stdout, sys.path[:] = saved
+        os.chdir(cwd)
+        inp.close()
+    return out.getvalue(), error
+
+
+def hot_functions(profiler, top=PROFILE_TOP):
+    """(calls, self_ms, cumulative_ms, name) of the functions with the most self time."""
+    try:
+        stats = pstats.Stats(profiler).stats
+    except TypeError:  # nothing was recorded
+        return []
+    rows = []
+    for (filename, line, func), (_, calls, self_s, cum_s, _) in stats.items():
+        name = func if filename == "~" else f"{func} ({os.path.basename(filename)}:{line})"
+        rows.append((calls, self_s * 1000.0, cum_s * 1000.0, name))
+    rows.sort(key=lambda r: r[1], reverse=True)
+    return rows[:top]
+
+
+def format_stats(timings, hot=()):
+    lines = [f"{step}\t{ms:.3f}" for step, ms in timings.items()]
+    for calls, self_ms, cum_ms, name in hot:
+        name = name.replace("\t", " ").replace("\n", " ")
+        lines.append(f"hot\t{calls}\t{self_ms:.3f}\t{cum_ms:.3f}\t{name}")
+    return "\n".join(lines).encode("utf-8")
+
+
+def serve(rx, tx, script_dir=None):
+    cache = ScriptCache(script_dir=script_dir)
+    while True:
+        op = read_frame(rx)
+        if op is None:
+            return
+        script_path = read_frame(rx).decode("utf-8")
+        data = read_frame(rx)
+
+        timings = {}
+        profiler = cProfile.Profile() if op == b"profile" else None
+        if op not in (b"run", b"profile"):
+            output, error = b"", f"unknown op {op!r}"
+        else:
+            try:
+                start = time.perf_counter()
+                code = cache.load(script_path)
+                timings["load"] = _ms(start)
+                output, error = run_script(code, script_path, data, profiler, timings)
+            except Exception:
+                output, error = b"", traceback.format_exc()
+
+        if error:
+            print(f"[CLOVER RUNTIME] {script_path}: {error}", file=sys.stderr, flush=True)
+        write_frame(tx, b"error" if error else b"ok")
+        write_frame(tx, output)
+        write_frame(tx, (error or "").encode("utf-8"))
+        write_frame(tx, format_stats(timings, hot_functions(profiler) if profiler is not None else ()))
+        tx.flush()
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    # --script-cache DIR: the worker's script cache, see ScriptCache
+    script_dir = argv[argv.index("--script-cache") + 1] if "--script-cache" in argv[:-1] else None
+    # Keep the protocol on private descriptors so stray prints or C extensions
+    # writing to fd 1 cannot corrupt the frame stream.
+    rx = os.fdopen(os.dup(0), "rb")
+    tx = os.fdopen(os.dup(1), "wb")
+    devnull = os.open(os.devnull, os.O_RDONLY)
+    os.dup2(devnull, 0)
+    os.close(devnull)
+    os.dup2(2, 1)
+    sys.stdout = sys.stderr
+    serve(rx, tx, script_dir)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+"""
+Iterative stencil jobs (cellular automata) on this machine.
+
+A stencil job (``"mode": "stencil"``, see clover.client.stencil_job) runs
+``generations`` steps of a Life-like rule over a grid. On the cluster the
+master cuts the grid into tiles that stay on the workers between
+generations and only exchanges their edges; this module computes the same
+result in one process, for LocalRunner and for checking cluster output.
+
+The grid format is the master's: a ``W H`` header line, then H rows of W
+cells, either space-separated 0/1 (``0 1 1 0``) or compact (``0110``,
+``.##.``). Missing rows or cells are dead. The output uses the
+space-separated form, split into one band of ``tile_size`` rows per result
+partition like the master writes it.
+
+Each row is a Python int with bit x set for a live cell x, so a generation
+is a few dozen big-int operations per row instead of a loop over cells.
+"""
+import re
+
+DEFAULT_RULE = "B3/S23"
+DEFAULT_TILE = 256
+ALIVE = "1#*O"
+
+_RULE = re.compile(r"B([0-8]*)/S([0-8]*)")
+
+
+def parse_rule(rule=DEFAULT_RULE):
+    """(birth, survive) bit masks of a rule like "B3/S23"; bit n is set
+    when a cell with n live neighbours is born / survives."""
+    m = _RULE.fullmatch(rule.strip().upper())
+    if not m:
+        raise ValueError(f"bad rule {rule!r} (expected e.g. B3/S23)")
+    return tuple(sum(1 << int(d) for d in set(g)) for g in m.groups())
+
+
+def parse_grid(text):
+    """(width, height, rows) of a grid in the master's input format."""
+    lines = text.split("\n")
+    at = 0
+    while at < len(lines) and (not lines[at].strip() or lines[at].startswith("#")):
+        at += 1
+    if at == len(lines):
+        raise ValueError("empty grid")
+    try:
+        width, height = (int(v) for v in lines[at].split()[:2])
+    except ValueError:
+        raise ValueError('grid must start with a "W H" header line') from None
+    if width < 1 or height < 1:
+        raise ValueError("grid is empty")
+    rows = []
+    for line in lines[at + 1:]:
+        if len(rows) == height:
+            break
+        line = line.strip()
+        if not line:
+            continue
+        cells = line.split() if " " in line or "\t" in line else line
+        row = 0
+        for x, cell in enumerate(cells[:width]):
+            if cell[0] in ALIVE:
+                row |= 1 << x
+        rows.append(row)
+    rows += [0] * (height - len(rows))
+    return width, height, rows
+
+
+def step(rows, width, birth, survive, wrap=False):
+    """One generation; neighbours outside the grid are dead unless it wraps."""
+    mask = (1 << width) - 1
+    height = len(rows)
+    out = []
+    for y, cur in enumerate(rows):
+        above = rows[y - 1] if y > 0 else (rows[-1] if wrap else 0)
+        below = rows[y + 1] if y + 1 < height else (rows[0] if wrap else 0)
+        s0 = s1 = s2 = s3 = 0  # neighbour count, one bit plane each
+        for i, r in enumerate((above, cur, below)):
+            # The west neighbour of x is x-1 (shift up), the east one x+1.
+            west = (r << 1 | (r >> (width - 1) if wrap else 0)) & mask
+            east = r >> 1 | ((r & 1) << (width - 1) if wrap else 0)
+            for n in ((west, east) if i == 1 else (west, r, east)):
+                c0 = s0 & n
+                s0 ^= n
+                c1 = s1 & c0
+                s1 ^= c0
+                c2 = s2 & c1
+                s2 ^= c1
+                s3 |= c2
+        born = keep = 0
+        for k in range(9):
+            if not (birth >> k & 1 or survive >> k & 1):
+                continue
+            eq = ((s0 if k & 1 else ~s0) & (s1 if k & 2 else ~s1)
+                  & (s2 if k & 4 else ~s2) & (s3 if k & 8 else ~s3) & mask)
+            if birth >> k & 1:
+                born |= eq
+            if survive >> k & 1:
+                keep |= eq
+        out.append((born & ~cur | keep & cur) & mask)
+    return out
+
+
+def run(text, generations=1, rule=DEFAULT_RULE, wrap=False):
+    """(width, height, rows) after `generations` steps of the grid in `text`."""
+    birth, survive = parse_rule(rule)
+    width, height, rows = parse_grid(text)
+    for _ in range(generations):
+        rows = step(rows, width, birth, survive, wrap)
+    return width, height, rows
+
+
+def format_rows(rows, width):
+    return "".join(" ".join("1" if r >> x & 1 else "0" for x in range(width)) + "\n" for r in rows)
+
+
+def bands(width, height, rows, tile_size=DEFAULT_TILE):
+    """The grid as the master's result partitions: {band: text}, one band per
+    `tile_size` rows, the first one starting with the "W H" header."""
+    out = {}
+    for b, y in enumerate(range(0, height, tile_size)):
+        text = format_rows(rows[y:y + tile_size], width)
+        out[b] = f"{width} {height}\n{text}" if b == 0 else text
+    return out
+
+
+def live(rows):
+    return sum(bin(r).count("1") for r in rows)
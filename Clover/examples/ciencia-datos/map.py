@@ -1,24 +1,6 @@
 #!/usr/bin/env python3
-import sys
+from clover import aggregate
 
-def mapper():
-    """
-    Mapper: lee números de stdin, emite:
-    sum -> valor
-    sumsq -> valor^2
-    count -> 1
-    """
-    for line in sys.stdin:
-        line = line.strip()
-        if not line:
-            continue
-        try:
-            x = float(line)
-            print(f"sum\t{x}")
-            print(f"sumsq\t{x*x}")
-            print("count\t1")
-        except ValueError:
-            continue
-
-if __name__ == "__main__":
-    mapper()
+# Modo por bloques: un solo registro por split con N, suma y suma de cuadrados.
+split = aggregate.load(columns=("x",))
+aggregate.emit(split, ["count", "sum(x)", "sumsq(x)"])
@@ -1,23 +1,14 @@
 #!/usr/bin/env python3
-import sys
-
-def reducer():
-    inside_count = 0
-    total_count = 0
-
-    for line in sys.stdin:
-        key, value = line.strip().split("\t")
-        value = int(value)
-        if key == "inside":
-            inside_count += value
-        elif key == "total":
-            total_count += value
-
-    if total_count > 0:
-        pi_estimate = 4 * inside_count / total_count
-        print(f"Estimación de pi: {pi_estimate}")
-    else:
-        print("No se encontraron datos válidos.")
-
-if __name__ == "__main__":
-    reducer()
+from clover import aggregate
+
+inside_count = 0
+total_count = 0
+for _, acc in aggregate.merged():
+    inside_count += int(acc["sum(inside)"])
+    total_count += acc["count"]
+
+if total_count > 0:
+    pi_estimate = 4 * inside_count / total_count
+    print(f"Estimación de pi: {pi_estimate}")
+else:
+    print("No se encontraron datos válidos.")
@@ -1,181 +1,375 @@
-import base64, json, sys, time, os
-import urllib.request
+import asyncio, sys, time, os
 import argparse
-from urllib.error import URLError, HTTPError
+import json
 
-MASTER = os.getenv("MASTER", "http://35.153.249.132:8080")
-
-def b64(path):
-    """Encode file content to base64"""
-    with open(path, "rb") as f:
-        return base64.b64encode(f.read()).decode("ascii")
-
-def post(url, data):
-    """Send POST request with JSON data"""
-    req = urllib.request.Request(url, data=json.dumps(data).encode("utf-8"),
-                                 headers={"Content-Type":"application/json"})
-    with urllib.request.urlopen(req) as resp:
-        return json.loads(resp.read().decode())
+from clover.client import Client, MasterError, example_job, stencil_job
+from clover.local import LocalJobError, LocalRunner
 
-def get_text(url):
-    """Get text response from URL"""
-    with urllib.request.urlopen(url) as resp:
-        return resp.read().decode()
+MASTER = os.getenv("MASTER", "http://35.153.249.132:8080")
+LOCAL_MAX_BYTES = 32 * 1024 * 1024  # --mode auto runs smaller inputs locally
 
-def validate_example_structure(example_dir):
+def validate_example_structure(example_dir, required_files=("map.py", "reduce.py", "data.txt")):
     """Validate that example directory has required files"""
-    required_files = ["map.py", "reduce.py", "data.txt"]
     missing_files = []
-    
+
     for file in required_files:
         file_path = os.path.join(example_dir, file)
         if not os.path.exists(file_path):
             missing_files.append(file)
-    
+
     if missing_files:
         print(f"❌ Error: Missing required files in {example_dir}:")
         for file in missing_files:
             print(f"   - {file}")
         return False
-    
+
     return True
 
-def submit_mapreduce_job(example_dir, job_id=None, split_size=64, reducers=2):
-    """Submit a MapReduce job from an example directory"""
-    
+def format_status(st):
+    status_str = f"Status: {st['state']}"
+    if 'generations' in st:
+        status_str += f" | Generation: {st['generation']}/{st['generations']}"
+        status_str += f" | Steps: {st['steps_completed']}/{st['steps_total']} | Live: {st.get('live')}"
+        if st.get('error'):
+            status_str += f" | Error: {st['error']}"
+        return status_str
+    if 'maps_completed' in st and 'maps_total' in st:
+        status_str += f" | Maps: {st['maps_completed']}/{st['maps_total']}"
+    if 'reduces_completed' in st and 'reduces_total' in st:
+        status_str += f" | Reduces: {st['reduces_completed']}/{st['reduces_total']}"
+    if st.get('map_cache_hits'):
+        status_str += f" | Cached maps: {st['map_cache_hits']}"
+    return status_str
+
+def format_profile(p, tag=""):
+    """Lines of a job profile (GET /api/jobs/profile): phase percentiles per
+    task type, the hottest functions of profiled scripts, the slowest tasks."""
+    lines = [f"{tag}{p['tasks']} tasks profiled"
+             + (f", {p['duplicates']} duplicate completions" if p.get('duplicates') else "")
+             + (f", {p['dropped']} not recorded" if p.get('dropped') else "")]
+    for task_type, phases in p.get("phases_ms", {}).items():
+        lines.append(f"{tag}{task_type + ' (ms)':<18} {'p50':>9} {'p90':>9} {'p99':>9} {'max':>9} {'total':>10}")
+        for phase, st in phases.items():
+            lines.append(f"{tag}  {phase:<16} {st['p50']:>9.1f} {st['p90']:>9.1f} {st['p99']:>9.1f} "
+                         f"{st['max']:>9.1f} {st['total']:>10.1f}")
+    for task_type, fns in p.get("hot", {}).items():
+        lines.append(f"{tag}{task_type} hot functions (self ms, calls):")
+        for fn in fns[:10]:
+            lines.append(f"{tag}  {fn['self_ms']:>10.1f} {fn['calls']:>10}  {fn['name']}")
+    slowest = p.get("slowest", [])[:3]
+    if slowest:
+        lines.append(f"{tag}slowest: " + ", ".join(
+            f"{t['task_id']}@{t['worker_id']} {t['phases_ms']['total']:.0f}ms" for t in slowest))
+    return lines
+
+def prepare_job(example_dir, job_id=None, split_size=64, reducers=2,
+                combiner=None, combine_with_reduce=False,
+                intermediate="text", compression="none", map_cache=True,
+                partitioner="hash", split_hot_keys=False, reduce_preserves_keys=False, cprofile=False,
+                input_path=None, repeat=1000, tag="",
+                generations=None, tile_size=256, rule="B3/S23", wrap=False):
+    """Job spec and input path for an example directory (None if it is incomplete).
+    With `generations`, the example's data.txt is a grid and the job is an
+    iterative stencil job instead of MapReduce (no scripts needed)."""
+
+    if generations is not None:
+        if not input_path and not validate_example_structure(example_dir, ("data.txt",)):
+            return None, None
+        name = os.path.basename(os.path.abspath(example_dir))
+        job = stencil_job(name, job_id=job_id, generations=generations, tile_size=tile_size, rule=rule, wrap=wrap)
+        data_path = input_path or os.path.join(example_dir, "data.txt")
+        print(f"🚀 {tag}Stencil job: {job['job_id']}")
+        print(f"📊 {tag}Grid: {data_path} | Generations: {generations} | Tile: {tile_size} "
+              f"| Rule: {rule}{' | wrap' if wrap else ''}")
+        return job, data_path
+
     # Validate structure
     if not validate_example_structure(example_dir):
-        return False
-    
-    # Generate job ID if not provided
-    if not job_id:
-        example_name = os.path.basename(os.path.abspath(example_dir))
-        timestamp = int(time.time())
-        job_id = f"{example_name}-{timestamp}"
-    
-    print(f"🚀 Submitting MapReduce job: {job_id}")
-    print(f"📂 Example directory: {example_dir}")
-    
+        return None, None
+
+    # Usar split_size fijo para tamaños grandes
+    if split_size == 64:  # Si es el default pequeño
+        split_size = 2048  # 2KB fijo - bueno para demos
+
+    job = example_job(example_dir, job_id=job_id, combiner=combiner,
+                      combine_with_reduce=combine_with_reduce, split_size=split_size,
+                      reducers=reducers, intermediate=intermediate, compression=compression,
+                      map_cache=map_cache, partitioner=partitioner, split_hot_keys=split_hot_keys,
+                      reduce_preserves_keys=reduce_preserves_keys,
+                      cprofile=cprofile)
+    data_path = input_path or os.path.join(example_dir, "data.txt")
+
+    data_size = os.path.getsize(data_path) * repeat
+    print(f"🚀 {tag}MapReduce job: {job['job_id']}")
+    print(f"📊 {tag}Data: {data_size} bytes ({data_path} x{repeat}) | Split size: {split_size} "
+          f"| ~{data_size // split_size} tasks | Reducers: {reducers} "
+          f"| Combiner: {'yes' if 'combine_script_b64' in job else 'no'}")
+    return job, data_path
+
+async def run_job(client, example_dir, output=None, partition=None, repeat=1000,
+                  compress=False, inline=False, tag="", profile=False, trace=None, **job_options):
+    """Submit one example job through `client`, wait for it and print or save
+    its result. With `profile`, also print where the tasks' time went; with
+    `trace`, save the job's timeline there (Chrome trace format). Returns
+    True on success."""
     try:
-        # Read scripts
-        map_path = os.path.join(example_dir, "map.py")
-        reduce_path = os.path.join(example_dir, "reduce.py")
-        data_path = os.path.join(example_dir, "data.txt")
-        
-        print(f"📄 Loading map script: {map_path}")
-        map_b64 = b64(map_path)
-        
-        print(f"📄 Loading reduce script: {reduce_path}")
-        reduce_b64 = b64(reduce_path)
-        
-        print(f"📄 Loading data file: {data_path}")
-        with open(data_path, 'r', encoding='utf-8') as f:
-            input_text = f.read()
-        
-        input_text=input_text*1000  # Aumentar tamaño para demo
-        
-        # Usar split_size fijo para tamaños grandes
-        if split_size == 64:  # Si es el default pequeño
-            split_size = 2048  # 2KB fijo - bueno para demos
-            
-        data_size = len(input_text)
-        estimated_tasks = data_size // split_size
-        
-        print(f"📊 Original data size: {len(input_text)//1000} characters")
-        print(f"📊 Expanded data size: {data_size} characters (x1000 for demo)")
-        print(f"📊 Split size: {split_size} bytes (fixed)")
-        print(f"📊 Estimated tasks: ~{estimated_tasks}")
-        print(f"📊 Reducers: {reducers}")
-        # Create job payload
-        job = {
-            "job_id": job_id,
-            "input_text": input_text,
-            "split_size": split_size,
-            "reducers": reducers,
-            "format": "text",
-            "map_script_b64": map_b64,
-            "reduce_script_b64": reduce_b64
-        }
-        
-        # Submit job
-        print(f"📤 Submitting to master: {MASTER}")
-        r = post(f"{MASTER}/api/jobs", job)
-        print(f"✅ Job submitted successfully: {r}")
-        
-        # Monitor job progress
-        print(f"\n🔄 Monitoring job progress...")
-        while True:
-            try:
-                st = json.loads(get_text(f"{MASTER}/api/jobs/status?job_id={job_id}"))
-                status_str = f"Status: {st['state']}"
-                if 'maps_completed' in st and 'maps_total' in st:
-                    status_str += f" | Maps: {st['maps_completed']}/{st['maps_total']}"
-                if 'reduces_completed' in st and 'reduces_total' in st:
-                    status_str += f" | Reduces: {st['reduces_completed']}/{st['reduces_total']}"
-                
-                print(status_str)
-                
-                if st["state"] in ("SUCCEEDED", "FAILED"):
-                    break
-                time.sleep(2)
-            except Exception as e:
-                print(f"⚠️  Error checking status: {e}")
-                break
-        
-        # Get results
-        if st["state"] == "SUCCEEDED":
-            print(f"\n🎉 Job completed successfully!")
-            try:
-                result = get_text(f"{MASTER}/api/jobs/result?job_id={job_id}")
-                print(f"\n📋 RESULTS:")
-                print("=" * 50)
-                print(result)
-                print("=" * 50)
-                return True
-            except Exception as e:
-                print(f"❌ Error retrieving results: {e}")
-                return False
-        else:
-            print(f"\n❌ Job failed with state: {st['state']}")
+        job, data_path = prepare_job(example_dir, repeat=repeat, tag=tag, **job_options)
+        if job is None:
             return False
-            
+        job_id = job["job_id"]
+
+        started = time.time()
+        r = await client.submit(job, input_path=data_path, repeat=repeat, compress=compress, inline=inline)
+        print(f"✅ {tag}Job submitted ({time.time() - started:.1f}s): {r}")
+
+        last = [None]
+        def on_status(st):
+            line = format_status(st)
+            if line != last[0]:
+                print(f"{tag}{line}")
+                last[0] = line
+
+        st = await client.wait(job_id, on_status=on_status)
+        if st["state"] != "SUCCEEDED":
+            print(f"\n❌ {tag}Job failed with state: {st['state']}")
+            return False
+
+        print(f"\n🎉 {tag}Job completed successfully!")
+        if profile:
+            print(f"\n⏱️  {tag}PROFILE:")
+            print("\n".join(format_profile(await client.profile(job_id), tag)))
+        if trace:
+            with open(trace, "w", encoding="utf-8") as f:
+                json.dump(await client.profile(job_id, trace=True), f)
+            print(f"🧭 {tag}Timeline written to {trace} (open in ui.perfetto.dev or chrome://tracing)")
+        if output:
+            size = await client.download(job_id, output, partition)
+            print(f"\n💾 {tag}Result written to {output} ({size} bytes)")
+            return True
+        print(f"\n📋 {tag}RESULTS:")
+        print("=" * 50)
+        async for chunk in client.result(job_id, partition):
+            sys.stdout.write(chunk.decode("utf-8", "replace"))
+        print("=" * 50)
+        return True
+
     except FileNotFoundError as e:
-        print(f"❌ File not found: {e}")
+        print(f"❌ {tag}File not found: {e}")
         return False
-    except URLError as e:
-        print(f"❌ Connection error: {e}")
-        print(f"   Make sure the master is running at: {MASTER}")
+    except (ConnectionError, OSError, asyncio.TimeoutError) as e:
+        print(f"❌ {tag}Connection error: {e}")
+        print(f"   Make sure the master is running at: {client.master}")
         return False
-    except HTTPError as e:
-        print(f"❌ HTTP error: {e}")
+    except MasterError as e:
+        print(f"❌ {tag}HTTP error: {e}")
         return False
     except Exception as e:
-        print(f"❌ Unexpected error: {e}")
+        print(f"❌ {tag}Unexpected error: {e}")
         return False
 
+def run_local_job(runner, example_dir, output=None, partition=None, repeat=1000,
+                  compress=False, inline=False, tag="", profile=False, trace=None, **job_options):
+    """Run one example job on this machine with `runner` (a LocalRunner).
+    Task profiles come from the master, so `profile` and `trace` are ignored.
+    Returns True on success."""
+    try:
+        job, data_path = prepare_job(example_dir, repeat=repeat, tag=tag, **job_options)
+        if job is None:
+            return False
+        print(f"💻 {tag}Running locally on {runner.processes} processes")
+        if inline:
+            # Same splits as the master cuts from input_text
+            with open(data_path, 'r', encoding='utf-8') as f:
+                job["input_text"] = f.read() * repeat
+            result = runner.run(job)
+        else:
+            result = runner.run(job, input_path=data_path, repeat=repeat)
+        timings = " | ".join(f"{k} {v:.2f}s" for k, v in result.timings.items())
+        counts = f"{result.maps} maps, {result.records} records shuffled | " if result.maps else ""
+        print(f"⏱️  {tag}{counts}{timings}")
+
+        print(f"\n🎉 {tag}Job completed successfully!")
+        if output:
+            size = result.write(output, partition)
+            print(f"\n💾 {tag}Result written to {output} ({size} bytes)")
+            return True
+        print(f"\n📋 {tag}RESULTS:")
+        print("=" * 50)
+        sys.stdout.write(result.text(partition))
+        print("=" * 50)
+        return True
+
+    except FileNotFoundError as e:
+        print(f"❌ {tag}File not found: {e}")
+        return False
+    except LocalJobError as e:
+        print(f"❌ {tag}Script failed: {e}")
+        return False
+    except Exception as e:
+        print(f"❌ {tag}Unexpected error: {e}")
+        return False
+
+def input_bytes(example_dir, input_path=None, repeat=1000, **_):
+    path = input_path or os.path.join(example_dir, "data.txt")
+    return os.path.getsize(path) * repeat if os.path.exists(path) else 0
+
+async def run_jobs(example_dirs, master=None, connections=8, mqtt_broker=None, job_id=None, output=None,
+                   mode="cluster", local_max_bytes=LOCAL_MAX_BYTES, processes=None, **options):
+    """Run the examples concurrently; returns True if all succeeded.
+
+    mode "cluster" submits every job to the master over one client, "local"
+    runs them on this machine, and "auto" runs locally those whose input is
+    below `local_max_bytes`.
+    """
+    several = len(example_dirs) > 1
+    if options.get("generations") is not None:
+        options["repeat"] = 1  # a grid repeated is not a grid
+    remote, local = [], []
+    for i, example_dir in enumerate(example_dirs):
+        args = dict(options,
+                    job_id=f"{job_id}-{i}" if job_id and several else job_id,
+                    output=f"{output}.{i}" if output and several else output,
+                    trace=f"{options['trace']}.{i}" if options.get("trace") and several else options.get("trace"),
+                    tag=f"[{os.path.basename(os.path.abspath(example_dir))}] " if several else "")
+        small = input_bytes(example_dir, **options) < local_max_bytes
+        (local if mode == "local" or (mode == "auto" and small) else remote).append((example_dir, args))
+
+    async def run_remote():
+        if not remote:
+            return []
+        async with Client(master or MASTER, connections=connections, mqtt_broker=mqtt_broker) as client:
+            print(f"📡 Completion via {'MQTT events' if client.events else 'polling'}")
+            return await asyncio.gather(*(run_job(client, d, **args) for d, args in remote))
+
+    def run_local():
+        # One pool at a time: local jobs run one after another, each using every core.
+        runner = LocalRunner(processes)
+        return [run_local_job(runner, d, **args) for d, args in local]
+
+    results = await asyncio.gather(run_remote(), asyncio.to_thread(run_local))
+    return all(results[0]) and all(results[1])
+
+def submit_mapreduce_job(example_dir, **options):
+    """Submit a MapReduce job from an example directory and wait for it
+    (see run_job for the options). Returns True on success."""
+    return asyncio.run(run_jobs([example_dir], **options))
+
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description='Submit MapReduce jobs to Poneglyph cluster')
-    parser.add_argument('example_dir', help='Path to example directory containing map.py, reduce.py, and data.txt')
+    parser.add_argument('example_dir', nargs='+',
+                        help='Path to example directory containing map.py, reduce.py, and data.txt '
+                             '(several run concurrently)')
     parser.add_argument('--job-id', help='Custom job ID (default: auto-generated)')
     parser.add_argument('--split-size', type=int, default=64, help='Split size in bytes (default: 64)')
     parser.add_argument('--reducers', type=int, default=2, help='Number of reducers (default: 2)')
+    parser.add_argument('--combiner', help='combine.py applied to each map output: a path, or a shared combiner from clover.combiners '
+                             '(sum, aggregate). Default: combine.py in example_dir, else the combiner its '
+                             '"combiner" file names, if any')
+    parser.add_argument('--combine-with-reduce', action='store_true',
+                        help='Use reduce.py as the combiner (its output must be key\\tvalue lines)')
+    parser.add_argument('--intermediate', choices=['text', 'binary', 'records'], default='text',
+                        help='Map output/reduce input format on gRPC workers: text (default), binary '
+                             '(records on the wire, text for scripts) or records (reduce.py reads clover.records)')
+    parser.add_argument('--compression', choices=['none', 'deflate'], default='none',
+                        help='Block compression for binary intermediate data (default: none)')
+    parser.add_argument('--partitioner', choices=['hash', 'range'], default='hash',
+                        help='Key partitioner; range is cut from a sample of early map output (default: hash)')
+    parser.add_argument('--split-hot-keys', action='store_true',
+                        help='Spread dominant keys over several reducers and merge their partial outputs '
+                             'with reduce.py (needs --reduce-preserves-keys)')
+    parser.add_argument('--reduce-preserves-keys', action='store_true',
+                        help='Declare that reduce.py prints key\\tvalue for the keys it reduces and accepts '
+                             'its own output as input (sums, counts, min/max)')
+    parser.add_argument('--no-cache', action='store_true',
+                        help='Run every map task even if its chunk was already mapped by the same scripts')
+    parser.add_argument('--output', '-o', metavar='FILE',
+                        help='Stream the result to FILE instead of printing it (FILE.N per job with several)')
+    parser.add_argument('--partition', type=int,
+                        help='Fetch only this reduce partition of the result')
+    parser.add_argument('--input', metavar='FILE',
+                        help='Input file (default: data.txt in example_dir); streamed, so it can be larger than memory')
+    parser.add_argument('--repeat', type=int, default=1000,
+                        help='Send the input this many times, to enlarge demo data (default: 1000)')
+    parser.add_argument('--compress', action='store_true',
+                        help='Gzip the input upload on the fly')
+    parser.add_argument('--inline', action='store_true',
+                        help='Embed the input in the job JSON (input_text) instead of uploading it')
+    parser.add_argument('--connections', type=int, default=8,
+                        help='Keep-alive connections to the master (default: 8)')
+    parser.add_argument('--mqtt', metavar='BROKER',
+                        help='MQTT broker for completion events, e.g. tcp://host:1883 '
+                             '(default: MQTT_BROKER env var; needs paho-mqtt)')
+    parser.add_argument('--no-mqtt', action='store_true',
+                        help='Poll job status instead of waiting for MQTT events')
+    parser.add_argument('--mode', choices=['cluster', 'local', 'auto'], default='cluster',
+                        help='Run on the cluster (default), locally on a process pool without master/workers, '
+                             'or locally only when the input is smaller than --local-max-mb')
+    parser.add_argument('--local', action='store_const', const='local', dest='mode',
+                        help='Shorthand for --mode local')
+    parser.add_argument('--local-max-mb', type=float, default=LOCAL_MAX_BYTES / (1024 * 1024),
+                        help=f'Input size below which --mode auto runs locally (default: {LOCAL_MAX_BYTES >> 20})')
+    parser.add_argument('--processes', type=int,
+                        help='Local mode: worker processes (default: CPU count)')
+    parser.add_argument('--generations', type=int,
+                        help='Run an iterative stencil job (cellular automaton) for this many generations '
+                             'over the grid in data.txt instead of MapReduce')
+    parser.add_argument('--tile-size', type=int, default=256,
+                        help='Stencil jobs: tile side in cells; tiles stay on the workers between generations (default: 256)')
+    parser.add_argument('--rule', default='B3/S23',
+                        help='Stencil jobs: Life-like rule (default: B3/S23, Conway)')
+    parser.add_argument('--wrap', action='store_true',
+                        help='Stencil jobs: the grid is a torus (default: dead cells all around)')
+    parser.add_argument('--cprofile', action='store_true',
+                        help='Run the map/combine/reduce scripts under cProfile on the workers (see --profile)')
+    parser.add_argument('--profile', action='store_true',
+                        help='Print per-phase task timings of each job once it finishes')
+    parser.add_argument('--trace', metavar='FILE',
+                        help='Save each job\'s timeline in Chrome trace format (ui.perfetto.dev, chrome://tracing)')
     parser.add_argument('--master', help='Master URL (default: from MASTER env var or http://localhost:8080)')
-    
+
     args = parser.parse_args()
-    
+
     # Override master URL if provided
     if args.master:
         MASTER = args.master
-    
-    print(f"🔗 Using master: {MASTER}")
-    
-    success = submit_mapreduce_job(
-        example_dir=args.example_dir,
+
+    if args.mode != 'local':
+        print(f"🔗 Using master: {MASTER}")
+
+    success = asyncio.run(run_jobs(
+        args.example_dir,
+        master=MASTER,
+        connections=args.connections,
+        mode=args.mode,
+        local_max_bytes=int(args.local_max_mb * 1024 * 1024),
+        processes=args.processes,
+        mqtt_broker=False if args.no_mqtt else args.mqtt,
         job_id=args.job_id,
         split_size=args.split_size,
-        reducers=args.reducers
-    )
-    
+        reducers=args.reducers,
+        combiner=args.combiner,
+        combine_with_reduce=args.combine_with_reduce,
+        intermediate=args.intermediate,
+        compression=args.compression,
+        map_cache=not args.no_cache,
+        partitioner=args.partitioner,
+        split_hot_keys=args.split_hot_keys,
+        reduce_preserves_keys=args.reduce_preserves_keys,
+        cprofile=args.cprofile,
+        profile=args.profile or args.cprofile,
+        trace=args.trace,
+        generations=args.generations,
+        tile_size=args.tile_size,
+        rule=args.rule,
+        wrap=args.wrap,
+        output=args.output,
+        partition=args.partition,
+        input_path=args.input,
+        repeat=max(1, args.repeat),
+        compress=args.compress,
+        inline=args.inline
+    ))
+
     if success:
         print(f"\n✅ Job completed successfully!")
         sys.exit(0)
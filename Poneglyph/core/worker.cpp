@@ -1,37 +1,249 @@
 #include "model/worker.hpp"
 
+#include <algorithm>
 #include <chrono>
+#include <condition_variable>
+#include <cstdlib>
+#include <deque>
+#include <filesystem>
 #include <iostream>
+#include <mutex>
 #include <sstream>
+#include <stdexcept>
 #include <thread>
 
 #include "gridmr.grpc.pb.h"
+#include "model/host_metrics.hpp"
 #include "model/http.hpp"
 #include "model/json.hpp"
+#include "model/records.hpp"
+#include "model/script_cache.hpp"
+#include "model/sha256.hpp"
+#include "model/stencil.hpp"
 #include "rpc/grpc_client.hpp"
+#include "runtime/py_runtime.hpp"
 #include "telemetry/mqtt.hpp"
 
+namespace {
+    // Fresh directory for one task; removed (with everything the scripts wrote) when the task ends.
+    class TaskDir {
+    public:
+        TaskDir(TaskSlot &slot, const std::string &root, const std::string &jobId, const std::string &taskId)
+            : slot_(slot) {
+            std::string name = jobId + "-" + taskId;
+            for (char &c: name)
+                if (c == '/' || c == '\\') c = '_';
+            path_ = std::filesystem::absolute(root + "/slot-" + std::to_string(slot.index) + "/" + name).string();
+            std::filesystem::create_directories(path_);
+            slot_.dir = path_;
+        }
+
+        ~TaskDir() {
+            std::error_code ec;
+            std::filesystem::remove_all(path_, ec);
+            slot_.dir.clear();
+        }
+
+        TaskDir(const TaskDir &) = delete;
+
+        TaskDir &operator=(const TaskDir &) = delete;
+
+    private:
+        TaskSlot &slot_;
+        std::string path_;
+    };
+
+    // Adds the time until it goes out of scope to one phase of the slot's task.
+    class PhaseTimer {
+    public:
+        PhaseTimer(TaskSlot &slot, const char *phase)
+            : slot_(slot), phase_(phase), start_(std::chrono::steady_clock::now()) {
+        }
+
+        ~PhaseTimer() {
+            slot_.phasesMs[phase_] += std::chrono::duration<double, std::milli>(
+                std::chrono::steady_clock::now() - start_).count();
+        }
+
+        PhaseTimer(const PhaseTimer &) = delete;
+
+        PhaseTimer &operator=(const PhaseTimer &) = delete;
+
+    private:
+        TaskSlot &slot_;
+        const char *phase_;
+        std::chrono::steady_clock::time_point start_;
+    };
+
+    // Starts the slot's profile for a new task.
+    void reset_profile(TaskSlot &slot, bool profileScripts) {
+        slot.phasesMs.clear();
+        slot.hot.clear();
+        slot.profileScripts = profileScripts;
+    }
+
+    gridmr::TaskProfile profile_proto(const TaskSlot &slot) {
+        gridmr::TaskProfile p;
+        for (const auto &[phase, ms]: slot.phasesMs) (*p.mutable_phases_ms())[phase] = ms;
+        p.set_slot(slot.index);
+        for (const auto &h: slot.hot) {
+            auto *f = p.add_hot();
+            f->set_name(h.name);
+            f->set_calls(h.calls);
+            f->set_self_ms(h.self_ms);
+            f->set_cumulative_ms(h.cumulative_ms);
+        }
+        return p;
+    }
+
+    // "profile" member of an HTTP completion: {"phases_ms":{...},"slot":n,"hot":[...]}.
+    std::string profile_json(const TaskSlot &slot) {
+        std::ostringstream j;
+        j << "{\"phases_ms\":{";
+        bool first = true;
+        for (const auto &[phase, ms]: slot.phasesMs) {
+            j << (first ? "" : ",") << json_str(phase) << ":" << ms;
+            first = false;
+        }
+        j << "},\"slot\":" << slot.index << ",\"hot\":[";
+        for (size_t i = 0; i < slot.hot.size(); ++i) {
+            const auto &h = slot.hot[i];
+            j << (i ? "," : "") << "{\"name\":" << json_str(h.name) << ",\"calls\":" << h.calls
+                    << ",\"self_ms\":" << h.self_ms << ",\"cumulative_ms\":" << h.cumulative_ms << "}";
+        }
+        j << "]}";
+        return j.str();
+    }
+
+    std::string shell_quote(const std::string &s) {
+        std::string q = "'";
+        for (char c: s) {
+            if (c == '\'') q += "'\\''";
+            else q += c;
+        }
+        return q + "'";
+    }
+
+    // Body of POST /api/tasks/complete; the task output goes in `field` (kv_lines or output).
+    std::string completion_json(const std::string &workerId, const std::string &taskId, const std::string &jobId,
+                                const char *type, const char *field, const std::string &data,
+                                const TaskSlot &slot) {
+        std::string j = "{\"worker_id\":";
+        append_json_str(j, workerId);
+        j += ",\"task_id\":";
+        append_json_str(j, taskId);
+        j += ",\"job_id\":";
+        append_json_str(j, jobId);
+        j += ",\"type\":\"";
+        j += type;
+        j += "\",\"";
+        j += field;
+        j += "\":";
+        append_json_str(j, data);
+        j += ",\"profile\":";
+        j += profile_json(slot);
+        j += "}";
+        return j;
+    }
+} // namespace
+
+struct PushQueue {
+    std::mutex mu;
+    std::condition_variable cv;
+    std::deque<gridmr::TaskAssignment> tasks;
+    std::atomic<bool> enabled{true}; // cleared if the master does not implement TaskStream
+
+    std::mutex writeMu;
+    MasterGrpcClient::TaskStream *stream = nullptr; // guarded by writeMu
+
+    void put(gridmr::TaskAssignment ta) {
+        {
+            std::lock_guard<std::mutex> lk(mu);
+            tasks.push_back(std::move(ta));
+        }
+        cv.notify_one();
+    }
+
+    bool take(gridmr::TaskAssignment &out, std::chrono::milliseconds wait) {
+        std::unique_lock<std::mutex> lk(mu);
+        if (!cv.wait_for(lk, wait, [this] { return !tasks.empty() || !enabled; }) || tasks.empty())
+            return false;
+        out = std::move(tasks.front());
+        tasks.pop_front();
+        return true;
+    }
+
+    int queued() {
+        std::lock_guard<std::mutex> lk(mu);
+        return static_cast<int>(tasks.size());
+    }
+
+    void attach(MasterGrpcClient::TaskStream *s) {
+        std::lock_guard<std::mutex> lk(writeMu);
+        stream = s;
+    }
+
+    // Tells the master this worker can start freeSlots more tasks.
+    void announce(const std::string &workerId, int freeSlots) {
+        std::lock_guard<std::mutex> lk(writeMu);
+        if (!stream || freeSlots <= 0) return;
+        gridmr::SlotAnnouncement a;
+        a.set_worker_id(workerId);
+        a.set_free_slots(freeSlots);
+        stream->Write(a);
+    }
+
+    void disable() {
+        enabled = false;
+        cv.notify_all();
+    }
+};
+
 Worker::Worker(std::string masterUrl,
                std::unique_ptr<telemetry::MqttClientManager> mqttClient,
-               std::unique_ptr<MasterGrpcClient> grpcClient)
-    : master(std::move(masterUrl)), mqtt(std::move(mqttClient)), grpc(std::move(grpcClient)) {
+               std::unique_ptr<MasterGrpcClient> grpcClient,
+               int slotCount,
+               std::string workDirectory,
+               bool pushDispatch,
+               int scriptCacheSize,
+               long long slotMemoryMb)
+    : master(std::move(masterUrl)), mqtt(std::move(mqttClient)), grpc(std::move(grpcClient)),
+      workDir(std::move(workDirectory)) {
+    if (grpc && pushDispatch) push = std::make_unique<PushQueue>();
+    if (scriptCacheSize > 0) scripts = std::make_unique<ScriptCache>(workDir + "/scripts", scriptCacheSize);
+    tiles = std::make_unique<stencil::TileStore>();
+    std::error_code ec;
+    std::filesystem::create_directories(workDir, ec); // free disk is measured on the work dir
+    metrics = std::make_unique<host::Metrics>(workDir);
+    if (slotCount <= 0) {
+        host::Sample s = metrics->sample();
+        slotCount = host::auto_slots(s, slotMemoryMb);
+        std::cout << "[SLOTS] " << slotCount << " slots for " << s.cores << " cores and "
+                << s.memory_available_mb << "MB available (" << slotMemoryMb << "MB per slot)" << std::endl;
+    }
+    slots.resize(slotCount);
+    usageFromMs = now_ms();
+    for (int i = 0; i < slotCount; ++i) {
+        slots[i].index = i;
+        slots[i].py = runtime::PyRuntime::from_env_or_null(scripts ? scripts->dir() : "");
+    }
 }
 
+Worker::~Worker() = default;
+
 long long Worker::now_ms() {
     using namespace std::chrono;
     return duration_cast<milliseconds>(steady_clock::now().time_since_epoch()).count();
 }
 
 void Worker::registerSelf() {
-    auto [cpuUsage, memUsage] = getSystemMetrics();
-
     // Prefer gRPC if available
     if (grpc) {
         std::string wid;
         int poll_ms = 1000;
         // Generate unique worker name using hostname + random suffix
         std::string workerName = "poneglyph-worker-" + std::to_string(rand() % 1000);
-        bool ok = grpc->RegisterWorker(workerName, /*capacity*/ 2, wid, &poll_ms);
+        bool ok = grpc->RegisterWorker(workerName, static_cast<int>(slots.size()), wid, &poll_ms);
         if (ok && !wid.empty()) {
             workerId = wid;
             std::cout << "[gRPC] Registered as " << workerId << " (poll=" << poll_ms << "ms)\n";
@@ -45,10 +257,9 @@ void Worker::registerSelf() {
         std::string workerName = "poneglyph-worker-" + std::to_string(rand() % 1000);
         std::ostringstream registrationPayload;
         registrationPayload << "{"
-                << "\"name\":\"" << workerName << "\","
-                << "\"capacity\":2," // Capacidad de tareas concurrentes
-                << "\"cpu_usage\":" << cpuUsage << ","
-                << "\"memory_usage\":" << memUsage
+                << "\"name\":" << json_str(workerName) << ","
+                << "\"capacity\":" << slots.size() << "," // Capacidad de tareas concurrentes
+                << resourceJson()
                 << "}";
         std::string reg = http_post_json(master + "/api/workers/register", registrationPayload.str());
         workerId = get_json_str(reg, "worker_id");
@@ -58,7 +269,7 @@ void Worker::registerSelf() {
     if (mqtt) {
         std::ostringstream j;
         j << "{\"workerId\":\"" << workerId << "\","
-                << "\"name\":\"poneglyph-worker\",\"capacity\":2,"
+                << "\"name\":\"poneglyph-worker\",\"capacity\":" << slots.size() << ","
                 << "\"ts\":" << now_ms() << "}";
         mqtt->publish_json("gridmr/worker/registered", j.str());
     }
@@ -68,14 +279,15 @@ void Worker::startHeartbeat() {
     std::thread([this] {
         while (true) {
             if (!workerId.empty()) {
-                // Obtener métricas básicas del sistema
-                auto [cpuUsage, memUsage] = getSystemMetrics();
-
-                // Enviar heartbeat al Master via HTTP
+                // Enviar heartbeat al Master via HTTP, con los recursos del host
+                // y el uso de cada slot desde el heartbeat anterior
                 std::ostringstream heartbeatJson;
-                heartbeatJson << "{\"worker_id\":\"" << workerId << "\","
-                        << "\"cpu_usage\":" << cpuUsage << ","
-                        << "\"memory_usage\":" << memUsage << ","
+                heartbeatJson << "{\"worker_id\":" << json_str(workerId) << ","
+                        << resourceJson() << ","
+                        << "\"capacity\":" << slots.size() << ","
+                        << "\"active_tasks\":" << activeTasks.load() << ","
+                        << "\"queue_depth\":" << (push ? push->queued() : 0) << ","
+                        << "\"slot_utilization\":" << slotUtilization() << ","
                         << "\"ts\":" << now_ms() << "}";
 
                 try {
@@ -94,54 +306,139 @@ void Worker::startHeartbeat() {
     }).detach();
 }
 
-std::pair<double, double> Worker::getSystemMetrics() {
-    // Implementación básica de métricas del sistema
-    // En un sistema real, esto leería /proc/stat, /proc/meminfo, etc.
+std::string Worker::resourceJson() {
+    host::Sample s = metrics->sample();
+    std::ostringstream j;
+    j << "\"cpu_usage\":" << s.cpu_usage << ","
+            << "\"memory_usage\":" << s.memory_usage << ","
+            << "\"load_avg\":" << s.load_avg << ","
+            << "\"cores\":" << s.cores << ","
+            << "\"memory_total_mb\":" << s.memory_total_mb << ","
+            << "\"memory_available_mb\":" << s.memory_available_mb << ","
+            << "\"disk_free_mb\":" << s.disk_free_mb;
+    return j.str();
+}
+
+void Worker::slotBusy(TaskSlot &slot, bool busy) {
+    std::lock_guard<std::mutex> lk(usageMu);
+    long long now = now_ms();
+    if (busy) {
+        slot.busySince = now;
+    } else if (slot.busySince) {
+        slot.busyMs += now - std::max(slot.busySince, usageFromMs);
+        slot.busySince = 0;
+    }
+}
+
+std::string Worker::slotUtilization() {
+    std::lock_guard<std::mutex> lk(usageMu);
+    long long now = now_ms();
+    double window = static_cast<double>(std::max(1LL, now - usageFromMs));
+    std::ostringstream j;
+    j << "[";
+    for (size_t i = 0; i < slots.size(); ++i) {
+        TaskSlot &slot = slots[i];
+        long long busy = slot.busyMs + (slot.busySince ? now - std::max(slot.busySince, usageFromMs) : 0);
+        slot.busyMs = 0;
+        j << (i ? "," : "") << std::min(1.0, static_cast<double>(busy) / window);
+    }
+    j << "]";
+    usageFromMs = now;
+    return j.str();
+}
+
+// Script bytes from the master, "" unless the response is 2xx: an error
+// body must never run as the user's script.
+static std::string fetch_script(const std::string &url) {
+    http::Response r = http::client().get(url);
+    if (r.status < 200 || r.status >= 300) {
+        std::cerr << "[WARN] GET " << url << " returned " << r.status << std::endl;
+        return "";
+    }
+    return std::move(r.body);
+}
+
+void Worker::stageScript(TaskSlot &slot, const std::string &name, const std::string &sha,
+                         const std::string &url, const std::string &embedded) {
+    PhaseTimer timer(slot, "fetch");
+    if (!embedded.empty()) {
+        save_file(slot.path(name), embedded);
+        return;
+    }
+    if (scripts && !sha.empty()) {
+        std::string cached = scripts->get(sha, [&] { return fetch_script(master + url); });
+        if (!cached.empty() && ScriptCache::link(cached, slot.path(name))) return;
+        std::cerr << "[WARN] Script cache unavailable for " << name << ", downloading it" << std::endl;
+    }
+    std::string data = fetch_script(master + url);
+    if (data.empty()) throw std::runtime_error("could not fetch " + name + " from " + url);
+    if (!sha.empty() && sha256::hex(data) != sha) throw std::runtime_error(name + " does not match its sha256");
+    save_file(slot.path(name), data);
+}
 
-    double cpuUsage = 0.1 + (rand() % 30) / 100.0; // Simular 10-40% CPU
-    double memUsage = 0.2 + (rand() % 40) / 100.0; // Simular 20-60% memoria
+std::string Worker::runScript(TaskSlot &slot, const std::string &script, const std::string &input,
+                              const char *phase) {
+    std::string out;
+    runtime::RunStats stats;
+    if (slot.py && slot.py->run(slot.path(script), input, out, &stats, slot.profileScripts)) {
+        slot.phasesMs["input"] += stats.input_ms;
+        slot.phasesMs["startup"] += stats.startup_ms;
+        slot.phasesMs[phase] += stats.user_ms;
+        slot.phasesMs["output"] += stats.output_ms;
+        for (auto &h: stats.hot) slot.hot.push_back(std::move(h));
+        return out;
+    }
 
-    return {cpuUsage, memUsage};
+    // Legacy path: one interpreter per task. Its start-up cannot be told
+    // apart from the script and counts as the script's time. The scripts
+    // import clover, which the runtime would have put on sys.path.
+    static const std::string pythonPath = runtime::PyRuntime::lib_root();
+    std::string stem = script.substr(0, script.rfind('.'));
+    {
+        PhaseTimer timer(slot, "input");
+        save_file(slot.path(stem + "_in.txt"), input);
+    }
+    {
+        PhaseTimer timer(slot, phase);
+        sh("cd " + shell_quote(slot.dir) + " && PYTHONPATH=" + shell_quote(pythonPath) +
+           "${PYTHONPATH:+:$PYTHONPATH} python3 " + script + " " + stem + "_in.txt > " + stem + ".out");
+    }
+    PhaseTimer timer(slot, "output");
+    return read_file(slot.path(stem + ".out"));
 }
 
-void Worker::handleMap(const std::string &taskJson) {
+std::string Worker::combine(TaskSlot &slot, const std::string &kv, const std::string &taskId) {
+    std::string combined = runScript(slot, "combine.py", kv, "combine");
+    if (combined.empty()) {
+        std::cerr << "[WARN] Combiner produced 0 lines for " << taskId << ", shipping raw map output" << std::endl;
+        return kv;
+    }
+    std::cout << "[COMBINE] " << taskId << " " << kv.size() << "B -> " << combined.size() << "B" << std::endl;
+    return combined;
+}
+
+void Worker::handleMap(const std::string &taskJson, TaskSlot &slot) {
     std::string taskId = get_json_str(taskJson, "task_id");
     std::string jobId = get_json_str(taskJson, "job_id");
     std::string chunk = get_json_str(taskJson, "input_chunk");
     std::string mapUrl = get_json_str(taskJson, "map_url");
+    std::string combineUrl = get_json_str(taskJson, "combine_url");
+    reset_profile(slot, get_json_str(taskJson, "profile_script") == "1");
 
-    // fetch scripts & input
-    save_file("map.py", http_get(master + mapUrl));
-    save_file("input.txt", chunk);
+    stageScript(slot, "map.py", get_json_str(taskJson, "map_sha256"), mapUrl, "");
 
     // run mapper
-    sh("python3 map.py input.txt > map.out");
-    std::string kv = sh("cat map.out");
+    std::string kv = runScript(slot, "map.py", chunk);
 
     if (kv.empty()) {
         std::cerr << "[WARN] Mapper produced 0 lines for " << taskId << std::endl;
+    } else if (!combineUrl.empty()) {
+        stageScript(slot, "combine.py", get_json_str(taskJson, "combine_sha256"), combineUrl, "");
+        kv = combine(slot, kv, taskId);
     }
 
-    // escape for JSON
-    std::ostringstream payload;
-    payload << "{"
-            << "\"worker_id\":\"" << workerId << "\","
-            << "\"task_id\":\"" << taskId << "\","
-            << "\"job_id\":\"" << jobId << "\","
-            << "\"type\":\"MAP\","
-            << "\"kv_lines\":\"";
-    for (char c: kv) {
-        if (c == '\\' || c == '\"')
-            payload << '\\' << c;
-        else if (c == '\n')
-            payload << "\\n";
-        else if (c == '\t')
-            payload << "\\t";
-        else
-            payload << c;
-    }
-    payload << "\"}";
-    http_post_json(master + "/api/tasks/complete", payload.str());
+    http_post_json(master + "/api/tasks/complete",
+                   completion_json(workerId, taskId, jobId, "MAP", "kv_lines", kv, slot));
     std::cout << "Completed MAP " << taskId << std::endl;
 
     if (mqtt) {
@@ -152,41 +449,23 @@ void Worker::handleMap(const std::string &taskJson) {
     }
 }
 
-void Worker::handleReduce(const std::string &taskJson) {
+void Worker::handleReduce(const std::string &taskJson, TaskSlot &slot) {
     std::string taskId = get_json_str(taskJson, "task_id");
     std::string jobId = get_json_str(taskJson, "job_id");
     std::string reduceUrl = get_json_str(taskJson, "reduce_url");
     std::string kvLines = get_json_str(taskJson, "kv_lines");
+    reset_profile(slot, get_json_str(taskJson, "profile_script") == "1");
 
-    save_file("reduce.py", http_get(master + reduceUrl));
-    save_file("reduce_in.txt", kvLines);
+    stageScript(slot, "reduce.py", get_json_str(taskJson, "reduce_sha256"), reduceUrl, "");
 
-    sh("python3 reduce.py reduce_in.txt > reduce.out");
-    std::string out = sh("cat reduce.out");
+    std::string out = runScript(slot, "reduce.py", kvLines);
 
     if (out.empty()) {
         std::cerr << "[WARN] Reducer produced 0 lines for " << taskId << std::endl;
     }
 
-    std::ostringstream payload;
-    payload << "{"
-            << "\"worker_id\":\"" << workerId << "\","
-            << "\"task_id\":\"" << taskId << "\","
-            << "\"job_id\":\"" << jobId << "\","
-            << "\"type\":\"REDUCE\","
-            << "\"output\":\"";
-    for (char c: out) {
-        if (c == '\\' || c == '\"')
-            payload << '\\' << c;
-        else if (c == '\n')
-            payload << "\\n";
-        else if (c == '\t')
-            payload << "\\t";
-        else
-            payload << c;
-    }
-    payload << "\"}";
-    http_post_json(master + "/api/tasks/complete", payload.str());
+    http_post_json(master + "/api/tasks/complete",
+                   completion_json(workerId, taskId, jobId, "REDUCE", "output", out, slot));
     std::cout << "Completed REDUCE " << taskId << std::endl;
 
     if (mqtt) {
@@ -199,12 +478,84 @@ void Worker::handleReduce(const std::string &taskJson) {
 
 int Worker::run() {
     std::cout << "Poneglyph Worker starting. Master(HTTP)=" << master
-            << (grpc ? "  [gRPC enabled]" : "  [gRPC disabled]") << std::endl;
+            << (grpc ? "  [gRPC enabled]" : "  [gRPC disabled]")
+            << "  slots=" << slots.size() << (push ? "  [push dispatch]" : "") << std::endl;
 
     registerSelf();
     startHeartbeat();
+    if (push) std::thread(&Worker::pushLoop, this).detach();
+
+    std::vector<std::thread> threads;
+    threads.reserve(slots.size());
+    for (auto &slot: slots)
+        threads.emplace_back(&Worker::slotLoop, this, std::ref(slot));
+    for (auto &t: threads)
+        t.join();
+    return 0;
+}
+
+void Worker::pushLoop() {
+    int backoffMs = 500;
+    while (true) {
+        grpc::ClientContext ctx;
+        auto stream = grpc->OpenTaskStream(ctx);
+        push->attach(stream.get());
+        // Slots that are neither running nor holding a queued assignment.
+        push->announce(workerId, static_cast<int>(slots.size()) - activeTasks.load() - push->queued());
+
+        gridmr::TaskAssignment ta;
+        while (stream->Read(&ta)) {
+            backoffMs = 500;
+            if (ta.has_task()) push->put(std::move(ta));
+            ta.Clear();
+        }
+
+        push->attach(nullptr);
+        stream->WritesDone();
+        grpc::Status status = stream->Finish();
+        if (status.error_code() == grpc::StatusCode::UNIMPLEMENTED) {
+            std::cerr << "[gRPC] Master has no TaskStream, falling back to NextTask polling\n";
+            push->disable();
+            return;
+        }
+        std::cerr << "[gRPC] TaskStream closed (" << status.error_message() << "), reconnecting in "
+                << backoffMs << "ms\n";
+        std::this_thread::sleep_for(std::chrono::milliseconds(backoffMs));
+        backoffMs = std::min(backoffMs * 2, 10000);
+    }
+}
+
+void Worker::runAssignment(const gridmr::TaskAssignment &ta, TaskSlot &slot) {
+    ++activeTasks;
+    slotBusy(slot, true);
+    try {
+        if (ta.has_map()) {
+            TaskDir dir(slot, workDir, ta.map().job_id(), ta.map().task_id());
+            handleMapGrpc(ta.map(), slot);
+        } else if (ta.has_step()) {
+            handleStepGrpc(ta.step(), slot);
+        } else {
+            TaskDir dir(slot, workDir, ta.reduce().job_id(), ta.reduce().task_id());
+            handleReduceGrpc(ta.reduce(), slot);
+        }
+    } catch (const std::exception &e) {
+        std::cerr << "[SLOT " << slot.index << "] Task failed: " << e.what() << std::endl;
+    }
+    slotBusy(slot, false);
+    --activeTasks;
+}
 
+void Worker::slotLoop(TaskSlot &slot) {
     while (true) {
+        if (push && push->enabled) {
+            gridmr::TaskAssignment ta;
+            if (push->take(ta, std::chrono::seconds(1))) {
+                if (ta.has_map() || ta.has_reduce() || ta.has_step()) runAssignment(ta, slot);
+                push->announce(workerId, 1);
+            }
+            continue;
+        }
+
         if (grpc) {
             gridmr::TaskAssignment ta;
             if (!grpc->NextTask(workerId, ta)) {
@@ -215,12 +566,11 @@ int Worker::run() {
                 std::this_thread::sleep_for(std::chrono::milliseconds(800));
                 continue;
             }
-            if (ta.has_map())
-                handleMapGrpc(ta.map());
-            else if (ta.has_reduce())
-                handleReduceGrpc(ta.reduce());
-            else
+            if (!ta.has_map() && !ta.has_reduce() && !ta.has_step()) {
                 std::this_thread::sleep_for(std::chrono::milliseconds(300));
+                continue;
+            }
+            runAssignment(ta, slot);
             continue;
         }
 
@@ -231,55 +581,73 @@ int Worker::run() {
             continue;
         }
         std::string type = get_json_str(task, "type");
-        if (type == "MAP")
-            handleMap(task);
-        else if (type == "REDUCE")
-            handleReduce(task);
-        else
+        if (type != "MAP" && type != "REDUCE" && type != "STEP") {
             std::this_thread::sleep_for(std::chrono::milliseconds(300));
+            continue;
+        }
+        ++activeTasks;
+        slotBusy(slot, true);
+        try {
+            if (type == "STEP") {
+                handleStep(task, slot);
+            } else {
+                TaskDir dir(slot, workDir, get_json_str(task, "job_id"), get_json_str(task, "task_id"));
+                if (type == "MAP")
+                    handleMap(task, slot);
+                else
+                    handleReduce(task, slot);
+            }
+        } catch (const std::exception &e) {
+            std::cerr << "[SLOT " << slot.index << "] Task failed: " << e.what() << std::endl;
+        }
+        slotBusy(slot, false);
+        --activeTasks;
     }
 }
 
-void Worker::handleMapGrpc(const gridmr::MapTask &mt) {
-    // Map script: prefer embedded; else fetch via HTTP fallback URL
-    if (!mt.map_script().empty()) {
-        std::string s(mt.map_script().begin(), mt.map_script().end());
-        save_file("map.py", s);
-    } else {
-        save_file("map.py", http_get(master + mt.map_url()));
-    }
-    // input
-    save_file("input.txt", mt.input_chunk());
+void Worker::handleMapGrpc(const gridmr::MapTask &mt, TaskSlot &slot) {
+    reset_profile(slot, mt.profile_script());
+    // Map script: embedded bytes (older masters), else by hash from the cache / map_url
+    stageScript(slot, "map.py", mt.map_script_sha256(), mt.map_url(), mt.map_script());
 
     // run
-    sh("python3 map.py input.txt > map.out");
-    std::string kv = sh("cat map.out");
-    if (kv.empty()) std::cerr << "[WARN] Mapper produced 0 lines for " << mt.task_id() << std::endl;
+    std::string kv = runScript(slot, "map.py", mt.input_chunk());
+    if (kv.empty()) {
+        std::cerr << "[WARN] Mapper produced 0 lines for " << mt.task_id() << std::endl;
+    } else if (!mt.combine_script().empty() || !mt.combine_url().empty()) {
+        stageScript(slot, "combine.py", mt.combine_script_sha256(), mt.combine_url(), mt.combine_script());
+        kv = combine(slot, kv, mt.task_id());
+    }
 
-    if (grpc) {
-        if (!grpc->CompleteMap(workerId, mt.task_id(), mt.job_id(), kv)) {
+    if (grpc && mt.binary_records()) {
+        gridmr::RecordBlock block;
+        {
+            PhaseTimer timer(slot, "encode");
+            int64_t count = 0;
+            std::string raw = records::from_output(kv, count);
+            std::string packed;
+            if (mt.records_codec() == gridmr::CODEC_DEFLATE && records::deflate_block(raw, packed)) {
+                block.set_codec(gridmr::CODEC_DEFLATE);
+                block.set_data(std::move(packed));
+            } else {
+                block.set_data(raw);
+            }
+            block.set_records(count);
+            block.set_raw_size(static_cast<int64_t>(raw.size()));
+        }
+        gridmr::TaskProfile profile = profile_proto(slot);
+        if (!grpc->CompleteMapRecords(workerId, mt.task_id(), mt.job_id(), block, &profile)) {
+            std::cerr << "[gRPC] CompleteMap failed\n";
+        }
+    } else if (grpc) {
+        gridmr::TaskProfile profile = profile_proto(slot);
+        if (!grpc->CompleteMap(workerId, mt.task_id(), mt.job_id(), kv, &profile)) {
             std::cerr << "[gRPC] CompleteMap failed\n";
         }
     } else {
         // Shouldn't happen, but keep symmetry
-        std::ostringstream payload;
-        payload << "{\"worker_id\":\"" << workerId << "\","
-                << "\"task_id\":\"" << mt.task_id() << "\","
-                << "\"job_id\":\"" << mt.job_id() << "\","
-                << "\"type\":\"MAP\","
-                << "\"kv_lines\":\"";
-        for (char c: kv) {
-            if (c == '\\' || c == '\"')
-                payload << '\\' << c;
-            else if (c == '\n')
-                payload << "\\n";
-            else if (c == '\t')
-                payload << "\\t";
-            else
-                payload << c;
-        }
-        payload << "\"}";
-        http_post_json(master + "/api/tasks/complete", payload.str());
+        http_post_json(master + "/api/tasks/complete",
+                       completion_json(workerId, mt.task_id(), mt.job_id(), "MAP", "kv_lines", kv, slot));
     }
 
     if (mqtt) {
@@ -290,42 +658,35 @@ void Worker::handleMapGrpc(const gridmr::MapTask &mt) {
     }
 }
 
-void Worker::handleReduceGrpc(const gridmr::ReduceTask &rt) {
-    if (!rt.reduce_script().empty()) {
-        std::string s(rt.reduce_script().begin(), rt.reduce_script().end());
-        save_file("reduce.py", s);
-    } else {
-        save_file("reduce.py", http_get(master + rt.reduce_url()));
+void Worker::handleReduceGrpc(const gridmr::ReduceTask &rt, TaskSlot &slot) {
+    reset_profile(slot, rt.profile_script());
+    stageScript(slot, "reduce.py", rt.reduce_script_sha256(), rt.reduce_url(), rt.reduce_script());
+
+    std::string input = rt.kv_lines();
+    if (rt.has_kv_records()) {
+        PhaseTimer timer(slot, "decode");
+        const auto &block = rt.kv_records();
+        std::string raw;
+        if (block.codec() == gridmr::CODEC_DEFLATE) {
+            if (!records::inflate_block(block.data(), static_cast<size_t>(block.raw_size()), raw))
+                std::cerr << "[WARN] Corrupt record block for " << rt.task_id() << std::endl;
+        } else {
+            raw = block.data();
+        }
+        input = rt.raw_records() ? records::kMagic + raw : records::to_text(raw);
     }
-    save_file("reduce_in.txt", rt.kv_lines());
 
-    sh("python3 reduce.py reduce_in.txt > reduce.out");
-    std::string out = sh("cat reduce.out");
+    std::string out = runScript(slot, "reduce.py", input);
     if (out.empty()) std::cerr << "[WARN] Reducer produced 0 lines for " << rt.task_id() << std::endl;
 
     if (grpc) {
-        if (!grpc->CompleteReduce(workerId, rt.task_id(), rt.job_id(), out)) {
+        gridmr::TaskProfile profile = profile_proto(slot);
+        if (!grpc->CompleteReduce(workerId, rt.task_id(), rt.job_id(), out, &profile)) {
             std::cerr << "[gRPC] CompleteReduce failed\n";
         }
     } else {
-        std::ostringstream payload;
-        payload << "{\"worker_id\":\"" << workerId << "\","
-                << "\"task_id\":\"" << rt.task_id() << "\","
-                << "\"job_id\":\"" << rt.job_id() << "\","
-                << "\"type\":\"REDUCE\","
-                << "\"output\":\"";
-        for (char c: out) {
-            if (c == '\\' || c == '\"')
-                payload << '\\' << c;
-            else if (c == '\n')
-                payload << "\\n";
-            else if (c == '\t')
-                payload << "\\t";
-            else
-                payload << c;
-        }
-        payload << "\"}";
-        http_post_json(master + "/api/tasks/complete", payload.str());
+        http_post_json(master + "/api/tasks/complete",
+                       completion_json(workerId, rt.task_id(), rt.job_id(), "REDUCE", "output", out, slot));
     }
 
     if (mqtt) {
@@ -335,3 +696,89 @@ void Worker::handleReduceGrpc(const gridmr::ReduceTask &rt) {
         mqtt->publish_json("gridmr/worker/" + workerId + "/reduce/completed", j.str());
     }
 }
+
+void Worker::handleStepGrpc(const gridmr::StepTask &st, TaskSlot &slot) {
+    reset_profile(slot, false);
+    stencil::StepInput in;
+    in.jobId = st.job_id();
+    in.tile = st.tile();
+    in.generation = st.generation();
+    in.rows = st.rows();
+    in.cols = st.cols();
+    in.rule = st.rule();
+    in.cells = st.cells();
+    in.north = st.north();
+    in.south = st.south();
+    in.west = st.west();
+    in.east = st.east();
+    in.corners = st.corners();
+    in.last = st.last();
+    stencil::StepOutput out;
+    {
+        PhaseTimer timer(slot, "user");
+        out = tiles->step(in);
+    }
+
+    gridmr::CompleteStepRequest req;
+    req.set_worker_id(workerId);
+    req.set_task_id(st.task_id());
+    req.set_job_id(st.job_id());
+    req.set_tile(st.tile());
+    req.set_generation(st.generation());
+    req.set_lost(out.lost);
+    req.set_live(out.live);
+    req.set_north(std::move(out.north));
+    req.set_south(std::move(out.south));
+    req.set_west(std::move(out.west));
+    req.set_east(std::move(out.east));
+    req.set_cells(std::move(out.cells));
+    *req.mutable_profile() = profile_proto(slot);
+    if (!grpc->CompleteStep(req)) {
+        std::cerr << "[gRPC] CompleteStep failed\n";
+    }
+    if (out.lost) std::cerr << "[STEP] " << st.job_id() << " tile " << st.tile() << " not held, reported lost\n";
+}
+
+void Worker::handleStep(const std::string &taskJson, TaskSlot &slot) {
+    reset_profile(slot, false);
+    std::string taskId = get_json_str(taskJson, "task_id");
+    std::string jobId = get_json_str(taskJson, "job_id");
+    stencil::StepInput in;
+    in.jobId = jobId;
+    in.tile = std::atoi(get_json_str(taskJson, "tile").c_str());
+    in.generation = std::atoi(get_json_str(taskJson, "generation").c_str());
+    in.rows = std::atoi(get_json_str(taskJson, "rows").c_str());
+    in.cols = std::atoi(get_json_str(taskJson, "cols").c_str());
+    in.rule = get_json_str(taskJson, "rule");
+    in.cells = base64_decode(get_json_str(taskJson, "cells"));
+    in.north = base64_decode(get_json_str(taskJson, "north"));
+    in.south = base64_decode(get_json_str(taskJson, "south"));
+    in.west = base64_decode(get_json_str(taskJson, "west"));
+    in.east = base64_decode(get_json_str(taskJson, "east"));
+    in.corners = static_cast<uint32_t>(std::atoi(get_json_str(taskJson, "corners").c_str()));
+    in.last = get_json_str(taskJson, "last") == "1";
+    stencil::StepOutput out;
+    {
+        PhaseTimer timer(slot, "user");
+        out = tiles->step(in);
+    }
+
+    std::string j = "{\"worker_id\":";
+    append_json_str(j, workerId);
+    j += ",\"task_id\":";
+    append_json_str(j, taskId);
+    j += ",\"job_id\":";
+    append_json_str(j, jobId);
+    j += ",\"type\":\"STEP\",\"tile\":" + std::to_string(in.tile)
+            + ",\"generation\":" + std::to_string(in.generation)
+            + ",\"north\":\"" + base64_encode(out.north)
+            + "\",\"south\":\"" + base64_encode(out.south)
+            + "\",\"west\":\"" + base64_encode(out.west)
+            + "\",\"east\":\"" + base64_encode(out.east)
+            + "\",\"cells\":\"" + base64_encode(out.cells)
+            + "\",\"live\":" + std::to_string(out.live)
+            + ",\"lost\":" + (out.lost ? "1" : "0")
+            + ",\"profile\":" + profile_json(slot) + "}";
+    http_post_json(master + "/api/tasks/complete", j);
+    if (out.lost) std::cerr << "[STEP] " << jobId << " tile " << in.tile << " not held, reported lost\n";
+}
@@ -22,6 +22,20 @@ int main() {
         grpcClient = std::make_unique<MasterGrpcClient>(grpc_addr);
     }
 
-    Worker w(master_http, std::move(mqtt), std::move(grpcClient));
+    // Concurrent task slots and their scratch root. 0 sizes them from the usable
+    // cores (affinity, cgroup quota) and the available memory at
+    // PONEGLYPH_SLOT_MEMORY_MB per slot.
+    int slots = std::atoi(getenv_or("PONEGLYPH_SLOTS", "0").c_str());
+    long long slot_memory_mb = std::atoll(getenv_or("PONEGLYPH_SLOT_MEMORY_MB", "512").c_str());
+    std::string work_dir = getenv_or("PONEGLYPH_WORK_DIR", "work");
+    // With gRPC, receive tasks over the TaskStream push RPC instead of polling NextTask.
+    const std::string push = getenv_or("PONEGLYPH_PUSH", "1");
+    bool push_dispatch = !(push == "0" || push == "false" || push == "FALSE");
+
+    // Scripts kept per content hash across tasks (0 = download them for every task).
+    int script_cache = std::atoi(getenv_or("PONEGLYPH_SCRIPT_CACHE", "64").c_str());
+
+    Worker w(master_http, std::move(mqtt), std::move(grpcClient), slots, work_dir, push_dispatch, script_cache,
+             slot_memory_mb);
     return w.run();
 }
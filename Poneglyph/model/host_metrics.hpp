@@ -0,0 +1,221 @@
+#pragma once
+#include <algorithm>
+#include <chrono>
+#include <cmath>
+#include <cstdint>
+#include <filesystem>
+#include <fstream>
+#include <mutex>
+#include <sched.h>
+#include <sstream>
+#include <string>
+#include <system_error>
+#include <thread>
+#include <unistd.h>
+
+// Resource usage of the machine (or container) a worker runs on, read from
+// /proc and the cgroup the worker lives in (v2 unified hierarchy, or the v1
+// cpu/memory controllers). Limits of the cgroup win over the host's: a
+// worker in a container with 2 CPUs and 4 GB sees 2 cores and 4 GB even when
+// /proc reports the whole host.
+namespace host {
+    struct Sample {
+        double cores = 1;                 // CPUs this process may use (affinity, cgroup quota)
+        double cpu_usage = 0;             // busy fraction of them since the previous sample, 0..1
+        double memory_usage = 0;          // used / limit, 0..1
+        long long memory_total_mb = 0;    // limit: cgroup limit or host RAM
+        long long memory_available_mb = 0;
+        double load_avg = 0;              // 1-minute load average per online host CPU
+        long long disk_free_mb = -1;      // free space of the work dir, -1 when unknown
+    };
+
+    namespace detail {
+        inline std::string read_first_line(const std::string &path) {
+            std::ifstream f(path);
+            std::string line;
+            if (f) std::getline(f, line);
+            return line;
+        }
+
+        // Value of `key` in a "key value" file such as memory.stat or cpu.stat; -1 if missing.
+        inline long long read_keyed(const std::string &path, const std::string &key) {
+            std::ifstream f(path);
+            std::string k;
+            long long v;
+            while (f >> k >> v) {
+                if (k == key) return v;
+            }
+            return -1;
+        }
+
+        // Number in a cgroup file; -1 for "max", a missing file or v1's "unlimited" (~2^63).
+        inline long long read_limit(const std::string &path) {
+            std::string s = read_first_line(path);
+            if (s.empty() || s == "max") return -1;
+            try {
+                long long v = std::stoll(s);
+                return v <= 0 || v >= (1LL << 60) ? -1 : v;
+            } catch (const std::exception &) {
+                return -1;
+            }
+        }
+
+        inline long long now_us() {
+            using namespace std::chrono;
+            return duration_cast<microseconds>(steady_clock::now().time_since_epoch()).count();
+        }
+    } // namespace detail
+
+    class Metrics {
+    public:
+        explicit Metrics(std::string diskPath = ".", std::string cgroupRoot = "/sys/fs/cgroup",
+                         std::string procRoot = "/proc")
+            : disk_(std::move(diskPath)), cg_(std::move(cgroupRoot)), proc_(std::move(procRoot)) {
+            v2_ = std::filesystem::exists(cg_ + "/cgroup.controllers");
+            cores_ = usable_cores();
+            sample(); // prime the CPU counters so the first real sample has a delta
+        }
+
+        // CPUs the process may run on: its affinity mask, capped by a cgroup CPU quota.
+        double usable_cores() const {
+            double cores = 0;
+            cpu_set_t set;
+            if (sched_getaffinity(0, sizeof(set), &set) == 0) cores = CPU_COUNT(&set);
+            if (cores <= 0) cores = std::max(1u, std::thread::hardware_concurrency());
+            double quota = cpu_quota();
+            return quota > 0 ? std::min(cores, quota) : cores;
+        }
+
+        Sample sample() {
+            std::lock_guard<std::mutex> lk(mu_);
+            Sample s;
+            s.cores = cores_;
+            s.cpu_usage = cpu_usage();
+            memory(s);
+            s.load_avg = load_avg();
+            std::error_code ec;
+            auto space = std::filesystem::space(disk_, ec);
+            if (!ec) s.disk_free_mb = static_cast<long long>(space.available >> 20);
+            return s;
+        }
+
+    private:
+        std::string disk_, cg_, proc_;
+        bool v2_ = false;
+        double cores_ = 1;
+        std::mutex mu_;
+        // Previous readings for CPU deltas
+        unsigned long long hostBusy_ = 0, hostTotal_ = 0;
+        long long cgUsageUs_ = -1, cgAtUs_ = 0;
+
+        // Cores granted by the cgroup CPU quota, or 0 without one.
+        double cpu_quota() const {
+            if (v2_) {
+                std::istringstream in(detail::read_first_line(cg_ + "/cpu.max"));
+                std::string quota;
+                double period = 0;
+                if (in >> quota >> period && quota != "max" && period > 0) {
+                    try {
+                        return std::stod(quota) / period;
+                    } catch (const std::exception &) {
+                    }
+                }
+                return 0;
+            }
+            long long quota = detail::read_limit(cg_ + "/cpu/cpu.cfs_quota_us");
+            long long period = detail::read_limit(cg_ + "/cpu/cpu.cfs_period_us");
+            return quota > 0 && period > 0 ? static_cast<double>(quota) / period : 0;
+        }
+
+        // CPU time of the cgroup in microseconds, or -1 when not available.
+        long long cgroup_cpu_us() const {
+            if (v2_) return detail::read_keyed(cg_ + "/cpu.stat", "usage_usec");
+            long long ns = detail::read_limit(cg_ + "/cpuacct/cpuacct.usage");
+            return ns < 0 ? -1 : ns / 1000;
+        }
+
+        // Busiest of the host (/proc/stat) and, under a quota, the cgroup's
+        // share of it: either one being saturated means tasks will crawl.
+        double cpu_usage() {
+            double usage = 0;
+            std::istringstream in(detail::read_first_line(proc_ + "/stat"));
+            std::string cpu;
+            unsigned long long v[8] = {};
+            if (in >> cpu && cpu == "cpu") {
+                for (auto &x: v) in >> x;
+                // user nice system idle iowait irq softirq steal
+                unsigned long long idle = v[3] + v[4];
+                unsigned long long total = 0;
+                for (auto x: v) total += x;
+                unsigned long long busy = total - idle;
+                if (hostTotal_ && total > hostTotal_) {
+                    usage = static_cast<double>(busy - std::min(busy, hostBusy_)) / static_cast<double>(total - hostTotal_);
+                }
+                hostBusy_ = busy;
+                hostTotal_ = total;
+            }
+            double quota = cpu_quota();
+            long long used = quota > 0 ? cgroup_cpu_us() : -1;
+            long long at = detail::now_us();
+            if (used >= 0 && cgUsageUs_ >= 0 && at > cgAtUs_) {
+                double share = static_cast<double>(used - cgUsageUs_) / (static_cast<double>(at - cgAtUs_) * quota);
+                usage = std::max(usage, share);
+            }
+            cgUsageUs_ = used;
+            cgAtUs_ = at;
+            return std::clamp(usage, 0.0, 1.0);
+        }
+
+        void memory(Sample &s) const {
+            long long totalKb = -1, availKb = -1;
+            std::ifstream f(proc_ + "/meminfo");
+            std::string key, unit;
+            long long value;
+            while (f >> key >> value >> unit) {
+                if (key == "MemTotal:") totalKb = value;
+                else if (key == "MemAvailable:") availKb = value;
+            }
+            double total = totalKb > 0 ? totalKb * 1024.0 : 0;
+            double avail = availKb >= 0 ? availKb * 1024.0 : total;
+
+            // Under a cgroup memory limit, page cache that can be reclaimed
+            // (inactive files) does not count as used.
+            long long limit, usage, inactive;
+            if (v2_) {
+                limit = detail::read_limit(cg_ + "/memory.max");
+                usage = detail::read_limit(cg_ + "/memory.current");
+                inactive = detail::read_keyed(cg_ + "/memory.stat", "inactive_file");
+            } else {
+                limit = detail::read_limit(cg_ + "/memory/memory.limit_in_bytes");
+                usage = detail::read_limit(cg_ + "/memory/memory.usage_in_bytes");
+                inactive = detail::read_keyed(cg_ + "/memory/memory.stat", "total_inactive_file");
+            }
+            if (limit > 0 && (total <= 0 || limit < total)) {
+                double used = usage > 0 ? static_cast<double>(usage - std::min(usage, std::max(0LL, inactive))) : 0;
+                total = static_cast<double>(limit);
+                avail = std::min(avail, std::max(0.0, total - used));
+            }
+            if (total <= 0) return;
+            s.memory_total_mb = static_cast<long long>(total / (1 << 20));
+            s.memory_available_mb = static_cast<long long>(avail / (1 << 20));
+            s.memory_usage = std::clamp(1.0 - avail / total, 0.0, 1.0);
+        }
+
+        double load_avg() const {
+            std::istringstream in(detail::read_first_line(proc_ + "/loadavg"));
+            double load1 = 0;
+            if (!(in >> load1)) return 0;
+            long online = sysconf(_SC_NPROCESSORS_ONLN);
+            return load1 / static_cast<double>(online > 0 ? online : 1);
+        }
+    };
+
+    // Task slots for a worker: one per usable core, but no more than the
+    // memory available now allows at perSlotMb each. Always at least one.
+    inline int auto_slots(const Sample &s, long long perSlotMb) {
+        int byCpu = std::max(1, static_cast<int>(std::floor(s.cores)));
+        if (perSlotMb <= 0 || s.memory_available_mb <= 0) return byCpu;
+        long long byMemory = s.memory_available_mb / perSlotMb;
+        return static_cast<int>(std::max(1LL, std::min<long long>(byCpu, byMemory)));
+    }
+} // namespace host
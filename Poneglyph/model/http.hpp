@@ -1,6 +1,26 @@
 #pragma once
+#include <netdb.h>
+#include <netinet/in.h>
+#include <netinet/tcp.h>
+#include <sys/socket.h>
+#include <sys/stat.h>
+#include <sys/time.h>
+#include <unistd.h>
+#include <zlib.h>
+
+#include <algorithm>
+#include <atomic>
+#include <cctype>
+#include <cerrno>
+#include <chrono>
 #include <cstdio>
+#include <cstdlib>
+#include <cstring>
+#include <iostream>
+#include <map>
+#include <mutex>
 #include <string>
+#include <vector>
 
 inline std::string sh(const std::string &cmd) {
     std::string full = cmd + " 2>/dev/null";
@@ -13,12 +33,440 @@ inline std::string sh(const std::string &cmd) {
     return out;
 }
 
+/**
+ * In-process HTTP/1.1 client for talking to the master.
+ *
+ * Connections are kept alive and pooled per host:port, so heartbeats,
+ * polling, script fetches and completions reuse a few sockets instead of
+ * forking curl and handshaking for every call. Request bodies come from
+ * memory or are streamed from a file; large ones are gzip-compressed on the
+ * fly and sent chunked. Only plain http:// URLs are supported.
+ *
+ * Env: PONEGLYPH_HTTP_TIMEOUT_MS (socket timeout, default 60000),
+ *      PONEGLYPH_HTTP_GZIP_MIN (compress bodies from this size, default 65536; 0 disables).
+ */
+namespace http {
+    struct Url {
+        std::string host;
+        std::string port = "80";
+        std::string target = "/";
+        bool ok = false;
+    };
+
+    inline Url parse_url(const std::string &url) {
+        Url u;
+        const std::string scheme = "http://";
+        if (url.compare(0, scheme.size(), scheme) != 0) return u;
+        size_t hostStart = scheme.size();
+        size_t slash = url.find('/', hostStart);
+        std::string authority = url.substr(hostStart, slash == std::string::npos ? std::string::npos : slash - hostStart);
+        if (slash != std::string::npos) u.target = url.substr(slash);
+        size_t colon = authority.rfind(':');
+        if (colon != std::string::npos && authority.find(']') == std::string::npos) {
+            u.host = authority.substr(0, colon);
+            u.port = authority.substr(colon + 1);
+        } else {
+            u.host = authority;
+        }
+        u.ok = !u.host.empty();
+        return u;
+    }
+
+    // Request body: in memory (data) or streamed from a file (path).
+    struct Body {
+        const std::string *data = nullptr;
+        std::string path;
+        std::string contentType = "application/json";
+
+        long long size() const {
+            if (data) return static_cast<long long>(data->size());
+            struct stat st{};
+            return (!path.empty() && ::stat(path.c_str(), &st) == 0) ? st.st_size : -1;
+        }
+    };
+
+    struct Response {
+        int status = 0; // 0 = transport error
+        std::string body;
+        bool keepAlive = true;
+    };
+
+    class Client {
+    public:
+        Client() {
+            const char *t = std::getenv("PONEGLYPH_HTTP_TIMEOUT_MS");
+            timeoutMs_ = t ? std::max(1, std::atoi(t)) : 60000;
+            const char *g = std::getenv("PONEGLYPH_HTTP_GZIP_MIN");
+            gzipMin_ = g ? std::atoll(g) : 64 * 1024;
+        }
+
+        ~Client() {
+            std::lock_guard<std::mutex> lk(mu_);
+            for (auto &[key, conns]: idle_)
+                for (auto &c: conns) ::close(c.fd);
+        }
+
+        Client(const Client &) = delete;
+
+        Client &operator=(const Client &) = delete;
+
+        Response get(const std::string &url) { return request("GET", url, nullptr); }
+
+        Response post(const std::string &url, const Body &body) { return request("POST", url, &body); }
+
+        long long connectionsOpened() const { return opened_.load(); }
+
+        long long requestsSent() const { return requests_.load(); }
+
+    private:
+        struct Idle {
+            int fd;
+            std::chrono::steady_clock::time_point since;
+        };
+
+        // The master's HTTP server drops idle connections after ~30s; retire ours first.
+        static constexpr auto kMaxIdle = std::chrono::seconds(20);
+        static constexpr size_t kMaxIdlePerHost = 16;
+
+        std::mutex mu_;
+        std::map<std::string, std::vector<Idle>> idle_;
+        int timeoutMs_;
+        long long gzipMin_;
+        std::atomic<long long> opened_{0};
+        std::atomic<long long> requests_{0};
+
+        Response request(const char *method, const std::string &url, const Body *body) {
+            Url u = parse_url(url);
+            if (!u.ok) {
+                std::cerr << "[HTTP] Unsupported URL: " << url << std::endl;
+                return {};
+            }
+            std::string key = u.host + ":" + u.port;
+            // A pooled connection may have been closed by the server meanwhile: if it
+            // fails before any response byte arrives, retry once on a fresh one.
+            for (int attempt = 0; attempt < 2; ++attempt) {
+                bool reused = false;
+                int fd = acquire(key, u, reused);
+                if (fd < 0) return {};
+                ++requests_;
+                Response r;
+                int rc = send_request(fd, method, u, body) ? read_response(fd, method, r) : 0;
+                if (rc > 0) {
+                    if (r.keepAlive) release(key, fd);
+                    else ::close(fd);
+                    return r;
+                }
+                ::close(fd);
+                if (rc < 0 || !reused) break;
+            }
+            std::cerr << "[HTTP] " << method << " " << url << " failed" << std::endl;
+            return {};
+        }
+
+        int acquire(const std::string &key, const Url &u, bool &reused) {
+            {
+                std::lock_guard<std::mutex> lk(mu_);
+                auto &conns = idle_[key];
+                auto now = std::chrono::steady_clock::now();
+                while (!conns.empty()) {
+                    Idle c = conns.back();
+                    conns.pop_back();
+                    if (now - c.since < kMaxIdle) {
+                        reused = true;
+                        return c.fd;
+                    }
+                    ::close(c.fd);
+                }
+            }
+            return connect_to(u);
+        }
+
+        void release(const std::string &key, int fd) {
+            std::lock_guard<std::mutex> lk(mu_);
+            auto &conns = idle_[key];
+            if (conns.size() >= kMaxIdlePerHost) {
+                ::close(fd);
+                return;
+            }
+            conns.push_back({fd, std::chrono::steady_clock::now()});
+        }
+
+        int connect_to(const Url &u) {
+            addrinfo hints{};
+            hints.ai_family = AF_UNSPEC;
+            hints.ai_socktype = SOCK_STREAM;
+            addrinfo *res = nullptr;
+            if (getaddrinfo(u.host.c_str(), u.port.c_str(), &hints, &res) != 0) {
+                std::cerr << "[HTTP] Cannot resolve " << u.host << std::endl;
+                return -1;
+            }
+            int fd = -1;
+            for (addrinfo *ai = res; ai; ai = ai->ai_next) {
+                fd = ::socket(ai->ai_family, ai->ai_socktype, ai->ai_protocol);
+                if (fd < 0) continue;
+                timeval tv{timeoutMs_ / 1000, (timeoutMs_ % 1000) * 1000};
+                setsockopt(fd, SOL_SOCKET, SO_RCVTIMEO, &tv, sizeof(tv));
+                setsockopt(fd, SOL_SOCKET, SO_SNDTIMEO, &tv, sizeof(tv));
+                int one = 1;
+                setsockopt(fd, IPPROTO_TCP, TCP_NODELAY, &one, sizeof(one));
+                setsockopt(fd, SOL_SOCKET, SO_KEEPALIVE, &one, sizeof(one));
+                if (::connect(fd, ai->ai_addr, ai->ai_addrlen) == 0) break;
+                ::close(fd);
+                fd = -1;
+            }
+            freeaddrinfo(res);
+            if (fd >= 0) ++opened_;
+            else std::cerr << "[HTTP] Cannot connect to " << u.host << ":" << u.port << std::endl;
+            return fd;
+        }
+
+        static bool send_all(int fd, const char *p, size_t n) {
+            while (n > 0) {
+                ssize_t w = ::send(fd, p, n, MSG_NOSIGNAL);
+                if (w < 0 && errno == EINTR) continue;
+                if (w <= 0) return false;
+                p += w;
+                n -= static_cast<size_t>(w);
+            }
+            return true;
+        }
+
+        static bool send_chunk(int fd, const char *p, size_t n) {
+            if (n == 0) return true;
+            char head[24];
+            int h = std::snprintf(head, sizeof(head), "%zx\r\n", n);
+            return send_all(fd, head, h) && send_all(fd, p, n) && send_all(fd, "\r\n", 2);
+        }
+
+        // Pulls the body piece by piece (memory slice or file read) into fn(ptr, len).
+        template<typename Fn>
+        static bool for_each_piece(const Body &body, Fn fn) {
+            if (body.data) return fn(body.data->data(), body.data->size());
+            FILE *f = std::fopen(body.path.c_str(), "rb");
+            if (!f) return false;
+            std::vector<char> buf(64 * 1024);
+            size_t n;
+            bool ok = true;
+            while (ok && (n = std::fread(buf.data(), 1, buf.size(), f)) > 0) ok = fn(buf.data(), n);
+            std::fclose(f);
+            return ok;
+        }
+
+        bool send_request(int fd, const char *method, const Url &u, const Body *body) {
+            std::string head;
+            head.reserve(256);
+            head += method;
+            head += ' ';
+            head += u.target;
+            head += " HTTP/1.1\r\nHost: " + u.host + ":" + u.port +
+                    "\r\nConnection: keep-alive\r\nAccept-Encoding: gzip\r\n";
+            if (!body) return send_all(fd, (head + "\r\n").data(), head.size() + 2);
+
+            long long size = body->size();
+            if (size < 0) return false;
+            head += "Content-Type: " + body->contentType + "\r\n";
+            if (gzipMin_ <= 0 || size < gzipMin_) {
+                head += "Content-Length: " + std::to_string(size) + "\r\n\r\n";
+                if (!send_all(fd, head.data(), head.size())) return false;
+                return for_each_piece(*body, [&](const char *p, size_t n) { return send_all(fd, p, n); });
+            }
+
+            // gzip on the fly, each deflate output block goes out as one chunk
+            head += "Content-Encoding: gzip\r\nTransfer-Encoding: chunked\r\n\r\n";
+            if (!send_all(fd, head.data(), head.size())) return false;
+            z_stream zs{};
+            if (deflateInit2(&zs, Z_BEST_SPEED, Z_DEFLATED, 15 + 16, 8, Z_DEFAULT_STRATEGY) != Z_OK) return false;
+            std::vector<char> out(64 * 1024);
+            auto pump = [&](const char *p, size_t n, int flush) {
+                zs.next_in = reinterpret_cast<Bytef *>(const_cast<char *>(p));
+                zs.avail_in = static_cast<uInt>(n);
+                int rc;
+                do {
+                    zs.next_out = reinterpret_cast<Bytef *>(out.data());
+                    zs.avail_out = static_cast<uInt>(out.size());
+                    rc = deflate(&zs, flush);
+                    if (rc == Z_STREAM_ERROR) return false;
+                    if (!send_chunk(fd, out.data(), out.size() - zs.avail_out)) return false;
+                } while (zs.avail_out == 0 || (flush == Z_FINISH && rc != Z_STREAM_END));
+                return true;
+            };
+            bool ok = for_each_piece(*body, [&](const char *p, size_t n) {
+                // zlib counts input in uInt; feed huge in-memory bodies in slices
+                while (n > 0) {
+                    size_t slice = std::min<size_t>(n, 1u << 30);
+                    if (!pump(p, slice, Z_NO_FLUSH)) return false;
+                    p += slice;
+                    n -= slice;
+                }
+                return true;
+            });
+            ok = ok && pump(nullptr, 0, Z_FINISH);
+            deflateEnd(&zs);
+            return ok && send_all(fd, "0\r\n\r\n", 5);
+        }
+
+        // Buffered reader over the socket for one response.
+        struct Reader {
+            int fd;
+            std::string buf;
+            size_t pos = 0;
+            bool any = false; // received at least one byte
+
+            bool fill() {
+                if (pos > 0 && pos == buf.size()) {
+                    buf.clear();
+                    pos = 0;
+                }
+                char tmp[16 * 1024];
+                ssize_t n;
+                do {
+                    n = ::recv(fd, tmp, sizeof(tmp), 0);
+                } while (n < 0 && errno == EINTR);
+                if (n <= 0) return false;
+                any = true;
+                buf.append(tmp, static_cast<size_t>(n));
+                return true;
+            }
+
+            bool line(std::string &out) {
+                while (true) {
+                    size_t nl = buf.find("\r\n", pos);
+                    if (nl != std::string::npos) {
+                        out.assign(buf, pos, nl - pos);
+                        pos = nl + 2;
+                        return true;
+                    }
+                    if (!fill()) return false;
+                }
+            }
+
+            bool take(size_t n, std::string &out) {
+                while (buf.size() - pos < n)
+                    if (!fill()) return false;
+                out.append(buf, pos, n);
+                pos += n;
+                return true;
+            }
+
+            void rest(std::string &out) {
+                do {
+                    out.append(buf, pos, std::string::npos);
+                    pos = buf.size();
+                } while (fill());
+            }
+        };
+
+        static std::string lower(std::string s) {
+            for (char &c: s) c = static_cast<char>(std::tolower(static_cast<unsigned char>(c)));
+            return s;
+        }
+
+        static bool gunzip(const std::string &in, std::string &out) {
+            z_stream zs{};
+            if (inflateInit2(&zs, 15 + 32) != Z_OK) return false;
+            zs.next_in = reinterpret_cast<Bytef *>(const_cast<char *>(in.data()));
+            zs.avail_in = static_cast<uInt>(in.size());
+            char buf[64 * 1024];
+            int rc;
+            do {
+                zs.next_out = reinterpret_cast<Bytef *>(buf);
+                zs.avail_out = sizeof(buf);
+                rc = inflate(&zs, Z_NO_FLUSH);
+                if (rc != Z_OK && rc != Z_STREAM_END) break;
+                out.append(buf, sizeof(buf) - zs.avail_out);
+            } while (rc != Z_STREAM_END);
+            inflateEnd(&zs);
+            return rc == Z_STREAM_END;
+        }
+
+        // 1 = complete response, 0 = connection closed before any byte, -1 = error.
+        static int read_response(int fd, const char *method, Response &r) {
+            Reader rd{fd};
+            std::string line;
+            if (!rd.line(line)) return rd.any ? -1 : 0;
+            // HTTP/1.1 200 OK
+            size_t sp = line.find(' ');
+            if (sp == std::string::npos) return -1;
+            r.status = std::atoi(line.c_str() + sp + 1);
+            r.keepAlive = line.compare(0, 8, "HTTP/1.0") != 0;
+
+            long long contentLength = -1;
+            bool chunked = false, gzipped = false;
+            while (true) {
+                if (!rd.line(line)) return -1;
+                if (line.empty()) break;
+                size_t colon = line.find(':');
+                if (colon == std::string::npos) continue;
+                std::string name = lower(line.substr(0, colon));
+                std::string value = line.substr(colon + 1);
+                value.erase(0, value.find_first_not_of(" \t"));
+                if (name == "content-length") contentLength = std::atoll(value.c_str());
+                else if (name == "transfer-encoding") chunked = lower(value).find("chunked") != std::string::npos;
+                else if (name == "content-encoding") gzipped = lower(value) == "gzip";
+                else if (name == "connection") {
+                    std::string v = lower(value);
+                    if (v == "close") r.keepAlive = false;
+                    else if (v == "keep-alive") r.keepAlive = true;
+                }
+            }
+
+            bool noBody = std::strcmp(method, "HEAD") == 0 || r.status == 204 || r.status == 304 ||
+                          (r.status >= 100 && r.status < 200);
+            std::string body;
+            if (noBody) {
+                // nothing to read
+            } else if (chunked) {
+                while (true) {
+                    if (!rd.line(line)) return -1;
+                    size_t n = std::strtoull(line.c_str(), nullptr, 16);
+                    if (n == 0) {
+                        do {
+                            if (!rd.line(line)) return -1; // trailers
+                        } while (!line.empty());
+                        break;
+                    }
+                    if (!rd.take(n, body) || !rd.line(line)) return -1;
+                }
+            } else if (contentLength >= 0) {
+                if (!rd.take(static_cast<size_t>(contentLength), body)) return -1;
+            } else {
+                rd.rest(body);
+                r.keepAlive = false;
+            }
+            if (gzipped) {
+                if (!gunzip(body, r.body)) return -1;
+            } else {
+                r.body = std::move(body);
+            }
+            return 1;
+        }
+    };
+
+    // Process-wide client: every thread shares its connection pool.
+    inline Client &client() {
+        static Client c;
+        return c;
+    }
+} // namespace http
+
+// Response body (empty on transport errors), like `curl -s` used to return.
 inline std::string http_get(const std::string &url) {
-    return sh("curl -s " + url);
+    return http::client().get(url).body;
 }
 
 inline std::string http_post_json(const std::string &url, const std::string &json) {
-    return sh("curl -s -X POST -H 'Content-Type: application/json' --data '" + json + "' " + url);
+    http::Body body;
+    body.data = &json;
+    return http::client().post(url, body).body;
+}
+
+// Streams the file as the request body instead of loading it.
+inline std::string http_post_file(const std::string &url, const std::string &path,
+                                  const std::string &contentType = "application/json") {
+    http::Body body;
+    body.path = path;
+    body.contentType = contentType;
+    return http::client().post(url, body).body;
 }
 
 inline void save_file(const std::string &path, const std::string &data) {
@@ -27,3 +475,14 @@ inline void save_file(const std::string &path, const std::string &data) {
         fclose(f);
     }
 }
+
+inline std::string read_file(const std::string &path) {
+    std::string out;
+    if (FILE *f = fopen(path.c_str(), "rb")) {
+        char buf[4096];
+        size_t n;
+        while ((n = fread(buf, 1, sizeof(buf), f)) > 0) out.append(buf, n);
+        fclose(f);
+    }
+    return out;
+}
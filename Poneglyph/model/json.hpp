@@ -1,10 +1,90 @@
 #pragma once
 #include <cctype>
+#include <cstdio>
 #include <string>
+#include <string_view>
+
+/**
+ * Append s to out as a JSON string literal (quotes included). Escapes
+ * quotes, backslashes and every control character; other bytes (UTF-8)
+ * pass through unchanged.
+ */
+inline void append_json_str(std::string &out, std::string_view s) {
+    out.reserve(out.size() + s.size() + 2);
+    out.push_back('"');
+    for (char c: s) {
+        switch (c) {
+            case '"': out += "\\\"";
+                break;
+            case '\\': out += "\\\\";
+                break;
+            case '\n': out += "\\n";
+                break;
+            case '\t': out += "\\t";
+                break;
+            case '\r': out += "\\r";
+                break;
+            case '\b': out += "\\b";
+                break;
+            case '\f': out += "\\f";
+                break;
+            default:
+                if (static_cast<unsigned char>(c) < 0x20) {
+                    char buf[8];
+                    std::snprintf(buf, sizeof(buf), "\\u%04x", static_cast<unsigned char>(c));
+                    out += buf;
+                } else {
+                    out.push_back(c);
+                }
+        }
+    }
+    out.push_back('"');
+}
+
+inline std::string json_str(std::string_view s) {
+    std::string out;
+    append_json_str(out, s);
+    return out;
+}
+
+namespace json_detail {
+    inline int hex4(const std::string &j, size_t p) {
+        if (p + 4 > j.size()) return -1;
+        int v = 0;
+        for (size_t k = p; k < p + 4; ++k) {
+            char c = j[k];
+            v <<= 4;
+            if (c >= '0' && c <= '9') v |= c - '0';
+            else if (c >= 'a' && c <= 'f') v |= c - 'a' + 10;
+            else if (c >= 'A' && c <= 'F') v |= c - 'A' + 10;
+            else return -1;
+        }
+        return v;
+    }
+
+    inline void put_utf8(std::string &out, unsigned cp) {
+        if (cp < 0x80) {
+            out.push_back(static_cast<char>(cp));
+        } else if (cp < 0x800) {
+            out.push_back(static_cast<char>(0xC0 | (cp >> 6)));
+            out.push_back(static_cast<char>(0x80 | (cp & 0x3F)));
+        } else if (cp < 0x10000) {
+            out.push_back(static_cast<char>(0xE0 | (cp >> 12)));
+            out.push_back(static_cast<char>(0x80 | ((cp >> 6) & 0x3F)));
+            out.push_back(static_cast<char>(0x80 | (cp & 0x3F)));
+        } else {
+            out.push_back(static_cast<char>(0xF0 | (cp >> 18)));
+            out.push_back(static_cast<char>(0x80 | ((cp >> 12) & 0x3F)));
+            out.push_back(static_cast<char>(0x80 | ((cp >> 6) & 0x3F)));
+            out.push_back(static_cast<char>(0x80 | (cp & 0x3F)));
+        }
+    }
+} // namespace json_detail
 
 /**
  * Extract a JSON string value by key from a flat object (very small helper).
- * Properly unescapes \n, \t, \r, \\, \", and ignores \uXXXX sequences.
+ * Properly unescapes \n, \t, \r, \\, \" and \uXXXX (including surrogate
+ * pairs, decoded to UTF-8; Gson emits \u003d for '=' and similar).
  * Not a general JSON parser; good enough for our controlled payloads.
  */
 inline std::string get_json_str(const std::string &j, const std::string &key) {
@@ -37,10 +117,20 @@ inline std::string get_json_str(const std::string &j, const std::string &key) {
                         break;
                     case '\"': val.push_back('\"');
                         break;
-                    case 'u':
-                        for (int k = 0; k < 4 && p < j.size(); ++k)
-                            if (isxdigit(static_cast<unsigned char>(j[p]))) ++p;
+                    case 'u': {
+                        int cp = json_detail::hex4(j, p);
+                        if (cp < 0) break;
+                        p += 4;
+                        if (cp >= 0xD800 && cp < 0xDC00 && p + 6 <= j.size() && j[p] == '\\' && j[p + 1] == 'u') {
+                            int lo = json_detail::hex4(j, p + 2);
+                            if (lo >= 0xDC00 && lo < 0xE000) {
+                                cp = 0x10000 + ((cp - 0xD800) << 10) + (lo - 0xDC00);
+                                p += 6;
+                            }
+                        }
+                        json_detail::put_utf8(val, static_cast<unsigned>(cp));
                         break;
+                    }
                     default: val.push_back(e);
                         break;
                 }
@@ -59,3 +149,54 @@ inline std::string get_json_str(const std::string &j, const std::string &key) {
         val.push_back(j[p++]);
     return val;
 }
+
+/**
+ * Standard base64 (with padding), used for the bitmaps of stencil steps on
+ * the HTTP path, which Java encodes with java.util.Base64.
+ */
+inline std::string base64_encode(std::string_view in) {
+    static constexpr char kAlphabet[] = "ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789+/";
+    std::string out;
+    out.reserve((in.size() + 2) / 3 * 4);
+    size_t i = 0;
+    for (; i + 2 < in.size(); i += 3) {
+        unsigned v = static_cast<unsigned char>(in[i]) << 16 | static_cast<unsigned char>(in[i + 1]) << 8
+                     | static_cast<unsigned char>(in[i + 2]);
+        out += kAlphabet[v >> 18];
+        out += kAlphabet[v >> 12 & 63];
+        out += kAlphabet[v >> 6 & 63];
+        out += kAlphabet[v & 63];
+    }
+    if (i < in.size()) {
+        unsigned v = static_cast<unsigned char>(in[i]) << 16;
+        if (i + 1 < in.size()) v |= static_cast<unsigned char>(in[i + 1]) << 8;
+        out += kAlphabet[v >> 18];
+        out += kAlphabet[v >> 12 & 63];
+        out += i + 1 < in.size() ? kAlphabet[v >> 6 & 63] : '=';
+        out += '=';
+    }
+    return out;
+}
+
+inline std::string base64_decode(std::string_view in) {
+    std::string out;
+    out.reserve(in.size() / 4 * 3);
+    unsigned v = 0;
+    int bits = 0;
+    for (char c: in) {
+        int d;
+        if (c >= 'A' && c <= 'Z') d = c - 'A';
+        else if (c >= 'a' && c <= 'z') d = c - 'a' + 26;
+        else if (c >= '0' && c <= '9') d = c - '0' + 52;
+        else if (c == '+') d = 62;
+        else if (c == '/') d = 63;
+        else continue; // padding
+        v = v << 6 | static_cast<unsigned>(d);
+        bits += 6;
+        if (bits >= 8) {
+            bits -= 8;
+            out.push_back(static_cast<char>(v >> bits & 0xFF));
+        }
+    }
+    return out;
+}
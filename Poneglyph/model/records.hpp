@@ -0,0 +1,115 @@
+#pragma once
+#include <cstdint>
+#include <string>
+#include <zlib.h>
+
+/**
+ * Binary intermediate records shared with the master (shuffle/RecordCodec.java)
+ * and Clover (clover/records.py): varint(len(key)) key varint(len(value)) value.
+ * Scripts using clover.records prefix their stream with kMagic so the worker
+ * can tell it apart from classic "k\tv\n" text.
+ */
+namespace records {
+    inline const std::string kMagic("\0GMR1\n", 6);
+
+    inline void put_varint(std::string &out, uint64_t v) {
+        while (v >= 0x80) {
+            out.push_back(static_cast<char>((v & 0x7F) | 0x80));
+            v >>= 7;
+        }
+        out.push_back(static_cast<char>(v));
+    }
+
+    inline bool get_varint(const std::string &in, size_t &pos, uint64_t &v) {
+        v = 0;
+        for (int shift = 0; shift < 64 && pos < in.size(); shift += 7) {
+            auto b = static_cast<unsigned char>(in[pos++]);
+            v |= static_cast<uint64_t>(b & 0x7F) << shift;
+            if (!(b & 0x80)) return true;
+        }
+        return false;
+    }
+
+    inline void put_record(std::string &out, const char *k, size_t kn, const char *v, size_t vn) {
+        put_varint(out, kn);
+        out.append(k, kn);
+        put_varint(out, vn);
+        out.append(v, vn);
+    }
+
+    // "k\tv\n..." -> records; lines without a tab are skipped like the master does.
+    inline std::string from_text(const std::string &text, int64_t &count) {
+        std::string out;
+        out.reserve(text.size());
+        count = 0;
+        size_t start = 0;
+        while (start < text.size()) {
+            size_t end = text.find('\n', start);
+            if (end == std::string::npos) end = text.size();
+            size_t tab = text.find('\t', start);
+            if (tab != std::string::npos && tab < end) {
+                put_record(out, text.data() + start, tab - start, text.data() + tab + 1, end - tab - 1);
+                ++count;
+            }
+            start = end + 1;
+        }
+        return out;
+    }
+
+    // Script output (text or kMagic-prefixed records) -> raw records.
+    inline std::string from_output(const std::string &output, int64_t &count) {
+        if (output.compare(0, kMagic.size(), kMagic) != 0) return from_text(output, count);
+        std::string raw = output.substr(kMagic.size());
+        count = 0;
+        size_t pos = 0;
+        uint64_t n;
+        while (pos < raw.size()) {
+            if (!get_varint(raw, pos, n) || pos + n > raw.size()) break;
+            pos += n;
+            if (!get_varint(raw, pos, n) || pos + n > raw.size()) break;
+            pos += n;
+            ++count;
+        }
+        return raw;
+    }
+
+    // Raw records -> "k\tv\n..." text for classic reducers.
+    inline std::string to_text(const std::string &raw) {
+        std::string out;
+        out.reserve(raw.size() + raw.size() / 8);
+        size_t pos = 0;
+        uint64_t kn, vn;
+        while (pos < raw.size()) {
+            if (!get_varint(raw, pos, kn) || pos + kn > raw.size()) break;
+            size_t k = pos;
+            pos += kn;
+            if (!get_varint(raw, pos, vn) || pos + vn > raw.size()) break;
+            if (!out.empty()) out.push_back('\n');
+            out.append(raw, k, kn);
+            out.push_back('\t');
+            out.append(raw, pos, vn);
+            pos += vn;
+        }
+        return out;
+    }
+
+    inline bool deflate_block(const std::string &raw, std::string &out) {
+        uLongf n = compressBound(raw.size());
+        out.resize(n);
+        if (compress2(reinterpret_cast<Bytef *>(out.data()), &n,
+                      reinterpret_cast<const Bytef *>(raw.data()), raw.size(), Z_BEST_SPEED) != Z_OK)
+            return false;
+        out.resize(n);
+        return true;
+    }
+
+    inline bool inflate_block(const std::string &data, size_t rawSize, std::string &out) {
+        out.resize(rawSize);
+        uLongf n = rawSize;
+        if (uncompress(reinterpret_cast<Bytef *>(out.data()), &n,
+                       reinterpret_cast<const Bytef *>(data.data()), data.size()) != Z_OK)
+            return false;
+        out.resize(n);
+        return true;
+    }
+} // namespace records
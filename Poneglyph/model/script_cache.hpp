@@ -0,0 +1,132 @@
+#pragma once
+#include <algorithm>
+#include <cctype>
+#include <condition_variable>
+#include <cstddef>
+#include <filesystem>
+#include <functional>
+#include <iostream>
+#include <list>
+#include <mutex>
+#include <string>
+#include <system_error>
+#include <unordered_map>
+#include <unordered_set>
+
+#include "model/http.hpp"
+#include "model/sha256.hpp"
+
+// Job scripts this worker has seen, stored once under dir/<sha256>.py and
+// kept in a bounded LRU. The master sends each task a script's content hash;
+// only a miss costs a download, and tasks get a hard link to the cached file
+// instead of a fresh copy. The link shares the inode, so the warm Python
+// runtime (told this directory) recognises the script and reuses its
+// compiled code without reading it. Fetched bytes
+// are cached only if they hash to the requested sha256.
+class ScriptCache {
+public:
+    ScriptCache(std::string dir, size_t capacity) : dir_(std::move(dir)), capacity_(std::max<size_t>(1, capacity)) {
+        std::error_code ec;
+        std::filesystem::remove_all(dir_, ec); // leftovers of a previous run are not indexed
+        std::filesystem::create_directories(dir_, ec);
+        dir_ = std::filesystem::absolute(dir_, ec).string();
+    }
+
+    // Path of the script with this hash; on a miss its bytes come from fetch().
+    // Empty when the hash is malformed, the fetch returned nothing (fetch
+    // returns "" on failure) or the bytes have another hash.
+    std::string get(const std::string &requested, const std::function<std::string()> &fetch) {
+        if (!valid(requested)) return "";
+        std::string sha = requested;
+        std::transform(sha.begin(), sha.end(), sha.begin(), [](unsigned char c) { return std::tolower(c); });
+
+        std::unique_lock<std::mutex> lk(mu_);
+        for (;;) {
+            auto it = index_.find(sha);
+            if (it != index_.end()) {
+                lru_.splice(lru_.begin(), lru_, it->second);
+                ++hits_;
+                return path(sha);
+            }
+            if (!fetching_.count(sha)) break;
+            // Another slot is downloading this script: wait for it rather than
+            // download it twice. Hits on other scripts do not wait.
+            fetched_.wait(lk);
+        }
+        fetching_.insert(sha);
+        lk.unlock();
+
+        std::string p = path(sha);
+        bool ok = false;
+        try {
+            std::string data = fetch();
+            if (!data.empty() && sha256::hex(data) != sha) {
+                std::cerr << "[WARN] Script fetched for " << sha << " has another hash, not cached" << std::endl;
+            } else if (!data.empty()) {
+                std::string tmp = p + ".tmp";
+                save_file(tmp, data);
+                std::error_code ec;
+                std::filesystem::rename(tmp, p, ec);
+                ok = !ec;
+            }
+        } catch (...) {
+            lk.lock();
+            fetching_.erase(sha);
+            fetched_.notify_all();
+            throw;
+        }
+
+        lk.lock();
+        fetching_.erase(sha);
+        fetched_.notify_all();
+        if (!ok) return ""; // waiters find neither entry nor download and try themselves
+        lru_.push_front(sha);
+        index_[sha] = lru_.begin();
+        ++misses_;
+        std::error_code ec;
+        while (lru_.size() > capacity_) {
+            // Tasks still running the evicted script keep it through their hard link.
+            std::filesystem::remove(path(lru_.back()), ec);
+            index_.erase(lru_.back());
+            lru_.pop_back();
+        }
+        return p;
+    }
+
+    // Makes a cached script appear at target without copying it (copies if
+    // the task directory is on another filesystem).
+    static bool link(const std::string &cached, const std::string &target) {
+        std::error_code ec;
+        std::filesystem::create_hard_link(cached, target, ec);
+        if (!ec) return true;
+        return std::filesystem::copy_file(cached, target, std::filesystem::copy_options::overwrite_existing, ec);
+    }
+
+    // Absolute directory of the cached files (<sha256>.py).
+    const std::string &dir() const { return dir_; }
+
+    long long hits() const { return hits_; }
+
+    long long misses() const { return misses_; }
+
+private:
+    std::string dir_;
+    size_t capacity_;
+    std::mutex mu_;
+    std::condition_variable fetched_;
+    std::unordered_set<std::string> fetching_; // hashes being downloaded
+    std::list<std::string> lru_; // most recently used first
+    std::unordered_map<std::string, std::list<std::string>::iterator> index_;
+    long long hits_ = 0;
+    long long misses_ = 0;
+
+    std::string path(const std::string &sha) const { return dir_ + "/" + sha + ".py"; }
+
+    // Hex only: the hash becomes a file name.
+    static bool valid(const std::string &sha) {
+        if (sha.empty() || sha.size() > 128) return false;
+        for (char c: sha)
+            if (!std::isxdigit(static_cast<unsigned char>(c))) return false;
+        return true;
+    }
+};
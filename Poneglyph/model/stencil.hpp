@@ -0,0 +1,296 @@
+#pragma once
+#include <algorithm>
+#include <chrono>
+#include <cstdint>
+#include <memory>
+#include <mutex>
+#include <string>
+#include <unordered_map>
+#include <utility>
+#include <vector>
+
+// Tiles of iterative stencil jobs (cellular automata). The master ships a
+// tile's cells once; the worker keeps the tile here and each later step
+// only brings the neighbours' edges (the halo) and returns the tile's own.
+//
+// Bitmaps on the wire are bit-packed LSB first: a row of n cells is
+// (n+7)/8 bytes, a column is packed top to bottom the same way, and a
+// whole tile is its rows one after another, each starting on a byte.
+namespace stencil {
+    // Life-like rule such as "B3/S23": bit n of birth/survive is set when a
+    // cell with n live neighbours is born/survives.
+    struct Rule {
+        uint16_t birth = 0;
+        uint16_t survive = 0;
+
+        static bool parse(const std::string &s, Rule &out) {
+            Rule r;
+            uint16_t *cur = nullptr;
+            for (char c: s) {
+                if (c == 'B' || c == 'b') cur = &r.birth;
+                else if (c == 'S' || c == 's') cur = &r.survive;
+                else if (c >= '0' && c <= '8' && cur) *cur |= static_cast<uint16_t>(1u << (c - '0'));
+                else if (c != '/') return false;
+            }
+            out = r;
+            return true;
+        }
+    };
+
+    inline bool get_bit(const std::string &b, size_t i) {
+        return i / 8 < b.size() && (static_cast<unsigned char>(b[i / 8]) >> (i % 8)) & 1u;
+    }
+
+    inline void set_bit(std::string &b, size_t i) {
+        b[i / 8] = static_cast<char>(static_cast<unsigned char>(b[i / 8]) | (1u << (i % 8)));
+    }
+
+    // One tile plus a one-cell halo ring, as rows of 64-bit words. Padded
+    // row 0 and rows+1 hold the north/south halo; in every padded row bit 0
+    // is the west halo, bits 1..cols the cells and bit cols+1 the east halo.
+    // A step computes 64 cells at once: the eight neighbour words of each
+    // cell word are summed bit-sliced and the rule picks births/survivals.
+    class Tile {
+    public:
+        Tile(int rows, int cols)
+            : rows_(rows), cols_(cols), words_((cols + 2 + 63) / 64),
+              cur_(static_cast<size_t>(rows + 2) * words_), next_(cur_.size()), mask_(words_) {
+            for (int pc = 1; pc <= cols_; ++pc) mask_[pc / 64] |= 1ull << (pc % 64);
+        }
+
+        int rows() const { return rows_; }
+        int cols() const { return cols_; }
+
+        int generation = 0;
+
+        void load(const std::string &cells) {
+            std::fill(cur_.begin(), cur_.end(), 0);
+            size_t rb = (cols_ + 7) / 8;
+            for (int r = 0; r < rows_; ++r) {
+                for (int c = 0; c < cols_; ++c) {
+                    if (get_bit(cells, r * rb * 8 + c)) put(r + 1, c + 1);
+                }
+            }
+        }
+
+        // Halo for the next step: the row above/below, the columns left/right
+        // (empty = dead) and the diagonal cells (1 NW, 2 NE, 4 SW, 8 SE).
+        void set_halo(const std::string &north, const std::string &south,
+                      const std::string &west, const std::string &east, uint32_t corners) {
+            uint64_t *top = row(0), *bottom = row(rows_ + 1);
+            std::fill(top, top + words_, 0);
+            std::fill(bottom, bottom + words_, 0);
+            for (int c = 0; c < cols_; ++c) {
+                if (get_bit(north, c)) put(0, c + 1);
+                if (get_bit(south, c)) put(rows_ + 1, c + 1);
+            }
+            if (corners & 1u) put(0, 0);
+            if (corners & 2u) put(0, cols_ + 1);
+            if (corners & 4u) put(rows_ + 1, 0);
+            if (corners & 8u) put(rows_ + 1, cols_ + 1);
+            for (int r = 0; r < rows_; ++r) {
+                uint64_t *w = row(r + 1);
+                w[0] = (w[0] & ~1ull) | (get_bit(west, r) ? 1ull : 0);
+                int pc = cols_ + 1;
+                w[pc / 64] = (w[pc / 64] & ~(1ull << (pc % 64))) | (get_bit(east, r) ? 1ull << (pc % 64) : 0);
+            }
+        }
+
+        // Advance one generation under the rule, using the current halo.
+        void step(const Rule &rule) {
+            for (int pr = 1; pr <= rows_; ++pr) {
+                const uint64_t *a = row(pr - 1), *b = row(pr), *c = row(pr + 1);
+                uint64_t *out = &next_[static_cast<size_t>(pr) * words_];
+                for (int i = 0; i < words_; ++i) {
+                    // Left neighbours sit one bit lower, right ones one bit higher.
+                    auto west = [&](const uint64_t *x) { return (x[i] << 1) | (i ? x[i - 1] >> 63 : 0); };
+                    auto east = [&](const uint64_t *x) { return (x[i] >> 1) | (i + 1 < words_ ? x[i + 1] << 63 : 0); };
+                    const uint64_t n[8] = {west(a), a[i], east(a), west(b), east(b), west(c), c[i], east(c)};
+                    uint64_t s0 = 0, s1 = 0, s2 = 0, s3 = 0; // neighbour count, one bit plane each
+                    for (uint64_t x: n) {
+                        uint64_t c0 = s0 & x;
+                        s0 ^= x;
+                        uint64_t c1 = s1 & c0;
+                        s1 ^= c0;
+                        uint64_t c2 = s2 & c1;
+                        s2 ^= c1;
+                        s3 |= c2;
+                    }
+                    uint64_t born = 0, keep = 0;
+                    for (int k = 0; k <= 8; ++k) {
+                        bool bk = rule.birth >> k & 1u, sk = rule.survive >> k & 1u;
+                        if (!bk && !sk) continue;
+                        uint64_t eq = (k & 1 ? s0 : ~s0) & (k & 2 ? s1 : ~s1) & (k & 4 ? s2 : ~s2) & (k & 8 ? s3 : ~s3);
+                        if (bk) born |= eq;
+                        if (sk) keep |= eq;
+                    }
+                    out[i] = ((~b[i] & born) | (b[i] & keep)) & mask_[i];
+                }
+            }
+            std::swap(cur_, next_);
+            ++generation;
+        }
+
+        // Bit-packed row r (0..rows-1) of the tile.
+        std::string row_bits(int r) const {
+            std::string out((cols_ + 7) / 8, '\0');
+            for (int c = 0; c < cols_; ++c) {
+                if (get(r + 1, c + 1)) set_bit(out, c);
+            }
+            return out;
+        }
+
+        // Bit-packed column c (0..cols-1) of the tile, top to bottom.
+        std::string column_bits(int c) const {
+            std::string out((rows_ + 7) / 8, '\0');
+            for (int r = 0; r < rows_; ++r) {
+                if (get(r + 1, c + 1)) set_bit(out, r);
+            }
+            return out;
+        }
+
+        std::string cells() const {
+            std::string out;
+            out.reserve(static_cast<size_t>(rows_) * ((cols_ + 7) / 8));
+            for (int r = 0; r < rows_; ++r) out += row_bits(r);
+            return out;
+        }
+
+        long long live() const {
+            long long n = 0;
+            for (int pr = 1; pr <= rows_; ++pr) {
+                const uint64_t *w = row(pr);
+                for (int i = 0; i < words_; ++i) n += __builtin_popcountll(w[i] & mask_[i]);
+            }
+            return n;
+        }
+
+    private:
+        int rows_, cols_, words_;
+        std::vector<uint64_t> cur_, next_, mask_;
+
+        uint64_t *row(int pr) { return &cur_[static_cast<size_t>(pr) * words_]; }
+        const uint64_t *row(int pr) const { return &cur_[static_cast<size_t>(pr) * words_]; }
+
+        bool get(int pr, int pc) const { return row(pr)[pc / 64] >> (pc % 64) & 1u; }
+        void put(int pr, int pc) { row(pr)[pc / 64] |= 1ull << (pc % 64); }
+    };
+
+    // One step as assigned by the master (gRPC StepTask or HTTP "STEP").
+    struct StepInput {
+        std::string jobId;
+        int tile = 0;
+        int generation = 0;
+        int rows = 0, cols = 0;
+        std::string rule;
+        std::string cells; // generation 1 only
+        std::string north, south, west, east;
+        uint32_t corners = 0;
+        bool last = false;
+    };
+
+    // What the worker reports back: the tile's edges after the step, or lost
+    // when it does not hold the tile's previous generation.
+    struct StepOutput {
+        bool lost = false;
+        std::string north, south, west, east;
+        std::string cells; // last generation only
+        long long live = 0;
+    };
+
+    // Tiles held by this worker, by job and tile index. Each entry has its
+    // own lock so slots stepping different tiles never wait on each other.
+    // Tiles of jobs that stopped sending steps (failed or cancelled) are
+    // dropped once idle for longer than the TTL.
+    class TileStore {
+    public:
+        struct Entry {
+            std::mutex mu;
+            std::unique_ptr<Tile> tile;
+            long long usedMs = 0;
+        };
+
+        explicit TileStore(long long ttlMs = 30 * 60 * 1000) : ttlMs_(ttlMs) {
+        }
+
+        // The entry for (job, tile), created empty when missing.
+        std::shared_ptr<Entry> get(const std::string &jobId, int tile) {
+            std::lock_guard<std::mutex> lk(mu_);
+            long long now = now_ms();
+            if (now - lastSweepMs_ > 60'000) sweep(now);
+            auto &e = tiles_[key(jobId, tile)];
+            if (!e) e = std::make_shared<Entry>();
+            e->usedMs = now;
+            return e;
+        }
+
+        // Runs one step. A step the tile already took (the master re-sent it
+        // after a timeout) is answered again from the current state; the
+        // last generation returns the whole tile and releases it.
+        StepOutput step(const StepInput &in) {
+            StepOutput out;
+            Rule rule;
+            if (!Rule::parse(in.rule, rule)) {
+                out.lost = true;
+                return out;
+            }
+            auto e = get(in.jobId, in.tile);
+            {
+                std::lock_guard<std::mutex> lk(e->mu);
+                Tile *t = e->tile.get();
+                if (in.generation == 1 && !t) {
+                    e->tile = std::make_unique<Tile>(in.rows, in.cols);
+                    t = e->tile.get();
+                    t->load(in.cells);
+                }
+                if (!t || t->generation < in.generation - 1 || t->generation > in.generation) {
+                    out.lost = true;
+                    return out;
+                }
+                if (t->generation == in.generation - 1) {
+                    t->set_halo(in.north, in.south, in.west, in.east, in.corners);
+                    t->step(rule);
+                }
+                out.north = t->row_bits(0);
+                out.south = t->row_bits(t->rows() - 1);
+                out.west = t->column_bits(0);
+                out.east = t->column_bits(t->cols() - 1);
+                out.live = t->live();
+                if (in.last) out.cells = t->cells();
+            }
+            if (in.last) erase(in.jobId, in.tile);
+            return out;
+        }
+
+        void erase(const std::string &jobId, int tile) {
+            std::lock_guard<std::mutex> lk(mu_);
+            tiles_.erase(key(jobId, tile));
+        }
+
+        size_t size() {
+            std::lock_guard<std::mutex> lk(mu_);
+            return tiles_.size();
+        }
+
+    private:
+        std::mutex mu_;
+        std::unordered_map<std::string, std::shared_ptr<Entry>> tiles_;
+        long long ttlMs_;
+        long long lastSweepMs_ = 0;
+
+        static std::string key(const std::string &jobId, int tile) { return jobId + "#" + std::to_string(tile); }
+
+        static long long now_ms() {
+            using namespace std::chrono;
+            return duration_cast<milliseconds>(steady_clock::now().time_since_epoch()).count();
+        }
+
+        void sweep(long long now) {
+            lastSweepMs_ = now;
+            for (auto it = tiles_.begin(); it != tiles_.end();) {
+                if (now - it->second->usedMs > ttlMs_) it = tiles_.erase(it);
+                else ++it;
+            }
+        }
+    };
+} // namespace stencil
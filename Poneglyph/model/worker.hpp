@@ -1,25 +1,71 @@
 #pragma once
+#include <atomic>
+#include <map>
 #include <memory>
+#include <mutex>
 #include <string>
-#include <utility>  // for std::pair
+#include <vector>
+
+#include "runtime/py_runtime.hpp"
 
 namespace telemetry {
     class MqttClientManager;
 }
 
+namespace stencil {
+    class TileStore;
+}
+
+namespace host {
+    class Metrics; // model/host_metrics.hpp
+}
+
 class MasterGrpcClient; // fwd
+class ScriptCache; // model/script_cache.hpp
 
 // fwd-declare proto messages so we can use them by reference in the header
 namespace gridmr {
     class MapTask;
     class ReduceTask;
+    class StepTask;
+    class TaskAssignment;
+    class TaskProfile;
 }
 
+struct PushQueue; // assignments pushed over TaskStream (core/worker.cpp)
+
+// One concurrent execution lane. Each slot pulls and runs its own tasks, with
+// its own warm runtime and a fresh working directory per task.
+struct TaskSlot {
+    int index = 0;
+    std::unique_ptr<runtime::PyRuntime> py; // if present, run scripts in the warm runtime
+    std::string dir; // working directory of the task currently running
+    long long busyMs = 0; // time spent running tasks since the last heartbeat (guarded by Worker::usageMu)
+    long long busySince = 0; // start of the running task, 0 when idle
+    // Profile of the running task, sent with its completion: ms per phase
+    // (fetch, input, startup, user, combine, output, encode) and, when the
+    // job asked for it, the scripts' hottest functions under cProfile.
+    std::map<std::string, double> phasesMs;
+    std::vector<runtime::HotFunction> hot;
+    bool profileScripts = false;
+
+    std::string path(const std::string &name) const { return dir + "/" + name; }
+};
+
 class Worker {
 public:
+    // slots <= 0 sizes the worker from its resources: one slot per usable
+    // core, but no more than the available memory allows at slotMemoryMb each.
     explicit Worker(std::string masterUrl,
                     std::unique_ptr<telemetry::MqttClientManager> mqtt = nullptr,
-                    std::unique_ptr<MasterGrpcClient> grpc = nullptr);
+                    std::unique_ptr<MasterGrpcClient> grpc = nullptr,
+                    int slots = 0,
+                    std::string workDir = "work",
+                    bool pushDispatch = true,
+                    int scriptCacheSize = 64,
+                    long long slotMemoryMb = 512);
+
+    ~Worker();
 
     int run();
 
@@ -30,21 +76,66 @@ private:
     std::unique_ptr<telemetry::MqttClientManager> mqtt;
     std::unique_ptr<MasterGrpcClient> grpc; // if present, use gRPC
 
+    std::string workDir; // per-task directories live under workDir/slot-N/
+    std::vector<TaskSlot> slots;
+    std::atomic<int> activeTasks{0};
+    std::unique_ptr<PushQueue> push; // gRPC only; nullptr means NextTask polling
+    std::unique_ptr<ScriptCache> scripts; // nullptr = fetch/write scripts for every task
+    std::unique_ptr<stencil::TileStore> tiles; // tiles of stencil jobs kept between steps
+    std::unique_ptr<host::Metrics> metrics; // CPU, memory, load and disk from /proc and cgroups
+
+    std::mutex usageMu;
+    long long usageFromMs = 0; // start of the current slot utilization window
+
     void registerSelf();
 
     void startHeartbeat();
 
     static long long now_ms();
 
-    std::pair<double, double> getSystemMetrics();
+    // Marks the slot as running a task (or idle again) for slot utilization.
+    void slotBusy(TaskSlot &slot, bool busy);
+
+    // Busy fraction of each slot since the previous call, as a JSON array.
+    std::string slotUtilization();
+
+    // Register/heartbeat fields with the host's current resource usage.
+    std::string resourceJson();
+
+    // Poll/execute loop of one slot; completions are reported as each task finishes.
+    void slotLoop(TaskSlot &slot);
+
+    // Keeps the TaskStream open: announces free slots and queues pushed assignments.
+    void pushLoop();
+
+    // Runs one gRPC assignment (map, reduce or stencil step) in the slot and reports it.
+    void runAssignment(const gridmr::TaskAssignment &ta, TaskSlot &slot);
+
+    // Puts a job script into the slot's task dir as `name`: embedded bytes if the
+    // master sent them, else the cached copy for sha, else a download of url.
+    void stageScript(TaskSlot &slot, const std::string &name, const std::string &sha,
+                     const std::string &url, const std::string &embedded);
+
+    // Runs a map/reduce script (in the slot's task dir) over input and returns its stdout.
+    // The script's own run time goes to `phase` of the slot's profile.
+    std::string runScript(TaskSlot &slot, const std::string &script, const std::string &input,
+                          const char *phase = "user");
+
+    // Applies the job's combine.py (already in the task dir) to map output.
+    std::string combine(TaskSlot &slot, const std::string &kv, const std::string &taskId);
 
     // HTTP paths (existing)
-    void handleMap(const std::string &taskJson);
+    void handleMap(const std::string &taskJson, TaskSlot &slot);
 
-    void handleReduce(const std::string &taskJson);
+    void handleReduce(const std::string &taskJson, TaskSlot &slot);
 
     // gRPC paths
-    void handleMapGrpc(const gridmr::MapTask &mt);
+    void handleMapGrpc(const gridmr::MapTask &mt, TaskSlot &slot);
+
+    void handleReduceGrpc(const gridmr::ReduceTask &rt, TaskSlot &slot);
+
+    // Stencil steps run natively on a tile held in `tiles`; no scripts or task dir.
+    void handleStep(const std::string &taskJson, TaskSlot &slot);
 
-    void handleReduceGrpc(const gridmr::ReduceTask &rt);
+    void handleStepGrpc(const gridmr::StepTask &st, TaskSlot &slot);
 };
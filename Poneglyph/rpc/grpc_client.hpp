@@ -42,12 +42,31 @@ public:
     bool CompleteMap(const std::string &worker_id,
                      const std::string &task_id,
                      const std::string &job_id,
-                     const std::string &kv_lines) {
+                     const std::string &kv_lines,
+                     const gridmr::TaskProfile *profile = nullptr) {
         gridmr::CompleteMapRequest req;
         req.set_worker_id(worker_id);
         req.set_task_id(task_id);
         req.set_job_id(job_id);
         req.set_kv_lines(kv_lines);
+        if (profile) *req.mutable_profile() = *profile;
+        gridmr::Ack ack;
+        grpc::ClientContext ctx;
+        auto status = stub_->CompleteMap(&ctx, req, &ack);
+        return status.ok() && ack.ok();
+    }
+
+    bool CompleteMapRecords(const std::string &worker_id,
+                            const std::string &task_id,
+                            const std::string &job_id,
+                            const gridmr::RecordBlock &records,
+                            const gridmr::TaskProfile *profile = nullptr) {
+        gridmr::CompleteMapRequest req;
+        req.set_worker_id(worker_id);
+        req.set_task_id(task_id);
+        req.set_job_id(job_id);
+        *req.mutable_kv_records() = records;
+        if (profile) *req.mutable_profile() = *profile;
         gridmr::Ack ack;
         grpc::ClientContext ctx;
         auto status = stub_->CompleteMap(&ctx, req, &ack);
@@ -57,18 +76,34 @@ public:
     bool CompleteReduce(const std::string &worker_id,
                         const std::string &task_id,
                         const std::string &job_id,
-                        const std::string &output) {
+                        const std::string &output,
+                        const gridmr::TaskProfile *profile = nullptr) {
         gridmr::CompleteReduceRequest req;
         req.set_worker_id(worker_id);
         req.set_task_id(task_id);
         req.set_job_id(job_id);
         req.set_output(output);
+        if (profile) *req.mutable_profile() = *profile;
         gridmr::Ack ack;
         grpc::ClientContext ctx;
         auto status = stub_->CompleteReduce(&ctx, req, &ack);
         return status.ok() && ack.ok();
     }
 
+    bool CompleteStep(const gridmr::CompleteStepRequest &req) {
+        gridmr::Ack ack;
+        grpc::ClientContext ctx;
+        auto status = stub_->CompleteStep(&ctx, req, &ack);
+        return status.ok() && ack.ok();
+    }
+
+    using TaskStream = grpc::ClientReaderWriter<gridmr::SlotAnnouncement, gridmr::TaskAssignment>;
+
+    // Push dispatch: the worker writes SlotAnnouncements, the master streams back assignments.
+    std::unique_ptr<TaskStream> OpenTaskStream(grpc::ClientContext &ctx) {
+        return stub_->TaskStream(&ctx);
+    }
+
 private:
     std::shared_ptr<grpc::Channel> channel_;
     std::unique_ptr<gridmr::Master::Stub> stub_;
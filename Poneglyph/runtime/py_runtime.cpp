@@ -0,0 +1,214 @@
+#include "py_runtime.hpp"
+
+#include <algorithm>
+#include <cerrno>
+#include <chrono>
+#include <csignal>
+#include <cstdint>
+#include <cstdlib>
+#include <filesystem>
+#include <iostream>
+#include <sstream>
+#include <sys/stat.h>
+#include <sys/wait.h>
+#include <unistd.h>
+
+namespace runtime {
+    static constexpr int kMaxConsecutiveFailures = 3;
+
+    static double ms_between(std::chrono::steady_clock::time_point a, std::chrono::steady_clock::time_point b) {
+        return std::chrono::duration<double, std::milli>(b - a).count();
+    }
+
+    // Parses the runtime's stats frame: "step\tms" lines and
+    // "hot\tcalls\tself_ms\tcumulative_ms\tname" lines.
+    static void parse_stats(const std::string &frame, double &load, double &input, double &exec,
+                            std::vector<HotFunction> &hot) {
+        std::istringstream lines(frame);
+        std::string line;
+        while (std::getline(lines, line)) {
+            std::istringstream in(line);
+            std::string step;
+            if (!std::getline(in, step, '\t')) continue;
+            if (step == "hot") {
+                HotFunction h;
+                std::string name;
+                if (in >> h.calls >> h.self_ms >> h.cumulative_ms && in.get() == '\t' && std::getline(in, name)) {
+                    h.name = std::move(name);
+                    hot.push_back(std::move(h));
+                }
+                continue;
+            }
+            double ms = 0;
+            if (!(in >> ms)) continue;
+            if (step == "load") load = ms;
+            else if (step == "input") input = ms;
+            else if (step == "exec") exec = ms;
+        }
+    }
+
+    std::unique_ptr<PyRuntime> PyRuntime::from_env_or_null(const std::string &scriptCacheDir) {
+        const char *v = std::getenv("PONEGLYPH_PY_RUNTIME");
+        std::string path = v ? std::string(v) : std::string("/opt/clover/clover/runtime.py");
+        struct stat st{};
+        if (path.empty() || stat(path.c_str(), &st) != 0) {
+            std::cout << "[PyRuntime] " << (path.empty() ? "disabled" : path + " not found")
+                    << ", using one python3 process per task" << std::endl;
+            return nullptr;
+        }
+        return std::make_unique<PyRuntime>(std::move(path), scriptCacheDir);
+    }
+
+    std::string PyRuntime::lib_root() {
+        const char *v = std::getenv("PONEGLYPH_PY_RUNTIME");
+        std::string path = v && *v ? std::string(v) : std::string("/opt/clover/clover/runtime.py");
+        // <root>/clover/runtime.py -> <root>, absolute because scripts run from the task dir
+        std::error_code ec;
+        auto abs = std::filesystem::absolute(path, ec);
+        return (ec ? std::filesystem::path(path) : abs).parent_path().parent_path().string();
+    }
+
+    PyRuntime::PyRuntime(std::string runtimePath, std::string scriptCacheDir)
+        : path_(std::move(runtimePath)), scriptCacheDir_(std::move(scriptCacheDir)) {
+        // A dead child must surface as a write error, not kill the worker.
+        std::signal(SIGPIPE, SIG_IGN);
+    }
+
+    PyRuntime::~PyRuntime() {
+        std::lock_guard<std::mutex> lk(mu_);
+        stop();
+    }
+
+    bool PyRuntime::start() {
+        int in_pipe[2], out_pipe[2];
+        if (pipe(in_pipe) != 0) return false;
+        if (pipe(out_pipe) != 0) {
+            close(in_pipe[0]);
+            close(in_pipe[1]);
+            return false;
+        }
+        pid_t pid = fork();
+        if (pid < 0) {
+            close(in_pipe[0]);
+            close(in_pipe[1]);
+            close(out_pipe[0]);
+            close(out_pipe[1]);
+            return false;
+        }
+        if (pid == 0) {
+            dup2(in_pipe[0], STDIN_FILENO);
+            dup2(out_pipe[1], STDOUT_FILENO);
+            close(in_pipe[0]);
+            close(in_pipe[1]);
+            close(out_pipe[0]);
+            close(out_pipe[1]);
+            if (scriptCacheDir_.empty()) {
+                execlp("python3", "python3", "-u", path_.c_str(), static_cast<char *>(nullptr));
+            } else {
+                execlp("python3", "python3", "-u", path_.c_str(), "--script-cache", scriptCacheDir_.c_str(),
+                       static_cast<char *>(nullptr));
+            }
+            _exit(127);
+        }
+        close(in_pipe[0]);
+        close(out_pipe[1]);
+        pid_ = pid;
+        to_child_ = in_pipe[1];
+        from_child_ = out_pipe[0];
+        std::cout << "[PyRuntime] Started " << path_ << " (pid " << pid_ << ")" << std::endl;
+        return true;
+    }
+
+    void PyRuntime::stop() {
+        if (to_child_ >= 0) close(to_child_);
+        if (from_child_ >= 0) close(from_child_);
+        to_child_ = from_child_ = -1;
+        if (pid_ > 0) {
+            kill(pid_, SIGTERM);
+            waitpid(pid_, nullptr, 0);
+        }
+        pid_ = -1;
+    }
+
+    bool PyRuntime::write_frame(const std::string &data) {
+        uint32_t n = static_cast<uint32_t>(data.size());
+        unsigned char hdr[4] = {
+            static_cast<unsigned char>(n >> 24), static_cast<unsigned char>(n >> 16),
+            static_cast<unsigned char>(n >> 8), static_cast<unsigned char>(n)
+        };
+        auto write_all = [this](const char *p, size_t len) {
+            while (len > 0) {
+                ssize_t w = write(to_child_, p, len);
+                if (w < 0 && errno == EINTR) continue;
+                if (w <= 0) return false;
+                p += w;
+                len -= static_cast<size_t>(w);
+            }
+            return true;
+        };
+        return write_all(reinterpret_cast<const char *>(hdr), 4) && write_all(data.data(), data.size());
+    }
+
+    bool PyRuntime::read_frame(std::string &data) {
+        auto read_all = [this](char *p, size_t len) {
+            while (len > 0) {
+                ssize_t r = read(from_child_, p, len);
+                if (r < 0 && errno == EINTR) continue;
+                if (r <= 0) return false;
+                p += r;
+                len -= static_cast<size_t>(r);
+            }
+            return true;
+        };
+        unsigned char hdr[4];
+        if (!read_all(reinterpret_cast<char *>(hdr), 4)) return false;
+        uint32_t n = (uint32_t(hdr[0]) << 24) | (uint32_t(hdr[1]) << 16) | (uint32_t(hdr[2]) << 8) | uint32_t(hdr[3]);
+        data.resize(n);
+        return n == 0 || read_all(data.data(), n);
+    }
+
+    bool PyRuntime::run(const std::string &scriptPath, const std::string &input, std::string &out,
+                        RunStats *stats, bool profile) {
+        std::lock_guard<std::mutex> lk(mu_);
+        if (failures_ >= kMaxConsecutiveFailures) return false;
+        if (pid_ < 0 && !start()) {
+            ++failures_;
+            return false;
+        }
+
+        using clock = std::chrono::steady_clock;
+        std::string status, message, frame;
+        auto t0 = clock::now();
+        bool ok = write_frame(profile ? "profile" : "run") && write_frame(scriptPath) && write_frame(input);
+        auto t1 = clock::now();
+        ok = ok && read_frame(status);
+        auto t2 = clock::now();
+        ok = ok && read_frame(out);
+        auto t3 = clock::now();
+        ok = ok && read_frame(message) && read_frame(frame);
+        if (!ok) {
+            std::cerr << "[PyRuntime] Runtime process died, restarting on next task" << std::endl;
+            stop();
+            if (++failures_ >= kMaxConsecutiveFailures)
+                std::cerr << "[PyRuntime] Giving up on the warm runtime after "
+                        << failures_ << " failures" << std::endl;
+            out.clear();
+            return false;
+        }
+        failures_ = 0;
+        if (stats) {
+            double load = 0, pyInput = 0, exec = 0;
+            parse_stats(frame, load, pyInput, exec, stats->hot);
+            // Whatever the runtime did not account for is waiting on it
+            // (interpreter start, pipe transfer) and counts as start-up.
+            double waited = ms_between(t1, t2);
+            stats->input_ms += ms_between(t0, t1) + pyInput;
+            stats->user_ms += exec;
+            stats->startup_ms += load + std::max(0.0, waited - load - pyInput - exec);
+            stats->output_ms += ms_between(t2, t3);
+        }
+        if (status != "ok")
+            std::cerr << "[PyRuntime] " << scriptPath << " failed: " << message << std::endl;
+        return true;
+    }
+} // namespace runtime
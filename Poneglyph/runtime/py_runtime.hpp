@@ -0,0 +1,74 @@
+#pragma once
+#include <memory>
+#include <mutex>
+#include <string>
+#include <sys/types.h>
+#include <vector>
+
+namespace runtime {
+    // Function of a user script as measured by cProfile.
+    struct HotFunction {
+        std::string name;
+        long long calls = 0;
+        double self_ms = 0;
+        double cumulative_ms = 0;
+    };
+
+    // Where the time of one run went (ms). startup covers compiling the
+    // script and waiting on the runtime process, including the interpreter
+    // start for the first task; hot is filled only for profiled runs.
+    struct RunStats {
+        double input_ms = 0;
+        double startup_ms = 0;
+        double user_ms = 0;
+        double output_ms = 0;
+        std::vector<HotFunction> hot;
+    };
+
+    // Warm Python executor (Clover/clover/runtime.py) driven over a pipe.
+    // One process serves many tasks, so scripts are compiled once and the
+    // interpreter start-up cost is paid per worker instead of per task.
+    class PyRuntime {
+    public:
+        // Uses PONEGLYPH_PY_RUNTIME (path to runtime.py), /opt/clover/clover/runtime.py when
+        // unset; nullptr if it is set to "" (disabled) or the file is missing.
+        // scriptCacheDir is the worker's script cache: the runtime reuses compiled code by
+        // inode only for files linked from it.
+        static std::unique_ptr<PyRuntime> from_env_or_null(const std::string &scriptCacheDir = "");
+
+        // Directory that holds the clover package, derived from PONEGLYPH_PY_RUNTIME
+        // (or its default). Scripts run outside the runtime need it on PYTHONPATH.
+        static std::string lib_root();
+
+        explicit PyRuntime(std::string runtimePath, std::string scriptCacheDir = "");
+
+        ~PyRuntime();
+
+        PyRuntime(const PyRuntime &) = delete;
+
+        PyRuntime &operator=(const PyRuntime &) = delete;
+
+        // Runs scriptPath over input and stores stdout in out. Returns false when the
+        // runtime itself is unavailable so the caller can fall back to forking python3.
+        // With stats, records the run's timings; profile runs the script under cProfile.
+        bool run(const std::string &scriptPath, const std::string &input, std::string &out,
+                 RunStats *stats = nullptr, bool profile = false);
+
+    private:
+        bool start();
+
+        void stop();
+
+        bool write_frame(const std::string &data);
+
+        bool read_frame(std::string &data);
+
+        std::string path_;
+        std::string scriptCacheDir_;
+        pid_t pid_ = -1;
+        int to_child_ = -1;
+        int from_child_ = -1;
+        int failures_ = 0;
+        std::mutex mu_;
+    };
+} // namespace runtime
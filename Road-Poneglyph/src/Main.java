@@ -3,6 +3,8 @@ import com.sun.net.httpserver.HttpServer;
 import api.JobsApi;
 import api.TasksApi;
 import api.WorkersApi;
+import cache.MapOutputCache;
+import core.JobLifecycle;
 import core.Scheduler;
 import core.SmartScheduler;
 import grpc.gRPCUtils;
@@ -14,9 +16,14 @@ import model.Task;
 import model.Worker;
 import rpc.MasterService;
 import store.RedisStore;
+import store.ResultUploader;
 import telemetry.MqttClientManager;
 
+import java.lang.management.GarbageCollectorMXBean;
+import java.lang.management.ManagementFactory;
+import java.lang.management.MemoryUsage;
 import java.net.InetSocketAddress;
+import java.util.LinkedHashMap;
 import java.util.Map;
 import java.util.concurrent.*;
 
@@ -38,8 +45,21 @@ public class Main {
             redis.cleanupStaleWorkers(5 * 60 * 1000); // 5 minutes
         }
 
+        // Content-addressed map output cache (MAP_CACHE_MB=0 disables it)
+        MapOutputCache mapCache = MapOutputCache.fromEnvOrNull(redis);
+
+        // One S3 client for the whole process; results upload in the background
+        ResultUploader uploader = ResultUploader.fromEnvOrNull(redis);
+
         // Inicializar SmartScheduler
         smartScheduler = new SmartScheduler(pendingTasks, workers, mqtt);
+        // Stencil tiles live on their workers: losing one fails the jobs it held tiles of
+        smartScheduler.setOnWorkerLost(workerId -> JobLifecycle.workerLost(jobs, workerId, smartScheduler, mqtt, redis));
+        // Attempts that will never report back leave the job's profile
+        smartScheduler.setOnAttemptLost((task, workerId) -> {
+            JobCtx ctx = jobs.get(task.jobId);
+            if (ctx != null) ctx.profile.lost(task.taskId, workerId);
+        });
 
         // ---- HTTP ----
         int port = 8080;
@@ -54,13 +74,15 @@ public class Main {
 
         // Workers
         server.createContext("/api/workers/register", new WorkersApi.RegisterHandler(workers, mqtt, redis));
-        server.createContext("/api/workers/heartbeat", new WorkersApi.HeartbeatHandler(workers, mqtt));
+        server.createContext("/api/workers/heartbeat", new WorkersApi.HeartbeatHandler(workers, mqtt, redis));
 
         // Jobs
-        server.createContext("/api/jobs", new JobsApi.SubmitHandler(jobs, smartScheduler, mqtt, redis));
+        server.createContext("/api/jobs", new JobsApi.SubmitHandler(jobs, smartScheduler, mqtt, redis, mapCache, uploader));
+        server.createContext("/api/jobs/input", new JobsApi.InputHandler());
         server.createContext("/api/jobs/status", new JobsApi.StatusHandler(jobs));
         server.createContext("/api/jobs/result", new JobsApi.ResultHandler(jobs));
         server.createContext("/api/jobs/debug", new JobsApi.DebugHandler(jobs));
+        server.createContext("/api/jobs/profile", new JobsApi.ProfileHandler(jobs));
         server.createContext("/api/jobs/scripts", new JobsApi.ScriptsHandler(jobs));
 
         // Tasks
@@ -76,10 +98,52 @@ public class Main {
             HttpUtils.respondJson(ex, 200, smartScheduler.getSchedulerStats());
         });
 
+        // Process metrics (heap, GC, threads) for benchmarks and monitoring
+        server.createContext("/api/metrics", ex -> {
+            if (!"GET".equals(ex.getRequestMethod())) {
+                HttpUtils.respond(ex, 405, "", "");
+                return;
+            }
+            MemoryUsage heap = ManagementFactory.getMemoryMXBean().getHeapMemoryUsage();
+            long gcCount = 0, gcMillis = 0;
+            for (GarbageCollectorMXBean gc : ManagementFactory.getGarbageCollectorMXBeans()) {
+                gcCount += Math.max(0, gc.getCollectionCount());
+                gcMillis += Math.max(0, gc.getCollectionTime());
+            }
+            Map<String, Object> m = new LinkedHashMap<>();
+            m.put("heap_used_bytes", heap.getUsed());
+            m.put("heap_committed_bytes", heap.getCommitted());
+            m.put("heap_max_bytes", heap.getMax());
+            m.put("gc_count", gcCount);
+            m.put("gc_ms", gcMillis);
+            m.put("threads", ManagementFactory.getThreadMXBean().getThreadCount());
+            m.put("jobs", jobs.size());
+            m.put("queued_tasks", pendingTasks.size());
+            m.put("workers", workers.size());
+            HttpUtils.respondJson(ex, 200, m);
+        });
+
 
+        // Handlers run on a bounded pool so completions are ingested in parallel
+        // (HTTP_THREADS, default 2x cores). When the backlog is full the accept
+        // thread runs the request itself, which throttles new connections.
+        int httpThreads = Integer.parseInt(System.getenv().getOrDefault("HTTP_THREADS",
+                String.valueOf(2 * Runtime.getRuntime().availableProcessors())));
+        ThreadPoolExecutor httpExecutor = new ThreadPoolExecutor(httpThreads, httpThreads,
+                60, TimeUnit.SECONDS, new LinkedBlockingQueue<>(1024), new ThreadFactory() {
+                    private int n = 0;
+
+                    @Override
+                    public synchronized Thread newThread(Runnable r) {
+                        Thread t = new Thread(r, "http-" + (n++));
+                        t.setDaemon(true);
+                        return t;
+                    }
+                }, new ThreadPoolExecutor.CallerRunsPolicy());
+        server.setExecutor(httpExecutor);
 
         server.start();
-        System.out.println("Road-Poneglyph HTTP listening on :8080");
+        System.out.println("Road-Poneglyph HTTP listening on :8080 (" + httpThreads + " handler threads)");
 
         // ---- gRPC ----
         int grpcPort = Integer.parseInt(System.getenv().getOrDefault("GRPC_PORT", "50051"));
@@ -119,6 +183,8 @@ public class Main {
 
         // Graceful shutdown
         Runtime.getRuntime().addShutdownHook(new Thread(() -> {
+            server.stop(1);
+            httpExecutor.shutdown();
             try {
                 grpcServer.shutdown();
             } catch (Exception ignored) {
@@ -127,6 +193,10 @@ public class Main {
                 if (mqtt != null) mqtt.close();
             } catch (Exception ignored) {
             }
+            try {
+                if (uploader != null) uploader.close(); // before Redis: it records the S3 location
+            } catch (Exception ignored) {
+            }
             try {
                 if (redis != null) redis.close();
             } catch (Exception ignored) {
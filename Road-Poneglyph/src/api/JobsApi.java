@@ -3,16 +3,27 @@ package api;
 import com.google.gson.Gson;
 import com.sun.net.httpserver.HttpExchange;
 import com.sun.net.httpserver.HttpHandler;
-import core.Partitioner;
+import cache.MapOutputCache;
+import core.JobLifecycle;
+import core.Partitioners;
 import core.Scheduler;
 import http.HttpUtils;
 import model.*;
+import shuffle.ShuffleStore;
+import stencil.StencilJob;
+import store.JobInput;
+import store.ResultSegments;
+import store.ResultUploader;
 import store.RedisStore;
 import telemetry.MqttClientManager;
 
 import java.io.IOException;
+import java.io.OutputStream;
+import java.nio.charset.StandardCharsets;
 import java.util.*;
 import java.util.concurrent.ConcurrentHashMap;
+import java.util.concurrent.ExecutorService;
+import java.util.concurrent.Executors;
 
 /**
  * Jobs endpoints grouped as nested handlers.
@@ -22,6 +33,13 @@ public final class JobsApi {
     }
 
     private static final Gson gson = new Gson();
+    // Keys the map tasks of uploaded inputs for the map output cache, which
+    // reads and hashes the whole file: kept off the request thread
+    private static final ExecutorService cacheResolver = Executors.newSingleThreadExecutor(r -> {
+        Thread t = new Thread(r, "map-cache-resolver");
+        t.setDaemon(true);
+        return t;
+    });
 
     /**
      * POST /api/jobs and GET /api/jobs (list ids)
@@ -31,12 +49,17 @@ public final class JobsApi {
         private final Scheduler scheduler;
         private final MqttClientManager mqtt;
         private final RedisStore redis;
+        private final MapOutputCache mapCache;
+        private final ResultUploader uploader;
 
-        public SubmitHandler(Map<String, JobCtx> jobs, Scheduler scheduler, MqttClientManager mqtt, RedisStore redis) {
+        public SubmitHandler(Map<String, JobCtx> jobs, Scheduler scheduler, MqttClientManager mqtt, RedisStore redis,
+                             MapOutputCache mapCache, ResultUploader uploader) {
             this.jobs = jobs;
             this.scheduler = scheduler;
             this.mqtt = mqtt;
             this.redis = redis;
+            this.mapCache = mapCache;
+            this.uploader = uploader;
         }
 
         @Override
@@ -44,36 +67,98 @@ public final class JobsApi {
             if ("POST".equals(ex.getRequestMethod())) {
                 String body = HttpUtils.readBody(ex);
                 JobSpec spec = gson.fromJson(body, JobSpec.class);
+                JobCtx previous = jobs.get(spec.job_id);
+                if (previous != null && (previous.state == JobState.PENDING || previous.state == JobState.RUNNING)) {
+                    // its result segments would be cleared under it
+                    HttpUtils.respond(ex, 409, "job " + spec.job_id + " is still running", "text/plain");
+                    return;
+                }
+                if (uploader != null && uploader.isUploading(spec.job_id)) {
+                    // the upload streams the previous run's segments, which this run would clear
+                    HttpUtils.respond(ex, 409, "result of job " + spec.job_id + " is still uploading", "text/plain");
+                    return;
+                }
+                JobInput input = null;
+                if (spec.input_id != null) {
+                    input = JobInput.open(spec.input_id);
+                    if (input == null) {
+                        HttpUtils.respond(ex, 400, "unknown input_id " + spec.input_id, "text/plain");
+                        return;
+                    }
+                }
+                if ("stencil".equalsIgnoreCase(spec.mode)) {
+                    submitStencil(ex, spec, input);
+                    return;
+                }
 
                 JobCtx ctx = new JobCtx();
                 ctx.spec = spec;
+                ctx.input = input;
+                ctx.inputBytes = input != null ? input.size()
+                        : spec.input_text == null ? 0 : spec.input_text.getBytes(StandardCharsets.UTF_8).length;
+                if (spec.map_script_b64 == null || spec.reduce_script_b64 == null) {
+                    HttpUtils.respond(ex, 400, "map_script_b64 and reduce_script_b64 are required", "text/plain");
+                    return;
+                }
+                if (Boolean.TRUE.equals(spec.split_hot_keys) && !Boolean.TRUE.equals(spec.reduce_preserves_keys)) {
+                    // the merge finds each split key's partial outputs by their "key\t" prefix
+                    HttpUtils.respond(ex, 400, "split_hot_keys requires reduce_preserves_keys", "text/plain");
+                    return;
+                }
                 ctx.mapScript = Base64.getDecoder().decode(spec.map_script_b64);
                 ctx.reduceScript = Base64.getDecoder().decode(spec.reduce_script_b64);
+                if (spec.combine_script_b64 != null && !spec.combine_script_b64.isBlank())
+                    ctx.combineScript = Base64.getDecoder().decode(spec.combine_script_b64);
+                ctx.hashScripts();
 
                 // init partitions
-                for (int i = 0; i < spec.reducers; i++) ctx.partitionKV.put(i, new ArrayList<>());
+                ctx.shuffle = ShuffleStore.fromEnv(spec.job_id, spec.reducers);
+                ctx.result = ResultSegments.fromEnv(spec.job_id);
+                ctx.uploader = uploader;
 
                 // build & enqueue maps
                 int splitSize = Math.max(1, Optional.ofNullable(spec.split_size).orElse(1024));
-                ctx.mapTasks = scheduler.buildMapTasks(spec.job_id, spec.input_text, splitSize);
+                ctx.mapTasks = input != null
+                        ? scheduler.buildMapTasks(spec.job_id, input, splitSize)
+                        : scheduler.buildMapTasks(spec.job_id, spec.input_text, splitSize);
+                Partitioners.configure(ctx.shuffle, spec, ctx.mapTasks.size());
                 ctx.state = JobState.RUNNING;
 
+                // chunks already mapped by the same scripts complete from the cache
+                List<Task> toRun = ctx.mapTasks;
+                boolean resolveLater = false;
+                if (mapCache != null && !Boolean.FALSE.equals(spec.map_cache)) {
+                    ctx.mapCache = mapCache;
+                    // inline text is already in memory; an uploaded input is hashed in the background
+                    if (input != null) resolveLater = true;
+                    else toRun = mapCache.resolve(ctx);
+                }
+
                 jobs.put(spec.job_id, ctx);
-                scheduler.enqueueAll(ctx.mapTasks);
+                if (resolveLater) cacheResolver.execute(() -> resolveAndEnqueue(ctx));
+                else scheduler.enqueueAll(toRun);
 
                 if (redis != null) {
                     redis.saveJobSpec(spec);
                     redis.setJobState(spec.job_id, ctx.state.toString());
-                    redis.saveJobCounters(spec.job_id, ctx.completedMaps, ctx.completedReduces);
+                    redis.saveJobCounters(spec.job_id, ctx.completedMaps.get(), ctx.completedReduces.get());
                 }
                 if (mqtt != null) {
                     mqtt.publishJson("gridmr/job/created", Map.of(
                             "jobId", spec.job_id, "reducers", spec.reducers, "splitSize", splitSize,
-                            "maps", ctx.mapTasks.size(), "ts", System.currentTimeMillis()
+                            "maps", ctx.mapTasks.size(), "combiner", ctx.combineScript != null,
+                            "cachedMaps", ctx.mapCacheHits.get(),
+                            "ts", System.currentTimeMillis()
                     ));
                 }
 
-                HttpUtils.respondJson(ex, 200, Map.of("job_id", spec.job_id, "maps", ctx.mapTasks.size()));
+                if (!resolveLater && toRun.isEmpty()) {
+                    // every chunk was cached (or the input is empty): go straight to reduce
+                    JobLifecycle.startReducePhase(ctx, scheduler, mqtt, redis);
+                }
+
+                HttpUtils.respondJson(ex, 200, Map.of("job_id", spec.job_id, "maps", ctx.mapTasks.size(),
+                        "cached_maps", ctx.mapCacheHits.get()));
                 return;
             }
             if ("GET".equals(ex.getRequestMethod())) {
@@ -82,6 +167,99 @@ public final class JobsApi {
             }
             HttpUtils.respond(ex, 405, "", "");
         }
+
+        /**
+         * Look up the map tasks of a submitted job in the map output cache,
+         * then queue the ones that still have to run.
+         */
+        private void resolveAndEnqueue(JobCtx ctx) {
+            List<Task> toRun;
+            try {
+                toRun = ctx.mapCache.resolve(ctx);
+            } catch (IOException | RuntimeException e) {
+                JobLifecycle.fail(ctx, "map cache lookup failed: " + e.getMessage(), scheduler, mqtt, redis);
+                return;
+            }
+            scheduler.enqueueAll(toRun);
+            if (redis != null) {
+                redis.saveJobCounters(ctx.spec.job_id, ctx.completedMaps.get(), ctx.completedReduces.get());
+            }
+            if (toRun.isEmpty()) JobLifecycle.startReducePhase(ctx, scheduler, mqtt, redis);
+        }
+
+        /**
+         * Iterative stencil job: the grid is parsed and tiled on the master and
+         * generation 1 of every tile is queued; no scripts or shuffle involved.
+         */
+        private void submitStencil(HttpExchange ex, JobSpec spec, JobInput input) throws IOException {
+            String text = input != null
+                    ? input.read(0, (int) Math.min(Integer.MAX_VALUE, input.size()))
+                    : Optional.ofNullable(spec.input_text).orElse("");
+            StencilJob stencil;
+            try {
+                stencil = StencilJob.parse(spec, text);
+            } catch (IllegalArgumentException e) {
+                HttpUtils.respond(ex, 400, "bad stencil job: " + e.getMessage(), "text/plain");
+                return;
+            }
+
+            JobCtx ctx = new JobCtx();
+            ctx.spec = spec;
+            ctx.input = input;
+            ctx.inputBytes = text.length();
+            ctx.stencil = stencil;
+            ctx.result = ResultSegments.fromEnv(spec.job_id);
+            ctx.uploader = uploader;
+            ctx.state = JobState.RUNNING;
+            jobs.put(spec.job_id, ctx);
+
+            if (redis != null) {
+                redis.saveJobSpec(spec);
+                redis.setJobState(spec.job_id, ctx.state.toString());
+            }
+            if (mqtt != null) {
+                mqtt.publishJson("gridmr/job/created", Map.of(
+                        "jobId", spec.job_id, "mode", "stencil", "tiles", stencil.tiles(),
+                        "generations", stencil.generations, "width", stencil.width, "height", stencil.height,
+                        "ts", System.currentTimeMillis()
+                ));
+            }
+
+            if (stencil.generations == 0) {
+                stencil.writeInitial(ctx.result);
+                JobLifecycle.finish(ctx, scheduler, mqtt, redis);
+            } else {
+                scheduler.enqueueAll(stencil.initialTasks());
+            }
+            HttpUtils.respondJson(ex, 200, Map.of("job_id", spec.job_id, "tiles", stencil.tiles(),
+                    "generations", stencil.generations));
+        }
+    }
+
+    /**
+     * POST /api/jobs/input: job input as the raw request body (optionally
+     * "Content-Encoding: gzip", usually sent chunked). Stored on disk as it
+     * arrives; returns {"input_id", "bytes"} for the job's input_id.
+     */
+    public static class InputHandler implements HttpHandler {
+        @Override
+        public void handle(HttpExchange ex) throws IOException {
+            if (!"POST".equals(ex.getRequestMethod())) {
+                HttpUtils.respond(ex, 405, "", "");
+                return;
+            }
+            boolean gzip = "gzip".equalsIgnoreCase(ex.getRequestHeaders().getFirst("Content-Encoding"));
+            JobInput input;
+            try {
+                input = JobInput.receive(ex.getRequestBody(), gzip);
+            } catch (IOException e) {
+                HttpUtils.respond(ex, 400, "input upload failed: " + e.getMessage(), "text/plain");
+                return;
+            }
+            long bytes = input.size();
+            System.out.println("[INPUT] Received " + input.id() + " (" + bytes + " bytes" + (gzip ? ", gzip" : "") + ")");
+            HttpUtils.respondJson(ex, 200, Map.of("input_id", input.id(), "bytes", bytes));
+        }
     }
 
     /**
@@ -108,15 +286,31 @@ public final class JobsApi {
             st.put("job_id", jobId);
             st.put("state", ctx.state.toString());
             st.put("maps_total", ctx.mapTasks.size());
-            st.put("maps_completed", ctx.completedMaps);
-            st.put("reduces_total", ctx.spec.reducers);
-            st.put("reduces_completed", ctx.completedReduces);
+            st.put("maps_completed", ctx.completedMaps.get());
+            st.put("reduces_total", Math.max(Optional.ofNullable(ctx.spec.reducers).orElse(0), ctx.reduceTasks.size()));
+            st.put("reduces_completed", ctx.completedReduces.get());
+            st.put("map_cache_hits", ctx.mapCacheHits.get());
+            st.put("map_cache_misses", ctx.mapCacheMisses.get());
+            if (ctx.stencil != null) {
+                StencilJob sj = ctx.stencil;
+                int gen = sj.generation();
+                st.put("tiles", sj.tiles());
+                st.put("generation", gen);
+                st.put("generations", sj.generations);
+                st.put("steps_total", sj.stepsTotal());
+                st.put("steps_completed", sj.stepsCompleted());
+                st.put("live", sj.live(gen));
+            }
+            if (ctx.error != null) st.put("error", ctx.error);
+            if (ctx.s3Key != null) st.put("result_s3_key", ctx.s3Key);
             HttpUtils.respondJson(ex, 200, st);
         }
     }
 
     /**
-     * GET /api/jobs/result?job_id=...
+     * GET /api/jobs/result?job_id=...[&partition=N][&offset=B&length=L]
+     * Streams the result segments (chunked); also honours "Range: bytes=".
+     * With &list=1, returns the partitions and their sizes as JSON instead.
      */
     public static class ResultHandler implements HttpHandler {
         private final Map<String, JobCtx> jobs;
@@ -127,8 +321,8 @@ public final class JobsApi {
 
         @Override
         public void handle(HttpExchange ex) throws IOException {
-            String q = ex.getRequestURI().getQuery();
-            String jobId = (q != null && q.startsWith("job_id=")) ? q.substring("job_id=".length()) : null;
+            Map<String, String> params = HttpUtils.queryParams(ex);
+            String jobId = params.get("job_id");
             JobCtx ctx = (jobId != null) ? jobs.get(jobId) : null;
             if (ctx == null) {
                 HttpUtils.respond(ex, 404, "not found", "text/plain");
@@ -138,7 +332,79 @@ public final class JobsApi {
                 HttpUtils.respond(ex, 409, "not ready", "text/plain");
                 return;
             }
-            HttpUtils.respond(ex, 200, ctx.finalOutput, "text/plain");
+            ResultSegments result = ctx.result;
+
+            if (params.containsKey("list")) {
+                List<Map<String, Object>> parts = new ArrayList<>();
+                for (int p : result.partitions()) parts.add(Map.of("partition", p, "bytes", result.size(p)));
+                HttpUtils.respondJson(ex, 200, Map.of("job_id", jobId, "bytes", result.bytes(null), "partitions", parts));
+                return;
+            }
+
+            Integer partition = null;
+            if (params.containsKey("partition")) {
+                try {
+                    partition = Integer.parseInt(params.get("partition"));
+                } catch (NumberFormatException e) {
+                    HttpUtils.respond(ex, 400, "bad partition", "text/plain");
+                    return;
+                }
+                if (!result.has(partition)) {
+                    HttpUtils.respond(ex, 404, "no such partition", "text/plain");
+                    return;
+                }
+            }
+
+            long total = result.bytes(partition);
+            long[] range;
+            try {
+                range = byteRange(params, ex.getRequestHeaders().getFirst("Range"), total);
+            } catch (NumberFormatException e) {
+                HttpUtils.respond(ex, 400, "bad range", "text/plain");
+                return;
+            }
+            if (range != null && (range[0] >= total || range[1] < range[0])) {
+                ex.getResponseHeaders().set("Content-Range", "bytes */" + total);
+                HttpUtils.respond(ex, 416, "range not satisfiable", "text/plain");
+                return;
+            }
+            long start = range == null ? 0 : range[0];
+            long end = range == null ? total - 1 : Math.min(range[1], total - 1);
+
+            // Chunked transfer straight from the segment files.
+            ex.getResponseHeaders().set("Content-Type", "text/plain; charset=utf-8");
+            ex.getResponseHeaders().set("Accept-Ranges", "bytes");
+            ex.getResponseHeaders().set("X-Result-Bytes", String.valueOf(total));
+            if (range != null) ex.getResponseHeaders().set("Content-Range", "bytes " + start + "-" + end + "/" + total);
+            ex.sendResponseHeaders(range != null ? 206 : 200, 0);
+            try (OutputStream os = ex.getResponseBody()) {
+                result.transferTo(os, partition, start, end - start + 1);
+            }
+        }
+
+        /**
+         * {start, end} (inclusive) from offset/length query params or a single
+         * "Range: bytes=a-b" header (also "a-" and "-suffix"); null for the whole body.
+         * A negative offset or a non-positive length yields an empty range (416).
+         */
+        private static long[] byteRange(Map<String, String> params, String header, long total) {
+            if (params.containsKey("offset") || params.containsKey("length")) {
+                long offset = Long.parseLong(params.getOrDefault("offset", "0"));
+                long length = params.containsKey("length") ? Long.parseLong(params.get("length")) : total - offset;
+                if (offset < 0 || length <= 0) return new long[]{0, -1};
+                return new long[]{offset, offset + Math.min(length, total - offset) - 1};
+            }
+            if (header == null || !header.startsWith("bytes=") || header.contains(",")) return null;
+            String spec = header.substring("bytes=".length()).trim();
+            int dash = spec.indexOf('-');
+            if (dash < 0) throw new NumberFormatException(spec);
+            String a = spec.substring(0, dash).trim();
+            String b = spec.substring(dash + 1).trim();
+            if (a.isEmpty()) {
+                long suffix = Long.parseLong(b);
+                return new long[]{Math.max(0, total - suffix), total - 1};
+            }
+            return new long[]{Long.parseLong(a), b.isEmpty() ? total - 1 : Long.parseLong(b)};
         }
     }
 
@@ -162,18 +428,102 @@ public final class JobsApi {
                 return;
             }
 
-            List<Integer> parts = new ArrayList<>();
-            for (int i = 0; i < ctx.spec.reducers; i++) parts.add(ctx.partitionKV.get(i).size());
-
             Map<String, Object> dbg = new LinkedHashMap<>();
             dbg.put("state", ctx.state.toString());
-            dbg.put("partition_sizes", parts);
+            if (ctx.stencil != null) {
+                StencilJob sj = ctx.stencil;
+                dbg.put("grid", List.of(sj.width, sj.height));
+                dbg.put("tile_size", sj.tileSize);
+                dbg.put("tiles", sj.tiles());
+                dbg.put("rule", sj.rule);
+                dbg.put("wrap", sj.wrap);
+                dbg.put("generation", sj.generation());
+                dbg.put("steps_completed", sj.stepsCompleted());
+                dbg.put("edge_bytes", sj.edgeBytes());
+                long finished = ctx.finishedAt;
+                dbg.put("ms", finished > 0 ? finished - ctx.submittedAt : null);
+                HttpUtils.respondJson(ex, 200, dbg);
+                return;
+            }
+            dbg.put("partition_sizes", ctx.shuffle.partitionSizes());
+            dbg.put("shuffle_spills", ctx.shuffle.spillCount());
+            dbg.put("partitioner", ctx.spec.partitioner == null ? "hash" : ctx.spec.partitioner);
+            dbg.put("split_keys", ctx.shuffle.splitKeys());
+            dbg.put("phases", phases(ctx));
             HttpUtils.respondJson(ex, 200, dbg);
         }
     }
 
     /**
-     * GET /api/jobs/scripts/{jobId}/{map.py|reduce.py}
+     * GET /api/jobs/profile?job_id=...[&format=trace]
+     * Per-task phase percentiles, hot functions of profiled scripts and the
+     * slowest tasks; with format=trace, the job's timeline in Chrome trace
+     * format (open it in ui.perfetto.dev or chrome://tracing).
+     */
+    public static class ProfileHandler implements HttpHandler {
+        private final Map<String, JobCtx> jobs;
+
+        public ProfileHandler(Map<String, JobCtx> jobs) {
+            this.jobs = jobs;
+        }
+
+        @Override
+        public void handle(HttpExchange ex) throws IOException {
+            Map<String, String> q = HttpUtils.queryParams(ex);
+            String jobId = q.get("job_id");
+            JobCtx ctx = (jobId != null) ? jobs.get(jobId) : null;
+            if (ctx == null) {
+                HttpUtils.respond(ex, 404, "not found", "text/plain");
+                return;
+            }
+            if ("trace".equals(q.get("format"))) {
+                HttpUtils.respondJson(ex, 200, ctx.profile.chromeTrace(jobId, ctx.mapsDoneAt, ctx.finishedAt));
+                return;
+            }
+            Map<String, Object> out = new LinkedHashMap<>();
+            out.put("job_id", jobId);
+            out.put("state", ctx.state.toString());
+            long finished = ctx.finishedAt;
+            out.put("ms", finished > 0 ? finished - ctx.submittedAt : null);
+            out.putAll(ctx.profile.summary());
+            HttpUtils.respondJson(ex, 200, out);
+        }
+    }
+
+    /**
+     * Per-job phase latencies (map: submit to last map, reduce: last map to
+     * finish; shuffle: master time spent ingesting and merging) and the bytes
+     * each phase moved.
+     */
+    static Map<String, Object> phases(JobCtx ctx) throws IOException {
+        long mapsDone = ctx.mapsDoneAt;
+        long finished = ctx.finishedAt;
+        Map<String, Object> ms = new LinkedHashMap<>();
+        ms.put("map", mapsDone > 0 ? mapsDone - ctx.submittedAt : null);
+        ms.put("shuffle_ingest", ctx.shuffle.ingestMillis());
+        ms.put("shuffle_merge", ctx.shuffle.mergeMillis());
+        ms.put("reduce", finished > 0 && mapsDone > 0 ? finished - mapsDone : null);
+        ms.put("total", finished > 0 ? finished - ctx.submittedAt : null);
+
+        Map<String, Object> bytes = new LinkedHashMap<>();
+        bytes.put("input", ctx.inputBytes);
+        bytes.put("map_output", ctx.shuffle.ingestedBytes());
+        bytes.put("reduce_input", ctx.shuffle.servedBytes());
+        bytes.put("result", ctx.state == JobState.SUCCEEDED ? ctx.result.bytes(null) : 0);
+
+        long records = 0;
+        for (int n : ctx.shuffle.partitionSizes()) records += n;
+        Map<String, Object> out = new LinkedHashMap<>();
+        out.put("ms", ms);
+        out.put("bytes", bytes);
+        out.put("records", records);
+        out.put("maps", ctx.mapTasks.size());
+        out.put("reduces", ctx.reduceTasks.size());
+        return out;
+    }
+
+    /**
+     * GET /api/jobs/scripts/{jobId}/{map.py|combine.py|reduce.py}
      */
     public static class ScriptsHandler implements HttpHandler {
         private final Map<String, JobCtx> jobs;
@@ -198,7 +548,15 @@ public final class JobsApi {
                 HttpUtils.respond(ex, 404, "", "");
                 return;
             }
-            byte[] data = "map.py".equals(which) ? ctx.mapScript : ctx.reduceScript;
+            byte[] data = switch (which) {
+                case "map.py" -> ctx.mapScript;
+                case "combine.py" -> ctx.combineScript;
+                default -> ctx.reduceScript;
+            };
+            if (data == null) {
+                HttpUtils.respond(ex, 404, "", "");
+                return;
+            }
 
             ex.getResponseHeaders().set("Content-Type", "text/x-python");
             ex.sendResponseHeaders(200, data.length);
@@ -4,11 +4,14 @@ import com.google.gson.JsonObject;
 import com.google.gson.JsonParser;
 import com.sun.net.httpserver.HttpExchange;
 import com.sun.net.httpserver.HttpHandler;
+import core.JobLifecycle;
 import core.Partitioner;
 import core.Scheduler;
 import core.SmartScheduler;
 import http.HttpUtils;
 import model.*;
+import profile.JobProfile;
+import stencil.StencilJob;
 import store.RedisStore;
 import telemetry.MqttClientManager;
 
@@ -44,7 +47,10 @@ public final class TasksApi {
                 HttpUtils.respond(ex, 204, "", "");
                 return;
             }
+            task.assignedAt = System.currentTimeMillis();
+            task.assignedTo = HttpUtils.queryParams(ex).get("workerId");
 
+            long buildStart = System.nanoTime();
             JobCtx ctx = jobs.get(task.jobId);
             Map<String, Object> resp = new LinkedHashMap<>();
             resp.put("type", task.type.toString());
@@ -52,14 +58,29 @@ public final class TasksApi {
             resp.put("job_id", task.jobId);
 
             if (task.type == TaskType.MAP) {
-                resp.put("input_chunk", task.inputChunk);
+                resp.put("input_chunk", ctx.mapInput(task));
                 resp.put("map_url", "/api/jobs/scripts/" + task.jobId + "/map.py");
+                resp.put("map_sha256", ctx.mapScriptSha);
                 resp.put("reducers", ctx.spec.reducers);
+                if (ctx.combineScript != null) {
+                    resp.put("combine_url", "/api/jobs/scripts/" + task.jobId + "/combine.py");
+                    resp.put("combine_sha256", ctx.combineScriptSha);
+                }
+            } else if (task.type == TaskType.STEP) {
+                putStep(resp, ctx, task);
             } else {
                 resp.put("partition_index", task.partitionIndex);
                 resp.put("reduce_url", "/api/jobs/scripts/" + task.jobId + "/reduce.py");
-                resp.put("kv_lines", String.join("\n", task.kvLinesForReduce));
+                resp.put("reduce_sha256", ctx.reduceScriptSha);
+            }
+            if (Boolean.TRUE.equals(ctx.spec.cprofile) && task.type != TaskType.STEP) resp.put("profile_script", 1);
+            if (task.type == TaskType.REDUCE) {
+                // kv_lines is written straight into the response, never built as one String
+                HttpUtils.respondJsonStreamed(ex, resp, "kv_lines", w -> ctx.shuffle.writePartition(task.partitionIndex, w));
+                ctx.profile.assigned(task, JobProfile.msSince(buildStart));
+                return;
             }
+            ctx.profile.assigned(task, JobProfile.msSince(buildStart));
             HttpUtils.respondJson(ex, 200, resp);
         }
     }
@@ -87,6 +108,8 @@ public final class TasksApi {
                 return;
             }
             String body = HttpUtils.readBody(ex);
+            long receivedAt = System.currentTimeMillis();
+            long ingestStart = System.nanoTime();
             JsonObject j = JsonParser.parseString(body).getAsJsonObject();
 
             String taskId = j.get("task_id").getAsString();
@@ -99,72 +122,52 @@ public final class TasksApi {
                 return;
             }
 
+            String workerId = j.has("worker_id") ? j.get("worker_id").getAsString() : null;
+            JobProfile.WorkerReport report = JobProfile.WorkerReport.fromJson(j.get("profile"));
+
+            if ("STEP".equals(type)) {
+                completeStep(j, ctx, workerId, scheduler, mqtt, redis);
+                ctx.profile.completed(taskId, workerId, receivedAt, JobProfile.msSince(ingestStart), report);
+                HttpUtils.respondJson(ex, 200, Map.of("ack", true));
+                return;
+            }
+            if (!ctx.markCompleted(taskId)) {
+                ctx.profile.completed(taskId, workerId, receivedAt, JobProfile.msSince(ingestStart), report);
+                System.out.println("[DUPLICATE COMPLETE] job=" + jobId + " task=" + taskId + " ignored");
+                HttpUtils.respondJson(ex, 200, Map.of("ack", true, "duplicate", true));
+                return;
+            }
+
             if ("MAP".equals(type)) {
                 String kv = j.get("kv_lines").getAsString(); // "k\tv\n..."
-                int added = 0;
-                for (String line : kv.split("\n")) {
-                    if (line.isBlank()) continue;
-                    String[] kvp = line.split("\t", 2);
-                    if (kvp.length < 2) continue;
-                    String k = kvp[0];
-                    String v = kvp[1];
-                    int p = core.Partitioner.partitionOf(k, ctx.spec.reducers);
-                    ctx.partitionKV.get(p).add(k + "\t" + v);
-                    added++;
+                int added;
+                try {
+                    added = ctx.shuffle.ingest(kv);
+                } catch (IOException e) {
+                    System.err.println("[SHUFFLE ERROR] job=" + jobId + " task=" + taskId + ": " + e.getMessage());
+                    ctx.completedTaskIds.remove(taskId);
+                    HttpUtils.respond(ex, 500, "shuffle ingest failed", "text/plain");
+                    return;
                 }
-                ctx.completedMaps++;
+                int copies = ctx.mapCache != null ? ctx.mapCache.storeText(ctx, taskId, kv, scheduler::enqueue) : 0;
+                ctx.profile.completed(taskId, workerId, receivedAt, JobProfile.msSince(ingestStart), report);
+                int mapsDone = ctx.completedMaps.addAndGet(1 + copies);
                 System.out.println("[MAP COMPLETE] job=" + jobId + " task=" + taskId + " kvAdded=" + added);
 
                 if (mqtt != null) {
-                    mqtt.publishJson("gridmr/job/" + jobId + "/map/completed", Map.of(
-                            "taskId", taskId, "added", added, "mapsCompleted", ctx.completedMaps, "ts", System.currentTimeMillis()
+                    mqtt.snapshots().mapsCompleted(jobId, mapsDone, ctx.mapTasks.size());
+                    mqtt.publishEvent("gridmr/job/" + jobId + "/map/completed", () -> Map.of(
+                            "taskId", taskId, "added", added, "mapsCompleted", mapsDone, "ts", System.currentTimeMillis()
                     ));
                 }
                 if (redis != null) {
-                    redis.saveJobCounters(jobId, ctx.completedMaps, ctx.completedReduces);
+                    redis.saveJobCounters(jobId, ctx.completedMaps.get(), ctx.completedReduces.get());
                 }
 
-                if (ctx.completedMaps == ctx.mapTasks.size()) {
-                    // build reduce tasks for ALL partitions (including empty ones)
-                    int rIx = 0;
-                    ctx.reduceTasks.clear();
-                    var sizes = new java.util.ArrayList<Integer>();
-
-                    for (int i = 0; i < ctx.spec.reducers; i++) {
-                        int sz = ctx.partitionKV.get(i).size();
-                        sizes.add(sz);
-                        // Create reduce tasks for ALL partitions, including empty ones
-
-                        Task rt = new Task();
-                        rt.type = TaskType.REDUCE;
-                        rt.taskId = "reduce-" + (rIx++);
-                        rt.jobId = jobId;
-                        rt.partitionIndex = i;
-                        rt.kvLinesForReduce = ctx.partitionKV.get(i);
-                        ctx.reduceTasks.add(rt);
-                        scheduler.enqueue(rt);
-                    }
-                    if (mqtt != null) {
-                        mqtt.publishJson("gridmr/job/" + jobId + "/shuffle/partitions", Map.of(
-                                "sizes", sizes, "ts", System.currentTimeMillis()
-                        ));
-                    }
-                    if (redis != null) {
-                        redis.savePartitionSizes(jobId, sizes);
-                    }
-                    if (ctx.reduceTasks.isEmpty()) {
-                        ctx.state = JobState.SUCCEEDED;
-                        Scheduler.persistResult(ctx);
-                        if (redis != null) {
-                            redis.setJobState(jobId, ctx.state.toString());
-                            redis.storeFinalResult(jobId, ctx.finalOutput);
-                        }
-                        if (mqtt != null) {
-                            mqtt.publishJson("gridmr/job/" + jobId + "/state", Map.of(
-                                    "state", ctx.state.toString(), "ts", System.currentTimeMillis()
-                            ));
-                        }
-                    }
+                // The output was taken even if spilling it failed: the task is done, the job fails
+                JobLifecycle.failIfSpillFailed(ctx, scheduler, mqtt, redis);
+                if (mapsDone == ctx.mapTasks.size()) {
+                    JobLifecycle.startReducePhase(ctx, scheduler, mqtt, redis);
                 }
                 HttpUtils.respondJson(ex, 200, Map.of("ack", true));
                 return;
@@ -172,35 +175,73 @@ public final class TasksApi {
 
             // REDUCE
             String out = j.get("output").getAsString(); // "k\tsum\n..."
-            ctx.completedReduces++;
-            ctx.finalOutput += out + (out.endsWith("\n") ? "" : "\n");
+            try {
+                ctx.addReduceOutput(taskId, out);
+            } catch (IOException e) {
+                System.err.println("[RESULT ERROR] job=" + jobId + " task=" + taskId + ": " + e.getMessage());
+                ctx.completedTaskIds.remove(taskId);
+                HttpUtils.respond(ex, 500, "result write failed", "text/plain");
+                return;
+            }
+            ctx.profile.completed(taskId, workerId, receivedAt, JobProfile.msSince(ingestStart), report);
+            int reducesDone = ctx.completedReduces.incrementAndGet();
 
             if (mqtt != null) {
-                mqtt.publishJson("gridmr/job/" + jobId + "/reduce/completed", Map.of(
-                        "taskId", taskId, "reducesCompleted", ctx.completedReduces, "ts", System.currentTimeMillis()
+                mqtt.snapshots().reducesCompleted(jobId, reducesDone, ctx.reduceTasks.size());
+                mqtt.publishEvent("gridmr/job/" + jobId + "/reduce/completed", () -> Map.of(
+                        "taskId", taskId, "reducesCompleted", reducesDone, "ts", System.currentTimeMillis()
                 ));
             }
             if (redis != null) {
-                redis.saveJobCounters(jobId, ctx.completedMaps, ctx.completedReduces);
+                redis.saveJobCounters(jobId, ctx.completedMaps.get(), ctx.completedReduces.get());
             }
 
-            if (ctx.completedReduces == ctx.reduceTasks.size()) {
-                ctx.state = JobState.SUCCEEDED;
-                Scheduler.persistResult(ctx);
-                if (redis != null) {
-                    redis.setJobState(jobId, ctx.state.toString());
-                    redis.storeFinalResult(jobId, ctx.finalOutput);
-                }
-                if (mqtt != null) {
-                    mqtt.publishJson("gridmr/job/" + jobId + "/state", Map.of(
-                            "state", ctx.state.toString(), "ts", System.currentTimeMillis()
-                    ));
-                }
-            }
+            JobLifecycle.reduceCompleted(ctx, reducesDone, scheduler, mqtt, redis);
             HttpUtils.respondJson(ex, 200, Map.of("ack", true));
         }
     }
 
+    /**
+     * STEP assignment fields; bitmaps travel base64-encoded ("" = all dead).
+     */
+    static void putStep(Map<String, Object> resp, JobCtx ctx, Task task) {
+        StencilJob.Halo h = task.halo;
+        resp.put("tile", task.tile);
+        resp.put("generation", task.generation);
+        resp.put("rows", h.rows);
+        resp.put("cols", h.cols);
+        resp.put("rule", ctx.stencil.rule);
+        resp.put("cells", b64(h.cells));
+        resp.put("north", b64(h.north));
+        resp.put("south", b64(h.south));
+        resp.put("west", b64(h.west));
+        resp.put("east", b64(h.east));
+        resp.put("corners", h.corners);
+        resp.put("last", h.last ? 1 : 0);
+    }
+
+    /**
+     * Body of a STEP completion: {"tile", "generation", "north", "south",
+     * "west", "east", "live", "cells", "lost"}.
+     */
+    static void completeStep(JsonObject j, JobCtx ctx, String workerId, Scheduler scheduler,
+                             MqttClientManager mqtt, RedisStore redis) throws IOException {
+        if (ctx.stencil == null) return;
+        StencilJob.Edges edges = new StencilJob.Edges(bytes(j, "north"), bytes(j, "south"),
+                bytes(j, "west"), bytes(j, "east"));
+        JobLifecycle.stepCompleted(ctx, workerId, j.get("tile").getAsInt(), j.get("generation").getAsInt(),
+                j.has("lost") && j.get("lost").getAsInt() != 0, edges,
+                j.has("live") ? j.get("live").getAsLong() : 0, bytes(j, "cells"), scheduler, mqtt, redis);
+    }
+
+    private static String b64(byte[] b) {
+        return b == null ? "" : Base64.getEncoder().encodeToString(b);
+    }
+
+    private static byte[] bytes(JsonObject j, String field) {
+        return j.has(field) ? Base64.getDecoder().decode(j.get(field).getAsString()) : null;
+    }
+
     /**
      * GET /api/tasks/next - Versión inteligente que usa SmartScheduler
      */
@@ -245,6 +286,7 @@ public final class TasksApi {
                 return;
             }
 
+            long buildStart = System.nanoTime();
             JobCtx ctx = jobs.get(task.jobId);
             Map<String, Object> resp = new LinkedHashMap<>();
             resp.put("type", task.type.toString());
@@ -252,14 +294,29 @@ public final class TasksApi {
             resp.put("job_id", task.jobId);
 
             if (task.type == TaskType.MAP) {
-                resp.put("input_chunk", task.inputChunk);
+                resp.put("input_chunk", ctx.mapInput(task));
                 resp.put("map_url", "/api/jobs/scripts/" + task.jobId + "/map.py");
+                resp.put("map_sha256", ctx.mapScriptSha);
                 resp.put("reducers", ctx.spec.reducers);
+                if (ctx.combineScript != null) {
+                    resp.put("combine_url", "/api/jobs/scripts/" + task.jobId + "/combine.py");
+                    resp.put("combine_sha256", ctx.combineScriptSha);
+                }
+            } else if (task.type == TaskType.STEP) {
+                putStep(resp, ctx, task);
             } else {
                 resp.put("partition_index", task.partitionIndex);
                 resp.put("reduce_url", "/api/jobs/scripts/" + task.jobId + "/reduce.py");
-                resp.put("kv_lines", String.join("\n", task.kvLinesForReduce));
+                resp.put("reduce_sha256", ctx.reduceScriptSha);
+            }
+            if (Boolean.TRUE.equals(ctx.spec.cprofile) && task.type != TaskType.STEP) resp.put("profile_script", 1);
+            if (task.type == TaskType.REDUCE) {
+                // kv_lines is written straight into the response, never built as one String
+                HttpUtils.respondJsonStreamed(ex, resp, "kv_lines", w -> ctx.shuffle.writePartition(task.partitionIndex, w));
+                ctx.profile.assigned(task, JobProfile.msSince(buildStart));
+                return;
             }
+            ctx.profile.assigned(task, JobProfile.msSince(buildStart));
             HttpUtils.respondJson(ex, 200, resp);
         }
     }
@@ -287,6 +344,8 @@ public final class TasksApi {
                 return;
             }
             String body = HttpUtils.readBody(ex);
+            long receivedAt = System.currentTimeMillis();
+            long ingestStart = System.nanoTime();
             JsonObject j = JsonParser.parseString(body).getAsJsonObject();
 
             String taskId = j.get("task_id").getAsString();
@@ -300,77 +359,55 @@ public final class TasksApi {
                 return;
             }
 
-            // Notificar al scheduler que la tarea se completó
-            if (workerId != null) {
-                smartScheduler.onTaskCompleted(taskId, workerId);
+            // El scheduler se entera de la tarea solo cuando su resultado quedó registrado
+            JobProfile.WorkerReport report = JobProfile.WorkerReport.fromJson(j.get("profile"));
+            if ("STEP".equals(type)) {
+                if (workerId != null) smartScheduler.onTaskCompleted(jobId, taskId, workerId);
+                completeStep(j, ctx, workerId, smartScheduler, mqtt, redis);
+                ctx.profile.completed(taskId, workerId, receivedAt, JobProfile.msSince(ingestStart), report);
+                HttpUtils.respondJson(ex, 200, Map.of("ack", true));
+                return;
+            }
+            if (!ctx.markCompleted(taskId)) {
+                if (workerId != null) smartScheduler.onTaskCompleted(jobId, taskId, workerId); // copia perdedora
+                ctx.profile.completed(taskId, workerId, receivedAt, JobProfile.msSince(ingestStart), report);
+                System.out.println("[DUPLICATE COMPLETE] job=" + jobId + " task=" + taskId + " ignored");
+                HttpUtils.respondJson(ex, 200, Map.of("ack", true, "duplicate", true));
+                return;
             }
 
             if ("MAP".equals(type)) {
                 String kv = j.get("kv_lines").getAsString(); // "k\tv\n..."
-                int added = 0;
-                for (String line : kv.split("\n")) {
-                    if (line.isBlank()) continue;
-                    String[] kvp = line.split("\t", 2);
-                    if (kvp.length < 2) continue;
-                    String k = kvp[0];
-                    String v = kvp[1];
-                    int p = core.Partitioner.partitionOf(k, ctx.spec.reducers);
-                    ctx.partitionKV.get(p).add(k + "\t" + v);
-                    added++;
+                int added;
+                try {
+                    added = ctx.shuffle.ingest(kv);
+                } catch (IOException e) {
+                    System.err.println("[SHUFFLE ERROR] job=" + jobId + " task=" + taskId + ": " + e.getMessage());
+                    ctx.completedTaskIds.remove(taskId);
+                    if (workerId != null) smartScheduler.onTaskFailed(jobId, taskId, workerId);
+                    HttpUtils.respond(ex, 500, "shuffle ingest failed", "text/plain");
+                    return;
                 }
-                ctx.completedMaps++;
+                if (workerId != null) smartScheduler.onTaskCompleted(jobId, taskId, workerId);
+                int copies = ctx.mapCache != null ? ctx.mapCache.storeText(ctx, taskId, kv, smartScheduler::enqueue) : 0;
+                ctx.profile.completed(taskId, workerId, receivedAt, JobProfile.msSince(ingestStart), report);
+                int mapsDone = ctx.completedMaps.addAndGet(1 + copies);
                 System.out.println("[MAP COMPLETE] job=" + jobId + " task=" + taskId + " kvAdded=" + added);
 
                 if (mqtt != null) {
-                    mqtt.publishJson("gridmr/job/" + jobId + "/map/completed", Map.of(
-                            "taskId", taskId, "added", added, "mapsCompleted", ctx.completedMaps, "ts", System.currentTimeMillis()
+                    mqtt.snapshots().mapsCompleted(jobId, mapsDone, ctx.mapTasks.size());
+                    mqtt.publishEvent("gridmr/job/" + jobId + "/map/completed", () -> Map.of(
+                            "taskId", taskId, "added", added, "mapsCompleted", mapsDone, "ts", System.currentTimeMillis()
                     ));
                 }
                 if (redis != null) {
-                    redis.saveJobCounters(jobId, ctx.completedMaps, ctx.completedReduces);
+                    redis.saveJobCounters(jobId, ctx.completedMaps.get(), ctx.completedReduces.get());
                 }
 
-                if (ctx.completedMaps == ctx.mapTasks.size()) {
-                    // build reduce tasks for ALL partitions (including empty ones)
-                    int rIx = 0;
-                    ctx.reduceTasks.clear();
-                    var sizes = new java.util.ArrayList<Integer>();
-
-                    for (int i = 0; i < ctx.spec.reducers; i++) {
-                        int sz = ctx.partitionKV.get(i).size();
-                        sizes.add(sz);
-                        // Create reduce tasks for ALL partitions, including empty ones
-
-                        Task rt = new Task();
-                        rt.type = TaskType.REDUCE;
-                        rt.taskId = "reduce-" + (rIx++);
-                        rt.jobId = jobId;
-                        rt.partitionIndex = i;
-                        rt.kvLinesForReduce = ctx.partitionKV.get(i);
-                        ctx.reduceTasks.add(rt);
-                        smartScheduler.enqueue(rt); // Usar smartScheduler
-                    }
-                    if (mqtt != null) {
-                        mqtt.publishJson("gridmr/job/" + jobId + "/shuffle/partitions", Map.of(
-                                "sizes", sizes, "ts", System.currentTimeMillis()
-                        ));
-                    }
-                    if (redis != null) {
-                        redis.savePartitionSizes(jobId, sizes);
-                    }
-                    if (ctx.reduceTasks.isEmpty()) {
-                        ctx.state = JobState.SUCCEEDED;
-                        Scheduler.persistResult(ctx);
-                        if (redis != null) {
-                            redis.setJobState(jobId, ctx.state.toString());
-                            redis.storeFinalResult(jobId, ctx.finalOutput);
-                        }
-                        if (mqtt != null) {
-                            mqtt.publishJson("gridmr/job/" + jobId + "/state", Map.of(
-                                    "state", ctx.state.toString(), "ts", System.currentTimeMillis()
-                            ));
-                        }
-                    }
+                // La salida quedó tomada aunque falle el spill: la tarea terminó, el job falla
+                JobLifecycle.failIfSpillFailed(ctx, smartScheduler, mqtt, redis);
+                if (mapsDone == ctx.mapTasks.size()) {
+                    JobLifecycle.startReducePhase(ctx, smartScheduler, mqtt, redis);
                 }
                 HttpUtils.respondJson(ex, 200, Map.of("ack", true));
                 return;
@@ -378,31 +415,30 @@ public final class TasksApi {
 
             // REDUCE
             String out = j.get("output").getAsString(); // "k\tsum\n..."
-            ctx.completedReduces++;
-            ctx.finalOutput += out + (out.endsWith("\n") ? "" : "\n");
+            try {
+                ctx.addReduceOutput(taskId, out);
+            } catch (IOException e) {
+                System.err.println("[RESULT ERROR] job=" + jobId + " task=" + taskId + ": " + e.getMessage());
+                ctx.completedTaskIds.remove(taskId);
+                if (workerId != null) smartScheduler.onTaskFailed(jobId, taskId, workerId);
+                HttpUtils.respond(ex, 500, "result write failed", "text/plain");
+                return;
+            }
+            if (workerId != null) smartScheduler.onTaskCompleted(jobId, taskId, workerId);
+            ctx.profile.completed(taskId, workerId, receivedAt, JobProfile.msSince(ingestStart), report);
+            int reducesDone = ctx.completedReduces.incrementAndGet();
 
             if (mqtt != null) {
-                mqtt.publishJson("gridmr/job/" + jobId + "/reduce/completed", Map.of(
-                        "taskId", taskId, "reducesCompleted", ctx.completedReduces, "ts", System.currentTimeMillis()
+                mqtt.snapshots().reducesCompleted(jobId, reducesDone, ctx.reduceTasks.size());
+                mqtt.publishEvent("gridmr/job/" + jobId + "/reduce/completed", () -> Map.of(
+                        "taskId", taskId, "reducesCompleted", reducesDone, "ts", System.currentTimeMillis()
                 ));
             }
             if (redis != null) {
-                redis.saveJobCounters(jobId, ctx.completedMaps, ctx.completedReduces);
+                redis.saveJobCounters(jobId, ctx.completedMaps.get(), ctx.completedReduces.get());
             }
 
-            if (ctx.completedReduces == ctx.reduceTasks.size()) {
-                ctx.state = JobState.SUCCEEDED;
-                Scheduler.persistResult(ctx);
-                if (redis != null) {
-                    redis.setJobState(jobId, ctx.state.toString());
-                    redis.storeFinalResult(jobId, ctx.finalOutput);
-                }
-                if (mqtt != null) {
-                    mqtt.publishJson("gridmr/job/" + jobId + "/state", Map.of(
-                            "state", ctx.state.toString(), "ts", System.currentTimeMillis()
-                    ));
-                }
-            }
+            JobLifecycle.reduceCompleted(ctx, reducesDone, smartScheduler, mqtt, redis);
             HttpUtils.respondJson(ex, 200, Map.of("ack", true));
         }
     }
@@ -1,5 +1,6 @@
 package api;
 
+import com.google.gson.JsonArray;
 import com.google.gson.JsonObject;
 import com.google.gson.JsonParser;
 import com.sun.net.httpserver.HttpExchange;
@@ -46,12 +47,7 @@ public final class WorkersApi {
             w.capacity = j.has("capacity") ? j.get("capacity").getAsInt() : 1;
 
             // Inicializar métricas del sistema si están disponibles
-            if (j.has("cpu_usage")) {
-                w.cpuUsage = j.get("cpu_usage").getAsDouble();
-            }
-            if (j.has("memory_usage")) {
-                w.memoryUsage = j.get("memory_usage").getAsDouble();
-            }
+            applyMetrics(w, j);
 
             w.lastHeartbeat = System.currentTimeMillis();
 
@@ -72,10 +68,12 @@ public final class WorkersApi {
     public static class HeartbeatHandler implements HttpHandler {
         private final Map<String, Worker> workers;
         private final MqttClientManager mqtt;
+        private final RedisStore redis;
 
-        public HeartbeatHandler(Map<String, Worker> workers, MqttClientManager mqtt) {
+        public HeartbeatHandler(Map<String, Worker> workers, MqttClientManager mqtt, RedisStore redis) {
             this.workers = workers;
             this.mqtt = mqtt;
+            this.redis = redis;
         }
 
         @Override
@@ -100,21 +98,25 @@ public final class WorkersApi {
             worker.lastHeartbeat = System.currentTimeMillis();
 
             // Actualizar métricas de sistema si están disponibles
-            if (j.has("cpu_usage")) {
-                worker.cpuUsage = Math.max(0.0, Math.min(1.0, j.get("cpu_usage").getAsDouble()));
-            }
-            if (j.has("memory_usage")) {
-                worker.memoryUsage = Math.max(0.0, Math.min(1.0, j.get("memory_usage").getAsDouble()));
+            applyMetrics(worker, j);
+            // Slots reales del worker (puede cambiar si se reinicia con otra configuración)
+            if (j.has("capacity")) {
+                worker.capacity = Math.max(1, j.get("capacity").getAsInt());
             }
+            worker.changed(); // re-rank in the scheduler's worker index
+            if (redis != null) redis.touchWorker(workerId, worker.lastHeartbeat);
 
-            // Publicar métricas via MQTT
+            // Métricas via MQTT: el snapshot del scheduler ya las lleva, evento solo con MQTT_EVENTS
             if (mqtt != null) {
-                mqtt.publishJson("gridmr/worker/heartbeat", Map.of(
+                mqtt.publishEvent("gridmr/worker/heartbeat", () -> Map.of(
                         "workerId", workerId,
                         "cpuUsage", worker.cpuUsage,
                         "memoryUsage", worker.memoryUsage,
-                        "activeTasks", worker.activeTasks,
+                        "activeTasks", worker.activeTasks.get(),
                         "capacity", worker.capacity,
+                        "usableSlots", worker.usableSlots(),
+                        "loadAverage", worker.loadAverage,
+                        "queueDepth", worker.queueDepth,
                         "loadScore", worker.getLoadScore(),
                         "ts", System.currentTimeMillis()
                 ));
@@ -123,4 +125,33 @@ public final class WorkersApi {
             HttpUtils.respondJson(ex, 200, Map.of("status", "ok"));
         }
     }
+
+    /**
+     * Copia al worker los recursos que reporta en el registro o el heartbeat
+     * (los campos que falten se dejan como estaban).
+     */
+    public static void applyMetrics(Worker w, JsonObject j) {
+        if (j.has("cpu_usage")) w.cpuUsage = clamp01(j.get("cpu_usage").getAsDouble());
+        if (j.has("memory_usage")) w.memoryUsage = clamp01(j.get("memory_usage").getAsDouble());
+        if (j.has("cores")) w.cores = Math.max(0.0, j.get("cores").getAsDouble());
+        if (j.has("load_avg")) w.loadAverage = Math.max(0.0, j.get("load_avg").getAsDouble());
+        if (j.has("memory_available_mb")) w.memoryAvailableMb = j.get("memory_available_mb").getAsLong();
+        if (j.has("disk_free_mb")) w.diskFreeMb = j.get("disk_free_mb").getAsLong();
+        if (j.has("queue_depth")) w.queueDepth = Math.max(0, j.get("queue_depth").getAsInt());
+        if (j.has("slot_utilization") && j.get("slot_utilization").isJsonArray()) {
+            JsonArray a = j.getAsJsonArray("slot_utilization");
+            double[] u = new double[a.size()];
+            for (int i = 0; i < u.length; i++) u[i] = clamp01(a.get(i).getAsDouble());
+            w.slotUtilization = u;
+        }
+        if (j.has("active_tasks")) {
+            // Lo que el worker tiene entre manos por encima de lo que el master le asignó
+            int held = j.get("active_tasks").getAsInt() + w.queueDepth;
+            w.untrackedTasks = Math.max(0, held - w.activeTasks.get());
+        }
+    }
+
+    private static double clamp01(double v) {
+        return Math.max(0.0, Math.min(1.0, v));
+    }
 }
@@ -0,0 +1,90 @@
+package bench;
+
+import com.google.gson.Gson;
+import com.google.gson.JsonParser;
+import shuffle.RecordCodec;
+import shuffle.ShuffleStore;
+
+import java.io.ByteArrayOutputStream;
+import java.io.IOException;
+import java.io.StringWriter;
+import java.lang.management.ManagementFactory;
+import java.lang.management.ThreadMXBean;
+import java.nio.charset.StandardCharsets;
+import java.nio.file.Files;
+import java.nio.file.Path;
+import java.util.Map;
+import java.util.Random;
+
+/**
+ * Bytes on the wire and master CPU per million intermediate records, text vs binary.
+ * <p>
+ * Usage: {@code ./gradlew benchIntermediate [-Precords=1000000] [-Preducers=4]}
+ */
+public final class IntermediateFormatBench {
+    private static final ThreadMXBean CPU = ManagementFactory.getThreadMXBean();
+    private static final int ROUNDS = 5;
+
+    private IntermediateFormatBench() {
+    }
+
+    public static void main(String[] args) throws Exception {
+        int n = args.length > 0 ? Integer.parseInt(args[0]) : 1_000_000;
+        int reducers = args.length > 1 ? Integer.parseInt(args[1]) : 4;
+        Path tmp = Files.createTempDirectory("gridmr-bench");
+
+        // Wordcount-shaped map output over a 10k-word vocabulary.
+        Random rnd = new Random(42);
+        StringBuilder text = new StringBuilder();
+        ByteArrayOutputStream raw = new ByteArrayOutputStream();
+        for (int i = 0; i < n; i++) {
+            String k = "word" + rnd.nextInt(10_000);
+            text.append(k).append("\t1\n");
+            RecordCodec.writeRecord(raw, k, "1");
+        }
+        String kvLines = text.toString();
+        String httpBody = new Gson().toJson(Map.of("task_id", "map-0", "job_id", "bench", "type", "MAP", "kv_lines", kvLines));
+        byte[] records = raw.toByteArray();
+        byte[] deflated = RecordCodec.deflate(records);
+
+        System.out.printf("records=%d reducers=%d%n%n", n, reducers);
+        System.out.printf("%-22s %14s %16s %16s%n", "path", "wire bytes", "ingest ms/1M", "reduce-out ms/1M");
+
+        report("http json text", httpBody.getBytes(StandardCharsets.UTF_8).length, n,
+                s -> s.ingest(JsonParser.parseString(httpBody).getAsJsonObject().get("kv_lines").getAsString()),
+                reducers, tmp, false);
+        report("grpc text", kvLines.getBytes(StandardCharsets.UTF_8).length, n,
+                s -> s.ingest(kvLines), reducers, tmp, false);
+        report("grpc records", records.length, n,
+                s -> s.ingestRecords(records), reducers, tmp, true);
+        report("grpc records+deflate", deflated.length, n,
+                s -> s.ingestRecords(RecordCodec.inflate(deflated, records.length)), reducers, tmp, true);
+    }
+
+    private interface Ingest {
+        void run(ShuffleStore store) throws IOException;
+    }
+
+    private static void report(String name, long wireBytes, int n, Ingest ingest,
+                               int reducers, Path tmp, boolean binaryOut) throws IOException {
+        double bestIngest = Double.MAX_VALUE;
+        double bestOut = Double.MAX_VALUE;
+        for (int round = 0; round < ROUNDS + 1; round++) {
+            try (ShuffleStore store = new ShuffleStore("bench-" + round, reducers, Long.MAX_VALUE, tmp)) {
+                long t0 = CPU.getCurrentThreadCpuTime();
+                ingest.run(store);
+                long t1 = CPU.getCurrentThreadCpuTime();
+                for (int p = 0; p < reducers; p++) {
+                    if (binaryOut) store.writePartitionRecords(p, new ByteArrayOutputStream());
+                    else store.writePartition(p, new StringWriter());
+                }
+                long t2 = CPU.getCurrentThreadCpuTime();
+                if (round == 0) continue; // warm-up
+                bestIngest = Math.min(bestIngest, (t1 - t0) / 1e6);
+                bestOut = Math.min(bestOut, (t2 - t1) / 1e6);
+            }
+        }
+        double scale = 1_000_000.0 / n;
+        System.out.printf("%-22s %14d %16.1f %16.1f%n", name, wireBytes, bestIngest * scale, bestOut * scale);
+    }
+}
@@ -0,0 +1,220 @@
+package bench;
+
+import api.WorkersApi;
+import com.google.gson.JsonArray;
+import com.google.gson.JsonObject;
+import core.SmartScheduler;
+import model.Task;
+import model.TaskType;
+import model.Worker;
+
+import java.util.ArrayList;
+import java.util.Arrays;
+import java.util.Collections;
+import java.util.Iterator;
+import java.util.List;
+import java.util.Map;
+import java.util.Random;
+import java.util.concurrent.ConcurrentHashMap;
+import java.util.concurrent.LinkedBlockingQueue;
+
+/**
+ * Placement check for the resource-aware SmartScheduler. Four simulated
+ * workers with 4 cores and 4 slots each drain a job of MAP tasks; one of
+ * them is artificially loaded, either by other processes using most of its
+ * CPU or by memory pressure. Heartbeats carry the fields the C++ worker
+ * reports and go through {@link WorkersApi#applyMetrics}. A task runs slower
+ * by the CPU oversubscription of its node when it starts.
+ * <p>
+ * Every scenario also runs with the random cpu/memory values workers used
+ * to report, for comparison. Exits 1 when the loaded worker still gets more
+ * than its free share of the work with real metrics.
+ * <p>
+ * Usage: {@code ./gradlew checkPlacement [-Ptasks=400]}
+ */
+public final class PlacementCheck {
+    private static final int WORKERS = 4;
+    private static final int CORES = 4;
+    private static final int HEARTBEAT_TICKS = 10;
+    private static final double TASK_TICKS = 10; // task length on an idle core
+
+    private record Scenario(String name, double foreignCores, double memoryUsage, double maxShare) {
+    }
+
+    private record Result(long makespan, double p50, double p95, double loadedShare) {
+    }
+
+    private static final class Running {
+        final Task task;
+        final int slot;
+        final long start;
+        final double end;
+
+        Running(Task task, int slot, long start, double end) {
+            this.task = task;
+            this.slot = slot;
+            this.start = start;
+            this.end = end;
+        }
+    }
+
+    private static final class Node {
+        final Worker worker = new Worker();
+        final double foreignCores;
+        final double memoryUsage;
+        final List<Running> running = new ArrayList<>();
+        final boolean[] slotBusy = new boolean[CORES];
+        final int[] busyTicks = new int[CORES]; // since the last heartbeat
+        int assigned;
+
+        Node(int i, double foreignCores, double memoryUsage) {
+            this.foreignCores = foreignCores;
+            this.memoryUsage = memoryUsage;
+            worker.workerId = "w-" + i;
+            worker.name = worker.workerId;
+            worker.capacity = CORES;
+        }
+
+        int freeSlot() {
+            for (int s = 0; s < CORES; s++) if (!slotBusy[s]) return s;
+            return -1;
+        }
+    }
+
+    private PlacementCheck() {
+    }
+
+    public static void main(String[] args) {
+        int tasks = args.length > 0 ? Integer.parseInt(args[0]) : 400;
+        List<Scenario> scenarios = List.of(
+                // 3.5 of 4 cores used by other processes: at most one slot is left
+                new Scenario("cpu-loaded", 3.5, 0.3, 0.15),
+                // past WORKER_MEMORY_PRESSURE: no new work at all
+                new Scenario("memory-pressure", 0.0, 0.94, 0.0));
+
+        System.out.printf("tasks=%d workers=%d cores/worker=%d (1 tick = 1/%d heartbeat)%n%n",
+                tasks, WORKERS, CORES, HEARTBEAT_TICKS);
+        System.out.printf("%-16s %-8s %10s %8s %8s %14s%n", "scenario", "metrics", "makespan", "p50", "p95", "loaded share");
+        boolean ok = true;
+        for (Scenario sc : scenarios) {
+            Result real = run(sc, tasks, true);
+            Result blind = run(sc, tasks, false);
+            print(sc.name(), "real", real);
+            print(sc.name(), "random", blind);
+            if (real.loadedShare() > sc.maxShare()) {
+                System.out.printf("FAIL %s: loaded worker ran %.1f%% of the tasks (max %.1f%%)%n",
+                        sc.name(), real.loadedShare() * 100, sc.maxShare() * 100);
+                ok = false;
+            }
+            if (sc.foreignCores() > 0 && real.p95() > blind.p95()) {
+                System.out.printf("FAIL %s: p95 task time %.1f ticks, %.1f with random metrics%n",
+                        sc.name(), real.p95(), blind.p95());
+                ok = false;
+            }
+        }
+        System.out.println(ok ? "\nOK" : "\nFAILED");
+        System.exit(ok ? 0 : 1); // the scheduler's fault tolerance threads are not daemons
+    }
+
+    private static Result run(Scenario sc, int tasks, boolean realMetrics) {
+        Random rnd = new Random(42);
+        Map<String, Worker> workers = new ConcurrentHashMap<>();
+        List<Node> nodes = new ArrayList<>();
+        for (int i = 0; i < WORKERS; i++) {
+            Node n = i == 0 ? new Node(i, sc.foreignCores(), sc.memoryUsage()) : new Node(i, 0.0, 0.3);
+            nodes.add(n);
+            workers.put(n.worker.workerId, n.worker);
+        }
+        SmartScheduler scheduler = new SmartScheduler(new LinkedBlockingQueue<>(), workers, null);
+        String jobId = "placement-" + sc.name() + (realMetrics ? "-real" : "-random");
+        for (int i = 0; i < tasks; i++) {
+            Task t = new Task();
+            t.type = TaskType.MAP;
+            t.jobId = jobId;
+            t.taskId = "map-" + i;
+            scheduler.enqueue(t);
+        }
+
+        List<Double> times = new ArrayList<>();
+        long tick = 0;
+        while (times.size() < tasks) {
+            for (Node n : nodes) {
+                for (Iterator<Running> it = n.running.iterator(); it.hasNext(); ) {
+                    Running r = it.next();
+                    if (r.end > tick) continue;
+                    it.remove();
+                    n.slotBusy[r.slot] = false;
+                    scheduler.onTaskCompleted(jobId, r.task.taskId, n.worker.workerId);
+                    times.add(r.end - r.start);
+                }
+            }
+            if (tick % HEARTBEAT_TICKS == 0) {
+                for (Node n : nodes) heartbeat(n, realMetrics, rnd);
+            }
+            // Workers poll in a rotating order, each until it gets nothing
+            for (int k = 0; k < WORKERS; k++) {
+                Node n = nodes.get((int) ((tick + k) % WORKERS));
+                int slot;
+                while ((slot = n.freeSlot()) >= 0) {
+                    Task t = scheduler.getNextTaskForWorker(n.worker.workerId);
+                    if (t == null) break;
+                    double slowdown = Math.max(1.0, (n.foreignCores + n.running.size() + 1) / CORES);
+                    double length = TASK_TICKS * (0.8 + 0.4 * rnd.nextDouble()) * slowdown;
+                    n.running.add(new Running(t, slot, tick, tick + length));
+                    n.slotBusy[slot] = true;
+                    n.assigned++;
+                }
+            }
+            for (Node n : nodes) {
+                for (int s = 0; s < CORES; s++) if (n.slotBusy[s]) n.busyTicks[s]++;
+            }
+            if (++tick > 1_000_000) throw new IllegalStateException(jobId + " did not finish");
+        }
+        scheduler.onJobFinished(jobId);
+
+        Collections.sort(times);
+        return new Result(tick, times.get(times.size() / 2), times.get((int) (times.size() * 0.95)),
+                (double) nodes.get(0).assigned / tasks);
+    }
+
+    /**
+     * The heartbeat the worker would send: node CPU is other processes plus
+     * the time slots spent on tasks, load is runnable processes per core.
+     * Without real metrics, the random values of the old worker.
+     */
+    private static void heartbeat(Node n, boolean realMetrics, Random rnd) {
+        JsonObject j = new JsonObject();
+        j.addProperty("worker_id", n.worker.workerId);
+        j.addProperty("capacity", CORES);
+        j.addProperty("active_tasks", n.running.size());
+        if (realMetrics) {
+            JsonArray util = new JsonArray();
+            double own = 0;
+            for (int s = 0; s < CORES; s++) {
+                double u = (double) n.busyTicks[s] / HEARTBEAT_TICKS;
+                util.add(u);
+                own += u;
+            }
+            j.addProperty("cpu_usage", Math.min(1.0, (n.foreignCores + own) / CORES));
+            j.addProperty("memory_usage", n.memoryUsage);
+            j.addProperty("load_avg", (n.foreignCores + n.running.size()) / CORES);
+            j.addProperty("cores", CORES);
+            j.addProperty("memory_available_mb", (long) ((1 - n.memoryUsage) * 16_384));
+            j.addProperty("disk_free_mb", 50_000);
+            j.addProperty("queue_depth", 0);
+            j.add("slot_utilization", util);
+        } else {
+            j.addProperty("cpu_usage", 0.1 + rnd.nextInt(30) / 100.0);
+            j.addProperty("memory_usage", 0.2 + rnd.nextInt(40) / 100.0);
+        }
+        Arrays.fill(n.busyTicks, 0);
+        WorkersApi.applyMetrics(n.worker, j);
+        n.worker.lastHeartbeat = System.currentTimeMillis();
+        n.worker.changed();
+    }
+
+    private static void print(String scenario, String metrics, Result r) {
+        System.out.printf("%-16s %-8s %10d %8.1f %8.1f %13.1f%%%n",
+                scenario, metrics, r.makespan(), r.p50(), r.p95(), r.loadedShare() * 100);
+    }
+}
@@ -0,0 +1,58 @@
+package bench;
+
+import store.RedisStore;
+
+import java.util.Arrays;
+
+/**
+ * Latency that Redis persistence adds to the task completion path, with
+ * synchronous writes vs the write-behind store. Each simulated completion
+ * updates the job counters; every 10th also records a worker heartbeat.
+ * Needs a local Redis (REDIS_URL, default redis://localhost:6379).
+ * <p>
+ * Usage: {@code ./gradlew benchRedis [-Pcompletions=20000]}
+ */
+public final class RedisCompletionBench {
+    private RedisCompletionBench() {
+    }
+
+    public static void main(String[] args) {
+        int n = args.length > 0 ? Integer.parseInt(args[0]) : 20_000;
+        String url = System.getenv().getOrDefault("REDIS_URL", "redis://localhost:6379");
+        System.out.printf("completions=%d redis=%s%n%n", n, url);
+        System.out.printf("%-14s %10s %10s %10s %12s %12s %10s%n",
+                "mode", "p50 us", "p99 us", "max us", "total ms", "drain ms", "commands");
+        run("sync", url, false, n);
+        run("write-behind", url, true, n);
+    }
+
+    private static void run(String mode, String url, boolean writeBehind, int n) {
+        RedisStore redis = RedisStore.connect(url, writeBehind, 20);
+        if (!redis.healthy()) {
+            System.err.println("Redis not reachable at " + url);
+            System.exit(1);
+        }
+        String jobId = "bench-" + mode + "-" + System.currentTimeMillis();
+        // warm-up: connections, JIT
+        for (int i = 0; i < 1000; i++) redis.saveJobCounters(jobId + "-warmup", i, 0);
+
+        long[] lat = new long[n];
+        long start = System.nanoTime();
+        for (int i = 0; i < n; i++) {
+            long t0 = System.nanoTime();
+            redis.saveJobCounters(jobId, i + 1, 0);
+            if (i % 10 == 0) redis.touchWorker("bench-worker-" + (i % 8), System.currentTimeMillis());
+            lat[i] = System.nanoTime() - t0;
+        }
+        long total = System.nanoTime() - start;
+        long d0 = System.nanoTime();
+        redis.close(); // write-behind: flushes what is still queued
+        long drain = System.nanoTime() - d0;
+        long commands = redis.writerStats().get("commands");
+
+        Arrays.sort(lat);
+        System.out.printf("%-14s %10.1f %10.1f %10.1f %12.1f %12.1f %10s%n", mode,
+                lat[n / 2] / 1e3, lat[(int) (n * 0.99)] / 1e3, lat[n - 1] / 1e3,
+                total / 1e6, drain / 1e6, writeBehind ? String.valueOf(commands) : "-");
+    }
+}
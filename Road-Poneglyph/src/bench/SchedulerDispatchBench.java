@@ -0,0 +1,131 @@
+package bench;
+
+import core.SmartScheduler;
+import model.Task;
+import model.TaskType;
+import model.Worker;
+
+import java.util.ArrayList;
+import java.util.Comparator;
+import java.util.List;
+import java.util.Map;
+import java.util.Random;
+import java.util.concurrent.ConcurrentHashMap;
+import java.util.concurrent.LinkedBlockingQueue;
+
+/**
+ * Average cost of one SmartScheduler dispatch (poll + completion) at 10, 100
+ * and 1000 registered workers, next to the sort-every-worker selection the
+ * worker index replaced. JMH-style: warm-up iterations are discarded and the
+ * measured ones are reported as mean ± stddev.
+ * <p>
+ * Usage: {@code ./gradlew benchScheduler [-Pops=20000]}
+ */
+public final class SchedulerDispatchBench {
+    private static final int[] WORKER_COUNTS = {10, 100, 1000};
+    private static final int WARMUP_ITERATIONS = 3;
+    private static final int MEASURE_ITERATIONS = 5;
+
+    private SchedulerDispatchBench() {
+    }
+
+    public static void main(String[] args) {
+        int ops = args.length > 0 ? Integer.parseInt(args[0]) : 20_000;
+        System.out.printf("ops/iteration=%d warmup=%d measure=%d%n%n", ops, WARMUP_ITERATIONS, MEASURE_ITERATIONS);
+        System.out.printf("%-22s %8s %14s %12s %10s%n", "benchmark", "workers", "ns/op", "± stddev", "assigned");
+        for (int n : WORKER_COUNTS) {
+            Map<String, Worker> workers = workers(n);
+            SmartScheduler scheduler = new SmartScheduler(new LinkedBlockingQueue<>(), workers, null);
+            dispatch(n, ops, workers, scheduler);
+            legacySelect(n, ops, workers);
+        }
+        System.exit(0); // the scheduler's fault tolerance threads are not daemons
+    }
+
+    private static Map<String, Worker> workers(int n) {
+        Random rnd = new Random(n);
+        Map<String, Worker> workers = new ConcurrentHashMap<>();
+        for (int i = 0; i < n; i++) {
+            Worker w = new Worker();
+            w.workerId = "w-" + i;
+            w.name = w.workerId;
+            w.capacity = 4 + rnd.nextInt(5);
+            w.cpuUsage = rnd.nextDouble() * 0.5;
+            w.memoryUsage = rnd.nextDouble() * 0.5;
+            workers.put(w.workerId, w);
+        }
+        return workers;
+    }
+
+    /**
+     * Workers poll round-robin; every assigned task completes right away so
+     * loads keep moving and the index keeps re-ranking.
+     */
+    private static void dispatch(int n, int ops, Map<String, Worker> workers, SmartScheduler scheduler) {
+        List<String> ids = new ArrayList<>(workers.keySet());
+        double[] samples = new double[MEASURE_ITERATIONS];
+        long assigned = 0;
+        for (int iter = 0; iter < WARMUP_ITERATIONS + MEASURE_ITERATIONS; iter++) {
+            String jobId = "bench-" + iter;
+            for (Worker w : workers.values()) w.lastHeartbeat = System.currentTimeMillis();
+            for (int i = 0; i < ops; i++) {
+                Task t = new Task();
+                t.type = TaskType.MAP;
+                t.jobId = jobId;
+                t.taskId = "map-" + i;
+                scheduler.enqueue(t);
+            }
+            long hits = 0;
+            long t0 = System.nanoTime();
+            for (int i = 0; i < ops; i++) {
+                String workerId = ids.get(i % n);
+                Task task = scheduler.getNextTaskForWorker(workerId);
+                if (task != null) {
+                    scheduler.onTaskCompleted(task.jobId, task.taskId, workerId);
+                    hits++;
+                }
+            }
+            long elapsed = System.nanoTime() - t0;
+            scheduler.onJobFinished(jobId);
+            if (iter >= WARMUP_ITERATIONS) {
+                samples[iter - WARMUP_ITERATIONS] = (double) elapsed / ops;
+                assigned += hits;
+            }
+        }
+        report("dispatch (index)", n, samples, (double) assigned / (ops * (long) MEASURE_ITERATIONS));
+    }
+
+    /**
+     * The previous selectBestWorker: filter, sort by score, keep the top 3.
+     */
+    private static void legacySelect(int n, int ops, Map<String, Worker> workers) {
+        double[] samples = new double[MEASURE_ITERATIONS];
+        long sink = 0;
+        for (int iter = 0; iter < WARMUP_ITERATIONS + MEASURE_ITERATIONS; iter++) {
+            long t0 = System.nanoTime();
+            for (int i = 0; i < ops; i++) {
+                List<Worker> top = workers.values().stream()
+                        .filter(Worker::canAcceptTask)
+                        .sorted(Comparator.comparingDouble(Worker::getLoadScore))
+                        .limit(3)
+                        .toList();
+                sink += top.size();
+            }
+            long elapsed = System.nanoTime() - t0;
+            if (iter >= WARMUP_ITERATIONS) samples[iter - WARMUP_ITERATIONS] = (double) elapsed / ops;
+        }
+        if (sink == 42) System.out.print(""); // keep the loop alive
+        report("select (legacy sort)", n, samples, Double.NaN);
+    }
+
+    private static void report(String name, int workers, double[] samples, double assignedRatio) {
+        double mean = 0;
+        for (double s : samples) mean += s;
+        mean /= samples.length;
+        double var = 0;
+        for (double s : samples) var += (s - mean) * (s - mean);
+        double stddev = Math.sqrt(var / Math.max(1, samples.length - 1));
+        String assigned = Double.isNaN(assignedRatio) ? "-" : String.format("%.0f%%", assignedRatio * 100);
+        System.out.printf("%-22s %8d %14.1f %12.1f %10s%n", name, workers, mean, stddev, assigned);
+    }
+}
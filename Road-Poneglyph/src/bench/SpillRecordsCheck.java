@@ -0,0 +1,95 @@
+package bench;
+
+import shuffle.RecordCodec;
+import shuffle.ShuffleStore;
+
+import java.io.ByteArrayOutputStream;
+import java.io.IOException;
+import java.nio.file.Files;
+import java.nio.file.Path;
+import java.util.ArrayList;
+import java.util.List;
+import java.util.Random;
+
+/**
+ * Spill check for binary-record jobs. Keys and values with tabs, newlines
+ * and a bare "\r" go through a ShuffleStore whose memory budget is small
+ * enough to spill many runs, and through one that never spills; every
+ * partition must come back with the same records, in the same order.
+ * Exits 1 on any difference or when nothing was spilled.
+ * <p>
+ * Usage: {@code ./gradlew checkSpill [-Precords=20000]}
+ */
+public final class SpillRecordsCheck {
+    private static final int REDUCERS = 4;
+    private static final int BATCH = 100; // records per map output
+    private static final long SPILL_BUDGET_BYTES = 64 * 1024;
+
+    private SpillRecordsCheck() {
+    }
+
+    public static void main(String[] args) throws IOException {
+        int n = args.length > 0 ? Integer.parseInt(args[0]) : 20_000;
+        Path tmp = Files.createTempDirectory("spill-check");
+        List<byte[]> outputs = mapOutputs(n, new Random(42));
+
+        boolean ok;
+        try (ShuffleStore spilled = new ShuffleStore("spilled", REDUCERS, SPILL_BUDGET_BYTES, tmp);
+             ShuffleStore memory = new ShuffleStore("memory", REDUCERS, Long.MAX_VALUE, tmp)) {
+            for (byte[] block : outputs) {
+                spilled.ingestRecords(block);
+                memory.ingestRecords(block);
+            }
+            System.out.printf("records=%d reducers=%d spills=%d%n", n, REDUCERS, spilled.spillCount());
+            ok = spilled.spillCount() > 0;
+            if (!ok) System.out.println("FAIL: nothing was spilled, lower the budget");
+            for (int p = 0; p < REDUCERS; p++) {
+                List<String> got = records(spilled, p);
+                List<String> want = records(memory, p);
+                boolean same = got.equals(want);
+                System.out.printf("partition %d: %d records %s%n", p, got.size(), same ? "ok" : "DIFFERENT");
+                if (!same) {
+                    ok = false;
+                    for (int i = 0; i < Math.min(got.size(), want.size()); i++) {
+                        if (!got.get(i).equals(want.get(i))) {
+                            System.out.printf("  first difference at %d: %s vs %s%n", i, got.get(i), want.get(i));
+                            break;
+                        }
+                    }
+                }
+            }
+        }
+        Files.deleteIfExists(tmp);
+        System.out.println(ok ? "OK" : "FAIL");
+        System.exit(ok ? 0 : 1);
+    }
+
+    /** Map outputs as raw record blocks, with separators inside keys and values. */
+    private static List<byte[]> mapOutputs(int n, Random rnd) throws IOException {
+        String[] parts = {"a", "b\tc", "line\nbreak", "\r", "tab\t", "\n", "ü"};
+        List<byte[]> out = new ArrayList<>();
+        ByteArrayOutputStream block = new ByteArrayOutputStream();
+        for (int i = 0; i < n; i++) {
+            String key = parts[rnd.nextInt(parts.length)] + (i % 500) + parts[rnd.nextInt(parts.length)];
+            String value = i + parts[rnd.nextInt(parts.length)] + "\t" + i;
+            RecordCodec.writeRecord(block, key, value);
+            if ((i + 1) % BATCH == 0 || i == n - 1) {
+                out.add(block.toByteArray());
+                block.reset();
+            }
+        }
+        return out;
+    }
+
+    private static List<String> records(ShuffleStore store, int partition) throws IOException {
+        ByteArrayOutputStream raw = new ByteArrayOutputStream();
+        store.writePartitionRecords(partition, raw);
+        List<String> out = new ArrayList<>();
+        RecordCodec.decode(raw.toByteArray(), (k, v) -> out.add(escape(k) + " => " + escape(v)));
+        return out;
+    }
+
+    private static String escape(String s) {
+        return s.replace("\\", "\\\\").replace("\t", "\\t").replace("\n", "\\n").replace("\r", "\\r");
+    }
+}
@@ -0,0 +1,132 @@
+package bench;
+
+import core.SmartScheduler;
+import model.Task;
+import model.TaskType;
+import model.Worker;
+import telemetry.MqttClientManager;
+
+import java.util.ArrayList;
+import java.util.List;
+import java.util.Map;
+import java.util.concurrent.ConcurrentHashMap;
+import java.util.concurrent.LinkedBlockingQueue;
+import java.util.concurrent.locks.LockSupport;
+
+/**
+ * SmartScheduler dispatch throughput (enqueue, poll and completion of every
+ * task of a job) with MQTT telemetry off and on. The broker is simulated by
+ * a sink that takes {@code latencyUs} per message. Modes:
+ * <ul>
+ *   <li>off: no MQTT client;</li>
+ *   <li>sync events: one blocking publish per queued/assigned/completed task,
+ *   what the scheduler did before the telemetry pipeline;</li>
+ *   <li>snapshots: the default pipeline, per-job/per-worker snapshots only;</li>
+ *   <li>snapshots+events: MQTT_EVENTS=1, per-task topics at the default rate.</li>
+ * </ul>
+ * Usage: {@code ./gradlew benchTelemetry [-Ptasks=10000] [-PlatencyUs=100]}
+ */
+public final class TelemetryDispatchBench {
+    private static final int WORKERS = 16;
+    private static final int WARMUP_ITERATIONS = 1;
+    private static final int MEASURE_ITERATIONS = 3;
+
+    private TelemetryDispatchBench() {
+    }
+
+    public static void main(String[] args) {
+        int tasks = args.length > 0 ? Integer.parseInt(args[0]) : 10_000;
+        long latencyUs = args.length > 1 ? Long.parseLong(args[1]) : 100;
+        System.out.printf("tasks=%d workers=%d broker latency=%dus/message warmup=%d measure=%d%n%n",
+                tasks, WORKERS, latencyUs, WARMUP_ITERATIONS, MEASURE_ITERATIONS);
+        System.out.printf("%-18s %12s %12s %10s %10s %12s%n",
+                "telemetry", "tasks/s", "± stddev", "published", "dropped", "rate-limited");
+
+        MqttClientManager.Sink broker = (topic, payload) -> {
+            LockSupport.parkNanos(latencyUs * 1_000);
+            return true;
+        };
+        MqttClientManager.Settings defaults = MqttClientManager.Settings.fromEnv();
+        MqttClientManager.Settings snapshots = new MqttClientManager.Settings(
+                defaults.buffer(), defaults.batch(), defaults.snapshotMs(), false, defaults.eventRate());
+        MqttClientManager.Settings events = new MqttClientManager.Settings(
+                defaults.buffer(), defaults.batch(), defaults.snapshotMs(), true, defaults.eventRate());
+
+        run("off", tasks, null, null);
+        run("sync events", tasks, null, broker);
+        run("snapshots", tasks, new MqttClientManager(broker, snapshots), null);
+        run("snapshots+events", tasks, new MqttClientManager(broker, events), null);
+        System.exit(0); // the scheduler's fault tolerance threads are not daemons
+    }
+
+    /**
+     * One mode; with {@code syncBroker} every task event is published inline
+     * on the dispatch path, like MqttClientManager.publishJson used to.
+     */
+    private static void run(String name, int tasks, MqttClientManager mqtt, MqttClientManager.Sink syncBroker) {
+        Map<String, Worker> workers = new ConcurrentHashMap<>();
+        for (int i = 0; i < WORKERS; i++) {
+            Worker w = new Worker();
+            w.workerId = "w-" + i;
+            w.name = w.workerId;
+            w.capacity = 4;
+            workers.put(w.workerId, w);
+        }
+        List<String> ids = new ArrayList<>(workers.keySet());
+        SmartScheduler scheduler = new SmartScheduler(new LinkedBlockingQueue<>(), workers, mqtt);
+        double[] samples = new double[MEASURE_ITERATIONS];
+        for (int iter = 0; iter < WARMUP_ITERATIONS + MEASURE_ITERATIONS; iter++) {
+            String jobId = "telemetry-" + name.replace(' ', '-') + "-" + iter;
+            for (Worker w : workers.values()) w.lastHeartbeat = System.currentTimeMillis();
+            long t0 = System.nanoTime();
+            for (int i = 0; i < tasks; i++) {
+                Task t = new Task();
+                t.type = TaskType.MAP;
+                t.jobId = jobId;
+                t.taskId = "map-" + i;
+                scheduler.enqueue(t);
+                publish(syncBroker, "gridmr/scheduler/task/queued");
+            }
+            int done = 0;
+            for (int i = 0; done < tasks; i++) {
+                String workerId = ids.get(i % WORKERS);
+                Task task = scheduler.getNextTaskForWorker(workerId);
+                if (task == null) {
+                    if (i > 100L * tasks * WORKERS) throw new IllegalStateException(jobId + " did not finish");
+                    continue;
+                }
+                publish(syncBroker, "gridmr/scheduler/task/assigned");
+                scheduler.onTaskCompleted(task.jobId, task.taskId, workerId);
+                publish(syncBroker, "gridmr/scheduler/task/completed");
+                done++;
+            }
+            long elapsed = System.nanoTime() - t0;
+            scheduler.onJobFinished(jobId);
+            if (iter >= WARMUP_ITERATIONS) samples[iter - WARMUP_ITERATIONS] = tasks * 1e9 / elapsed;
+        }
+        report(name, samples, mqtt);
+        if (mqtt != null) mqtt.close();
+    }
+
+    private static void publish(MqttClientManager.Sink broker, String topic) {
+        if (broker == null) return;
+        try {
+            broker.publish(topic, new byte[0]);
+        } catch (Exception e) {
+            throw new IllegalStateException(e);
+        }
+    }
+
+    private static void report(String name, double[] samples, MqttClientManager mqtt) {
+        double mean = 0;
+        for (double s : samples) mean += s;
+        mean /= samples.length;
+        double var = 0;
+        for (double s : samples) var += (s - mean) * (s - mean);
+        double stddev = Math.sqrt(var / Math.max(1, samples.length - 1));
+        Map<String, Object> stats = mqtt != null ? mqtt.stats() : Map.of();
+        System.out.printf("%-18s %12.0f %12.0f %10s %10s %12s%n", name, mean, stddev,
+                stats.getOrDefault("published", "-"), stats.getOrDefault("dropped", "-"),
+                stats.getOrDefault("rateLimited", "-"));
+    }
+}
@@ -0,0 +1,208 @@
+package cache;
+
+import model.JobCtx;
+import model.Task;
+import shuffle.RecordCodec;
+import store.RedisStore;
+
+import java.io.IOException;
+import java.nio.charset.StandardCharsets;
+import java.security.MessageDigest;
+import java.security.NoSuchAlgorithmException;
+import java.util.*;
+import java.util.function.Consumer;
+
+/**
+ * Content-addressed cache of map output.
+ * <p>
+ * A map task's output depends only on its scripts (map + combiner) and its
+ * input chunk, so it is keyed by {@code sha256(scripts):sha256(chunk)}.
+ * Unchanged chunks of a job that is re-run complete at submit time from the
+ * cached output instead of being scheduled; byte-identical chunks within a
+ * job run once and the others complete from that task's output. Entries are
+ * raw {@link RecordCodec} blocks kept in a
+ * size-bounded LRU, optionally backed by Redis so they survive restarts.
+ */
+public class MapOutputCache {
+    private static final long DEFAULT_MEMORY_MB = 256;
+    private static final long DEFAULT_TTL_HOURS = 48;
+
+    private final long maxBytes;
+    private final RedisStore redis; // null = memory only
+    private final long redisTtlSeconds;
+
+    private final LinkedHashMap<String, byte[]> entries = new LinkedHashMap<>(16, 0.75f, true);
+    private long bytes = 0;
+
+    public MapOutputCache(long maxBytes, RedisStore redis, long redisTtlSeconds) {
+        this.maxBytes = maxBytes;
+        this.redis = redis;
+        this.redisTtlSeconds = redisTtlSeconds;
+    }
+
+    /**
+     * Memory budget from MAP_CACHE_MB (default 256, 0 disables the cache).
+     * Redis is used when available unless MAP_CACHE_REDIS=0; entries expire
+     * after MAP_CACHE_TTL_HOURS (default 48).
+     */
+    public static MapOutputCache fromEnvOrNull(RedisStore redis) {
+        long mb = envLong("MAP_CACHE_MB", DEFAULT_MEMORY_MB);
+        if (mb <= 0) return null;
+        boolean useRedis = redis != null && !"0".equals(System.getenv().getOrDefault("MAP_CACHE_REDIS", "1"));
+        long ttlHours = envLong("MAP_CACHE_TTL_HOURS", DEFAULT_TTL_HOURS);
+        System.out.println("[MAP CACHE] " + mb + "MB in memory" + (useRedis ? " + Redis (ttl " + ttlHours + "h)" : ""));
+        return new MapOutputCache(mb * 1024 * 1024, useRedis ? redis : null, Math.max(1, ttlHours) * 3600);
+    }
+
+    private static long envLong(String name, long dflt) {
+        try {
+            return Long.parseLong(System.getenv().getOrDefault(name, String.valueOf(dflt)));
+        } catch (NumberFormatException e) {
+            System.err.println("[MAP CACHE WARN] Invalid " + name + ", using " + dflt);
+            return dflt;
+        }
+    }
+
+    /**
+     * Key every map task of the job, ingest cached output for hits and return
+     * the tasks that still have to run: one per distinct chunk, the others
+     * wait in {@link JobCtx#mapDuplicates} for its output. Updates the job's
+     * hit/miss counters (a duplicate counts as a hit). Reads and hashes the
+     * whole input, so for an uploaded input it runs off the request thread.
+     */
+    public List<Task> resolve(JobCtx ctx) throws IOException {
+        String scripts = scriptsHash(ctx);
+        Map<String, Task> running = new HashMap<>(); // cache key -> task that runs it
+        List<Task> misses = new ArrayList<>();
+        for (Task t : ctx.mapTasks) {
+            t.cacheKey = scripts + ":" + sha256(ctx.mapInput(t).getBytes(StandardCharsets.UTF_8));
+            Task first = running.get(t.cacheKey);
+            if (first != null) {
+                ctx.mapDuplicates.computeIfAbsent(first.taskId, k -> new ArrayList<>()).add(t);
+                ctx.mapCacheHits.incrementAndGet();
+                continue;
+            }
+            byte[] cached = get(t.cacheKey);
+            if (cached == null) {
+                ctx.mapCacheMisses.incrementAndGet();
+                ctx.mapCacheKeys.put(t.taskId, t.cacheKey);
+                running.put(t.cacheKey, t);
+                misses.add(t);
+                continue;
+            }
+            ctx.shuffle.ingestRecords(cached);
+            ctx.markCompleted(t.taskId);
+            ctx.completedMaps.incrementAndGet();
+            ctx.mapCacheHits.incrementAndGet();
+        }
+        if (ctx.mapCacheHits.get() > 0) {
+            System.out.println("[MAP CACHE] job=" + ctx.spec.job_id + " hits=" + ctx.mapCacheHits.get()
+                    + " misses=" + ctx.mapCacheMisses.get());
+        }
+        return misses;
+    }
+
+    /**
+     * Remember the text output of a completed map task and complete its
+     * duplicates from it. Returns how many duplicates completed; the caller
+     * counts them as completed maps along with the task itself. A duplicate
+     * whose output cannot be ingested is handed to {@code rerun} instead.
+     */
+    public int storeText(JobCtx ctx, String taskId, String kvLines, Consumer<Task> rerun) {
+        String key = ctx.mapCacheKeys.remove(taskId);
+        List<Task> duplicates = ctx.mapDuplicates.remove(taskId);
+        if (key == null && duplicates == null) return 0;
+        return store(ctx, key, duplicates, RecordCodec.fromText(kvLines), rerun);
+    }
+
+    /**
+     * Remember the raw record output of a completed map task; see {@link #storeText}.
+     */
+    public int storeRecords(JobCtx ctx, String taskId, byte[] records, Consumer<Task> rerun) {
+        return store(ctx, ctx.mapCacheKeys.remove(taskId), ctx.mapDuplicates.remove(taskId), records, rerun);
+    }
+
+    private int store(JobCtx ctx, String key, List<Task> duplicates, byte[] records, Consumer<Task> rerun) {
+        if (key != null) put(key, records);
+        if (duplicates == null) return 0;
+        int done = 0;
+        for (Task t : duplicates) {
+            if (!ctx.markCompleted(t.taskId)) continue;
+            try {
+                ctx.shuffle.ingestRecords(records);
+                done++;
+            } catch (IOException e) {
+                System.err.println("[MAP CACHE WARN] job=" + ctx.spec.job_id + " task=" + t.taskId
+                        + " could not reuse " + key + ", running it: " + e.getMessage());
+                ctx.completedTaskIds.remove(t.taskId);
+                rerun.accept(t);
+            }
+        }
+        return done;
+    }
+
+    public byte[] get(String key) {
+        synchronized (this) {
+            byte[] hit = entries.get(key);
+            if (hit != null) return hit;
+        }
+        if (redis == null) return null;
+        try {
+            byte[] stored = redis.loadMapOutput(key);
+            if (stored != null) remember(key, stored);
+            return stored;
+        } catch (RuntimeException e) {
+            System.err.println("[MAP CACHE WARN] Redis read failed: " + e.getMessage());
+            return null;
+        }
+    }
+
+    public void put(String key, byte[] records) {
+        remember(key, records);
+        if (redis == null) return;
+        try {
+            redis.saveMapOutput(key, records, redisTtlSeconds);
+        } catch (RuntimeException e) {
+            System.err.println("[MAP CACHE WARN] Redis write failed: " + e.getMessage());
+        }
+    }
+
+    private synchronized void remember(String key, byte[] records) {
+        // One huge output should not flush everything else.
+        if (records.length > maxBytes / 8) return;
+        byte[] old = entries.put(key, records);
+        if (old != null) bytes -= old.length;
+        bytes += records.length;
+        Iterator<Map.Entry<String, byte[]>> it = entries.entrySet().iterator();
+        while (bytes > maxBytes && it.hasNext()) {
+            bytes -= it.next().getValue().length;
+            it.remove();
+        }
+    }
+
+    public synchronized long sizeBytes() {
+        return bytes;
+    }
+
+    private static String scriptsHash(JobCtx ctx) {
+        MessageDigest md = sha256();
+        md.update(ctx.mapScript == null ? new byte[0] : ctx.mapScript);
+        if (ctx.combineScript != null) {
+            md.update((byte) 0);
+            md.update(ctx.combineScript);
+        }
+        return HexFormat.of().formatHex(md.digest());
+    }
+
+    private static String sha256(byte[] data) {
+        return HexFormat.of().formatHex(sha256().digest(data));
+    }
+
+    private static MessageDigest sha256() {
+        try {
+            return MessageDigest.getInstance("SHA-256");
+        } catch (NoSuchAlgorithmException e) {
+            throw new IllegalStateException(e); // every JRE ships SHA-256
+        }
+    }
+}
@@ -0,0 +1,216 @@
+package core;
+
+import model.JobCtx;
+import model.JobState;
+import model.Task;
+import model.TaskType;
+import stencil.StencilJob;
+import store.RedisStore;
+import telemetry.MqttClientManager;
+
+import java.io.IOException;
+import java.io.UncheckedIOException;
+import java.util.ArrayList;
+import java.util.List;
+import java.util.Map;
+import java.util.Set;
+import java.util.TreeSet;
+
+/**
+ * Phase transitions shared by the HTTP and gRPC completion paths.
+ */
+public final class JobLifecycle {
+    private JobLifecycle() {
+    }
+
+    /**
+     * All maps are done: create and enqueue one reduce task per partition
+     * (including empty ones). A job with no reducers finishes right away.
+     */
+    public static void startReducePhase(JobCtx ctx, Scheduler scheduler, MqttClientManager mqtt, RedisStore redis) {
+        if (failIfSpillFailed(ctx, scheduler, mqtt, redis)) return;
+        String jobId = ctx.spec.job_id;
+        ctx.mapsDoneAt = System.currentTimeMillis();
+        int rIx = 0;
+        List<Integer> sizes = ctx.shuffle.partitionSizes();
+
+        // Publish the full task list before enqueueing: a fast reduce must
+        // not complete while reduceTasks.size() is still growing.
+        List<Task> reduces = new ArrayList<>();
+        for (int i = 0; i < ctx.spec.reducers; i++) {
+            Task rt = new Task();
+            rt.type = TaskType.REDUCE;
+            rt.taskId = "reduce-" + (rIx++);
+            rt.jobId = jobId;
+            rt.partitionIndex = i;
+            reduces.add(rt);
+        }
+        ctx.reduceTasks.clear();
+        ctx.reduceTasks.addAll(reduces);
+        scheduler.enqueueAll(reduces);
+        if (mqtt != null) {
+            mqtt.publishJson("gridmr/job/" + jobId + "/shuffle/partitions", Map.of(
+                    "sizes", sizes, "ts", System.currentTimeMillis()
+            ));
+        }
+        if (redis != null) redis.savePartitionSizes(jobId, sizes);
+
+        if (ctx.reduceTasks.isEmpty()) finish(ctx, scheduler, mqtt, redis);
+    }
+
+    /**
+     * Fail the job if its shuffle could not spill. Call after a map output was
+     * counted as completed; returns true when the job was failed.
+     */
+    public static boolean failIfSpillFailed(JobCtx ctx, Scheduler scheduler, MqttClientManager mqtt, RedisStore redis) {
+        IOException e = ctx.shuffle.spillError();
+        if (e == null) return false;
+        fail(ctx, "shuffle spill failed: " + e.getMessage(), scheduler, mqtt, redis);
+        return true;
+    }
+
+    /**
+     * Called after every reduce completion with the updated completion count.
+     * The call whose count reaches the number of reduce tasks either schedules
+     * the merge of split hot keys or finishes the job; all others return.
+     */
+    public static void reduceCompleted(JobCtx ctx, int reducesDone, Scheduler scheduler, MqttClientManager mqtt, RedisStore redis) {
+        if (reducesDone != ctx.reduceTasks.size()) return;
+        if (!ctx.mergeScheduled && startMerge(ctx, scheduler, mqtt, redis)) return;
+        finish(ctx, scheduler, mqtt, redis);
+    }
+
+    /**
+     * Move the partial outputs of split keys out of the result segments into
+     * a new partition and enqueue one more reduce over it. Returns false when
+     * there is nothing to merge. A split key without partial outputs means
+     * the reducer did not echo its keys back; the job fails instead of
+     * finishing with unmerged partials.
+     */
+    private static boolean startMerge(JobCtx ctx, Scheduler scheduler, MqttClientManager mqtt, RedisStore redis) {
+        ctx.mergeScheduled = true;
+        Set<String> split = ctx.shuffle.splitKeys();
+        if (split.isEmpty()) return false;
+
+        List<String[]> partials;
+        int partition;
+        try {
+            partials = ctx.result.extractKeys(split);
+            Set<String> missing = new TreeSet<>(split);
+            for (String[] r : partials) missing.remove(r[0]);
+            if (!missing.isEmpty()) {
+                fail(ctx, "no partial output for split keys " + missing
+                        + " (reduce.py must print \"key\\tvalue\" for every key it reduces)", scheduler, mqtt, redis);
+                return true;
+            }
+            partition = ctx.shuffle.addPartition();
+            for (String[] r : partials) ctx.shuffle.add(partition, r[0], r[1]);
+        } catch (IOException e) {
+            throw new UncheckedIOException("merge input preparation failed", e);
+        }
+        Task mt = new Task();
+        mt.type = TaskType.REDUCE;
+        mt.taskId = "merge-0";
+        mt.jobId = ctx.spec.job_id;
+        mt.partitionIndex = partition;
+        ctx.reduceTasks.add(mt);
+        System.out.println("[MERGE] job=" + ctx.spec.job_id + " merging " + partials.size()
+                + " partial outputs of " + split.size() + " split keys");
+        if (mqtt != null) {
+            mqtt.publishJson("gridmr/job/" + ctx.spec.job_id + "/merge/scheduled", Map.of(
+                    "splitKeys", split.size(), "partials", partials.size(), "ts", System.currentTimeMillis()
+            ));
+        }
+        scheduler.enqueue(mt);
+        return true;
+    }
+
+    /**
+     * Mark the job SUCCEEDED, persist its output and release the shuffle.
+     * The result itself already sits on disk as per-partition segments.
+     */
+    public static void finish(JobCtx ctx, Scheduler scheduler, MqttClientManager mqtt, RedisStore redis) {
+        String jobId = ctx.spec.job_id;
+        // Upload queued first: a re-run with this id is accepted once the job is
+        // terminal and must already see the upload that still reads its segments
+        Scheduler.persistResult(ctx);
+        ctx.state = JobState.SUCCEEDED;
+        ctx.finishedAt = System.currentTimeMillis();
+        if (ctx.shuffle != null) ctx.shuffle.close();
+        if (ctx.input != null) ctx.input.delete();
+        scheduler.onJobFinished(jobId);
+        if (redis != null) {
+            // Queued in this order, so SUCCEEDED is never visible before the result.
+            redis.storeFinalResult(jobId, ctx.result);
+            redis.setJobState(jobId, ctx.state.toString());
+        }
+        if (mqtt != null) {
+            mqtt.publishJson("gridmr/job/" + jobId + "/state", Map.of(
+                    "state", ctx.state.toString(), "ts", System.currentTimeMillis()
+            ));
+        }
+    }
+
+    /**
+     * Record one stencil step reported by a worker and queue the steps it
+     * unblocked; finishes the job once the last band of the grid is written.
+     * A worker that no longer holds the tile (`lost`) fails the job, since
+     * its state cannot be rebuilt without recomputing every generation.
+     */
+    public static void stepCompleted(JobCtx ctx, String workerId, int tile, int generation, boolean lost,
+                                     StencilJob.Edges edges, long live, byte[] cells,
+                                     Scheduler scheduler, MqttClientManager mqtt, RedisStore redis) throws IOException {
+        StencilJob st = ctx.stencil;
+        if (ctx.state != JobState.RUNNING || st.reported(tile, generation)) return;
+        if (lost) {
+            fail(ctx, "worker " + workerId + " lost tile " + tile + " before generation " + generation,
+                    scheduler, mqtt, redis);
+            return;
+        }
+        int before = st.generation();
+        List<Task> next = st.complete(workerId, tile, generation, edges, live, cells, ctx.result);
+        if (!next.isEmpty()) scheduler.enqueueAll(next);
+        int now = st.generation();
+        if (now > before && mqtt != null) {
+            mqtt.publishJson("gridmr/job/" + ctx.spec.job_id + "/stencil/generation", Map.of(
+                    "generation", now, "generations", st.generations, "live", st.live(now),
+                    "ts", System.currentTimeMillis()
+            ));
+        }
+        if (st.claimFinish()) finish(ctx, scheduler, mqtt, redis);
+    }
+
+    /**
+     * A worker left the cluster: fail the stencil jobs that kept tiles on it.
+     */
+    public static void workerLost(Map<String, JobCtx> jobs, String workerId, Scheduler scheduler,
+                                  MqttClientManager mqtt, RedisStore redis) {
+        for (JobCtx ctx : jobs.values()) {
+            if (ctx.stencil != null && ctx.state == JobState.RUNNING && ctx.stencil.dependsOn(workerId)) {
+                fail(ctx, "worker " + workerId + " holding tiles was lost", scheduler, mqtt, redis);
+            }
+        }
+    }
+
+    /**
+     * Mark the job FAILED and drop its queued tasks.
+     */
+    public static synchronized void fail(JobCtx ctx, String reason, Scheduler scheduler, MqttClientManager mqtt,
+                                         RedisStore redis) {
+        if (ctx.state != JobState.RUNNING) return;
+        String jobId = ctx.spec.job_id;
+        ctx.error = reason;
+        ctx.state = JobState.FAILED;
+        ctx.finishedAt = System.currentTimeMillis();
+        System.out.println("[JOB] job=" + jobId + " failed: " + reason);
+        if (ctx.shuffle != null) ctx.shuffle.close();
+        if (ctx.input != null) ctx.input.delete();
+        scheduler.onJobFinished(jobId);
+        if (redis != null) redis.setJobState(jobId, ctx.state.toString());
+        if (mqtt != null) {
+            mqtt.publishJson("gridmr/job/" + jobId + "/state", Map.of(
+                    "state", ctx.state.toString(), "error", reason, "ts", System.currentTimeMillis()
+            ));
+        }
+    }
+}
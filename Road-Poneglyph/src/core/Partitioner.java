@@ -1,10 +1,24 @@
 package core;
 
-public final class Partitioner {
-    private Partitioner() {
+import java.util.Set;
+
+/**
+ * Maps intermediate keys to reduce partitions. See {@link Partitioners} for
+ * the strategies a job can select. Implementations are called concurrently
+ * by the threads ingesting map output.
+ */
+public interface Partitioner {
+    int partition(String key);
+
+    /**
+     * Keys whose records are spread over several partitions; their partial
+     * reduce outputs are merged by a final reduce pass.
+     */
+    default Set<String> splitKeys() {
+        return Set.of();
     }
 
-    public static int partitionOf(String key, int reducers) {
+    static int partitionOf(String key, int reducers) {
         return Math.floorMod(key.hashCode(), reducers);
     }
 }
@@ -0,0 +1,117 @@
+package core;
+
+import model.JobSpec;
+import shuffle.ShuffleStore;
+
+import java.util.*;
+import java.util.concurrent.ConcurrentHashMap;
+
+/**
+ * Partitioning strategies selectable per job ({@code JobSpec.partitioner}):
+ * <ul>
+ *     <li>{@code hash} (default): {@code floorMod(key.hashCode(), reducers)}.</li>
+ *     <li>{@code range}: contiguous key ranges cut so that each reducer gets a
+ *     similar share of the records sampled from the first map outputs.</li>
+ * </ul>
+ * With {@code split_hot_keys}, keys holding more than 1/reducers of the sample
+ * are additionally spread round-robin over several reducers, and their partial
+ * outputs are combined by a final merge reduce (see {@link JobLifecycle}).
+ */
+public final class Partitioners {
+    public static final double DEFAULT_SAMPLE_FRACTION = 0.1;
+
+    private Partitioners() {
+    }
+
+    public static Partitioner hash(int reducers) {
+        return key -> Partitioner.partitionOf(key, reducers);
+    }
+
+    /**
+     * Upper bounds chosen so every range holds about 1/reducers of the sampled records.
+     */
+    public static Partitioner range(Map<String, Long> sample, int reducers) {
+        if (reducers <= 1 || sample.isEmpty()) return hash(reducers);
+        TreeMap<String, Long> sorted = new TreeMap<>(sample);
+        long total = sorted.values().stream().mapToLong(Long::longValue).sum();
+        List<String> bounds = new ArrayList<>(); // inclusive upper key of partitions 0..n-2
+        long seen = 0;
+        for (Map.Entry<String, Long> e : sorted.entrySet()) {
+            seen += e.getValue();
+            if (bounds.size() < reducers - 1 && seen * reducers >= total * (bounds.size() + 1)
+                    && !e.getKey().equals(sorted.lastKey())) {
+                bounds.add(e.getKey());
+            }
+        }
+        return key -> {
+            int i = Collections.binarySearch(bounds, key);
+            return i >= 0 ? i : -i - 1;
+        };
+    }
+
+    /**
+     * Wrap base so keys with more than 1/reducers of the sample are split over
+     * ceil(share * reducers) partitions.
+     */
+    public static Partitioner splitHotKeys(Partitioner base, Map<String, Long> sample, int reducers) {
+        long total = sample.values().stream().mapToLong(Long::longValue).sum();
+        Map<String, Integer> ways = new HashMap<>();
+        for (Map.Entry<String, Long> e : sample.entrySet()) {
+            int w = (int) Math.min(reducers, Math.ceil((double) e.getValue() * reducers / total));
+            if (w > 1) ways.put(e.getKey(), w);
+        }
+        return ways.isEmpty() ? base : new HotKeyPartitioner(base, ways, reducers);
+    }
+
+    /**
+     * Install the job's strategy on its shuffle. Non-default strategies are
+     * built once the first {@code partition_sample} fraction of map outputs
+     * (default 10%, at least one) has been seen.
+     */
+    public static void configure(ShuffleStore shuffle, JobSpec spec, int mapTasks) {
+        String kind = spec.partitioner == null ? "hash" : spec.partitioner.toLowerCase(Locale.ROOT);
+        if (!"hash".equals(kind) && !"range".equals(kind)) {
+            System.err.println("[SHUFFLE WARN] Unknown partitioner '" + spec.partitioner + "', using hash");
+            kind = "hash";
+        }
+        boolean split = Boolean.TRUE.equals(spec.split_hot_keys);
+        if ("hash".equals(kind) && !split) return; // the shuffle's default
+
+        boolean range = "range".equals(kind);
+        int reducers = shuffle.partitions();
+        double fraction = spec.partition_sample == null ? DEFAULT_SAMPLE_FRACTION
+                : Math.min(1.0, Math.max(0.0, spec.partition_sample));
+        int sampleOutputs = Math.max(1, (int) Math.ceil(mapTasks * fraction));
+        shuffle.partitionFromSample(sampleOutputs, sample -> {
+            Partitioner base = range ? range(sample, reducers) : hash(reducers);
+            return split ? splitHotKeys(base, sample, reducers) : base;
+        });
+    }
+
+    private static final class HotKeyPartitioner implements Partitioner {
+        private final Partitioner base;
+        private final Map<String, Integer> ways;
+        private final Map<String, Integer> next = new ConcurrentHashMap<>();
+        private final int reducers;
+
+        HotKeyPartitioner(Partitioner base, Map<String, Integer> ways, int reducers) {
+            this.base = base;
+            this.ways = ways;
+            this.reducers = reducers;
+        }
+
+        @Override
+        public int partition(String key) {
+            Integer w = ways.get(key);
+            if (w == null) return base.partition(key);
+            // Round-robin counter kept in [0, w), so it never overflows
+            int n = next.compute(key, (k, v) -> v == null ? 1 % w : (v + 1) % w);
+            return Math.floorMod(base.partition(key) + n, reducers);
+        }
+
+        @Override
+        public Set<String> splitKeys() {
+            return Collections.unmodifiableSet(ways.keySet());
+        }
+    }
+}
@@ -3,30 +3,92 @@ package core;
 import model.JobCtx;
 import model.Task;
 import model.TaskType;
-import utils.S3Utils;
+import store.JobInput;
 
-import java.nio.charset.StandardCharsets;
-import java.io.File;
-import java.io.FileOutputStream;
+import java.io.IOException;
 import java.util.*;
 import java.util.concurrent.BlockingQueue;
+import java.util.function.BiConsumer;
 
 /**
  * Very small FIFO scheduler. Evolve it to use capacity/heartbeats/timeouts.
  */
 public class Scheduler {
     private final BlockingQueue<Task> pending;
+    private volatile Runnable onEnqueue;
+    private volatile BiConsumer<Task, String> onAttemptLost;
 
     public Scheduler(BlockingQueue<Task> pending) {
         this.pending = pending;
     }
 
     public void enqueueAll(List<Task> tasks) {
-        for (Task t : tasks) pending.offer(t);
+        long now = System.currentTimeMillis();
+        for (Task t : tasks) {
+            t.enqueuedAt = now;
+            pending.offer(t);
+        }
+        notifyEnqueued();
     }
 
     public void enqueue(Task t) {
+        t.enqueuedAt = System.currentTimeMillis();
         pending.offer(t);
+        notifyEnqueued();
+    }
+
+    /**
+     * Tasks waiting to be assigned.
+     */
+    public int queuedTasks() {
+        return pending.size();
+    }
+
+    /**
+     * Callback run after tasks are queued (push dispatch wakes up on it).
+     */
+    public void setOnEnqueue(Runnable callback) {
+        this.onEnqueue = callback;
+    }
+
+    /**
+     * Callback run with the task and worker of every attempt given up on
+     * (lost, timed out, on a dead worker): it will never report back.
+     */
+    public void setOnAttemptLost(BiConsumer<Task, String> callback) {
+        this.onAttemptLost = callback;
+    }
+
+    /**
+     * A task taken for {@code workerId} never reached it (the assignment
+     * could not be built or sent): queue it again right away.
+     */
+    public void onTaskLost(Task task, String workerId) {
+        notifyAttemptLost(task, workerId);
+        enqueue(task);
+    }
+
+    /**
+     * The push stream of {@code workerId} closed. This FIFO scheduler does not
+     * track assignments, so nothing can be recovered here.
+     */
+    public void onWorkerDisconnected(String workerId) {
+    }
+
+    /**
+     * Called once a job reaches a final state.
+     */
+    public void onJobFinished(String jobId) {
+    }
+
+    protected void notifyEnqueued() {
+        Runnable callback = onEnqueue;
+        if (callback != null) callback.run();
+    }
+
+    protected void notifyAttemptLost(Task task, String workerId) {
+        BiConsumer<Task, String> callback = onAttemptLost;
+        if (callback != null) callback.accept(task, workerId);
     }
 
     /**
@@ -67,71 +129,36 @@ public class Scheduler {
     }
 
     /**
-     * Persist final output as our "local S3 sink".
+     * Build MAP tasks over an uploaded input: each covers a byte range that
+     * ends on a line boundary, and its text is only read when dispatched.
      */
-    public static void persistResult(JobCtx ctx) {
-        try {
-            // Store locally (existing functionality)
-            File dir = new File("out");
-            if (!dir.exists()) dir.mkdirs();
-            File f = new File(dir, ctx.spec.job_id + ".txt");
-            try (FileOutputStream fos = new FileOutputStream(f, false)) {
-                fos.write(ctx.finalOutput.getBytes(StandardCharsets.UTF_8));
-            }
-            System.out.println("[RESULT STORED] " + f.getAbsolutePath());
-
-            // Store in AWS S3
-            storeResultInS3(ctx);
-
-        } catch (Exception e) {
-            e.printStackTrace();
+    public List<Task> buildMapTasks(String jobId, JobInput input, int splitSize) throws IOException {
+        List<Task> out = new ArrayList<>();
+        int t = 0;
+        for (long[] split : input.splits(splitSize)) {
+            Task mt = new Task();
+            mt.type = TaskType.MAP;
+            mt.taskId = "map-" + (t++);
+            mt.jobId = jobId;
+            mt.inputOffset = split[0];
+            mt.inputLength = (int) Math.min(Integer.MAX_VALUE, split[1]);
+            out.add(mt);
         }
+        return out;
     }
 
     /**
-     * Store job result in AWS S3 using S3Utils.
+     * Persist final output as our "local S3 sink". Locally it is already
+     * stored: reduce outputs are written as segments when they arrive. The
+     * S3 copy, if configured, is queued on the job's uploader.
      */
-    private static void storeResultInS3(JobCtx ctx) {
+    public static void persistResult(JobCtx ctx) {
         try {
-            S3Utils s3Utils = S3Utils.fromEnvironment();
-            if (s3Utils == null) {
-                System.out.println("[S3] S3 storage not configured - skipping S3 upload");
-                return;
-            }
-            
-            // Check if bucket is accessible before attempting upload
-            if (!s3Utils.isBucketAccessible()) {
-                System.err.println("[S3] Bucket not accessible - skipping S3 upload");
-                return;
-            }
-            
-            // Prepare metadata for the job result
-            Map<String, String> metadata = new HashMap<>();
-            metadata.put("job-type", "mapreduce");
-            metadata.put("maps-completed", String.valueOf(ctx.completedMaps));
-            metadata.put("reduces-completed", String.valueOf(ctx.completedReduces));
-            metadata.put("final-output-size", String.valueOf(ctx.finalOutput.length()));
-            
-            // Store the result in S3
-            String s3Key = s3Utils.storeJobResultWithMetadata(
-                ctx.spec.job_id, 
-                ctx.finalOutput, 
-                metadata
-            );
-            
-            System.out.println("[S3] Job result stored at: " + s3Key);
-            
-            // Optionally generate a presigned URL for temporary access (24 hours)
-            String presignedUrl = s3Utils.generatePresignedUrl(s3Key, 24 * 60);
-            if (presignedUrl != null) {
-                System.out.println("[S3] Temporary access URL (24h): " + presignedUrl);
-            }
-            
-            s3Utils.close();
-            
+            System.out.println("[RESULT STORED] " + ctx.result.dir().toAbsolutePath()
+                    + " (" + ctx.result.partitions().size() + " segments, " + ctx.result.bytes(null) + " bytes)");
         } catch (Exception e) {
-            System.err.println("[S3 ERROR] Failed to store result in S3: " + e.getMessage());
             e.printStackTrace();
         }
+        if (ctx.uploader != null) ctx.uploader.submit(ctx);
     }
 }
@@ -4,6 +4,7 @@ import model.Task;
 import model.TaskType;
 import model.Worker;
 import telemetry.MqttClientManager;
+import utils.RateLimitedLog;
 
 import java.util.*;
 import java.util.concurrent.ConcurrentHashMap;
@@ -12,6 +13,9 @@ import java.util.concurrent.LinkedBlockingQueue;
 import java.util.concurrent.Executors;
 import java.util.concurrent.ScheduledExecutorService;
 import java.util.concurrent.TimeUnit;
+import java.util.concurrent.atomic.AtomicInteger;
+import java.util.concurrent.atomic.AtomicLong;
+import java.util.function.Consumer;
 
 /**
  * Scheduler inteligente que asigna tareas basándose en recursos y carga de workers.
@@ -19,22 +23,45 @@ import java.util.concurrent.TimeUnit;
  */
 public class SmartScheduler extends Scheduler {
     private final Map<String, Worker> workers;
+    private final WorkerIndex index;
     private final MqttClientManager mqtt;
+    private final RateLimitedLog log = new RateLimitedLog(5_000);
 
     // Cola organizada por prioridad para diferentes tipos de tareas
     private final BlockingQueue<Task> mapTasks = new LinkedBlockingQueue<>();
     private final BlockingQueue<Task> reduceTasks = new LinkedBlockingQueue<>();
+    // Pasos de jobs stencil; desde la generación 2 van fijados al worker que guarda el tile
+    private final BlockingQueue<Task> stepTasks = new LinkedBlockingQueue<>();
+    private volatile Consumer<String> onWorkerLost;
 
-    // Tracking de asignaciones para métricas y tolerancia a fallos
+    // Tracking de asignaciones para métricas y tolerancia a fallos.
+    // Claves: tarea = "jobId/taskId" (los taskId se repiten entre jobs), intento = "jobId/taskId@workerId"
     private final Map<String, Long> taskAssignmentTimes = new ConcurrentHashMap<>();
-    private final Map<String, TaskAssignment> assignedTasks = new ConcurrentHashMap<>(); // taskId -> assignment info
+    private final Map<String, TaskAssignment> assignedTasks = new ConcurrentHashMap<>(); // intento -> assignment info
     private final ScheduledExecutorService faultToleranceExecutor = Executors.newScheduledThreadPool(2);
-    
+
+    // Ejecución especulativa: la primera copia que termina gana
+    private final Set<String> finishedTasks = ConcurrentHashMap.newKeySet();
+    private final Set<String> speculatedTasks = ConcurrentHashMap.newKeySet();
+    private final Map<String, PhaseStats> phases = new ConcurrentHashMap<>(); // "jobId:MAP|REDUCE"
+    private final AtomicLong speculativeLaunched = new AtomicLong();
+    private final AtomicLong speculativeWins = new AtomicLong();
+    private final AtomicLong duplicateCompletions = new AtomicLong();
+    private final AtomicLong wastedTaskMs = new AtomicLong();
+    private final boolean speculationEnabled =
+            !"0".equals(System.getenv().getOrDefault("SPECULATIVE_EXECUTION", "1"));
+
     // Configuración de timeouts
     private static final long TASK_TIMEOUT_MS = 300_000; // 5 minutos
     private static final long WORKER_TIMEOUT_MS = 120_000; // 2 minutos 
     private static final long FAULT_CHECK_INTERVAL_MS = 30_000; // 30 segundos
-    
+
+    // Configuración de especulación
+    private static final long SPECULATION_CHECK_INTERVAL_MS = 1_000;
+    private static final double SPECULATION_PHASE_FRACTION = 0.75; // fracción de la fase ya completada
+    private static final double SPECULATION_SLOWDOWN = 2.0;        // tiempo transcurrido vs mediana de la fase
+    private static final long SPECULATION_MIN_ELAPSED_MS = 1_000;
+
     // Clase interna para tracking de asignaciones
     private static class TaskAssignment {
         final String taskId;
@@ -54,10 +81,40 @@ public class SmartScheduler extends Scheduler {
         }
     }
 
+    // Progreso de una fase (MAP o REDUCE) de un job
+    private static class PhaseStats {
+        final Set<String> tasks = ConcurrentHashMap.newKeySet();
+        final AtomicInteger completed = new AtomicInteger();
+        final List<Long> durations = Collections.synchronizedList(new ArrayList<>());
+
+        long medianMs() {
+            synchronized (durations) {
+                if (durations.isEmpty()) return 0;
+                List<Long> sorted = new ArrayList<>(durations);
+                Collections.sort(sorted);
+                return sorted.get(sorted.size() / 2);
+            }
+        }
+    }
+
+    private static String keyOf(Task task) {
+        return task.jobId + "/" + task.taskId;
+    }
+
+    private static String attemptKey(String taskKey, String workerId) {
+        return taskKey + "@" + workerId;
+    }
+
+    private static String phaseOf(Task task) {
+        return task.jobId + ":" + task.type;
+    }
+
     public SmartScheduler(BlockingQueue<Task> pending, Map<String, Worker> workers, MqttClientManager mqtt) {
         super(pending);
         this.workers = workers;
+        this.index = new WorkerIndex(workers);
         this.mqtt = mqtt;
+        if (mqtt != null) mqtt.snapshots().setSchedulerStats(this::getSchedulerStats);
         
         // Iniciar threads de tolerancia a fallos
         startFaultToleranceSystem();
@@ -74,6 +131,54 @@ public class SmartScheduler extends Scheduler {
         // Thread para limpieza de workers inactivos
         faultToleranceExecutor.scheduleWithFixedDelay(this::cleanupDeadWorkers,
                 WORKER_TIMEOUT_MS, WORKER_TIMEOUT_MS, TimeUnit.MILLISECONDS);
+
+        // Copias de respaldo para tareas rezagadas
+        if (speculationEnabled) {
+            faultToleranceExecutor.scheduleWithFixedDelay(this::speculateStragglers,
+                    SPECULATION_CHECK_INTERVAL_MS, SPECULATION_CHECK_INTERVAL_MS, TimeUnit.MILLISECONDS);
+        }
+    }
+
+    /**
+     * Lanza una copia de respaldo de las tareas cuyo tiempo supera varias veces
+     * la mediana de su fase, cuando la mayor parte de la fase ya terminó.
+     * La primera copia en completar gana; las demás cuentan como trabajo desperdiciado.
+     */
+    private void speculateStragglers() {
+        try {
+            long now = System.currentTimeMillis();
+            for (TaskAssignment a : assignedTasks.values()) {
+                String key = keyOf(a.task);
+                if (a.task.speculative || a.task.type == TaskType.STEP || finishedTasks.contains(key) || speculatedTasks.contains(key)) continue;
+
+                PhaseStats phase = phases.get(phaseOf(a.task));
+                if (phase == null || phase.completed.get() < SPECULATION_PHASE_FRACTION * phase.tasks.size()) continue;
+                long median = phase.medianMs();
+                long elapsed = now - a.assignedTime;
+                if (median <= 0 || elapsed < SPECULATION_MIN_ELAPSED_MS || elapsed < SPECULATION_SLOWDOWN * median) continue;
+
+                if (index.bestExcept(a.workerId) == null) continue; // no hay worker libre para la copia
+
+                speculatedTasks.add(key);
+                speculativeLaunched.incrementAndGet();
+                System.out.println("[SPECULATION] Task " + key + " running " + elapsed + "ms on " + a.workerId
+                        + " (phase median " + median + "ms), launching backup");
+                if (mqtt != null) {
+                    mqtt.snapshots().taskSpeculated();
+                    mqtt.publishJson("gridmr/scheduler/task/speculated", Map.of(
+                            "taskId", a.taskId,
+                            "jobId", a.task.jobId,
+                            "workerId", a.workerId,
+                            "elapsedMs", elapsed,
+                            "medianMs", median,
+                            "ts", now
+                    ));
+                }
+                enqueue(a.task.backupCopy());
+            }
+        } catch (RuntimeException e) {
+            System.err.println("[SPECULATION] Check failed: " + e.getMessage());
+        }
     }
     
     /**
@@ -103,14 +208,17 @@ public class SmartScheduler extends Scheduler {
                 worker.onTaskFailed();
             }
             
-            // Re-encolar la tarea
-            enqueue(failedTask.task);
-            
             // Limpiar tracking
-            taskAssignmentTimes.remove(failedTask.taskId);
+            taskAssignmentTimes.remove(attemptKey(keyOf(failedTask.task), failedTask.workerId));
+            notifyAttemptLost(failedTask.task, failedTask.workerId);
+
+            // Re-encolar la tarea (salvo que otra copia ya la haya completado)
+            if (finishedTasks.contains(keyOf(failedTask.task))) continue;
+            enqueue(failedTask.task);
             
             // Publicar evento de recuperación
             if (mqtt != null) {
+                mqtt.snapshots().taskRecovered();
                 mqtt.publishJson("gridmr/scheduler/task/recovered", Map.of(
                     "taskId", failedTask.taskId,
                     "workerId", failedTask.workerId, 
@@ -144,6 +252,7 @@ public class SmartScheduler extends Scheduler {
         
         // Re-encolar tareas de workers muertos
         for (String deadWorkerId : deadWorkers) {
+            index.remove(deadWorkerId);
             List<TaskAssignment> deadWorkerTasks = assignedTasks.values().stream()
                 .filter(assignment -> deadWorkerId.equals(assignment.workerId))
                 .toList();
@@ -152,11 +261,16 @@ public class SmartScheduler extends Scheduler {
                 System.out.println("[FAULT TOLERANCE] Worker " + deadWorkerId + 
                     " is dead, recovering task " + deadTask.taskId);
                     
+                String attempt = attemptKey(keyOf(deadTask.task), deadWorkerId);
+                assignedTasks.remove(attempt);
+                taskAssignmentTimes.remove(attempt);
+                notifyAttemptLost(deadTask.task, deadWorkerId);
+                if (finishedTasks.contains(keyOf(deadTask.task))) continue;
+                if (deadWorkerId.equals(deadTask.task.pinnedWorker)) continue; // el estado del tile se perdió con el worker
                 enqueue(deadTask.task);
-                assignedTasks.remove(deadTask.taskId);
-                taskAssignmentTimes.remove(deadTask.taskId);
                 
                 if (mqtt != null) {
+                    mqtt.snapshots().taskRecovered();
                     mqtt.publishJson("gridmr/scheduler/task/recovered", Map.of(
                         "taskId", deadTask.taskId,
                         "workerId", deadWorkerId,
@@ -168,31 +282,118 @@ public class SmartScheduler extends Scheduler {
             
             System.out.println("[FAULT TOLERANCE] Removed dead worker " + deadWorkerId + 
                 ", recovered " + deadWorkerTasks.size() + " tasks");
+            stepTasks.removeIf(t -> deadWorkerId.equals(t.pinnedWorker));
+            Consumer<String> listener = onWorkerLost;
+            if (listener != null) listener.accept(deadWorkerId);
         }
     }
 
+    /**
+     * La asignación no llegó al worker (falló el envío): se re-encola ya,
+     * sin esperar el timeout de asignación.
+     */
+    @Override
+    public void onTaskLost(Task task, String workerId) {
+        TaskAssignment a = assignedTasks.get(attemptKey(keyOf(task), workerId));
+        if (a != null) recoverAttempt(a, "send_failed");
+    }
+
+    /**
+     * El worker reportó la tarea pero el master no pudo registrar su resultado
+     * (falló la ingesta): se re-encola ya en vez de darla por terminada.
+     */
+    public void onTaskFailed(String jobId, String taskId, String workerId) {
+        String key = jobId + "/" + taskId;
+        // Una copia que reportó mientras tanto fue descartada como duplicada: la tarea no terminó
+        finishedTasks.remove(key);
+        TaskAssignment a = assignedTasks.get(attemptKey(key, workerId));
+        if (a != null) recoverAttempt(a, "ingest_failed");
+    }
+
+    /**
+     * Se cerró el stream de push del worker: sus tareas en curso se re-encolan
+     * ya. Si el worker igual las completa, gana la primera copia.
+     */
+    @Override
+    public void onWorkerDisconnected(String workerId) {
+        int recovered = 0;
+        for (TaskAssignment a : assignedTasks.values()) {
+            if (workerId.equals(a.workerId) && recoverAttempt(a, "stream_closed")) recovered++;
+        }
+        if (recovered > 0) {
+            System.out.println("[FAULT TOLERANCE] Worker " + workerId + " stream closed, recovered " + recovered + " tasks");
+        }
+    }
+
+    /**
+     * Quita el intento y re-encola la tarea, salvo que otra copia ya la haya
+     * completado. Devuelve false si el intento ya no estaba (otro camino lo recuperó).
+     */
+    private boolean recoverAttempt(TaskAssignment a, String reason) {
+        String key = keyOf(a.task);
+        String attempt = attemptKey(key, a.workerId);
+        if (assignedTasks.remove(attempt) == null) return false;
+        taskAssignmentTimes.remove(attempt);
+        notifyAttemptLost(a.task, a.workerId);
+        Worker worker = workers.get(a.workerId);
+        if (worker != null) worker.onTaskFailed();
+        if (finishedTasks.contains(key)) return true;
+        System.out.println("[FAULT TOLERANCE] Task " + key + " lost on " + a.workerId + " (" + reason + "), re-queueing");
+        enqueue(a.task);
+        if (mqtt != null) {
+            long now = System.currentTimeMillis();
+            mqtt.snapshots().taskRecovered();
+            mqtt.publishJson("gridmr/scheduler/task/recovered", Map.of(
+                    "taskId", a.taskId,
+                    "workerId", a.workerId,
+                    "reason", reason,
+                    "ts", now
+            ));
+        }
+        return true;
+    }
+
+    /**
+     * Callback con el id de cada worker dado por muerto (los jobs stencil que
+     * guardaban tiles en él no pueden continuar).
+     */
+    public void setOnWorkerLost(Consumer<String> callback) {
+        this.onWorkerLost = callback;
+    }
+
     @Override
     public void enqueue(Task task) {
+        task.enqueuedAt = System.currentTimeMillis();
+        // Los pasos stencil no se especulan: no hace falta seguir su fase
+        if (task.type != TaskType.STEP) {
+            phases.computeIfAbsent(phaseOf(task), k -> new PhaseStats()).tasks.add(keyOf(task));
+        }
+
         // Separar tareas por tipo para mejor manejo
         if (task.type == TaskType.MAP) {
             mapTasks.offer(task);
         } else if (task.type == TaskType.REDUCE) {
             reduceTasks.offer(task);
+        } else if (task.type == TaskType.STEP) {
+            stepTasks.offer(task);
         }
 
-        // Publicar métrica de tarea encolada
+        // Métrica de tarea encolada: agregada en el snapshot, evento solo con MQTT_EVENTS
         if (mqtt != null) {
-            mqtt.publishJson("gridmr/scheduler/task/queued", Map.of(
+            mqtt.snapshots().taskQueued(task.jobId);
+            mqtt.publishEvent("gridmr/scheduler/task/queued", () -> Map.of(
                     "taskId", task.taskId,
                     "jobId", task.jobId,
                     "type", task.type.toString(),
                     "queueSizes", Map.of(
                             "map", mapTasks.size(),
-                            "reduce", reduceTasks.size()
+                            "reduce", reduceTasks.size(),
+                            "step", stepTasks.size()
                     ),
                     "ts", System.currentTimeMillis()
             ));
         }
+        notifyEnqueued();
     }
 
     @Override
@@ -203,161 +404,217 @@ public class SmartScheduler extends Scheduler {
         }
     }
 
+    @Override
+    public int queuedTasks() {
+        return mapTasks.size() + reduceTasks.size() + stepTasks.size();
+    }
+
     /**
      * Selecciona el mejor worker para una tarea basándose en métricas de carga.
+     * El índice se mantiene al asignar, completar y recibir heartbeats, así que
+     * esto no recorre ni ordena todos los workers.
      */
     public Worker selectBestWorker(TaskType taskType) {
-        List<Worker> availableWorkers = workers.values().stream()
-                .filter(Worker::canAcceptTask)
-                .sorted(Comparator.comparingDouble(Worker::getLoadScore))
-                .limit(3) // Considerar solo los 3 mejores para evitar siempre el mismo
-                .toList();
-
-        if (availableWorkers.isEmpty()) {
-            return null;
-        }
-
-        // Si hay empate en los top workers, usar round-robin simple
-        Worker selected = availableWorkers.get(0);
-
-        // Log de la selección para debugging
-        System.out.println("[SMART SCHEDULER] Selected worker " + selected.workerId +
-                " (score: " + String.format("%.3f", selected.getLoadScore()) +
-                ", load: " + selected.activeTasks + "/" + selected.capacity + ")");
-
-        return selected;
+        return index.best();
     }
 
     /**
      * Intenta asignar la próxima tarea al worker solicitante.
-     * Si el worker no es óptimo, puede devolver null para que espere.
+     * Si el worker no es óptimo, puede devolver null para que espere; en ese
+     * caso la cola no se toca, así el orden FIFO se mantiene.
      */
     public Task getNextTaskForWorker(String workerId) {
         Worker requestingWorker = workers.get(workerId);
-        System.out.println("[SMART SCHEDULER] Worker " + workerId + " request. Found: " + (requestingWorker != null));
-
         if (requestingWorker == null) {
-            System.out.println("[SMART SCHEDULER] Worker " + workerId + " not found in registry");
+            log.info("unknown:" + workerId, "[SMART SCHEDULER] Worker " + workerId + " not found in registry");
             return null;
         }
+        index.track(requestingWorker);
 
-        if (!requestingWorker.canAcceptTask()) {
-            System.out.println("[SMART SCHEDULER] Worker " + workerId + " cannot accept task (health: " +
-                    requestingWorker.isHealthy() + ", tasks: " + requestingWorker.activeTasks +
-                    "/" + requestingWorker.capacity + ")");
+        if (!requestingWorker.isHealthy() || queuedTasks() == 0) {
+            return null;
+        }
+        boolean pinned = hasPinnedTask(workerId);
+        if (!requestingWorker.canAcceptTask() && !pinned) {
             return null;
         }
 
-        // Priorizar REDUCE sobre MAP para completar trabajos más rápido
-        Task task = reduceTasks.poll();
-        if (task == null) {
-            task = mapTasks.poll();
+        // Si el worker solicitante no es el mejor, dársela de todos modos si la
+        // diferencia de score es pequeña (< 0.2) para evitar starvation.
+        // Los pasos fijados a este worker solo los puede correr él.
+        Worker bestWorker = index.best();
+        if (bestWorker != null && !bestWorker.workerId.equals(workerId) && !pinned
+                && requestingWorker.getLoadScore() - bestWorker.getLoadScore() >= 0.2) {
+            return null;
         }
 
-        System.out.println("[SMART SCHEDULER] Queue sizes - MAP: " + mapTasks.size() +
-                ", REDUCE: " + reduceTasks.size() + ", Task assigned: " + (task != null));
+        // Reservar el slot antes de sacar la tarea: dos pedidos concurrentes no exceden la capacidad.
+        // Un worker sin slots utilizables por presión de recursos sigue corriendo
+        // los pasos fijados a él (sus tiles no existen en otro lado), pero nada más.
+        boolean pinnedOnly = false;
+        if (!requestingWorker.tryAssign()) {
+            if (!pinned || !requestingWorker.tryAssign(requestingWorker.capacity)) {
+                return null;
+            }
+            pinnedOnly = true;
+        }
 
-        if (task != null) {
-            // Seleccionar el mejor worker para esta tarea
-            Worker bestWorker = selectBestWorker(task.type);
+        // Priorizar pasos stencil (cortos, y de ellos dependen los vecinos) y
+        // REDUCE sobre MAP para completar trabajos más rápido
+        Task task = pollRunnable(stepTasks, workerId, pinnedOnly);
+        if (task == null && !pinnedOnly) {
+            task = pollRunnable(reduceTasks, workerId, false);
+        }
+        if (task == null && !pinnedOnly) {
+            task = pollRunnable(mapTasks, workerId, false);
+        }
+        if (task == null) {
+            requestingWorker.onTaskFailed(); // liberar la reserva
+            return null;
+        }
 
-            // Si el worker solicitante no es el mejor, considerar dársela de todos modos
-            // si la diferencia no es muy grande (evitar starvation)
-            boolean assignToRequester = false;
+        long assignmentTime = System.currentTimeMillis();
+        task.assignedAt = assignmentTime;
+        task.assignedTo = workerId;
+        String attempt = attemptKey(keyOf(task), workerId);
+        taskAssignmentTimes.put(attempt, assignmentTime);
 
-            if (bestWorker == null) {
-                // No hay workers disponibles, devolver tarea a cola
-                if (task.type == TaskType.MAP) {
-                    mapTasks.offer(task);
-                } else {
-                    reduceTasks.offer(task);
-                }
-                return null;
-            }
+        // Registrar asignación para fault tolerance
+        assignedTasks.put(attempt, new TaskAssignment(task.taskId, workerId, task));
 
-            if (bestWorker.workerId.equals(workerId)) {
-                assignToRequester = true;
-            } else {
-                // Calcular diferencia de score
-                double scoreDiff = requestingWorker.getLoadScore() - bestWorker.getLoadScore();
-                // Si la diferencia es pequeña (< 0.2), asignar al solicitante para evitar starvation
-                if (scoreDiff < 0.2) {
-                    assignToRequester = true;
-                }
-            }
+        log.info("assign", "[SMART SCHEDULER] Assigned " + task.jobId + "/" + task.taskId + " to " + workerId
+                + " (load " + requestingWorker.activeTasks.get() + "/" + requestingWorker.usableSlots()
+                + " of " + requestingWorker.capacity
+                + ", queued MAP " + mapTasks.size() + " REDUCE " + reduceTasks.size() + " STEP " + stepTasks.size() + ")");
 
-            if (assignToRequester) {
-                // Asignar tarea y actualizar métricas
-                requestingWorker.onTaskAssigned();
-                long assignmentTime = System.currentTimeMillis();
-                taskAssignmentTimes.put(task.taskId, assignmentTime);
-                
-                // NUEVO: Registrar asignación para fault tolerance
-                assignedTasks.put(task.taskId, new TaskAssignment(task.taskId, workerId, task));
+        // Publicar métrica de asignación
+        if (mqtt != null) {
+            String taskId = task.taskId;
+            mqtt.snapshots().taskAssigned(task.jobId, workerId);
+            mqtt.publishEvent("gridmr/scheduler/task/assigned", () -> Map.of(
+                    "taskId", taskId,
+                    "workerId", workerId,
+                    "workerLoad", requestingWorker.activeTasks.get(),
+                    "workerCapacity", requestingWorker.capacity,
+                    "workerScore", requestingWorker.getLoadScore(),
+                    "ts", assignmentTime
+            ));
+        }
 
-                // Publicar métrica de asignación
-                if (mqtt != null) {
-                    mqtt.publishJson("gridmr/scheduler/task/assigned", Map.of(
-                            "taskId", task.taskId,
-                            "workerId", workerId,
-                            "workerLoad", requestingWorker.activeTasks,
-                            "workerCapacity", requestingWorker.capacity,
-                            "workerScore", requestingWorker.getLoadScore(),
-                            "ts", assignmentTime
-                    ));
-                }
+        return task;
+    }
 
-                return task;
-            } else {
-                // Devolver tarea a cola y que el worker espere
-                if (task.type == TaskType.MAP) {
-                    mapTasks.offer(task);
-                } else {
-                    reduceTasks.offer(task);
-                }
-                return null;
+    /**
+     * Saca de la cola la primera tarea que este worker puede ejecutar, sin
+     * alterar el orden del resto: descarta copias de tareas ya completadas y
+     * salta las copias de tareas que este mismo worker ya ejecuta. Con
+     * pinnedOnly solo toma tareas fijadas a este worker.
+     */
+    private Task pollRunnable(BlockingQueue<Task> queue, String workerId, boolean pinnedOnly) {
+        for (Iterator<Task> it = queue.iterator(); it.hasNext(); ) {
+            Task t = it.next();
+            String key = keyOf(t);
+            if (finishedTasks.contains(key)) {
+                it.remove();
+                continue;
             }
+            if (assignedTasks.containsKey(attemptKey(key, workerId))) continue;
+            if (t.pinnedWorker == null ? pinnedOnly : !t.pinnedWorker.equals(workerId)) continue;
+            // Otro hilo pudo tomarla entre next() y remove()
+            if (queue.remove(t)) return t;
         }
-
         return null;
     }
 
+    private boolean hasPinnedTask(String workerId) {
+        for (Task t : stepTasks) {
+            if (workerId.equals(t.pinnedWorker)) return true;
+        }
+        return false;
+    }
+
     /**
      * Notifica cuando una tarea se completa para actualizar métricas.
+     * Solo la primera copia que completa cuenta; las siguientes se registran
+     * como completaciones duplicadas (trabajo desperdiciado).
      */
-    public void onTaskCompleted(String taskId, String workerId) {
+    public void onTaskCompleted(String jobId, String taskId, String workerId) {
+        String key = jobId + "/" + taskId;
+        String attempt = attemptKey(key, workerId);
+        Long assignmentTime = taskAssignmentTimes.remove(attempt);
+        TaskAssignment assignment = assignedTasks.remove(attempt);
         Worker worker = workers.get(workerId);
-        if (worker != null) {
-            Long assignmentTime = taskAssignmentTimes.remove(taskId);
-            if (assignmentTime != null) {
-                long duration = System.currentTimeMillis() - assignmentTime;
-                worker.onTaskCompleted(duration);
+        if (assignmentTime == null) return;
+        long duration = System.currentTimeMillis() - assignmentTime;
+
+        if (!finishedTasks.add(key)) {
+            duplicateCompletions.incrementAndGet();
+            wastedTaskMs.addAndGet(duration);
+            if (worker != null) worker.onTaskFailed();
+            System.out.println("[SPECULATION] Duplicate completion of " + key + " by " + workerId
+                    + " ignored (" + duration + "ms wasted)");
+            return;
+        }
+        if (assignment != null) {
+            PhaseStats phase = phases.get(phaseOf(assignment.task));
+            if (phase != null) {
+                phase.completed.incrementAndGet();
+                phase.durations.add(duration);
+            }
+            if (assignment.task.speculative) speculativeWins.incrementAndGet();
+        }
+        if (speculatedTasks.contains(key)) {
+            // La copia que no llegó a asignarse ya no hace falta
+            mapTasks.removeIf(t -> keyOf(t).equals(key));
+            reduceTasks.removeIf(t -> keyOf(t).equals(key));
+        }
 
-                // NUEVO: Limpiar tracking de fault tolerance
-                assignedTasks.remove(taskId);
+        if (worker != null) {
+            worker.onTaskCompleted(duration);
 
-                // Publicar métrica de finalización
-                if (mqtt != null) {
-                    mqtt.publishJson("gridmr/scheduler/task/completed", Map.of(
-                            "taskId", taskId,
-                            "workerId", workerId,
-                            "durationMs", duration,
-                            "workerAvgTime", worker.avgTaskTimeMs,
-                            "ts", System.currentTimeMillis()
-                    ));
-                }
+            // Publicar métrica de finalización
+            if (mqtt != null) {
+                mqtt.snapshots().taskCompleted(jobId, workerId, duration);
+                mqtt.publishEvent("gridmr/scheduler/task/completed", () -> Map.of(
+                        "taskId", taskId,
+                        "workerId", workerId,
+                        "durationMs", duration,
+                        "workerAvgTime", worker.avgTaskTimeMs,
+                        "ts", System.currentTimeMillis()
+                ));
             }
         }
     }
-    
 
+    /**
+     * Olvida el estado de especulación de un job terminado. Las copias que
+     * todavía corren liberan su slot aquí; si completan después, se ignoran.
+     */
+    @Override
+    public void onJobFinished(String jobId) {
+        String prefix = jobId + "/";
+        finishedTasks.removeIf(k -> k.startsWith(prefix));
+        speculatedTasks.removeIf(k -> k.startsWith(prefix));
+        phases.keySet().removeIf(k -> k.startsWith(jobId + ":"));
+        mapTasks.removeIf(t -> jobId.equals(t.jobId));
+        reduceTasks.removeIf(t -> jobId.equals(t.jobId));
+        stepTasks.removeIf(t -> jobId.equals(t.jobId));
+        assignedTasks.entrySet().removeIf(e -> {
+            if (!e.getKey().startsWith(prefix)) return false;
+            Worker w = workers.get(e.getValue().workerId);
+            if (w != null) w.onTaskFailed();
+            taskAssignmentTimes.remove(e.getKey());
+            wastedTaskMs.addAndGet(System.currentTimeMillis() - e.getValue().assignedTime);
+            return true;
+        });
+    }
 
     /**
      * Obtiene estadísticas del scheduler para monitoreo.
      */
     public Map<String, Object> getSchedulerStats() {
         int healthyWorkers = (int) workers.values().stream().mapToLong(w -> w.isHealthy() ? 1 : 0).sum();
-        int totalActiveTasks = workers.values().stream().mapToInt(w -> w.activeTasks).sum();
+        int totalActiveTasks = workers.values().stream().mapToInt(w -> w.activeTasks.get()).sum();
         int totalCapacity = workers.values().stream().mapToInt(w -> w.capacity).sum();
 
         // Crear información detallada de cada worker
@@ -368,10 +625,17 @@ public class SmartScheduler extends Scheduler {
             workerInfo.put("id", entry.getKey());
             workerInfo.put("name", worker.name != null ? worker.name : entry.getKey());
             workerInfo.put("isHealthy", worker.isHealthy());
-            workerInfo.put("activeTasks", worker.activeTasks);
+            workerInfo.put("activeTasks", worker.activeTasks.get());
             workerInfo.put("capacity", worker.capacity);
-            workerInfo.put("completedTasks", worker.completedTasks);
-            workerInfo.put("loadPercentage", worker.capacity > 0 ? (double) worker.activeTasks / worker.capacity * 100 : 0.0);
+            workerInfo.put("usableSlots", worker.usableSlots());
+            workerInfo.put("cores", worker.cores);
+            workerInfo.put("loadAverage", worker.loadAverage);
+            workerInfo.put("memoryAvailableMb", worker.memoryAvailableMb);
+            workerInfo.put("diskFreeMb", worker.diskFreeMb);
+            workerInfo.put("queueDepth", worker.queueDepth);
+            workerInfo.put("slotUtilization", worker.slotUtilization);
+            workerInfo.put("completedTasks", worker.completedTasks.get());
+            workerInfo.put("loadPercentage", worker.capacity > 0 ? (double) worker.activeTasks.get() / worker.capacity * 100 : 0.0);
             workerInfo.put("loadScore", worker.getLoadScore());
             workerInfo.put("avgTaskTime", worker.avgTaskTimeMs);
             workerInfo.put("cpuUsage", worker.cpuUsage * 100);
@@ -388,11 +652,19 @@ public class SmartScheduler extends Scheduler {
         stats.put("totalCapacity", totalCapacity);
         stats.put("queueSizes", Map.of(
                 "map", mapTasks.size(),
-                "reduce", reduceTasks.size()
+                "reduce", reduceTasks.size(),
+                "step", stepTasks.size()
         ));
         stats.put("avgWorkerLoad", totalCapacity > 0 ? (double) totalActiveTasks / totalCapacity * 100 : 0.0);
+        stats.put("speculation", Map.of(
+                "enabled", speculationEnabled,
+                "launched", speculativeLaunched.get(),
+                "backupWins", speculativeWins.get(),
+                "duplicateCompletions", duplicateCompletions.get(),
+                "wastedTaskMs", wastedTaskMs.get()
+        ));
         stats.put("workers", workerDetails);
-        stats.put("algorithm", "Smart Scheduler (Hybrid: 50% Load + 30% Resources + 20% Performance)");
+        stats.put("algorithm", "Smart Scheduler (Hybrid: 50% Load + 30% Resources + 20% Performance, resource-capped slots)");
         
         return stats;
     }
@@ -0,0 +1,87 @@
+package core;
+
+import model.Worker;
+
+import java.util.Map;
+import java.util.concurrent.ConcurrentHashMap;
+import java.util.concurrent.ConcurrentSkipListSet;
+
+/**
+ * Workers that can take a task, ordered by {@link Worker#getLoadScore()}.
+ * <p>
+ * Each tracked worker re-indexes itself whenever its score inputs change
+ * (assign, complete, failure, heartbeat), so picking the best worker is a
+ * walk from the head of a skip list instead of a sort of every worker.
+ * Full workers, and workers whose reported resources leave them no usable
+ * slot, are left out of the index until that changes.
+ */
+public class WorkerIndex {
+    private record Entry(double score, String workerId, Worker worker) implements Comparable<Entry> {
+        @Override
+        public int compareTo(Entry o) {
+            int c = Double.compare(score, o.score);
+            return c != 0 ? c : workerId.compareTo(o.workerId);
+        }
+    }
+
+    private final Map<String, Worker> workers;
+    private final ConcurrentSkipListSet<Entry> ranked = new ConcurrentSkipListSet<>();
+    private final Map<String, Entry> current = new ConcurrentHashMap<>();
+
+    public WorkerIndex(Map<String, Worker> workers) {
+        this.workers = workers;
+    }
+
+    /**
+     * Start indexing a worker (no-op if it already is).
+     */
+    public void track(Worker w) {
+        if (current.containsKey(w.workerId)) return;
+        w.setOnChange(() -> update(w));
+        update(w);
+    }
+
+    /**
+     * Re-rank a worker after its load, capacity or metrics changed.
+     */
+    public void update(Worker w) {
+        current.compute(w.workerId, (id, old) -> {
+            if (old != null) ranked.remove(old);
+            Entry e = new Entry(w.getLoadScore(), id, w);
+            if (w.activeTasks.get() < w.usableSlots()) ranked.add(e);
+            return e;
+        });
+    }
+
+    public void remove(String workerId) {
+        current.computeIfPresent(workerId, (id, old) -> {
+            ranked.remove(old);
+            old.worker.setOnChange(null);
+            return null;
+        });
+    }
+
+    /**
+     * Lowest-score worker that can accept a task, or null. Entries of workers
+     * that left the registry are dropped on the way; stale ones are skipped.
+     */
+    public Worker best() {
+        return bestExcept(null);
+    }
+
+    public Worker bestExcept(String excludedId) {
+        for (Entry e : ranked) {
+            if (workers.get(e.workerId) != e.worker) {
+                remove(e.workerId);
+                continue;
+            }
+            if (e.workerId.equals(excludedId) || !e.worker.canAcceptTask()) continue;
+            return e.worker;
+        }
+        return null;
+    }
+
+    public int size() {
+        return current.size();
+    }
+}
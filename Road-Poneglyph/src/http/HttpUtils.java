@@ -4,7 +4,11 @@ import com.google.gson.Gson;
 import com.sun.net.httpserver.HttpExchange;
 
 import java.io.*;
+import java.net.URLDecoder;
 import java.nio.charset.StandardCharsets;
+import java.util.LinkedHashMap;
+import java.util.Map;
+import java.util.zip.GZIPInputStream;
 
 public final class HttpUtils {
     private static final Gson gson = new Gson();
@@ -12,12 +16,31 @@ public final class HttpUtils {
     private HttpUtils() {
     }
 
+    /**
+     * Request body as UTF-8; bodies sent with "Content-Encoding: gzip" (large
+     * worker completions) are inflated on the way in.
+     */
     public static String readBody(HttpExchange ex) throws IOException {
-        try (InputStream is = ex.getRequestBody()) {
+        InputStream raw = ex.getRequestBody();
+        String encoding = ex.getRequestHeaders().getFirst("Content-Encoding");
+        try (InputStream is = "gzip".equalsIgnoreCase(encoding) ? new GZIPInputStream(raw, 64 * 1024) : raw) {
             return new String(is.readAllBytes(), StandardCharsets.UTF_8);
         }
     }
 
+    public static Map<String, String> queryParams(HttpExchange ex) {
+        Map<String, String> params = new LinkedHashMap<>();
+        String q = ex.getRequestURI().getRawQuery();
+        if (q == null || q.isEmpty()) return params;
+        for (String pair : q.split("&")) {
+            int eq = pair.indexOf('=');
+            String k = eq < 0 ? pair : pair.substring(0, eq);
+            String v = eq < 0 ? "" : pair.substring(eq + 1);
+            params.put(URLDecoder.decode(k, StandardCharsets.UTF_8), URLDecoder.decode(v, StandardCharsets.UTF_8));
+        }
+        return params;
+    }
+
     public static void respond(HttpExchange ex, int code, String body, String contentType) throws IOException {
         byte[] bytes = body == null ? new byte[0] : body.getBytes(StandardCharsets.UTF_8);
         ex.getResponseHeaders().set("Content-Type", contentType);
@@ -30,4 +53,72 @@ public final class HttpUtils {
     public static void respondJson(HttpExchange ex, int code, Object obj) throws IOException {
         respond(ex, code, gson.toJson(obj), "application/json");
     }
+
+    /** Writes a (possibly large) string value piece by piece. */
+    public interface StringSource {
+        void writeTo(Writer out) throws IOException;
+    }
+
+    /**
+     * 200 response with the JSON object {@code head} plus one string field
+     * whose value is streamed from {@code value} with chunked transfer, so a
+     * large value (a reduce partition) is never built as one String.
+     */
+    public static void respondJsonStreamed(HttpExchange ex, Map<String, Object> head, String field,
+                                           StringSource value) throws IOException {
+        String json = gson.toJson(head);
+        ex.getResponseHeaders().set("Content-Type", "application/json");
+        ex.sendResponseHeaders(200, 0);
+        try (Writer w = new BufferedWriter(new OutputStreamWriter(ex.getResponseBody(), StandardCharsets.UTF_8), 64 * 1024)) {
+            w.write(json, 0, json.length() - 1); // without the closing brace
+            if (!head.isEmpty()) w.write(',');
+            w.write(gson.toJson(field));
+            w.write(":\"");
+            value.writeTo(new JsonStringWriter(w));
+            w.write("\"}");
+        }
+    }
+
+    /** Escapes what is written to it as the inside of a JSON string. */
+    private static final class JsonStringWriter extends Writer {
+        private final Writer out;
+
+        JsonStringWriter(Writer out) {
+            this.out = out;
+        }
+
+        @Override
+        public void write(int c) throws IOException {
+            switch (c) {
+                case '"' -> out.write("\\\"");
+                case '\\' -> out.write("\\\\");
+                case '\n' -> out.write("\\n");
+                case '\r' -> out.write("\\r");
+                case '\t' -> out.write("\\t");
+                default -> {
+                    if (c < 0x20 || c == 0x2028 || c == 0x2029) out.write(String.format("\\u%04x", c));
+                    else out.write(c);
+                }
+            }
+        }
+
+        @Override
+        public void write(char[] buf, int off, int len) throws IOException {
+            for (int i = off; i < off + len; i++) write(buf[i]);
+        }
+
+        @Override
+        public void write(String str, int off, int len) throws IOException {
+            for (int i = off; i < off + len; i++) write(str.charAt(i));
+        }
+
+        @Override
+        public void flush() throws IOException {
+            out.flush();
+        }
+
+        @Override
+        public void close() {
+        }
+    }
 }
@@ -1,19 +1,126 @@
 package model;
 
+import cache.MapOutputCache;
+import shuffle.ShuffleStore;
+import stencil.StencilJob;
+import store.JobInput;
+import store.ResultSegments;
+import store.ResultUploader;
+
+import profile.JobProfile;
+
+import java.io.IOException;
+import java.security.MessageDigest;
+import java.security.NoSuchAlgorithmException;
 import java.util.*;
+import java.util.concurrent.ConcurrentHashMap;
+import java.util.concurrent.CopyOnWriteArrayList;
+import java.util.concurrent.atomic.AtomicBoolean;
+import java.util.concurrent.atomic.AtomicInteger;
 
 public class JobCtx {
     public JobSpec spec;
-    public JobState state = JobState.PENDING;
+    public volatile JobState state = JobState.PENDING;
 
+    public JobInput input; // null when the input came inline as input_text
     public List<Task> mapTasks = new ArrayList<>();
-    public Map<Integer, List<String>> partitionKV = new HashMap<>();
-    public List<Task> reduceTasks = new ArrayList<>();
+    public ShuffleStore shuffle; // null for stencil jobs
+    public List<Task> reduceTasks = new CopyOnWriteArrayList<>();
 
-    public String finalOutput = "";
+    public ResultSegments result; // reduce outputs, one segment per partition
+    public ResultUploader uploader; // null when results are not copied to S3
+    public final AtomicBoolean uploadSubmitted = new AtomicBoolean(); // this run's result was queued for upload
+    public volatile String s3Key; // set once the S3 upload finished
     public byte[] mapScript;
     public byte[] reduceScript;
+    public byte[] combineScript; // null when the job has no combiner
+    // sha256 of each script; workers cache scripts by it and fetch the bytes only on a miss
+    public String mapScriptSha;
+    public String reduceScriptSha;
+    public String combineScriptSha;
+
+    // Completions arrive concurrently (HTTP pool + gRPC threads); the thread whose
+    // increment reaches the total is the only one that advances the job.
+    public final AtomicInteger completedMaps = new AtomicInteger();
+    public final AtomicInteger completedReduces = new AtomicInteger();
+    public volatile boolean mergeScheduled = false; // final reduce over the partial outputs of split keys
+    public Set<String> completedTaskIds = ConcurrentHashMap.newKeySet();
+
+    // Phase boundaries (epoch ms, 0 until reached) and input size, for /api/jobs/debug
+    public final long submittedAt = System.currentTimeMillis();
+    public volatile long mapsDoneAt;
+    public volatile long finishedAt;
+    public long inputBytes;
+
+    public StencilJob stencil; // null for MapReduce jobs
+    public volatile String error; // why the job FAILED
+
+    public final JobProfile profile = new JobProfile(submittedAt); // task phase timings, for /api/jobs/profile
+
+    public MapOutputCache mapCache; // null when the job does not use the map output cache
+    public final AtomicInteger mapCacheHits = new AtomicInteger();
+    public final AtomicInteger mapCacheMisses = new AtomicInteger();
+    // Map tasks that run with a cache key (taskId -> key), and the tasks with
+    // identical chunks that complete from each one's output instead of running
+    public final Map<String, String> mapCacheKeys = new ConcurrentHashMap<>();
+    public final Map<String, List<Task>> mapDuplicates = new ConcurrentHashMap<>();
+
+    /**
+     * Record the first completion of a task. Returns false for a duplicate
+     * (a speculative copy or a retried report), which must be ignored.
+     */
+    public boolean markCompleted(String taskId) {
+        return completedTaskIds.add(taskId);
+    }
+
+    /**
+     * Compute the script hashes; call once the scripts are set.
+     */
+    public void hashScripts() {
+        mapScriptSha = sha256(mapScript);
+        reduceScriptSha = sha256(reduceScript);
+        combineScriptSha = sha256(combineScript);
+    }
+
+    private static String sha256(byte[] data) {
+        if (data == null) return null;
+        try {
+            return HexFormat.of().formatHex(MessageDigest.getInstance("SHA-256").digest(data));
+        } catch (NoSuchAlgorithmException e) {
+            throw new IllegalStateException(e);
+        }
+    }
+
+    /**
+     * Input text of a map task, read from the uploaded input if it has no inline chunk.
+     */
+    public String mapInput(Task t) throws IOException {
+        if (t.inputChunk != null || input == null) return t.inputChunk == null ? "" : t.inputChunk;
+        return input.read(t.inputOffset, t.inputLength);
+    }
+
+    public Task reduceTask(String taskId) {
+        for (Task t : reduceTasks) {
+            if (t.taskId.equals(taskId)) return t;
+        }
+        return null;
+    }
+
+    /**
+     * Store one reduce task's output as its partition's result segment. Call
+     * before counting the reduce as completed so whoever finishes the job
+     * sees every segment.
+     */
+    public void addReduceOutput(String taskId, String out) throws IOException {
+        Task t = reduceTask(taskId);
+        if (t == null) throw new IOException("unknown reduce task " + taskId);
+        result.write(t.partitionIndex, out);
+    }
 
-    public int completedMaps = 0;
-    public int completedReduces = 0;
+    /**
+     * Map output and reduce input travel as binary record blocks instead of text.
+     */
+    public boolean binaryIntermediate() {
+        return "binary".equals(spec.intermediate_format) || "records".equals(spec.intermediate_format);
+    }
 }
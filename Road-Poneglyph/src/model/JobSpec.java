@@ -1,14 +1,30 @@
 package model;
 
 /**
- * Client-submitted MapReduce program and config
+ * Client-submitted MapReduce program and config, or an iterative stencil
+ * job (mode "stencil", see stencil.StencilJob) that needs no scripts
  */
 public class JobSpec {
     public String job_id;
     public String input_text;
+    public String input_id; // uploaded via POST /api/jobs/input, used instead of input_text
     public Integer split_size;
     public Integer reducers;
     public String format;
     public String map_script_b64;
     public String reduce_script_b64;
+    public String combine_script_b64; // optional map-side combiner
+    public String intermediate_format; // "text" (default), "binary" or "records" (gRPC workers only)
+    public String intermediate_compression; // "none" (default) or "deflate"
+    public Boolean map_cache; // reuse cached output of identical chunks (default true)
+    public String partitioner; // "hash" (default) or "range" (see core.Partitioners)
+    public Boolean split_hot_keys; // spread dominant keys over several reducers + final merge reduce
+    public Boolean reduce_preserves_keys; // reduce.py prints "key\tvalue" for its input keys and accepts its own output (required by split_hot_keys)
+    public Double partition_sample; // fraction of map outputs sampled before partitioning (default 0.1)
+    public String mode; // "mapreduce" (default) or "stencil"
+    public Integer generations; // stencil: generations to compute (default 1)
+    public Integer tile_size; // stencil: tile side in cells (default 256)
+    public String rule; // stencil: Life-like rule (default "B3/S23", Conway)
+    public Boolean wrap; // stencil: the grid is a torus instead of dead cells all around
+    public Boolean cprofile; // run map/combine/reduce scripts under cProfile and report their hot functions
 }
@@ -1,17 +1,52 @@
 package model;
 
-import java.util.ArrayList;
-import java.util.List;
+import stencil.StencilJob;
 
 public class Task {
     public String taskId;
     public String jobId;
     public TaskType type;
 
-    // MAP
+    // MAP: inline text, or a byte range of the job's uploaded input (read at dispatch time)
     public String inputChunk;
+    public long inputOffset;
+    public int inputLength;
+    public String cacheKey; // content address of the output (MapOutputCache), null when not cached
 
-    // REDUCE
+    // REDUCE (input is read from JobCtx.shuffle at dispatch time)
     public int partitionIndex;
-    public List<String> kvLinesForReduce = new ArrayList<>();
+
+    // STEP: one generation of one tile; after generation 1 it must run on the
+    // worker that holds the tile (pinnedWorker)
+    public int tile;
+    public int generation;
+    public String pinnedWorker;
+    public StencilJob.Halo halo;
+
+    // Backup copy launched for a straggler (speculative execution)
+    public boolean speculative;
+
+    // Current attempt: when it was queued and handed out, and to whom (epoch ms,
+    // 0 until then). Feed the job profile (profile.JobProfile).
+    public volatile long enqueuedAt;
+    public volatile long assignedAt;
+    public volatile String assignedTo;
+
+    public Task backupCopy() {
+        Task t = new Task();
+        t.taskId = taskId;
+        t.jobId = jobId;
+        t.type = type;
+        t.inputChunk = inputChunk;
+        t.inputOffset = inputOffset;
+        t.inputLength = inputLength;
+        t.cacheKey = cacheKey;
+        t.partitionIndex = partitionIndex;
+        t.tile = tile;
+        t.generation = generation;
+        t.pinnedWorker = pinnedWorker;
+        t.halo = halo;
+        t.speculative = true;
+        return t;
+    }
 }
@@ -2,5 +2,6 @@ package model;
 
 public enum TaskType {
     MAP,
-    REDUCE
+    REDUCE,
+    STEP // one generation of one tile of a stencil job
 }
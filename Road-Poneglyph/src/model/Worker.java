@@ -1,31 +1,57 @@
 package model;
 
+import java.util.concurrent.atomic.AtomicInteger;
+import java.util.concurrent.atomic.AtomicLong;
+
 public class Worker {
+    // Umbrales de presión de recursos (ver usableSlots)
+    public static final double MEMORY_PRESSURE =
+            Double.parseDouble(System.getenv().getOrDefault("WORKER_MEMORY_PRESSURE", "0.90"));
+    public static final long MIN_DISK_FREE_MB =
+            Long.parseLong(System.getenv().getOrDefault("WORKER_MIN_DISK_FREE_MB", "256"));
+    public static final double LOAD_SATURATED = 2.0; // procesos ejecutables por core
+
     public String workerId;
     public String name;
-    public int capacity;
-    public long lastHeartbeat = System.currentTimeMillis();
+    public volatile int capacity;
+    public volatile long lastHeartbeat = System.currentTimeMillis();
 
-    // Métricas de rendimiento
-    public int activeTasks = 0;
-    public int completedTasks = 0;
-    public double avgTaskTimeMs = 0.0;
-    public long totalTaskTimeMs = 0;
+    // Métricas de rendimiento (se actualizan desde hilos HTTP y gRPC)
+    public final AtomicInteger activeTasks = new AtomicInteger();
+    public final AtomicInteger completedTasks = new AtomicInteger();
+    public final AtomicLong totalTaskTimeMs = new AtomicLong();
+    public volatile double avgTaskTimeMs = 0.0;
 
-    // Recursos del sistema (reportados por el worker)
-    public double cpuUsage = 0.0;     // 0.0 - 1.0
-    public double memoryUsage = 0.0;  // 0.0 - 1.0
+    // Recursos del sistema (reportados por el worker en cada heartbeat)
+    public volatile double cpuUsage = 0.0;     // 0.0 - 1.0
+    public volatile double memoryUsage = 0.0;  // 0.0 - 1.0
+    public volatile double cores = 0.0;        // CPUs utilizables (afinidad, cuota del cgroup); 0 = desconocido
+    public volatile double loadAverage = 0.0;  // load average de 1 minuto por core
+    public volatile long memoryAvailableMb = -1;
+    public volatile long diskFreeMb = -1;      // -1 = desconocido
+    public volatile double[] slotUtilization = new double[0]; // fracción ocupada de cada slot
+    public volatile int queueDepth = 0;        // asignaciones recibidas que esperan un slot libre
+    // Tareas que el worker corre o tiene en cola sin que el master las cuente
+    // (p. ej. tareas dadas por perdidas por timeout que siguen ejecutándose)
+    public volatile int untrackedTasks = 0;
+
+    // Aviso al índice del scheduler cuando cambia el score (ver WorkerIndex)
+    private transient volatile Runnable onChange;
 
     /**
      * Calcula un score de carga para este worker.
      * Score más bajo = mejor candidato para asignar tareas.
      */
     public double getLoadScore() {
-        if (capacity <= 0) return Double.MAX_VALUE;
+        int cap = capacity;
+        if (cap <= 0) return Double.MAX_VALUE;
 
-        double loadFactor = (double) activeTasks / capacity;
-        double resourceFactor = (cpuUsage + memoryUsage) / 2.0;
-        double performanceFactor = avgTaskTimeMs > 0 ? avgTaskTimeMs / 10000.0 : 0.1; // Normalizar a ~10s
+        double loadFactor = (double) (activeTasks.get() + untrackedTasks) / cap;
+        // CPU ajena: la que usan otros procesos del nodo, no nuestras tareas (ya están en loadFactor)
+        double cpu = cores > 0 ? Math.min(1.0, foreignCpu() / cores) : cpuUsage;
+        double resourceFactor = (Math.max(cpu, Math.min(1.0, loadAverage / LOAD_SATURATED)) + memoryUsage) / 2.0;
+        double avg = avgTaskTimeMs;
+        double performanceFactor = avg > 0 ? avg / 10000.0 : 0.1; // Normalizar a ~10s
 
         // Pesos: carga actual (50%), recursos (30%), rendimiento (20%)
         return loadFactor * 0.5 + resourceFactor * 0.3 + performanceFactor * 0.2;
@@ -42,31 +68,101 @@ public class Worker {
      * Verifica si el worker puede tomar más tareas.
      */
     public boolean canAcceptTask() {
-        return isHealthy() && activeTasks < capacity;
+        return isHealthy() && activeTasks.get() < usableSlots();
+    }
+
+    /**
+     * Slots que el scheduler puede llenar según los recursos reportados.
+     * Sin memoria o sin disco libre el nodo no recibe trabajo nuevo; con la
+     * CPU ocupada por otros procesos se le asigna solo lo que queda libre,
+     * pero al menos una tarea para que un cluster saturado siga avanzando.
+     */
+    public int usableSlots() {
+        int cap = capacity - untrackedTasks;
+        if (memoryUsage >= MEMORY_PRESSURE) return 0;
+        long disk = diskFreeMb;
+        if (disk >= 0 && disk < MIN_DISK_FREE_MB) return 0;
+        double n = cores;
+        if (n > 0) {
+            cap = Math.min(cap, Math.max(1, (int) Math.round(n - foreignCpu())));
+        }
+        if (loadAverage >= LOAD_SATURATED) cap = Math.min(cap, 1);
+        return Math.max(0, cap);
+    }
+
+    /**
+     * Cores ocupados por procesos que no son tareas de este worker: el uso de
+     * CPU del nodo menos el tiempo que sus slots pasaron ejecutando tareas.
+     */
+    public double foreignCpu() {
+        double own = 0;
+        for (double u : slotUtilization) own += u;
+        return Math.max(0.0, cpuUsage * cores - own);
     }
 
     /**
      * Actualiza métricas cuando se completa una tarea.
      */
     public void onTaskCompleted(long taskDurationMs) {
-        activeTasks = Math.max(0, activeTasks - 1);
-        completedTasks++;
-        totalTaskTimeMs += taskDurationMs;
-        avgTaskTimeMs = (double) totalTaskTimeMs / completedTasks;
+        release();
+        int done = completedTasks.incrementAndGet();
+        long total = totalTaskTimeMs.addAndGet(taskDurationMs);
+        avgTaskTimeMs = (double) total / done;
+        changed();
+    }
+
+    /**
+     * Reserva un slot para una tarea. Falla si el worker ya está lleno, así
+     * dos asignaciones concurrentes no pueden exceder la capacidad.
+     */
+    public boolean tryAssign() {
+        return tryAssign(usableSlots());
+    }
+
+    /**
+     * Igual que {@link #tryAssign()} pero hasta {@code limit} tareas activas.
+     */
+    public boolean tryAssign(int limit) {
+        int n;
+        do {
+            n = activeTasks.get();
+            if (n >= limit) return false;
+        } while (!activeTasks.compareAndSet(n, n + 1));
+        changed();
+        return true;
     }
 
     /**
      * Incrementa el contador de tareas activas.
      */
     public void onTaskAssigned() {
-        activeTasks++;
+        activeTasks.incrementAndGet();
+        changed();
     }
-    
+
     /**
-     * Maneja una tarea fallida (timeout o worker muerto).
+     * Maneja una tarea fallida (timeout o worker muerto) o una reserva que no
+     * llegó a usarse.
      */
     public void onTaskFailed() {
-        activeTasks = Math.max(0, activeTasks - 1);
+        release();
         // No incrementar completedTasks ya que la tarea falló
+        changed();
+    }
+
+    private void release() {
+        activeTasks.updateAndGet(n -> Math.max(0, n - 1));
+    }
+
+    public void setOnChange(Runnable onChange) {
+        this.onChange = onChange;
+    }
+
+    /**
+     * Llamar después de modificar capacity, heartbeat o métricas de recursos.
+     */
+    public void changed() {
+        Runnable callback = onChange;
+        if (callback != null) callback.run();
     }
 }
@@ -0,0 +1,466 @@
+package profile;
+
+import com.google.gson.JsonArray;
+import com.google.gson.JsonElement;
+import com.google.gson.JsonObject;
+import gridmr.HotFunction;
+import gridmr.TaskProfile;
+import model.Task;
+
+import java.util.*;
+
+/**
+ * Where the time of a job's tasks went, phase by phase.
+ * <p>
+ * The master records when a task was queued, when it was handed to a worker
+ * and how long building the assignment and ingesting the result took; the
+ * worker reports its own phases with the completion (script fetch, input,
+ * interpreter start-up, user code, combiner, output, encoding). Whatever the
+ * worker did not account for between assignment and completion is
+ * "transfer": network, worker-side queueing and polling. It is derived from
+ * the master's clock only, so worker clock skew does not matter.
+ * <p>
+ * Served by GET /api/jobs/profile as per-phase percentiles ({@link #summary})
+ * or as a Chrome trace / Perfetto timeline ({@link #chromeTrace}).
+ */
+public class JobProfile {
+    // Completed attempts kept per job; later ones are only counted as dropped.
+    private static final int MAX_TASKS =
+            Integer.parseInt(System.getenv().getOrDefault("PROFILE_MAX_TASKS", "50000"));
+    // Attempts still running after this long are taken for lost when the profile is full.
+    private static final long STALE_MS =
+            Long.parseLong(System.getenv().getOrDefault("PROFILE_STALE_MS", "600000"));
+    private static final int TOP_HOT = 15;
+    private static final int TOP_SLOWEST = 10;
+    // Worker phases in the order they run; the timeline draws them back to back.
+    private static final List<String> WORKER_PHASES = List.of(
+            "fetch", "decode", "input", "startup", "user", "combine", "output", "encode");
+
+    /**
+     * Phase timings and hot functions a worker reported with a completion.
+     */
+    public record WorkerReport(Map<String, Double> phasesMs, int slot, List<Hot> hot) {
+        public static final WorkerReport NONE = new WorkerReport(Map.of(), -1, List.of());
+
+        /**
+         * The "profile" member of an HTTP completion, or NONE without one.
+         */
+        public static WorkerReport fromJson(JsonElement e) {
+            if (e == null || !e.isJsonObject()) return NONE;
+            JsonObject j = e.getAsJsonObject();
+            Map<String, Double> phases = new LinkedHashMap<>();
+            if (j.has("phases_ms") && j.get("phases_ms").isJsonObject()) {
+                for (Map.Entry<String, JsonElement> p : j.getAsJsonObject("phases_ms").entrySet()) {
+                    phases.put(p.getKey(), p.getValue().getAsDouble());
+                }
+            }
+            List<Hot> hot = new ArrayList<>();
+            if (j.has("hot") && j.get("hot").isJsonArray()) {
+                for (JsonElement h : j.getAsJsonArray("hot")) {
+                    JsonObject o = h.getAsJsonObject();
+                    hot.add(new Hot(o.get("name").getAsString(), o.get("calls").getAsLong(),
+                            o.get("self_ms").getAsDouble(), o.get("cumulative_ms").getAsDouble()));
+                }
+            }
+            return new WorkerReport(phases, j.has("slot") ? j.get("slot").getAsInt() : -1, hot);
+        }
+
+        /**
+         * The profile of a gRPC completion, or NONE when the worker sent none.
+         */
+        public static WorkerReport fromProto(boolean present, TaskProfile p) {
+            if (!present) return NONE;
+            List<Hot> hot = new ArrayList<>();
+            for (HotFunction h : p.getHotList()) {
+                hot.add(new Hot(h.getName(), h.getCalls(), h.getSelfMs(), h.getCumulativeMs()));
+            }
+            return new WorkerReport(new LinkedHashMap<>(p.getPhasesMsMap()), p.getSlot(), hot);
+        }
+    }
+
+    /**
+     * One function of a user script as measured by cProfile.
+     */
+    public record Hot(String name, long calls, double selfMs, double cumulativeMs) {
+    }
+
+    private static final class Attempt {
+        final String taskId;
+        final String type;
+        final String workerId;
+        final long enqueuedAt; // epoch ms, 0 when unknown
+        final long assignedAt;
+        final double buildMs;
+        long receivedAt;
+        double ingestMs;
+        boolean duplicate;
+        WorkerReport report = WorkerReport.NONE;
+
+        Attempt(String taskId, String type, String workerId, long enqueuedAt, long assignedAt, double buildMs) {
+            this.taskId = taskId;
+            this.type = type;
+            this.workerId = workerId;
+            this.enqueuedAt = enqueuedAt;
+            this.assignedAt = assignedAt;
+            this.buildMs = buildMs;
+        }
+
+        double workerMs() {
+            double sum = 0;
+            for (double ms : report.phasesMs().values()) sum += ms;
+            return sum;
+        }
+
+        // Between the assignment leaving the master and its result arriving, minus the worker's phases.
+        double transferMs() {
+            return Math.max(0, receivedAt - assignedAt - buildMs - workerMs());
+        }
+
+        // From queued (or assigned, when that is unknown) to the result being ingested.
+        double totalMs() {
+            return Math.max(0, receivedAt - (enqueuedAt > 0 ? enqueuedAt : assignedAt)) + ingestMs;
+        }
+
+        /**
+         * Every phase of the attempt in ms, master and worker ones alike.
+         */
+        Map<String, Double> phases() {
+            Map<String, Double> p = new LinkedHashMap<>();
+            if (enqueuedAt > 0) p.put("queue", (double) Math.max(0, assignedAt - enqueuedAt));
+            p.put("build", buildMs);
+            for (String phase : WORKER_PHASES) {
+                Double ms = report.phasesMs().get(phase);
+                if (ms != null) p.put(phase, ms);
+            }
+            for (Map.Entry<String, Double> e : report.phasesMs().entrySet()) {
+                p.putIfAbsent(e.getKey(), e.getValue()); // phases of newer workers
+            }
+            p.put("transfer", transferMs());
+            p.put("ingest", ingestMs);
+            p.put("total", totalMs());
+            return p;
+        }
+    }
+
+    private final long origin; // job submission, epoch ms
+    private final Map<String, Attempt> running = new HashMap<>(); // by taskId@workerId
+    private final List<Attempt> done = new ArrayList<>();
+    private final Set<String> completedTasks = new HashSet<>();
+    private long dropped;
+    private long lost;
+
+    public JobProfile(long submittedAt) {
+        this.origin = submittedAt;
+    }
+
+    /**
+     * Milliseconds since a System.nanoTime() reading.
+     */
+    public static double msSince(long nanoStart) {
+        return (System.nanoTime() - nanoStart) / 1e6;
+    }
+
+    private static String key(String taskId, String workerId) {
+        return taskId + "@" + workerId;
+    }
+
+    /**
+     * Record that a task was handed to task.assignedTo, once its assignment was built.
+     */
+    public synchronized void assigned(Task task, double buildMs) {
+        if (running.size() >= MAX_TASKS) evictStale();
+        if (running.size() >= MAX_TASKS) {
+            dropped++;
+            return;
+        }
+        long at = task.assignedAt > 0 ? task.assignedAt : System.currentTimeMillis() - (long) buildMs;
+        String worker = task.assignedTo == null ? "?" : task.assignedTo;
+        running.put(key(task.taskId, worker),
+                new Attempt(task.taskId, task.type.toString(), worker, task.enqueuedAt, at, buildMs));
+    }
+
+    /**
+     * Forget an attempt that will never complete (lost assignment, timeout,
+     * dead worker). If it reports after all, it is simply not recorded.
+     */
+    public synchronized void lost(String taskId, String workerId) {
+        if (running.remove(key(taskId, workerId == null ? "?" : workerId)) != null) lost++;
+    }
+
+    // Backstop for attempts nobody reported as lost (e.g. a scheduler without tracking).
+    private void evictStale() {
+        long cutoff = System.currentTimeMillis() - STALE_MS;
+        int before = running.size();
+        running.values().removeIf(a -> a.assignedAt < cutoff);
+        lost += before - running.size();
+    }
+
+    /**
+     * Record a completion report that arrived at receivedAt and took ingestMs
+     * to process. Only the first completion of a task counts towards the
+     * percentiles; later ones (losing speculative copies, retried reports)
+     * show up in the timeline only.
+     */
+    public synchronized void completed(String taskId, String workerId, long receivedAt, double ingestMs,
+                                       WorkerReport report) {
+        Attempt a = running.remove(key(taskId, workerId == null ? "?" : workerId));
+        if (a == null) return; // assigned before a master restart, or not recorded
+        if (done.size() >= MAX_TASKS) {
+            dropped++;
+            return;
+        }
+        a.receivedAt = receivedAt;
+        a.ingestMs = ingestMs;
+        a.report = report;
+        a.duplicate = !completedTasks.add(taskId);
+        done.add(a);
+    }
+
+    /**
+     * Per task type: count, mean and percentiles of every phase, the hot
+     * functions of profiled scripts summed over tasks, and the slowest tasks.
+     */
+    public synchronized Map<String, Object> summary() {
+        Map<String, Map<String, List<Double>>> byType = new TreeMap<>();
+        // Per type, function name -> calls, self ms, cumulative ms, tasks
+        Map<String, Map<String, double[]>> hotByType = new TreeMap<>();
+        List<Attempt> firsts = new ArrayList<>();
+        int duplicates = 0;
+        for (Attempt a : done) {
+            if (a.duplicate) {
+                duplicates++;
+                continue;
+            }
+            firsts.add(a);
+            Map<String, List<Double>> phases = byType.computeIfAbsent(a.type, k -> new LinkedHashMap<>());
+            for (Map.Entry<String, Double> e : a.phases().entrySet()) {
+                phases.computeIfAbsent(e.getKey(), k -> new ArrayList<>()).add(e.getValue());
+            }
+            Map<String, double[]> hot = hotByType.computeIfAbsent(a.type, k -> new HashMap<>());
+            for (Hot h : a.report.hot()) {
+                double[] acc = hot.computeIfAbsent(h.name(), k -> new double[4]);
+                acc[0] += h.calls();
+                acc[1] += h.selfMs();
+                acc[2] += h.cumulativeMs();
+                acc[3]++;
+            }
+        }
+
+        Map<String, Object> phases = new LinkedHashMap<>();
+        for (Map.Entry<String, Map<String, List<Double>>> t : byType.entrySet()) {
+            Map<String, Object> stats = new LinkedHashMap<>();
+            for (Map.Entry<String, List<Double>> p : t.getValue().entrySet()) {
+                stats.put(p.getKey(), stats(p.getValue()));
+            }
+            phases.put(t.getKey(), stats);
+        }
+
+        Map<String, Object> hot = new LinkedHashMap<>();
+        for (Map.Entry<String, Map<String, double[]>> t : hotByType.entrySet()) {
+            if (t.getValue().isEmpty()) continue;
+            List<Map.Entry<String, double[]>> fns = new ArrayList<>(t.getValue().entrySet());
+            fns.sort((x, y) -> Double.compare(y.getValue()[1], x.getValue()[1]));
+            List<Map<String, Object>> top = new ArrayList<>();
+            for (Map.Entry<String, double[]> f : fns.subList(0, Math.min(TOP_HOT, fns.size()))) {
+                double[] v = f.getValue();
+                Map<String, Object> fn = new LinkedHashMap<>();
+                fn.put("name", f.getKey());
+                fn.put("calls", (long) v[0]);
+                fn.put("self_ms", round(v[1]));
+                fn.put("cumulative_ms", round(v[2]));
+                fn.put("tasks", (long) v[3]);
+                top.add(fn);
+            }
+            hot.put(t.getKey(), top);
+        }
+
+        firsts.sort((x, y) -> Double.compare(y.totalMs(), x.totalMs()));
+        List<Map<String, Object>> slowest = new ArrayList<>();
+        for (Attempt a : firsts.subList(0, Math.min(TOP_SLOWEST, firsts.size()))) {
+            Map<String, Object> t = new LinkedHashMap<>();
+            t.put("task_id", a.taskId);
+            t.put("type", a.type);
+            t.put("worker_id", a.workerId);
+            Map<String, Object> ms = new LinkedHashMap<>();
+            a.phases().forEach((k, v) -> ms.put(k, round(v)));
+            t.put("phases_ms", ms);
+            slowest.add(t);
+        }
+
+        Map<String, Object> out = new LinkedHashMap<>();
+        out.put("tasks", firsts.size());
+        out.put("duplicates", duplicates);
+        out.put("running", running.size());
+        out.put("lost", lost);
+        out.put("dropped", dropped);
+        out.put("phases_ms", phases);
+        out.put("hot", hot);
+        out.put("slowest", slowest);
+        return out;
+    }
+
+    private static Map<String, Object> stats(List<Double> values) {
+        double[] v = values.stream().mapToDouble(Double::doubleValue).sorted().toArray();
+        double total = 0;
+        for (double x : v) total += x;
+        Map<String, Object> s = new LinkedHashMap<>();
+        s.put("count", v.length);
+        s.put("mean", round(total / v.length));
+        s.put("p50", round(percentile(v, 0.50)));
+        s.put("p90", round(percentile(v, 0.90)));
+        s.put("p99", round(percentile(v, 0.99)));
+        s.put("max", round(v[v.length - 1]));
+        s.put("total", round(total));
+        return s;
+    }
+
+    // Nearest rank of a sorted, non-empty array.
+    private static double percentile(double[] sorted, double p) {
+        int rank = (int) Math.ceil(p * sorted.length);
+        return sorted[Math.max(0, Math.min(sorted.length - 1, rank - 1))];
+    }
+
+    private static double round(double ms) {
+        return Math.round(ms * 1000) / 1000.0;
+    }
+
+    /**
+     * The job as a Chrome trace (chrome://tracing, ui.perfetto.dev): one
+     * process per worker with a row per concurrent task, each task a span
+     * with its phases nested inside, and the master as process 0 with the
+     * time every task waited in the queue.
+     */
+    public synchronized JsonObject chromeTrace(String jobId, long mapsDoneAt, long finishedAt) {
+        JsonArray events = new JsonArray();
+        events.add(metadata("process_name", 0, 0, "master"));
+        events.add(metadata("thread_name", 0, 0, "queue"));
+
+        List<Attempt> attempts = new ArrayList<>(done);
+        attempts.sort(Comparator.comparingLong(a -> a.assignedAt));
+        Map<String, Integer> pids = new LinkedHashMap<>();
+        Map<String, List<Double>> laneEnds = new HashMap<>(); // per worker, end of the last span on each row
+        long queueId = 0;
+        for (Attempt a : attempts) {
+            Integer pid = pids.get(a.workerId);
+            if (pid == null) {
+                pid = pids.size() + 1;
+                pids.put(a.workerId, pid);
+                events.add(metadata("process_name", pid, 0, "worker " + a.workerId));
+            }
+            double start = us(a.assignedAt);
+            double end = us(a.receivedAt) + a.ingestMs * 1000;
+            List<Double> lanes = laneEnds.computeIfAbsent(a.workerId, k -> new ArrayList<>());
+            int tid = 0;
+            while (tid < lanes.size() && lanes.get(tid) > start) tid++;
+            if (tid == lanes.size()) {
+                lanes.add(end);
+                events.add(metadata("thread_name", pid, tid, "task " + tid));
+            } else {
+                lanes.set(tid, end);
+            }
+
+            JsonObject args = new JsonObject();
+            args.addProperty("task_id", a.taskId);
+            args.addProperty("type", a.type);
+            if (a.report.slot() >= 0) args.addProperty("slot", a.report.slot());
+            if (a.duplicate) args.addProperty("duplicate", true);
+            if (!a.report.hot().isEmpty()) {
+                Hot h = a.report.hot().get(0);
+                args.addProperty("hottest", h.name() + " (" + round(h.selfMs()) + " ms self)");
+            }
+            events.add(span(a.type + " " + a.taskId, a.type, pid, tid, start, end - start, args));
+
+            double at = start;
+            at = phase(events, "build", pid, tid, at, a.buildMs);
+            for (String p : WORKER_PHASES) {
+                Double ms = a.report.phasesMs().get(p);
+                if (ms != null) at = phase(events, p, pid, tid, at, ms);
+            }
+            phase(events, "transfer", pid, tid, at, a.transferMs());
+            phase(events, "ingest", pid, tid, us(a.receivedAt), a.ingestMs);
+
+            if (a.enqueuedAt > 0 && a.assignedAt > a.enqueuedAt) {
+                String id = Long.toString(queueId++);
+                events.add(async("b", a, us(a.enqueuedAt), id));
+                events.add(async("e", a, us(a.assignedAt), id));
+            }
+        }
+        if (mapsDoneAt > 0) events.add(instant("maps done", us(mapsDoneAt)));
+        if (finishedAt > 0) events.add(instant("job finished", us(finishedAt)));
+
+        JsonObject other = new JsonObject();
+        other.addProperty("job_id", jobId);
+        other.addProperty("submitted_at", origin);
+        other.addProperty("dropped", dropped);
+        JsonObject trace = new JsonObject();
+        trace.add("traceEvents", events);
+        trace.addProperty("displayTimeUnit", "ms");
+        trace.add("otherData", other);
+        return trace;
+    }
+
+    // Microseconds since job submission, the trace's time base.
+    private double us(long epochMs) {
+        return (epochMs - origin) * 1000.0;
+    }
+
+    private static double phase(JsonArray events, String name, int pid, int tid, double startUs, double ms) {
+        if (ms > 0) events.add(span(name, "phase", pid, tid, startUs, ms * 1000, null));
+        return startUs + ms * 1000;
+    }
+
+    private static JsonObject span(String name, String cat, int pid, int tid, double ts, double dur, JsonObject args) {
+        JsonObject e = new JsonObject();
+        e.addProperty("name", name);
+        e.addProperty("cat", cat);
+        e.addProperty("ph", "X");
+        e.addProperty("pid", pid);
+        e.addProperty("tid", tid);
+        e.addProperty("ts", ts);
+        e.addProperty("dur", Math.max(0, dur));
+        if (args != null) e.add("args", args);
+        return e;
+    }
+
+    // Queue waits overlap freely, so they are async events (one row each in the viewer).
+    private static JsonObject async(String ph, Attempt a, double ts, String id) {
+        JsonObject e = new JsonObject();
+        e.addProperty("name", "queued " + a.taskId);
+        e.addProperty("cat", "queue");
+        e.addProperty("ph", ph);
+        e.addProperty("pid", 0);
+        e.addProperty("tid", 0);
+        e.addProperty("ts", ts);
+        e.addProperty("id", id);
+        if ("b".equals(ph)) {
+            JsonObject args = new JsonObject();
+            args.addProperty("type", a.type);
+            args.addProperty("worker_id", a.workerId);
+            e.add("args", args);
+        }
+        return e;
+    }
+
+    private static JsonObject instant(String name, double ts) {
+        JsonObject e = new JsonObject();
+        e.addProperty("name", name);
+        e.addProperty("ph", "i");
+        e.addProperty("s", "g");
+        e.addProperty("pid", 0);
+        e.addProperty("tid", 0);
+        e.addProperty("ts", ts);
+        return e;
+    }
+
+    private static JsonObject metadata(String kind, int pid, int tid, String name) {
+        JsonObject args = new JsonObject();
+        args.addProperty("name", name);
+        JsonObject e = new JsonObject();
+        e.addProperty("name", kind);
+        e.addProperty("ph", "M");
+        e.addProperty("pid", pid);
+        e.addProperty("tid", tid);
+        e.add("args", args);
+        return e;
+    }
+}
@@ -2,14 +2,23 @@ package rpc;
 
 import com.google.gson.Gson;
 import gridmr.*;
+import core.JobLifecycle;
 import core.Scheduler;
 import core.SmartScheduler;
 import http.HttpUtils;
 import model.*;
+import profile.JobProfile;
+import shuffle.RecordCodec;
+import stencil.StencilJob;
 import store.RedisStore;
 import telemetry.MqttClientManager;
 import io.grpc.stub.StreamObserver;
 
+import java.io.BufferedWriter;
+import java.io.IOException;
+import java.io.OutputStreamWriter;
+import java.io.Writer;
+import java.nio.charset.StandardCharsets;
 import java.util.*;
 import java.util.concurrent.BlockingQueue;
 import java.util.concurrent.ConcurrentMap;
@@ -23,6 +32,7 @@ public class MasterService extends MasterGrpc.MasterImplBase {
     private final Scheduler scheduler;
     private final MqttClientManager mqtt;
     private final RedisStore redis;
+    private final TaskPushDispatcher pusher;
 
     public MasterService(ConcurrentMap<String, Worker> workers,
                          ConcurrentMap<String, JobCtx> jobs,
@@ -36,6 +46,8 @@ public class MasterService extends MasterGrpc.MasterImplBase {
         this.scheduler = scheduler;
         this.mqtt = mqtt;
         this.redis = redis;
+        this.pusher = new TaskPushDispatcher(this::takeTaskFor, this::buildAssignment, scheduler::queuedTasks, scheduler);
+        scheduler.setOnEnqueue(pusher::wake);
     }
 
     // ---- Register ----
@@ -62,53 +74,106 @@ public class MasterService extends MasterGrpc.MasterImplBase {
     // ---- NextTask ----
     @Override
     public void nextTask(NextTaskRequest req, StreamObserver<TaskAssignment> respObs) {
-        String workerId = req.getWorkerId();
-        Task task = null;
-        
-        // Use SmartScheduler if available, otherwise fall back to basic scheduler
-        if (scheduler instanceof SmartScheduler) {
-            task = ((SmartScheduler) scheduler).getNextTaskForWorker(workerId);
-        } else {
-            task = pending.poll();
-        }
-        
+        Task task = takeTaskFor(req.getWorkerId());
         if (task == null) {
             respObs.onNext(TaskAssignment.newBuilder().setHasTask(false).build());
             respObs.onCompleted();
             return;
         }
+        try {
+            respObs.onNext(buildAssignment(task));
+        } catch (IOException e) {
+            scheduler.onTaskLost(task, req.getWorkerId());
+            respObs.onError(io.grpc.Status.INTERNAL
+                    .withDescription("task input read failed: " + e.getMessage()).asRuntimeException());
+            return;
+        }
+        respObs.onCompleted();
+    }
+
+    // ---- TaskStream (push dispatch) ----
+    @Override
+    public StreamObserver<SlotAnnouncement> taskStream(StreamObserver<TaskAssignment> respObs) {
+        return pusher.open(respObs);
+    }
+
+    // SmartScheduler only: it tracks attempts (and losing speculative copies)
+    private void taskCompleted(String jobId, String taskId, String workerId) {
+        if (scheduler instanceof SmartScheduler) {
+            ((SmartScheduler) scheduler).onTaskCompleted(jobId, taskId, workerId);
+        }
+    }
+
+    // The output could not be ingested: the task runs again right away
+    private void taskFailed(String jobId, String taskId, String workerId) {
+        if (scheduler instanceof SmartScheduler) {
+            ((SmartScheduler) scheduler).onTaskFailed(jobId, taskId, workerId);
+        }
+    }
+
+    private Task takeTaskFor(String workerId) {
+        // Use SmartScheduler if available, otherwise fall back to basic scheduler
+        if (scheduler instanceof SmartScheduler) {
+            return ((SmartScheduler) scheduler).getNextTaskForWorker(workerId);
+        }
+        Task task = pending.poll();
+        if (task != null) {
+            task.assignedAt = System.currentTimeMillis();
+            task.assignedTo = workerId;
+        }
+        return task;
+    }
+
+    private TaskAssignment buildAssignment(Task task) throws IOException {
+        long buildStart = System.nanoTime();
         JobCtx ctx = jobs.get(task.jobId);
+        boolean profileScript = Boolean.TRUE.equals(ctx.spec.cprofile);
 
         TaskAssignment.Builder out = TaskAssignment.newBuilder().setHasTask(true);
         if (task.type == TaskType.MAP) {
             MapTask.Builder mt = MapTask.newBuilder()
                     .setTaskId(task.taskId)
                     .setJobId(task.jobId)
-                    .setInputChunk(task.inputChunk == null ? "" : task.inputChunk)
+                    .setInputChunk(ctx.mapInput(task))
                     .setMapUrl("/api/jobs/scripts/" + task.jobId + "/map.py")
                     .setReducers(ctx.spec.reducers == null ? 1 : ctx.spec.reducers);
-            // opcional: enviar script embebido
-            if (ctx.mapScript != null && ctx.mapScript.length > 0)
-                mt.setMapScript(com.google.protobuf.ByteString.copyFrom(ctx.mapScript));
-            out.setMap(mt);
+            // Solo el hash: el worker descarga el script por map_url si no lo tiene en cache
+            mt.setMapScriptSha256(ctx.mapScriptSha);
+            if (ctx.combineScript != null) {
+                mt.setCombineUrl("/api/jobs/scripts/" + task.jobId + "/combine.py")
+                        .setCombineScriptSha256(ctx.combineScriptSha);
+            }
+            if (ctx.binaryIntermediate()) {
+                mt.setBinaryRecords(true).setRecordsCodec(codecOf(ctx));
+            }
+            out.setMap(mt.setProfileScript(profileScript));
+        } else if (task.type == TaskType.STEP) {
+            out.setStep(stepTask(ctx, task));
         } else {
             ReduceTask.Builder rt = ReduceTask.newBuilder()
                     .setTaskId(task.taskId)
                     .setJobId(task.jobId)
                     .setPartitionIndex(task.partitionIndex)
-                    .setReduceUrl("/api/jobs/scripts/" + task.jobId + "/reduce.py")
-                    .setKvLines(String.join("\n", task.kvLinesForReduce));
-            if (ctx.reduceScript != null && ctx.reduceScript.length > 0)
-                rt.setReduceScript(com.google.protobuf.ByteString.copyFrom(ctx.reduceScript));
-            out.setReduce(rt);
+                    .setReduceUrl("/api/jobs/scripts/" + task.jobId + "/reduce.py");
+            if (ctx.binaryIntermediate()) {
+                rt.setKvRecords(partitionRecords(ctx, task.partitionIndex))
+                        .setRawRecords("records".equals(ctx.spec.intermediate_format));
+            } else {
+                rt.setKvLinesBytes(partitionText(ctx, task.partitionIndex));
+            }
+            rt.setReduceScriptSha256(ctx.reduceScriptSha);
+            out.setReduce(rt.setProfileScript(profileScript));
         }
-        respObs.onNext(out.build());
-        respObs.onCompleted();
+        TaskAssignment assignment = out.build();
+        ctx.profile.assigned(task, JobProfile.msSince(buildStart));
+        return assignment;
     }
 
     // ---- CompleteMap ----
     @Override
     public void completeMap(CompleteMapRequest req, StreamObserver<Ack> respObs) {
+        long receivedAt = System.currentTimeMillis();
+        long ingestStart = System.nanoTime();
         String jobId = req.getJobId();
         JobCtx ctx = jobs.get(jobId);
         if (ctx == null) {
@@ -117,82 +182,98 @@ public class MasterService extends MasterGrpc.MasterImplBase {
             return;
         }
 
-        String kv = req.getKvLines();
-        int added = 0;
-        for (String line : kv.split("\n")) {
-            if (line.isBlank()) continue;
-            String[] kvp = line.split("\t", 2);
-            if (kvp.length < 2) continue;
-            String k = kvp[0];
-            String v = kvp[1];
-            int p = core.Partitioner.partitionOf(k, ctx.spec.reducers);
-            ctx.partitionKV.get(p).add(k + "\t" + v);
-            added++;
+        // The scheduler hears about the task only once its output is ingested
+        JobProfile.WorkerReport report = JobProfile.WorkerReport.fromProto(req.hasProfile(), req.getProfile());
+        if (!ctx.markCompleted(req.getTaskId())) {
+            taskCompleted(jobId, req.getTaskId(), req.getWorkerId()); // a losing speculative copy frees its slot
+            ctx.profile.completed(req.getTaskId(), req.getWorkerId(), receivedAt, JobProfile.msSince(ingestStart), report);
+            System.out.println("[DUPLICATE COMPLETE] job=" + jobId + " task=" + req.getTaskId() + " ignored");
+            respObs.onNext(Ack.newBuilder().setOk(true).build());
+            respObs.onCompleted();
+            return;
         }
-        ctx.completedMaps++;
-        System.out.println("[MAP COMPLETE gRPC] job=" + jobId + " task=" + req.getTaskId() + " kvAdded=" + added);
-        
-        // Notify SmartScheduler if available
-        if (scheduler instanceof SmartScheduler) {
-            ((SmartScheduler) scheduler).onTaskCompleted(req.getTaskId(), req.getWorkerId());
+
+        int added;
+        int copies = 0; // tasks with the same chunk, completed from this output
+        try {
+            if (req.hasKvRecords()) {
+                byte[] records = rawRecords(req.getKvRecords());
+                added = ctx.shuffle.ingestRecords(records);
+                if (ctx.mapCache != null) copies = ctx.mapCache.storeRecords(ctx, req.getTaskId(), records, scheduler::enqueue);
+            } else {
+                added = ctx.shuffle.ingest(req.getKvLines());
+                if (ctx.mapCache != null) copies = ctx.mapCache.storeText(ctx, req.getTaskId(), req.getKvLines(), scheduler::enqueue);
+            }
+        } catch (IOException e) {
+            System.err.println("[SHUFFLE ERROR] job=" + jobId + " task=" + req.getTaskId() + ": " + e.getMessage());
+            ctx.completedTaskIds.remove(req.getTaskId());
+            taskFailed(jobId, req.getTaskId(), req.getWorkerId());
+            respObs.onNext(Ack.newBuilder().setOk(false).build());
+            respObs.onCompleted();
+            return;
         }
+        taskCompleted(jobId, req.getTaskId(), req.getWorkerId());
+        ctx.profile.completed(req.getTaskId(), req.getWorkerId(), receivedAt, JobProfile.msSince(ingestStart), report);
+        int mapsDone = ctx.completedMaps.addAndGet(1 + copies);
+        System.out.println("[MAP COMPLETE gRPC] job=" + jobId + " task=" + req.getTaskId() + " kvAdded=" + added);
 
         if (mqtt != null) {
-            mqtt.publishJson("gridmr/job/" + jobId + "/map/completed", Map.of(
-                    "taskId", req.getTaskId(), "added", added, "mapsCompleted", ctx.completedMaps, "ts", System.currentTimeMillis()
+            mqtt.snapshots().mapsCompleted(jobId, mapsDone, ctx.mapTasks.size());
+            mqtt.publishEvent("gridmr/job/" + jobId + "/map/completed", () -> Map.of(
+                    "taskId", req.getTaskId(), "added", added, "mapsCompleted", mapsDone, "ts", System.currentTimeMillis()
             ));
         }
         if (redis != null) {
-            redis.saveJobCounters(jobId, ctx.completedMaps, ctx.completedReduces);
-        }
-
-        if (ctx.completedMaps == ctx.mapTasks.size()) {
-            int rIx = 0;
-            ctx.reduceTasks.clear();
-            var sizes = new ArrayList<Integer>();
-
-            for (int i = 0; i < ctx.spec.reducers; i++) {
-                int sz = ctx.partitionKV.get(i).size();
-                sizes.add(sz);
-                // Create reduce tasks for ALL partitions, including empty ones
-                Task rt = new Task();
-                rt.type = TaskType.REDUCE;
-                rt.taskId = "reduce-" + (rIx++);
-                rt.jobId = jobId;
-                rt.partitionIndex = i;
-                rt.kvLinesForReduce = ctx.partitionKV.get(i);
-                ctx.reduceTasks.add(rt);
-                scheduler.enqueue(rt);
-            }
-            if (mqtt != null) {
-                mqtt.publishJson("gridmr/job/" + jobId + "/shuffle/partitions", Map.of(
-                        "sizes", sizes, "ts", System.currentTimeMillis()
-                ));
-            }
-            if (redis != null) redis.savePartitionSizes(jobId, sizes);
-
-            if (ctx.reduceTasks.isEmpty()) {
-                ctx.state = JobState.SUCCEEDED;
-                Scheduler.persistResult(ctx);
-                if (redis != null) {
-                    redis.setJobState(jobId, ctx.state.toString());
-                    redis.storeFinalResult(jobId, ctx.finalOutput);
-                }
-                if (mqtt != null) {
-                    mqtt.publishJson("gridmr/job/" + jobId + "/state", Map.of(
-                            "state", ctx.state.toString(), "ts", System.currentTimeMillis()
-                    ));
-                }
-            }
+            redis.saveJobCounters(jobId, ctx.completedMaps.get(), ctx.completedReduces.get());
+        }
+
+        // The output was taken even if spilling it failed: the task is done, the job fails
+        JobLifecycle.failIfSpillFailed(ctx, scheduler, mqtt, redis);
+        if (mapsDone == ctx.mapTasks.size()) {
+            JobLifecycle.startReducePhase(ctx, scheduler, mqtt, redis);
         }
 
         respObs.onNext(Ack.newBuilder().setOk(true).build());
         respObs.onCompleted();
     }
 
+    // ---- CompleteStep ----
+    @Override
+    public void completeStep(CompleteStepRequest req, StreamObserver<Ack> respObs) {
+        long receivedAt = System.currentTimeMillis();
+        long ingestStart = System.nanoTime();
+        String jobId = req.getJobId();
+        JobCtx ctx = jobs.get(jobId);
+        if (ctx == null || ctx.stencil == null) {
+            respObs.onNext(Ack.newBuilder().setOk(false).build());
+            respObs.onCompleted();
+            return;
+        }
+        if (scheduler instanceof SmartScheduler) {
+            ((SmartScheduler) scheduler).onTaskCompleted(jobId, req.getTaskId(), req.getWorkerId());
+        }
+        try {
+            StencilJob.Edges edges = new StencilJob.Edges(req.getNorth().toByteArray(), req.getSouth().toByteArray(),
+                    req.getWest().toByteArray(), req.getEast().toByteArray());
+            JobLifecycle.stepCompleted(ctx, req.getWorkerId(), req.getTile(), req.getGeneration(), req.getLost(),
+                    edges, req.getLive(), req.getCells().toByteArray(), scheduler, mqtt, redis);
+            ctx.profile.completed(req.getTaskId(), req.getWorkerId(), receivedAt, JobProfile.msSince(ingestStart),
+                    JobProfile.WorkerReport.fromProto(req.hasProfile(), req.getProfile()));
+        } catch (IOException e) {
+            System.err.println("[RESULT ERROR] job=" + jobId + " task=" + req.getTaskId() + ": " + e.getMessage());
+            respObs.onNext(Ack.newBuilder().setOk(false).build());
+            respObs.onCompleted();
+            return;
+        }
+        respObs.onNext(Ack.newBuilder().setOk(true).build());
+        respObs.onCompleted();
+    }
+
     // ---- CompleteReduce ----
     @Override
     public void completeReduce(CompleteReduceRequest req, StreamObserver<Ack> respObs) {
+        long receivedAt = System.currentTimeMillis();
+        long ingestStart = System.nanoTime();
         String jobId = req.getJobId();
         JobCtx ctx = jobs.get(jobId);
         if (ctx == null) {
@@ -201,39 +282,98 @@ public class MasterService extends MasterGrpc.MasterImplBase {
             return;
         }
 
-        String out = req.getOutput();
-        ctx.completedReduces++;
-        ctx.finalOutput += out + (out.endsWith("\n") ? "" : "\n");
-        
-        // Notify SmartScheduler if available
-        if (scheduler instanceof SmartScheduler) {
-            ((SmartScheduler) scheduler).onTaskCompleted(req.getTaskId(), req.getWorkerId());
+        // The scheduler hears about the task only once its output is stored
+        JobProfile.WorkerReport report = JobProfile.WorkerReport.fromProto(req.hasProfile(), req.getProfile());
+        if (!ctx.markCompleted(req.getTaskId())) {
+            taskCompleted(jobId, req.getTaskId(), req.getWorkerId()); // a losing speculative copy frees its slot
+            ctx.profile.completed(req.getTaskId(), req.getWorkerId(), receivedAt, JobProfile.msSince(ingestStart), report);
+            System.out.println("[DUPLICATE COMPLETE] job=" + jobId + " task=" + req.getTaskId() + " ignored");
+            respObs.onNext(Ack.newBuilder().setOk(true).build());
+            respObs.onCompleted();
+            return;
+        }
+
+        try {
+            ctx.addReduceOutput(req.getTaskId(), req.getOutput());
+        } catch (IOException e) {
+            System.err.println("[RESULT ERROR] job=" + jobId + " task=" + req.getTaskId() + ": " + e.getMessage());
+            ctx.completedTaskIds.remove(req.getTaskId());
+            taskFailed(jobId, req.getTaskId(), req.getWorkerId());
+            respObs.onNext(Ack.newBuilder().setOk(false).build());
+            respObs.onCompleted();
+            return;
         }
+        taskCompleted(jobId, req.getTaskId(), req.getWorkerId());
+        ctx.profile.completed(req.getTaskId(), req.getWorkerId(), receivedAt, JobProfile.msSince(ingestStart), report);
+        int reducesDone = ctx.completedReduces.incrementAndGet();
 
         if (mqtt != null) {
-            mqtt.publishJson("gridmr/job/" + jobId + "/reduce/completed", Map.of(
-                    "taskId", req.getTaskId(), "reducesCompleted", ctx.completedReduces, "ts", System.currentTimeMillis()
+            mqtt.snapshots().reducesCompleted(jobId, reducesDone, ctx.reduceTasks.size());
+            mqtt.publishEvent("gridmr/job/" + jobId + "/reduce/completed", () -> Map.of(
+                    "taskId", req.getTaskId(), "reducesCompleted", reducesDone, "ts", System.currentTimeMillis()
             ));
         }
         if (redis != null) {
-            redis.saveJobCounters(jobId, ctx.completedMaps, ctx.completedReduces);
+            redis.saveJobCounters(jobId, ctx.completedMaps.get(), ctx.completedReduces.get());
         }
 
-        if (ctx.completedReduces == ctx.reduceTasks.size()) {
-            ctx.state = JobState.SUCCEEDED;
-            Scheduler.persistResult(ctx);
-            if (redis != null) {
-                redis.setJobState(jobId, ctx.state.toString());
-                redis.storeFinalResult(jobId, ctx.finalOutput);
-            }
-            if (mqtt != null) {
-                mqtt.publishJson("gridmr/job/" + jobId + "/state", Map.of(
-                        "state", ctx.state.toString(), "ts", System.currentTimeMillis()
-                ));
-            }
-        }
+        JobLifecycle.reduceCompleted(ctx, reducesDone, scheduler, mqtt, redis);
 
         respObs.onNext(Ack.newBuilder().setOk(true).build());
         respObs.onCompleted();
     }
+
+    private static StepTask stepTask(JobCtx ctx, Task task) {
+        StencilJob.Halo h = task.halo;
+        StepTask.Builder st = StepTask.newBuilder()
+                .setTaskId(task.taskId)
+                .setJobId(task.jobId)
+                .setTile(task.tile)
+                .setGeneration(task.generation)
+                .setRows(h.rows)
+                .setCols(h.cols)
+                .setRule(ctx.stencil.rule)
+                .setCorners(h.corners)
+                .setLast(h.last);
+        if (h.cells != null) st.setCells(com.google.protobuf.ByteString.copyFrom(h.cells));
+        if (h.north != null) st.setNorth(com.google.protobuf.ByteString.copyFrom(h.north));
+        if (h.south != null) st.setSouth(com.google.protobuf.ByteString.copyFrom(h.south));
+        if (h.west != null) st.setWest(com.google.protobuf.ByteString.copyFrom(h.west));
+        if (h.east != null) st.setEast(com.google.protobuf.ByteString.copyFrom(h.east));
+        return st.build();
+    }
+
+    private static Codec codecOf(JobCtx ctx) {
+        return "deflate".equals(ctx.spec.intermediate_compression) ? Codec.CODEC_DEFLATE : Codec.CODEC_NONE;
+    }
+
+    /**
+     * The partition as UTF-8 "k\tv" lines, written straight into the bytes the
+     * message carries (no intermediate String or char copy).
+     */
+    private static com.google.protobuf.ByteString partitionText(JobCtx ctx, int partition) throws IOException {
+        com.google.protobuf.ByteString.Output out = com.google.protobuf.ByteString.newOutput();
+        Writer w = new BufferedWriter(new OutputStreamWriter(out, StandardCharsets.UTF_8), 64 * 1024);
+        ctx.shuffle.writePartition(partition, w);
+        w.flush();
+        return out.toByteString();
+    }
+
+    private static RecordBlock partitionRecords(JobCtx ctx, int partition) throws IOException {
+        com.google.protobuf.ByteString.Output raw = com.google.protobuf.ByteString.newOutput();
+        int n = ctx.shuffle.writePartitionRecords(partition, raw);
+        Codec codec = codecOf(ctx);
+        com.google.protobuf.ByteString data = raw.toByteString();
+        return RecordBlock.newBuilder()
+                .setData(codec == Codec.CODEC_DEFLATE ? com.google.protobuf.ByteString.copyFrom(RecordCodec.deflate(data.toByteArray())) : data)
+                .setCodec(codec)
+                .setRecords(n)
+                .setRawSize(data.size())
+                .build();
+    }
+
+    private static byte[] rawRecords(RecordBlock block) throws IOException {
+        byte[] data = block.getData().toByteArray();
+        return block.getCodec() == Codec.CODEC_DEFLATE ? RecordCodec.inflate(data, block.getRawSize()) : data;
+    }
 }
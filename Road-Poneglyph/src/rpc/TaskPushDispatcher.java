@@ -0,0 +1,169 @@
+package rpc;
+
+import core.Scheduler;
+import gridmr.SlotAnnouncement;
+import gridmr.TaskAssignment;
+import io.grpc.stub.ServerCallStreamObserver;
+import io.grpc.stub.StreamObserver;
+import model.Task;
+
+import java.io.IOException;
+import java.util.Set;
+import java.util.concurrent.ConcurrentHashMap;
+import java.util.concurrent.Executors;
+import java.util.concurrent.ScheduledExecutorService;
+import java.util.concurrent.TimeUnit;
+import java.util.concurrent.atomic.AtomicBoolean;
+import java.util.concurrent.atomic.AtomicInteger;
+import java.util.function.IntSupplier;
+
+/**
+ * Server side of the TaskStream RPC.
+ * <p>
+ * Every connected worker holds credits (the free slots it announced). Whenever
+ * tasks are queued or credits arrive, a single dispatch thread hands queued
+ * tasks to workers with credits and writes them to their streams, so a task
+ * starts as soon as it is queued instead of on the worker's next poll.
+ * <p>
+ * A task whose assignment cannot be sent, or that was sent on a stream that
+ * later closes, goes straight back to the scheduler instead of waiting for
+ * its assignment timeout.
+ */
+public class TaskPushDispatcher {
+    // The scheduler may hold tasks back for a better worker; look again after this.
+    private static final long RETRY_MS = 200;
+
+    public interface TaskSource {
+        Task take(String workerId);
+    }
+
+    public interface AssignmentBuilder {
+        TaskAssignment build(Task task) throws IOException;
+    }
+
+    private static final class Session {
+        final StreamObserver<TaskAssignment> out;
+        final AtomicInteger credits = new AtomicInteger();
+        volatile String workerId;
+        volatile boolean closed;
+
+        Session(StreamObserver<TaskAssignment> out) {
+            this.out = out;
+        }
+
+        boolean cancelled() {
+            return closed || (out instanceof ServerCallStreamObserver<?> call && call.isCancelled());
+        }
+    }
+
+    private final TaskSource source;
+    private final AssignmentBuilder builder;
+    private final IntSupplier queued;
+    private final Scheduler scheduler;
+    private final Set<Session> sessions = ConcurrentHashMap.newKeySet();
+    private final AtomicBoolean scheduled = new AtomicBoolean();
+    private final ScheduledExecutorService executor = Executors.newSingleThreadScheduledExecutor(r -> {
+        Thread t = new Thread(r, "task-push");
+        t.setDaemon(true);
+        return t;
+    });
+
+    public TaskPushDispatcher(TaskSource source, AssignmentBuilder builder, IntSupplier queued, Scheduler scheduler) {
+        this.source = source;
+        this.builder = builder;
+        this.queued = queued;
+        this.scheduler = scheduler;
+    }
+
+    /**
+     * Accept a worker stream; returns the observer for its slot announcements.
+     */
+    public StreamObserver<SlotAnnouncement> open(StreamObserver<TaskAssignment> out) {
+        Session session = new Session(out);
+        sessions.add(session);
+        return new StreamObserver<>() {
+            @Override
+            public void onNext(SlotAnnouncement a) {
+                if (session.workerId == null) {
+                    System.out.println("[PUSH] Worker " + a.getWorkerId() + " connected");
+                }
+                session.workerId = a.getWorkerId();
+                session.credits.addAndGet(Math.max(0, a.getFreeSlots()));
+                wake();
+            }
+
+            @Override
+            public void onError(Throwable t) {
+                close(session, false);
+            }
+
+            @Override
+            public void onCompleted() {
+                close(session, true);
+            }
+        };
+    }
+
+    public int connectedWorkers() {
+        return sessions.size();
+    }
+
+    /**
+     * Schedule a dispatch round (cheap; rounds never overlap).
+     */
+    public void wake() {
+        if (sessions.isEmpty()) return;
+        if (scheduled.compareAndSet(false, true)) executor.execute(this::pump);
+    }
+
+    private void close(Session session, boolean completeStream) {
+        session.closed = true;
+        sessions.remove(session);
+        String workerId = session.workerId;
+        System.out.println("[PUSH] Worker " + workerId + " disconnected");
+        // All writes to a stream happen on the dispatch thread, and so does
+        // recovery, so a send in progress on this session finishes first.
+        executor.execute(() -> {
+            if (completeStream) {
+                try {
+                    session.out.onCompleted();
+                } catch (RuntimeException ignored) {
+                }
+            }
+            // A worker that reconnected right away keeps its tasks.
+            if (workerId != null && sessions.stream().noneMatch(s -> workerId.equals(s.workerId))) {
+                scheduler.onWorkerDisconnected(workerId);
+            }
+        });
+    }
+
+    private void pump() {
+        scheduled.set(false);
+        boolean heldBack = false;
+        boolean progress = true;
+        while (progress && queued.getAsInt() > 0) {
+            progress = false;
+            for (Session s : sessions) {
+                if (s.workerId == null || s.credits.get() <= 0 || s.cancelled()) continue;
+                Task task = source.take(s.workerId);
+                if (task == null) {
+                    heldBack = true;
+                    continue;
+                }
+                try {
+                    s.out.onNext(builder.build(task));
+                    s.credits.decrementAndGet();
+                    progress = true;
+                } catch (IOException | RuntimeException e) {
+                    System.err.println("[PUSH ERROR] task=" + task.taskId + " worker=" + s.workerId + ": " + e.getMessage());
+                    // Back after a short pause, so a task that cannot be built does not spin the dispatcher
+                    String workerId = s.workerId;
+                    executor.schedule(() -> scheduler.onTaskLost(task, workerId), RETRY_MS, TimeUnit.MILLISECONDS);
+                }
+            }
+        }
+        if (heldBack && queued.getAsInt() > 0) {
+            executor.schedule(this::wake, RETRY_MS, TimeUnit.MILLISECONDS);
+        }
+    }
+}
@@ -0,0 +1,171 @@
+package shuffle;
+
+import java.io.ByteArrayOutputStream;
+import java.io.IOException;
+import java.io.InputStream;
+import java.io.OutputStream;
+import java.io.UncheckedIOException;
+import java.nio.charset.StandardCharsets;
+import java.util.zip.DataFormatException;
+import java.util.zip.Deflater;
+import java.util.zip.Inflater;
+
+/**
+ * Binary intermediate record format shared with the C++ worker
+ * (Poneglyph/model/records.hpp) and Clover (clover/records.py).
+ * <p>
+ * A block is a sequence of records, each one {@code varint(len(key)) key
+ * varint(len(value)) value} with UTF-8 keys and values. Blocks may be
+ * deflate-compressed as a whole ({@link #deflate}/{@link #inflate}).
+ */
+public final class RecordCodec {
+    private RecordCodec() {
+    }
+
+    public interface RecordSink {
+        void accept(String key, String value) throws IOException;
+    }
+
+    public static void writeRecord(OutputStream out, String key, String value) throws IOException {
+        byte[] k = key.getBytes(StandardCharsets.UTF_8);
+        byte[] v = value.getBytes(StandardCharsets.UTF_8);
+        writeVarint(out, k.length);
+        out.write(k);
+        writeVarint(out, v.length);
+        out.write(v);
+    }
+
+    /**
+     * Encode "k\tv\n..." text as a raw block, with the same line rules as {@link ShuffleStore#ingest}.
+     */
+    public static byte[] fromText(String kvLines) {
+        ByteArrayOutputStream out = new ByteArrayOutputStream(kvLines.length());
+        int start = 0;
+        int n = kvLines.length();
+        try {
+            while (start < n) {
+                int end = kvLines.indexOf('\n', start);
+                if (end < 0) end = n;
+                int tab = kvLines.indexOf('\t', start);
+                if (tab >= 0 && tab < end) {
+                    String k = kvLines.substring(start, tab);
+                    String v = kvLines.substring(tab + 1, end);
+                    if (!k.isBlank() || !v.isBlank()) writeRecord(out, k, v);
+                }
+                start = end + 1;
+            }
+        } catch (IOException e) {
+            throw new UncheckedIOException(e); // ByteArrayOutputStream does not throw
+        }
+        return out.toByteArray();
+    }
+
+    /**
+     * Decode every record in a raw (uncompressed) block. Returns the record count.
+     */
+    public static int decode(byte[] data, RecordSink sink) throws IOException {
+        int[] pos = {0};
+        int n = 0;
+        while (pos[0] < data.length) {
+            int kl = readVarint(data, pos);
+            String k = new String(data, pos[0], kl, StandardCharsets.UTF_8);
+            pos[0] += kl;
+            int vl = readVarint(data, pos);
+            String v = new String(data, pos[0], vl, StandardCharsets.UTF_8);
+            pos[0] += vl;
+            sink.accept(k, v);
+            n++;
+        }
+        return n;
+    }
+
+    /**
+     * Read the next record of a raw block from a stream into {@code kv}
+     * ({key, value}). Returns false at the end of the stream.
+     */
+    public static boolean readRecord(InputStream in, String[] kv) throws IOException {
+        int kl = readVarint(in, true);
+        if (kl < 0) return false;
+        byte[] k = in.readNBytes(kl);
+        int vl = k.length == kl ? readVarint(in, false) : 0;
+        byte[] v = in.readNBytes(vl);
+        if (k.length != kl || v.length != vl) throw new IOException("truncated record block");
+        kv[0] = new String(k, StandardCharsets.UTF_8);
+        kv[1] = new String(v, StandardCharsets.UTF_8);
+        return true;
+    }
+
+    private static void writeVarint(OutputStream out, int value) throws IOException {
+        while ((value & ~0x7F) != 0) {
+            out.write((value & 0x7F) | 0x80);
+            value >>>= 7;
+        }
+        out.write(value);
+    }
+
+    private static int readVarint(byte[] data, int[] pos) throws IOException {
+        int result = 0;
+        for (int shift = 0; shift < 35; shift += 7) {
+            if (pos[0] >= data.length) throw new IOException("truncated record block");
+            int b = data[pos[0]++] & 0xFF;
+            result |= (b & 0x7F) << shift;
+            if ((b & 0x80) == 0) {
+                if (result < 0 || pos[0] + result > data.length) throw new IOException("corrupt record length");
+                return result;
+            }
+        }
+        throw new IOException("varint too long");
+    }
+
+    // -1 when the stream ends before the first byte and that is allowed.
+    private static int readVarint(InputStream in, boolean eofOk) throws IOException {
+        int result = 0;
+        for (int shift = 0; shift < 35; shift += 7) {
+            int b = in.read();
+            if (b < 0) {
+                if (shift == 0 && eofOk) return -1;
+                throw new IOException("truncated record block");
+            }
+            result |= (b & 0x7F) << shift;
+            if ((b & 0x80) == 0) {
+                if (result < 0) throw new IOException("corrupt record length");
+                return result;
+            }
+        }
+        throw new IOException("varint too long");
+    }
+
+    public static byte[] deflate(byte[] raw) {
+        Deflater d = new Deflater(Deflater.BEST_SPEED);
+        d.setInput(raw);
+        d.finish();
+        ByteArrayOutputStream out = new ByteArrayOutputStream(Math.max(64, raw.length / 4));
+        byte[] buf = new byte[64 * 1024];
+        while (!d.finished()) {
+            int n = d.deflate(buf);
+            out.write(buf, 0, n);
+        }
+        d.end();
+        return out.toByteArray();
+    }
+
+    public static byte[] inflate(byte[] compressed, long rawSize) throws IOException {
+        Inflater inf = new Inflater();
+        inf.setInput(compressed);
+        ByteArrayOutputStream out = new ByteArrayOutputStream((int) Math.max(64, Math.min(rawSize, Integer.MAX_VALUE - 8)));
+        byte[] buf = new byte[64 * 1024];
+        try {
+            while (!inf.finished()) {
+                int n = inf.inflate(buf);
+                if (n == 0 && (inf.needsInput() || inf.needsDictionary()))
+                    throw new IOException("truncated deflate block");
+                out.write(buf, 0, n);
+            }
+        } catch (DataFormatException e) {
+            throw new IOException("corrupt deflate block", e);
+        } finally {
+            inf.end();
+        }
+        return out.toByteArray();
+    }
+}
@@ -0,0 +1,568 @@
+package shuffle;
+
+import core.Partitioner;
+import core.Partitioners;
+
+import java.io.*;
+import java.nio.file.Files;
+import java.nio.file.Path;
+import java.nio.file.Paths;
+import java.util.*;
+import java.util.concurrent.atomic.AtomicLong;
+import java.util.concurrent.locks.ReentrantReadWriteLock;
+import java.util.function.Function;
+
+/**
+ * Intermediate key/value store for one job.
+ * <p>
+ * Map output is buffered per partition until the job's memory budget is
+ * exceeded; then every buffer is sorted by key and written to disk as a run.
+ * Reading a partition k-way merges its runs with the in-memory tail, so
+ * reducers always receive their input sorted (and therefore grouped) by key
+ * while master memory stays bounded by the budget.
+ * <p>
+ * Keys are hash-partitioned unless {@link #partitionFromSample} installs a
+ * strategy that is built from the first map outputs; until then records are
+ * held unpartitioned (within the same budget) and counted per key.
+ * <p>
+ * Map outputs are ingested concurrently: records are parsed and partitioned
+ * outside any lock, then appended under a shared lock plus the target
+ * partition's monitor. Spilling, sampling and structural changes take the
+ * exclusive lock.
+ * <p>
+ * A failed spill does not fail the ingest that triggered it: the records
+ * are already buffered and stay readable, so the map output must count as
+ * taken (ingesting it again would duplicate it). The failure is kept in
+ * {@link #spillError()} for the caller to fail the job.
+ */
+public class ShuffleStore implements AutoCloseable {
+    private static final long DEFAULT_MEMORY_MB = 64;
+    private static final long RECORD_OVERHEAD_BYTES = 64;
+
+    private final String jobId;
+    private final int partitions; // reduce partitions; merge partitions are added after them
+    private final long memoryBudgetBytes;
+    private final Path spillDir;
+
+    // Read lock: appends and partition reads. Write lock: spill, sampling, add/close partitions.
+    private final ReentrantReadWriteLock lock = new ReentrantReadWriteLock();
+    private final List<List<String[]>> buffers = new ArrayList<>(); // each list guarded by its own monitor
+    private final List<List<Path>> runs = new ArrayList<>();
+    private int[] counts;
+    private final AtomicLong bufferedBytes = new AtomicLong();
+    private int spills = 0;
+    private volatile IOException spillError; // first failed spill, null if none
+
+    // Work done for this job (reported by /api/jobs/debug)
+    private final AtomicLong ingestedBytes = new AtomicLong(); // map output received
+    private final AtomicLong ingestNanos = new AtomicLong();
+    private final AtomicLong servedBytes = new AtomicLong(); // reduce input handed out
+    private final AtomicLong mergeNanos = new AtomicLong();
+
+    private volatile Partitioner partitioner; // null while sampling
+    private Function<Map<String, Long>, Partitioner> sampledPartitioner;
+    private int sampleOutputsLeft;
+    private final List<String[]> unpartitioned = new ArrayList<>();
+    private final Map<String, Long> sample = new HashMap<>();
+
+    public ShuffleStore(String jobId, int partitions, long memoryBudgetBytes, Path spillRoot) {
+        this.jobId = jobId;
+        this.partitions = partitions;
+        this.memoryBudgetBytes = memoryBudgetBytes;
+        this.spillDir = spillRoot.resolve(jobId);
+        this.counts = new int[partitions];
+        this.partitioner = Partitioners.hash(partitions);
+        for (int i = 0; i < partitions; i++) {
+            buffers.add(new ArrayList<>());
+            runs.add(new ArrayList<>());
+        }
+    }
+
+    /**
+     * Budget from SHUFFLE_MEMORY_MB (default 64) and spill directory from
+     * SHUFFLE_SPILL_DIR (default ./shuffle).
+     */
+    public static ShuffleStore fromEnv(String jobId, int partitions) {
+        long mb = DEFAULT_MEMORY_MB;
+        try {
+            mb = Long.parseLong(System.getenv().getOrDefault("SHUFFLE_MEMORY_MB", String.valueOf(DEFAULT_MEMORY_MB)));
+        } catch (NumberFormatException e) {
+            System.err.println("[SHUFFLE WARN] Invalid SHUFFLE_MEMORY_MB, using " + DEFAULT_MEMORY_MB);
+        }
+        Path root = Paths.get(System.getenv().getOrDefault("SHUFFLE_SPILL_DIR", "shuffle"));
+        return new ShuffleStore(jobId, partitions, mb * 1024 * 1024, root);
+    }
+
+    public int partitions() {
+        return partitions;
+    }
+
+    /**
+     * Hold records until {@code sampleOutputs} map outputs have been ingested
+     * (or the memory budget fills up), then partition everything with the
+     * partitioner built from the sampled key counts. Call before ingesting.
+     */
+    public void partitionFromSample(int sampleOutputs, Function<Map<String, Long>, Partitioner> build) {
+        lock.writeLock().lock();
+        try {
+            this.partitioner = null;
+            this.sampledPartitioner = build;
+            this.sampleOutputsLeft = Math.max(1, sampleOutputs);
+        } finally {
+            lock.writeLock().unlock();
+        }
+    }
+
+    /**
+     * Keys spread over several partitions by the partitioner (their reduce outputs need a merge).
+     */
+    public Set<String> splitKeys() {
+        Partitioner p = partitioner;
+        return p == null ? Set.of() : p.splitKeys();
+    }
+
+    /**
+     * Add an empty partition after the existing ones and return its index.
+     */
+    public int addPartition() {
+        lock.writeLock().lock();
+        try {
+            buffers.add(new ArrayList<>());
+            runs.add(new ArrayList<>());
+            counts = Arrays.copyOf(counts, counts.length + 1);
+            return counts.length - 1;
+        } finally {
+            lock.writeLock().unlock();
+        }
+    }
+
+    /**
+     * Partition and buffer "k\tv\n..." map output. Returns the number of records added.
+     */
+    public int ingest(String kvLines) throws IOException {
+        long start = System.nanoTime();
+        try {
+            return ingest(sink -> parseLines(kvLines, sink));
+        } finally {
+            ingestNanos.addAndGet(System.nanoTime() - start);
+            ingestedBytes.addAndGet(kvLines.length());
+        }
+    }
+
+    /**
+     * Partition and buffer a raw {@link RecordCodec} block. Returns the number of records added.
+     */
+    public int ingestRecords(byte[] block) throws IOException {
+        long start = System.nanoTime();
+        try {
+            return ingest(sink -> RecordCodec.decode(block, sink));
+        } finally {
+            ingestNanos.addAndGet(System.nanoTime() - start);
+            ingestedBytes.addAndGet(block.length);
+        }
+    }
+
+    private interface Source {
+        int emit(RecordCodec.RecordSink sink) throws IOException;
+    }
+
+    private static int parseLines(String kvLines, RecordCodec.RecordSink sink) throws IOException {
+        int added = 0;
+        int start = 0;
+        int n = kvLines.length();
+        while (start < n) {
+            int end = kvLines.indexOf('\n', start);
+            if (end < 0) end = n;
+            int tab = kvLines.indexOf('\t', start);
+            if (tab >= 0 && tab < end) {
+                String k = kvLines.substring(start, tab);
+                String v = kvLines.substring(tab + 1, end);
+                if (!k.isBlank() || !v.isBlank()) {
+                    sink.accept(k, v);
+                    added++;
+                }
+            }
+            start = end + 1;
+        }
+        return added;
+    }
+
+    private int ingest(Source source) throws IOException {
+        Partitioner p = partitioner;
+        if (p == null) {
+            // Sampling: rare and short, done under the exclusive lock.
+            lock.writeLock().lock();
+            try {
+                int added = source.emit(this::route);
+                mapOutputDone();
+                return added;
+            } finally {
+                lock.writeLock().unlock();
+            }
+        }
+
+        // Parse and partition without holding any lock, then append per partition.
+        List<List<String[]>> batch = new ArrayList<>();
+        long[] bytes = {0};
+        int added = source.emit((k, v) -> {
+            int part = p.partition(k);
+            while (batch.size() <= part) batch.add(new ArrayList<>());
+            batch.get(part).add(new String[]{k, v});
+            bytes[0] += recordBytes(k, v);
+        });
+        append(batch, bytes[0]);
+        return added;
+    }
+
+    private static long recordBytes(String key, String value) {
+        return 2L * (key.length() + value.length()) + RECORD_OVERHEAD_BYTES;
+    }
+
+    private void append(List<List<String[]>> batch, long bytes) throws IOException {
+        lock.readLock().lock();
+        try {
+            for (int part = 0; part < batch.size(); part++) {
+                List<String[]> records = batch.get(part);
+                if (records.isEmpty()) continue;
+                List<String[]> buf = buffers.get(part);
+                synchronized (buf) {
+                    buf.addAll(records);
+                    counts[part] += records.size();
+                }
+            }
+            bytes = bufferedBytes.addAndGet(bytes);
+        } finally {
+            lock.readLock().unlock();
+        }
+        if (bytes > memoryBudgetBytes) spillIfOverBudget();
+    }
+
+    private void spillIfOverBudget() {
+        lock.writeLock().lock();
+        try {
+            // Another thread may have spilled already.
+            if (bufferedBytes.get() > memoryBudgetBytes) trySpill();
+        } finally {
+            lock.writeLock().unlock();
+        }
+    }
+
+    // Callers hold the write lock. Records stay buffered when the spill fails.
+    private void trySpill() {
+        try {
+            spill();
+        } catch (IOException e) {
+            if (spillError == null) spillError = e;
+            System.err.println("[SHUFFLE ERROR] job=" + jobId + " spill failed: " + e.getMessage());
+        }
+    }
+
+    /**
+     * The first spill that failed, or null. The buffered records are intact,
+     * but the job can no longer keep to its memory budget.
+     */
+    public IOException spillError() {
+        return spillError;
+    }
+
+    // Callers hold the write lock.
+    private void route(String key, String value) throws IOException {
+        if (partitioner != null) {
+            addLocked(partitioner.partition(key), key, value);
+            return;
+        }
+        unpartitioned.add(new String[]{key, value});
+        sample.merge(key, 1L, Long::sum);
+        if (bufferedBytes.addAndGet(recordBytes(key, value)) > memoryBudgetBytes) ensurePartitioned();
+    }
+
+    private void mapOutputDone() throws IOException {
+        if (partitioner == null && --sampleOutputsLeft <= 0) ensurePartitioned();
+    }
+
+    // Callers hold the write lock.
+    private void ensurePartitioned() {
+        if (partitioner != null) return;
+        Partitioner built = sampledPartitioner.apply(sample);
+        partitioner = built;
+        System.out.println("[SHUFFLE] job=" + jobId + " partitioner built from " + unpartitioned.size()
+                + " sampled records, " + sample.size() + " keys"
+                + (built.splitKeys().isEmpty() ? "" : ", split keys " + built.splitKeys()));
+        List<String[]> held = new ArrayList<>(unpartitioned);
+        unpartitioned.clear();
+        sample.clear();
+        bufferedBytes.set(0);
+        for (String[] r : held) addLocked(built.partition(r[0]), r[0], r[1]);
+    }
+
+    public void add(int partition, String key, String value) {
+        lock.writeLock().lock();
+        try {
+            addLocked(partition, key, value);
+        } finally {
+            lock.writeLock().unlock();
+        }
+    }
+
+    private void addLocked(int partition, String key, String value) {
+        buffers.get(partition).add(new String[]{key, value});
+        counts[partition]++;
+        if (bufferedBytes.addAndGet(recordBytes(key, value)) > memoryBudgetBytes) trySpill();
+    }
+
+    /**
+     * Records per partition (buffered and spilled). All zero while still sampling.
+     */
+    public List<Integer> partitionSizes() {
+        lock.writeLock().lock();
+        try {
+            List<Integer> sizes = new ArrayList<>(counts.length);
+            for (int c : counts) sizes.add(c);
+            return sizes;
+        } finally {
+            lock.writeLock().unlock();
+        }
+    }
+
+    /**
+     * Map output bytes ingested so far (characters for text output).
+     */
+    public long ingestedBytes() {
+        return ingestedBytes.get();
+    }
+
+    /**
+     * Reduce input served so far: key, value and two separators per record.
+     */
+    public long servedBytes() {
+        return servedBytes.get();
+    }
+
+    /**
+     * Time spent parsing and partitioning map output, summed over threads.
+     */
+    public long ingestMillis() {
+        return ingestNanos.get() / 1_000_000;
+    }
+
+    /**
+     * Time spent merging sorted partitions for reducers, summed over threads.
+     */
+    public long mergeMillis() {
+        return mergeNanos.get() / 1_000_000;
+    }
+
+    public int spillCount() {
+        lock.readLock().lock();
+        try {
+            return spills;
+        } finally {
+            lock.readLock().unlock();
+        }
+    }
+
+    // Callers hold the write lock.
+    private void spill() throws IOException {
+        Files.createDirectories(spillDir);
+        for (int p = 0; p < buffers.size(); p++) {
+            List<String[]> buf = buffers.get(p);
+            if (buf.isEmpty()) continue;
+            buf.sort(Comparator.comparing(r -> r[0]));
+            // RecordCodec format: keys and values may contain tabs and newlines (binary-record jobs)
+            Path run = spillDir.resolve("p" + p + "-run" + runs.get(p).size() + ".rec");
+            try (OutputStream out = new BufferedOutputStream(Files.newOutputStream(run), 64 * 1024)) {
+                for (String[] r : buf) RecordCodec.writeRecord(out, r[0], r[1]);
+            }
+            runs.get(p).add(run);
+            buffers.set(p, new ArrayList<>());
+        }
+        spills++;
+        System.out.println("[SHUFFLE] job=" + jobId + " spilled " + (bufferedBytes.get() / 1024) + "KB to " + spillDir);
+        bufferedBytes.set(0);
+    }
+
+    /**
+     * Stream a partition as "k\tv" lines sorted by key, separated by '\n'.
+     */
+    public void writePartition(int partition, Writer out) throws IOException {
+        boolean[] first = {true};
+        merge(partition, (k, v) -> {
+            if (!first[0]) out.write('\n');
+            out.write(k);
+            out.write('\t');
+            out.write(v);
+            first[0] = false;
+        });
+    }
+
+    /**
+     * Stream a partition as a raw {@link RecordCodec} block sorted by key. Returns the record count.
+     */
+    public int writePartitionRecords(int partition, OutputStream out) throws IOException {
+        int[] n = {0};
+        merge(partition, (k, v) -> {
+            RecordCodec.writeRecord(out, k, v);
+            n[0]++;
+        });
+        return n[0];
+    }
+
+    /**
+     * Partitions are merged under the shared lock, so several reduce inputs
+     * can be read in parallel; no spill can happen meanwhile.
+     */
+    private void merge(int partition, RecordCodec.RecordSink sink) throws IOException {
+        long start = System.nanoTime();
+        long[] bytes = {0};
+        try {
+            mergeCounted(partition, (k, v) -> {
+                bytes[0] += k.length() + v.length() + 2;
+                sink.accept(k, v);
+            });
+        } finally {
+            mergeNanos.addAndGet(System.nanoTime() - start);
+            servedBytes.addAndGet(bytes[0]);
+        }
+    }
+
+    private void mergeCounted(int partition, RecordCodec.RecordSink sink) throws IOException {
+        if (partitioner == null) {
+            lock.writeLock().lock();
+            try {
+                ensurePartitioned();
+            } finally {
+                lock.writeLock().unlock();
+            }
+        }
+        lock.readLock().lock();
+        try {
+            mergeLocked(partition, sink);
+        } finally {
+            lock.readLock().unlock();
+        }
+    }
+
+    private void mergeLocked(int partition, RecordCodec.RecordSink sink) throws IOException {
+        List<String[]> buf = buffers.get(partition);
+        List<String[]> mem;
+        synchronized (buf) {
+            mem = new ArrayList<>(buf);
+        }
+        mem.sort(Comparator.comparing(r -> r[0]));
+
+        List<Cursor> cursors = new ArrayList<>();
+        try {
+            List<Path> partRuns = runs.get(partition);
+            for (int i = 0; i < partRuns.size(); i++) {
+                cursors.add(new FileCursor(i, new BufferedInputStream(Files.newInputStream(partRuns.get(i)), 64 * 1024)));
+            }
+            cursors.add(new MemoryCursor(partRuns.size(), mem.iterator()));
+
+            // Ties keep arrival order: earlier runs first, memory tail last.
+            PriorityQueue<Cursor> heap = new PriorityQueue<>(
+                    Comparator.comparing((Cursor c) -> c.key).thenComparingInt(c -> c.order));
+            for (Cursor c : cursors) if (c.advance()) heap.add(c);
+
+            while (!heap.isEmpty()) {
+                Cursor c = heap.poll();
+                sink.accept(c.key, c.value);
+                if (c.advance()) heap.add(c);
+            }
+        } finally {
+            for (Cursor c : cursors) c.close();
+        }
+    }
+
+    /**
+     * Drop buffers and delete spill files.
+     */
+    @Override
+    public void close() {
+        lock.writeLock().lock();
+        try {
+            closeLocked();
+        } finally {
+            lock.writeLock().unlock();
+        }
+    }
+
+    private void closeLocked() {
+        unpartitioned.clear();
+        sample.clear();
+        for (int p = 0; p < buffers.size(); p++) {
+            buffers.set(p, new ArrayList<>());
+            for (Path run : runs.get(p)) {
+                try {
+                    Files.deleteIfExists(run);
+                } catch (IOException ignored) {
+                }
+            }
+            runs.get(p).clear();
+        }
+        try {
+            Files.deleteIfExists(spillDir);
+        } catch (IOException ignored) {
+        }
+        bufferedBytes.set(0);
+    }
+
+    private abstract static class Cursor implements Closeable {
+        final int order;
+        String key;
+        String value;
+
+        Cursor(int order) {
+            this.order = order;
+        }
+
+        abstract boolean advance() throws IOException;
+
+        @Override
+        public void close() {
+        }
+    }
+
+    private static final class MemoryCursor extends Cursor {
+        private final Iterator<String[]> it;
+
+        MemoryCursor(int order, Iterator<String[]> it) {
+            super(order);
+            this.it = it;
+        }
+
+        @Override
+        boolean advance() {
+            if (!it.hasNext()) return false;
+            String[] r = it.next();
+            key = r[0];
+            value = r[1];
+            return true;
+        }
+    }
+
+    private static final class FileCursor extends Cursor {
+        private final InputStream in;
+        private final String[] kv = new String[2];
+
+        FileCursor(int order, InputStream in) {
+            super(order);
+            this.in = in;
+        }
+
+        @Override
+        boolean advance() throws IOException {
+            if (!RecordCodec.readRecord(in, kv)) return false;
+            key = kv[0];
+            value = kv[1];
+            return true;
+        }
+
+        @Override
+        public void close() {
+            try {
+                in.close();
+            } catch (IOException ignored) {
+            }
+        }
+    }
+}
@@ -0,0 +1,416 @@
+package stencil;
+
+import model.JobSpec;
+import model.Task;
+import model.TaskType;
+import store.ResultSegments;
+
+import java.io.IOException;
+import java.util.*;
+import java.util.regex.Pattern;
+
+/**
+ * Iterative cellular-automaton job ("mode": "stencil").
+ * <p>
+ * The grid is cut into tiles of tile_size x tile_size cells. Generation 1 of
+ * every tile ships the tile's cells; the worker that runs it keeps the tile
+ * in memory, and every later step of that tile is pinned to it. After a step
+ * the worker reports only the tile's four edges (bit-packed rows/columns).
+ * Step g+1 of a tile is queued as soon as the tile and its eight neighbours
+ * have reported generation g, with the neighbours' edges as its halo, so
+ * fast regions run ahead of slow ones instead of waiting on a global barrier.
+ * The last step returns the whole tile, and the final grid is written one
+ * band of tile rows per result partition, in the input format: "W H" and
+ * then one line of space-separated 0/1 cells per row.
+ */
+public class StencilJob {
+    public static final int DEFAULT_TILE = 256;
+    public static final String DEFAULT_RULE = "B3/S23";
+    private static final Pattern RULE = Pattern.compile("B[0-8]*/S[0-8]*");
+
+    /**
+     * A tile's own edges after a step.
+     */
+    public static final class Edges {
+        public final byte[] north, south, west, east;
+
+        public Edges(byte[] north, byte[] south, byte[] west, byte[] east) {
+            this.north = north;
+            this.south = south;
+            this.west = west;
+            this.east = east;
+        }
+
+        int bytes() {
+            return len(north) + len(south) + len(west) + len(east);
+        }
+    }
+
+    /**
+     * Input of one step: the neighbours' edges around the tile (null = dead),
+     * the diagonal neighbour cells (1 NW, 2 NE, 4 SW, 8 SE) and, for
+     * generation 1 only, the tile itself.
+     */
+    public static final class Halo {
+        public int rows, cols;
+        public byte[] cells;
+        public byte[] north, south, west, east;
+        public int corners;
+        public boolean last;
+    }
+
+    public final String jobId;
+    public final int width, height, tileSize, tilesX, tilesY, generations;
+    public final String rule;
+    public final boolean wrap;
+
+    private final byte[][] initial; // per tile until its first step completed
+    private final Edges[][] edges;  // [generation % 2][tile]
+    private final int[] done;       // last generation each tile reported
+    private final int[] queued;     // last generation queued for each tile
+    private final String[] owner;   // worker holding each tile
+    private final byte[][] last;    // final cells per tile until its band is written
+    private final long[] live;      // live cells per generation (0 = input)
+    private final int[] reported;   // tiles that reported each generation
+    private int bandsLeft;
+    private boolean finishClaimed;
+    private int generation;         // every tile has reached this generation
+    private long stepsCompleted;
+    private long edgeBytes;         // halo traffic reported by workers
+
+    private StencilJob(String jobId, int width, int height, int tileSize, int generations, String rule, boolean wrap) {
+        this.jobId = jobId;
+        this.width = width;
+        this.height = height;
+        this.tileSize = tileSize;
+        this.tilesX = (width + tileSize - 1) / tileSize;
+        this.tilesY = (height + tileSize - 1) / tileSize;
+        this.generations = generations;
+        this.rule = rule;
+        this.wrap = wrap;
+        int tiles = tilesX * tilesY;
+        initial = new byte[tiles][];
+        edges = new Edges[2][tiles];
+        done = new int[tiles];
+        queued = new int[tiles];
+        owner = new String[tiles];
+        last = new byte[tiles][];
+        live = new long[generations + 1];
+        reported = new int[generations + 1];
+        bandsLeft = tilesY;
+    }
+
+    /**
+     * Parse the job spec and its grid: a "W H" header line, then H rows of W
+     * cells, either space-separated 0/1 or compact ("0110", '.'/'#').
+     * Missing rows and cells are dead; lines starting with '#' before the
+     * header are comments.
+     */
+    public static StencilJob parse(JobSpec spec, String text) {
+        int generations = Optional.ofNullable(spec.generations).orElse(1);
+        int tileSize = Optional.ofNullable(spec.tile_size).orElse(DEFAULT_TILE);
+        String rule = Optional.ofNullable(spec.rule).orElse(DEFAULT_RULE).trim().toUpperCase(Locale.ROOT);
+        if (generations < 0) throw new IllegalArgumentException("generations must be >= 0");
+        if (tileSize < 1) throw new IllegalArgumentException("tile_size must be >= 1");
+        if (!RULE.matcher(rule).matches()) throw new IllegalArgumentException("bad rule " + rule + " (expected e.g. B3/S23)");
+
+        String[] lines = Optional.ofNullable(text).orElse("").split("\n");
+        int at = 0;
+        while (at < lines.length && (lines[at].isBlank() || lines[at].startsWith("#"))) at++;
+        if (at == lines.length) throw new IllegalArgumentException("empty grid");
+        String[] header = lines[at++].trim().split("\\s+");
+        int width, height;
+        try {
+            width = Integer.parseInt(header[0]);
+            height = Integer.parseInt(header[1]);
+        } catch (RuntimeException e) {
+            throw new IllegalArgumentException("grid must start with a \"W H\" header line");
+        }
+        if (width < 1 || height < 1) throw new IllegalArgumentException("grid is empty");
+
+        StencilJob job = new StencilJob(spec.job_id, width, height, tileSize, generations, rule, Boolean.TRUE.equals(spec.wrap));
+        for (int t = 0; t < job.initial.length; t++) {
+            job.initial[t] = new byte[job.rows(t / job.tilesX) * rowBytes(job.cols(t % job.tilesX))];
+        }
+        long alive = 0;
+        for (int y = 0; y < height && at < lines.length; at++) {
+            String ln = lines[at].strip();
+            if (ln.isEmpty()) continue;
+            boolean spaced = ln.indexOf(' ') >= 0 || ln.indexOf('\t') >= 0;
+            int x = 0;
+            for (int i = 0; i < ln.length() && x < width; i++) {
+                char c = ln.charAt(i);
+                if (c == ' ' || c == '\t') continue;
+                if (c == '1' || c == '#' || c == '*' || c == 'O') {
+                    job.setInitial(x, y);
+                    alive++;
+                }
+                x++;
+                // one cell per token when the row is space-separated
+                if (spaced) while (i + 1 < ln.length() && ln.charAt(i + 1) != ' ' && ln.charAt(i + 1) != '\t') i++;
+            }
+            y++;
+        }
+        job.live[0] = alive;
+        return job;
+    }
+
+    private void setInitial(int x, int y) {
+        int tx = x / tileSize, ty = y / tileSize;
+        int c = x % tileSize, r = y % tileSize;
+        setBit(initial[ty * tilesX + tx], r * rowBytes(cols(tx)) + c / 8, c % 8);
+    }
+
+    public int tiles() {
+        return tilesX * tilesY;
+    }
+
+    int rows(int ty) {
+        return Math.min(tileSize, height - ty * tileSize);
+    }
+
+    int cols(int tx) {
+        return Math.min(tileSize, width - tx * tileSize);
+    }
+
+    /**
+     * Step tasks for generation 1 of every tile (none when generations is 0).
+     */
+    public synchronized List<Task> initialTasks() {
+        List<Task> out = new ArrayList<>();
+        if (generations == 0) return out;
+        for (int t = 0; t < tiles(); t++) {
+            queued[t] = 1;
+            out.add(stepTask(t, 1));
+        }
+        return out;
+    }
+
+    /**
+     * Record a step result. Returns the steps it made runnable; duplicates and
+     * late reports of a generation the tile already passed are ignored. The
+     * final grid is written to `result` band by band as the last steps land.
+     */
+    public synchronized List<Task> complete(String workerId, int tile, int gen, Edges e, long liveCells, byte[] cells,
+                                            ResultSegments result) throws IOException {
+        if (tile < 0 || tile >= tiles() || gen != done[tile] + 1 || gen > generations) return List.of();
+        if (gen == 1) {
+            owner[tile] = workerId;
+            initial[tile] = null;
+        }
+        edges[gen % 2][tile] = e;
+        done[tile] = gen;
+        stepsCompleted++;
+        edgeBytes += e.bytes();
+        live[gen] += liveCells;
+        if (++reported[gen] == tiles()) generation = gen;
+
+        if (gen == generations) {
+            last[tile] = cells;
+            int ty = tile / tilesX;
+            boolean band = true;
+            for (int tx = 0; tx < tilesX && band; tx++) band = last[ty * tilesX + tx] != null;
+            if (band) {
+                writeBand(ty, last, result);
+                for (int tx = 0; tx < tilesX; tx++) last[ty * tilesX + tx] = null;
+                bandsLeft--;
+            }
+            return List.of();
+        }
+        List<Task> out = new ArrayList<>();
+        for (int n : neighbourhood(tile)) {
+            if (queued[n] == gen && ready(n, gen)) {
+                queued[n] = gen + 1;
+                out.add(stepTask(n, gen + 1));
+            }
+        }
+        return out;
+    }
+
+    /**
+     * generations == 0: the result is the input grid itself.
+     */
+    public synchronized void writeInitial(ResultSegments result) throws IOException {
+        for (int ty = 0; ty < tilesY; ty++) writeBand(ty, initial, result);
+        bandsLeft = 0;
+    }
+
+    /**
+     * Every band of the final grid has been written.
+     */
+    public synchronized boolean finished() {
+        return bandsLeft == 0;
+    }
+
+    /**
+     * True exactly once, for the caller that should finish the job after the
+     * last band was written.
+     */
+    public synchronized boolean claimFinish() {
+        if (bandsLeft != 0 || finishClaimed) return false;
+        finishClaimed = true;
+        return true;
+    }
+
+    /**
+     * Whether `workerId` holds tiles that still have steps to run.
+     */
+    public synchronized boolean dependsOn(String workerId) {
+        for (int t = 0; t < tiles(); t++) {
+            if (workerId.equals(owner[t]) && done[t] < generations) return true;
+        }
+        return false;
+    }
+
+    /**
+     * Whether a report for (tile, gen) would be a duplicate of one already recorded.
+     */
+    public synchronized boolean reported(int tile, int gen) {
+        return tile < 0 || tile >= tiles() || gen <= done[tile];
+    }
+
+    public synchronized int generation() {
+        return generation;
+    }
+
+    public synchronized long live(int gen) {
+        return live[gen];
+    }
+
+    public synchronized long stepsCompleted() {
+        return stepsCompleted;
+    }
+
+    public long stepsTotal() {
+        return (long) tiles() * generations;
+    }
+
+    public synchronized long edgeBytes() {
+        return edgeBytes;
+    }
+
+    private Task stepTask(int tile, int gen) {
+        Task t = new Task();
+        t.type = TaskType.STEP;
+        t.taskId = "step-" + tile + "-" + gen;
+        t.jobId = jobId;
+        t.tile = tile;
+        t.generation = gen;
+        t.pinnedWorker = gen == 1 ? null : owner[tile];
+        t.halo = halo(tile, gen - 1);
+        return t;
+    }
+
+    private Halo halo(int tile, int g) {
+        int ty = tile / tilesX, tx = tile % tilesX;
+        Halo h = new Halo();
+        h.rows = rows(ty);
+        h.cols = cols(tx);
+        h.last = g + 1 == generations;
+        if (g == 0) h.cells = initial[tile];
+
+        Edges n = edges(g, ty - 1, tx), s = edges(g, ty + 1, tx);
+        Edges w = edges(g, ty, tx - 1), e = edges(g, ty, tx + 1);
+        h.north = n == null ? null : n.south;
+        h.south = s == null ? null : s.north;
+        h.west = w == null ? null : w.east;
+        h.east = e == null ? null : e.west;
+
+        Edges nw = edges(g, ty - 1, tx - 1), ne = edges(g, ty - 1, tx + 1);
+        Edges sw = edges(g, ty + 1, tx - 1), se = edges(g, ty + 1, tx + 1);
+        if (nw != null && bit(nw.south, cols(Math.floorMod(tx - 1, tilesX)) - 1)) h.corners |= 1;
+        if (ne != null && bit(ne.south, 0)) h.corners |= 2;
+        if (sw != null && bit(sw.north, cols(Math.floorMod(tx - 1, tilesX)) - 1)) h.corners |= 4;
+        if (se != null && bit(se.north, 0)) h.corners |= 8;
+        return h;
+    }
+
+    /**
+     * Edges of the tile at (ty, tx) after generation g: the initial cells'
+     * edges for g == 0, null outside the grid unless it wraps.
+     */
+    private Edges edges(int g, int ty, int tx) {
+        if (wrap) {
+            ty = Math.floorMod(ty, tilesY);
+            tx = Math.floorMod(tx, tilesX);
+        } else if (ty < 0 || ty >= tilesY || tx < 0 || tx >= tilesX) {
+            return null;
+        }
+        int t = ty * tilesX + tx;
+        return g == 0 ? initialEdges(t) : edges[g % 2][t];
+    }
+
+    private Edges initialEdges(int t) {
+        Edges cached = edges[0][t];
+        if (cached != null) return cached;
+        int rows = rows(t / tilesX), cols = cols(t % tilesX), rb = rowBytes(cols);
+        byte[] cells = initial[t];
+        byte[] west = new byte[rowBytes(rows)], east = new byte[rowBytes(rows)];
+        for (int r = 0; r < rows; r++) {
+            if (bit(cells, r * rb * 8)) setBit(west, r / 8, r % 8);
+            if (bit(cells, r * rb * 8 + cols - 1)) setBit(east, r / 8, r % 8);
+        }
+        Edges e = new Edges(Arrays.copyOfRange(cells, 0, rb), Arrays.copyOfRange(cells, (rows - 1) * rb, rows * rb), west, east);
+        edges[0][t] = e; // generation 2 overwrites it, by then no step needs it
+        return e;
+    }
+
+    /**
+     * The tile and its (distinct) neighbours.
+     */
+    private Set<Integer> neighbourhood(int tile) {
+        int ty = tile / tilesX, tx = tile % tilesX;
+        Set<Integer> out = new LinkedHashSet<>();
+        for (int dy = -1; dy <= 1; dy++) {
+            for (int dx = -1; dx <= 1; dx++) {
+                int y = ty + dy, x = tx + dx;
+                if (wrap) {
+                    y = Math.floorMod(y, tilesY);
+                    x = Math.floorMod(x, tilesX);
+                } else if (y < 0 || y >= tilesY || x < 0 || x >= tilesX) {
+                    continue;
+                }
+                out.add(y * tilesX + x);
+            }
+        }
+        return out;
+    }
+
+    private boolean ready(int tile, int gen) {
+        for (int n : neighbourhood(tile)) {
+            if (done[n] < gen) return false;
+        }
+        return true;
+    }
+
+    private void writeBand(int ty, byte[][] cells, ResultSegments result) throws IOException {
+        int rows = rows(ty);
+        StringBuilder sb = new StringBuilder(rows * width * 2 + (ty == 0 ? 16 : 0));
+        if (ty == 0) sb.append(width).append(' ').append(height).append('\n');
+        for (int r = 0; r < rows; r++) {
+            for (int x = 0; x < width; x++) {
+                int tx = x / tileSize, c = x % tileSize;
+                if (x > 0) sb.append(' ');
+                sb.append(bit(cells[ty * tilesX + tx], r * rowBytes(cols(tx)) * 8 + c) ? '1' : '0');
+            }
+            sb.append('\n');
+        }
+        result.write(ty, sb.toString());
+    }
+
+    static int rowBytes(int cells) {
+        return (cells + 7) / 8;
+    }
+
+    static boolean bit(byte[] b, int i) {
+        return b != null && i >= 0 && i / 8 < b.length && ((b[i / 8] >> (i % 8)) & 1) != 0;
+    }
+
+    private static void setBit(byte[] b, int index, int bit) {
+        b[index] |= (byte) (1 << bit);
+    }
+
+    private static int len(byte[] b) {
+        return b == null ? 0 : b.length;
+    }
+}
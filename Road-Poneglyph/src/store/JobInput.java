@@ -0,0 +1,134 @@
+package store;
+
+import java.io.IOException;
+import java.io.InputStream;
+import java.io.OutputStream;
+import java.nio.ByteBuffer;
+import java.nio.channels.FileChannel;
+import java.nio.charset.StandardCharsets;
+import java.nio.file.*;
+import java.util.ArrayList;
+import java.util.List;
+import java.util.UUID;
+import java.util.zip.GZIPInputStream;
+
+/**
+ * Job input uploaded as a file instead of inline {@code input_text}.
+ * <p>
+ * {@code POST /api/jobs/input} streams the body to {@code INPUT_DIR/<id>}
+ * (default ./input) block by block, inflating it first when it was sent
+ * gzip-compressed. A job that references the id is split into byte ranges
+ * ending on line boundaries, found by seeking instead of reading the input,
+ * and each map task reads its range only when it is dispatched.
+ */
+public class JobInput {
+    private static final int BLOCK = 64 * 1024;
+
+    private final String id;
+    private final Path file;
+
+    private JobInput(String id, Path file) {
+        this.id = id;
+        this.file = file;
+    }
+
+    private static Path root() {
+        return Paths.get(System.getenv().getOrDefault("INPUT_DIR", "input"));
+    }
+
+    /**
+     * Store an uploaded input and return it. The file only appears under its
+     * id once the whole body was received.
+     */
+    public static JobInput receive(InputStream body, boolean gzip) throws IOException {
+        Path dir = root();
+        Files.createDirectories(dir);
+        String id = UUID.randomUUID().toString();
+        Path tmp = dir.resolve(id + ".part");
+        try (InputStream in = gzip ? new GZIPInputStream(body, BLOCK) : body;
+             OutputStream out = Files.newOutputStream(tmp)) {
+            byte[] buf = new byte[BLOCK];
+            int n;
+            while ((n = in.read(buf)) > 0) out.write(buf, 0, n);
+        } catch (IOException e) {
+            Files.deleteIfExists(tmp);
+            throw e;
+        }
+        Path file = dir.resolve(id);
+        Files.move(tmp, file, StandardCopyOption.ATOMIC_MOVE);
+        return new JobInput(id, file);
+    }
+
+    /**
+     * A previously uploaded input, or null if there is none with this id.
+     */
+    public static JobInput open(String id) {
+        if (id == null || !id.matches("[0-9a-fA-F-]{1,64}")) return null;
+        Path file = root().resolve(id);
+        return Files.isRegularFile(file) ? new JobInput(id, file) : null;
+    }
+
+    public String id() {
+        return id;
+    }
+
+    public long size() throws IOException {
+        return Files.size(file);
+    }
+
+    /**
+     * Cut the input into ranges of about {@code splitSize} bytes, each
+     * extended to the end of its last line. Returns {offset, length} pairs.
+     */
+    public List<long[]> splits(int splitSize) throws IOException {
+        List<long[]> out = new ArrayList<>();
+        try (FileChannel ch = FileChannel.open(file, StandardOpenOption.READ)) {
+            long size = ch.size();
+            ByteBuffer buf = ByteBuffer.allocate(4096);
+            long start = 0;
+            while (start < size) {
+                long end = Math.min(size, start + splitSize);
+                end = lineEnd(ch, end, size, buf);
+                out.add(new long[]{start, end - start});
+                start = end;
+            }
+        }
+        return out;
+    }
+
+    // First position after the '\n' that ends the line containing byte pos-1 (or size).
+    private static long lineEnd(FileChannel ch, long pos, long size, ByteBuffer buf) throws IOException {
+        long at = pos - 1;
+        while (at < size) {
+            buf.clear();
+            int n = ch.read(buf, at);
+            if (n <= 0) break;
+            for (int i = 0; i < n; i++) {
+                if (buf.get(i) == '\n') return at + i + 1;
+            }
+            at += n;
+        }
+        return size;
+    }
+
+    /**
+     * Text of one split.
+     */
+    public String read(long offset, int length) throws IOException {
+        ByteBuffer buf = ByteBuffer.allocate(length);
+        try (FileChannel ch = FileChannel.open(file, StandardOpenOption.READ)) {
+            while (buf.hasRemaining()) {
+                if (ch.read(buf, offset + buf.position()) < 0) break;
+            }
+        }
+        return new String(buf.array(), 0, buf.position(), StandardCharsets.UTF_8);
+    }
+
+    public void delete() {
+        try {
+            Files.deleteIfExists(file);
+        } catch (IOException e) {
+            System.err.println("[INPUT] Could not delete " + file + ": " + e.getMessage());
+        }
+    }
+}
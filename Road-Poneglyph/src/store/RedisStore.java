@@ -1,35 +1,104 @@
 package store;
 
 import com.google.gson.Gson;
-import model.JobCtx;
 import model.JobSpec;
 import model.Worker;
 import redis.clients.jedis.JedisPooled;
-import utils.S3Utils;
+import redis.clients.jedis.Pipeline;
+import redis.clients.jedis.params.ScanParams;
+import redis.clients.jedis.resultset.ScanResult;
 
+import java.io.ByteArrayOutputStream;
+import java.nio.charset.StandardCharsets;
+import java.util.ArrayList;
+import java.util.HashMap;
 import java.util.List;
 import java.util.Map;
+import java.util.concurrent.BlockingDeque;
+import java.util.concurrent.BlockingQueue;
+import java.util.concurrent.ConcurrentHashMap;
+import java.util.concurrent.Executors;
+import java.util.concurrent.LinkedBlockingDeque;
+import java.util.concurrent.LinkedBlockingQueue;
+import java.util.concurrent.ScheduledExecutorService;
+import java.util.concurrent.TimeUnit;
+import java.util.concurrent.atomic.AtomicLong;
 
+/**
+ * Job and worker state in Redis, written behind the completion path.
+ * <p>
+ * Writes are queued and flushed by one background thread every
+ * REDIS_FLUSH_MS (default 20) as a single pipeline. Counter updates and
+ * heartbeats are coalesced, so only the latest value per job or worker goes
+ * out. Job, result and worker writes are never dropped: when a flush fails
+ * (Redis unreachable) they go back to the front of the queue and are retried
+ * with a backoff of up to MAX_RETRY_MS. Only map output cache entries are
+ * dropped, once MAX_PENDING_CACHE_OPS of them are waiting or when their
+ * flush fails.
+ * REDIS_WRITE_BEHIND=0 writes synchronously instead. Reads are always
+ * synchronous.
+ */
 public final class RedisStore implements AutoCloseable {
     private static final Gson GSON = new Gson();
+    private static final String HEARTBEATS = "gridmr:heartbeats"; // sorted set workerId -> last heartbeat
+    private static final int MAX_PENDING_CACHE_OPS = 100_000;
+    private static final int RESULT_CHUNK_BYTES = 1024 * 1024;
+    private static final long MIN_RETRY_MS = 100;
+    private static final long MAX_RETRY_MS = 5_000;
+
+    /**
+     * A queued write; runs on the writer thread against the current pipeline.
+     */
+    private interface Op {
+        void apply(Pipeline p) throws Exception;
+    }
 
     private final JedisPooled jedis;
+    private final boolean writeBehind;
+    private final BlockingDeque<Op> ops = new LinkedBlockingDeque<>(); // state: unbounded, in order
+    private final BlockingQueue<Op> cacheOps = new LinkedBlockingQueue<>(MAX_PENDING_CACHE_OPS); // best effort
+    private final Map<String, int[]> counters = new ConcurrentHashMap<>(); // jobId -> {maps, reduces}
+    private final Map<String, Long> heartbeats = new ConcurrentHashMap<>();
+    private final ScheduledExecutorService writer;
+    private final AtomicLong flushes = new AtomicLong();
+    private final AtomicLong commands = new AtomicLong();
+    private final AtomicLong dropped = new AtomicLong();
+    private final AtomicLong failedFlushes = new AtomicLong();
+    private long retryMs; // writer thread only: current backoff, 0 after a good flush
+    private long retryAt;
 
-    private RedisStore(String url) {
+    private RedisStore(String url, boolean writeBehind, long flushMs) {
         this.jedis = new JedisPooled(url);
+        this.writeBehind = writeBehind;
+        if (writeBehind) {
+            writer = Executors.newSingleThreadScheduledExecutor(r -> {
+                Thread t = new Thread(r, "redis-writer");
+                t.setDaemon(true);
+                return t;
+            });
+            writer.scheduleWithFixedDelay(this::flush, flushMs, flushMs, TimeUnit.MILLISECONDS);
+        } else {
+            writer = null;
+        }
     }
 
     public static RedisStore fromEnvOrNull() {
         try {
             String url = System.getenv().getOrDefault("REDIS_URL", "");
             if (url.isBlank()) return null;
-            return new RedisStore(url);
+            boolean writeBehind = !"0".equals(System.getenv().getOrDefault("REDIS_WRITE_BEHIND", "1"));
+            long flushMs = Long.parseLong(System.getenv().getOrDefault("REDIS_FLUSH_MS", "20"));
+            return connect(url, writeBehind, flushMs);
         } catch (Exception e) {
             e.printStackTrace();
             return null; // run without Redis if not available
         }
     }
 
+    public static RedisStore connect(String url, boolean writeBehind, long flushMs) {
+        return new RedisStore(url, writeBehind, Math.max(1, flushMs));
+    }
+
     public boolean healthy() {
         try {
             return "PONG".equalsIgnoreCase(jedis.ping());
@@ -38,141 +107,293 @@ public final class RedisStore implements AutoCloseable {
         }
     }
 
+    // --- Write-behind ---
+    private void submit(Op op) {
+        if (!writeBehind) {
+            writeNow(op);
+            return;
+        }
+        ops.add(op);
+    }
+
+    /**
+     * A write that may be lost when the writer falls behind (map output cache).
+     */
+    private void submitDroppable(Op op) {
+        if (!writeBehind) {
+            writeNow(op);
+            return;
+        }
+        if (!cacheOps.offer(op) && dropped.incrementAndGet() % 1000 == 1) {
+            System.err.println("[REDIS WARN] Cache write queue full, dropped " + dropped.get() + " writes so far");
+        }
+    }
+
+    private void writeNow(Op op) {
+        try (Pipeline p = jedis.pipelined()) {
+            op.apply(p);
+            p.sync();
+        } catch (Exception e) {
+            System.err.println("[REDIS ERROR] " + e.getMessage());
+        }
+    }
+
+    /**
+     * Send everything queued so far as one pipeline. Runs on the writer thread
+     * (and once more on close). After a failed flush the next attempts wait
+     * for the backoff, except the last one on close.
+     */
+    private void flush() {
+        flush(false);
+    }
+
+    private synchronized void flush(boolean force) {
+        if (ops.isEmpty() && cacheOps.isEmpty() && counters.isEmpty() && heartbeats.isEmpty()) return;
+        if (!force && System.currentTimeMillis() < retryAt) return;
+        List<Op> state = new ArrayList<>();
+        List<Op> cache = new ArrayList<>();
+        ops.drainTo(state);
+        cacheOps.drainTo(cache);
+        Map<String, int[]> counterBatch = new HashMap<>();
+        for (String jobId : new ArrayList<>(counters.keySet())) {
+            int[] c = counters.remove(jobId);
+            if (c != null) counterBatch.put(jobId, c);
+        }
+        Map<String, Long> heartbeatBatch = new HashMap<>();
+        for (String workerId : new ArrayList<>(heartbeats.keySet())) {
+            Long ts = heartbeats.remove(workerId);
+            if (ts != null) heartbeatBatch.put(workerId, ts);
+        }
+        try (Pipeline p = jedis.pipelined()) {
+            apply(p, state);
+            apply(p, cache);
+            counterBatch.forEach((jobId, c) -> p.hset("gridmr:jobs:" + jobId + ":counters", Map.of(
+                    "maps_completed", String.valueOf(c[0]),
+                    "reduces_completed", String.valueOf(c[1])
+            )));
+            heartbeatBatch.forEach((workerId, ts) -> {
+                p.hset("gridmr:workers:" + workerId, "lastHeartbeat", String.valueOf(ts));
+                p.zadd(HEARTBEATS, ts, workerId);
+            });
+            commands.addAndGet(p.syncAndReturnAll().size());
+            flushes.incrementAndGet();
+            retryMs = 0;
+        } catch (Exception e) {
+            // Put the state writes back in front of anything queued since, in order
+            for (int i = state.size() - 1; i >= 0; i--) ops.addFirst(state.get(i));
+            counterBatch.forEach((jobId, c) -> counters.merge(jobId, c,
+                    (a, b) -> new int[]{Math.max(a[0], b[0]), Math.max(a[1], b[1])}));
+            heartbeatBatch.forEach((workerId, ts) -> heartbeats.merge(workerId, ts, Math::max));
+            dropped.addAndGet(cache.size());
+            failedFlushes.incrementAndGet();
+            retryMs = retryMs == 0 ? MIN_RETRY_MS : Math.min(MAX_RETRY_MS, retryMs * 2);
+            retryAt = System.currentTimeMillis() + retryMs;
+            System.err.println("[REDIS ERROR] Flush of " + (state.size() + counterBatch.size() + heartbeatBatch.size())
+                    + " writes failed, retrying in " + retryMs + "ms: " + e.getMessage());
+        }
+    }
+
+    private static void apply(Pipeline p, List<Op> batch) {
+        for (Op op : batch) {
+            try {
+                op.apply(p);
+            } catch (Exception e) {
+                System.err.println("[REDIS ERROR] Queued write failed: " + e.getMessage());
+            }
+        }
+    }
+
+    /**
+     * Writer counters: flushes, failed flushes, commands sent, writes still
+     * queued, writes dropped.
+     */
+    public Map<String, Long> writerStats() {
+        return Map.of("flushes", flushes.get(), "failedFlushes", failedFlushes.get(), "commands", commands.get(),
+                "pending", (long) ops.size() + cacheOps.size() + counters.size() + heartbeats.size(),
+                "dropped", dropped.get());
+    }
+
     // --- Workers ---
     public void saveWorker(Worker w) {
-        if (jedis == null) return;
         String key = "gridmr:workers:" + w.workerId;
-        jedis.hset(key, Map.of(
+        Map<String, String> fields = Map.of(
                 "workerId", w.workerId,
                 "name", w.name,
                 "capacity", String.valueOf(w.capacity),
                 "lastHeartbeat", String.valueOf(w.lastHeartbeat)
-        ));
+        );
+        long ts = w.lastHeartbeat;
+        submit(p -> {
+            p.hset(key, fields);
+            p.zadd(HEARTBEATS, ts, w.workerId);
+        });
+    }
+
+    /**
+     * Record a heartbeat; only the latest per worker is written.
+     */
+    public void touchWorker(String workerId, long ts) {
+        if (!writeBehind) {
+            submit(p -> {
+                p.hset("gridmr:workers:" + workerId, "lastHeartbeat", String.valueOf(ts));
+                p.zadd(HEARTBEATS, ts, workerId);
+            });
+            return;
+        }
+        heartbeats.merge(workerId, ts, Math::max);
     }
 
     public void removeWorker(String workerId) {
-        if (jedis == null) return;
-        String key = "gridmr:workers:" + workerId;
-        jedis.del(key);
+        // A heartbeat still pending would recreate the worker's hash after the delete.
+        // Locked so a failed flush cannot put one back between the two steps.
+        synchronized (this) {
+            heartbeats.remove(workerId);
+            submit(p -> {
+                p.del("gridmr:workers:" + workerId);
+                p.zrem(HEARTBEATS, workerId);
+            });
+        }
         System.out.println("[REDIS] Removed worker: " + workerId);
     }
 
+    /**
+     * Remove workers whose last heartbeat is older than the threshold, found
+     * through the heartbeat index. Worker hashes written before the index
+     * existed are indexed first with SCAN (never KEYS).
+     */
     public void cleanupStaleWorkers(long staleThresholdMs) {
-        if (jedis == null) return;
         try {
-            // Get all worker keys
-            var workerKeys = jedis.keys("gridmr:workers:*");
-            long currentTime = System.currentTimeMillis();
-            int removedCount = 0;
-
-            for (String key : workerKeys) {
-                String lastHeartbeatStr = jedis.hget(key, "lastHeartbeat");
-                if (lastHeartbeatStr != null) {
-                    long lastHeartbeat = Long.parseLong(lastHeartbeatStr);
-                    if (currentTime - lastHeartbeat > staleThresholdMs) {
-                        String workerId = jedis.hget(key, "workerId");
-                        jedis.del(key);
-                        removedCount++;
-                        System.out.println("[REDIS] Cleaned up stale worker: " + workerId + 
-                                " (last heartbeat: " + (currentTime - lastHeartbeat) + "ms ago)");
-                    }
+            if (!jedis.exists(HEARTBEATS)) indexExistingWorkers();
+
+            long cutoff = System.currentTimeMillis() - staleThresholdMs;
+            List<String> stale = jedis.zrangeByScore(HEARTBEATS, Double.NEGATIVE_INFINITY, cutoff);
+            if (stale.isEmpty()) return;
+            try (Pipeline p = jedis.pipelined()) {
+                for (String workerId : stale) {
+                    p.del("gridmr:workers:" + workerId);
+                    p.zrem(HEARTBEATS, workerId);
+                    System.out.println("[REDIS] Cleaned up stale worker: " + workerId);
                 }
+                p.sync();
             }
-            
-            if (removedCount > 0) {
-                System.out.println("[REDIS] Cleaned up " + removedCount + " stale workers");
-            }
+            System.out.println("[REDIS] Cleaned up " + stale.size() + " stale workers");
         } catch (Exception e) {
             System.err.println("[REDIS] Error cleaning up stale workers: " + e.getMessage());
         }
     }
 
+    private void indexExistingWorkers() {
+        ScanParams params = new ScanParams().match("gridmr:workers:*").count(500);
+        String cursor = ScanParams.SCAN_POINTER_START;
+        do {
+            ScanResult<String> page = jedis.scan(cursor, params);
+            for (String key : page.getResult()) {
+                String ts = jedis.hget(key, "lastHeartbeat");
+                if (ts != null) jedis.zadd(HEARTBEATS, Long.parseLong(ts), key.substring("gridmr:workers:".length()));
+            }
+            cursor = page.getCursor();
+        } while (!ScanParams.SCAN_POINTER_START.equals(cursor));
+    }
+
     // --- Jobs ---
     public void saveJobSpec(JobSpec spec) {
-        if (jedis == null) return;
-        jedis.set("gridmr:jobs:" + spec.job_id + ":spec", GSON.toJson(spec));
+        String json = GSON.toJson(spec);
+        submit(p -> p.set("gridmr:jobs:" + spec.job_id + ":spec", json));
     }
 
+    /**
+     * Called on every completion; coalesced to one HSET per job and flush.
+     */
     public void saveJobCounters(String jobId, int mapsCompleted, int reducesCompleted) {
-        if (jedis == null) return;
-        String key = "gridmr:jobs:" + jobId + ":counters";
-        jedis.hset(key, Map.of(
-                "maps_completed", String.valueOf(mapsCompleted),
-                "reduces_completed", String.valueOf(reducesCompleted)
-        ));
+        if (!writeBehind) {
+            submit(p -> p.hset("gridmr:jobs:" + jobId + ":counters", Map.of(
+                    "maps_completed", String.valueOf(mapsCompleted),
+                    "reduces_completed", String.valueOf(reducesCompleted)
+            )));
+            return;
+        }
+        counters.merge(jobId, new int[]{mapsCompleted, reducesCompleted},
+                (a, b) -> new int[]{Math.max(a[0], b[0]), Math.max(a[1], b[1])});
     }
 
     public void savePartitionSizes(String jobId, List<Integer> sizes) {
-        if (jedis == null) return;
-        jedis.set("gridmr:jobs:" + jobId + ":partitions", GSON.toJson(sizes));
+        String json = GSON.toJson(sizes);
+        submit(p -> p.set("gridmr:jobs:" + jobId + ":partitions", json));
     }
 
     public void setJobState(String jobId, String state) {
-        if (jedis == null) return;
-        jedis.set("gridmr:jobs:" + jobId + ":state", state);
+        submit(p -> p.set("gridmr:jobs:" + jobId + ":state", state));
     }
 
-    public void storeFinalResult(String jobId, String output) {
-        if (jedis == null) return;
-        jedis.set("gridmr:jobs:" + jobId + ":result", output);
-
-        // Also store in S3
-        storeResultInS3(jobId, output);
+    /**
+     * Store the result in chunks of at most 1MB, streamed from the segment
+     * files: hash {@code gridmr:jobs:<id>:result} holds fields
+     * {@code <partition>:<chunk>}, and {@code ...:result:meta} lists the
+     * partitions, chunk counts and total size.
+     */
+    public void storeFinalResult(String jobId, ResultSegments result) {
+        String key = "gridmr:jobs:" + jobId + ":result";
+        byte[] rawKey = key.getBytes(StandardCharsets.UTF_8);
+        submit(p -> {
+            p.del(key, key + ":meta");
+            List<String> parts = new ArrayList<>();
+            long total = 0;
+            for (int part : result.partitions()) {
+                long size = result.size(part);
+                int chunks = 0;
+                for (long off = 0; off < size; off += RESULT_CHUNK_BYTES, chunks++) {
+                    ByteArrayOutputStream chunk = new ByteArrayOutputStream();
+                    result.transferTo(chunk, part, off, Math.min(RESULT_CHUNK_BYTES, size - off));
+                    p.hset(rawKey, (part + ":" + chunks).getBytes(StandardCharsets.UTF_8), chunk.toByteArray());
+                    if (chunks % 16 == 15) p.sync(); // bound what the pipeline buffers
+                }
+                p.hset(key + ":meta", "chunks:" + part, String.valueOf(chunks));
+                parts.add(String.valueOf(part));
+                total += size;
+            }
+            p.hset(key + ":meta", Map.of(
+                    "partitions", String.join(",", parts),
+                    "bytes", String.valueOf(total),
+                    "chunk_bytes", String.valueOf(RESULT_CHUNK_BYTES),
+                    "dir", result.dir().toAbsolutePath().toString()
+            ));
+            p.sync();
+        });
     }
 
     /**
-     * Store job result in AWS S3 with Redis metadata.
+     * Where the result was uploaded, once the S3 upload finished.
      */
-    private void storeResultInS3(String jobId, String output) {
-        try {
-            S3Utils s3Utils = S3Utils.fromEnvironment();
-            if (s3Utils == null) {
-                System.out.println("[REDIS-S3] S3 storage not configured - skipping S3 upload");
-                return;
-            }
-            
-            if (!s3Utils.isBucketAccessible()) {
-                System.err.println("[REDIS-S3] Bucket not accessible - skipping S3 upload");
-                return;
-            }
-            
-            // Retrieve additional metadata from Redis
-            Map<String, String> metadata = new java.util.HashMap<>();
-            metadata.put("storage-source", "redis-store");
-            metadata.put("stored-timestamp", String.valueOf(System.currentTimeMillis()));
-            
-            // Get job counters if available
-            String countersKey = "gridmr:jobs:" + jobId + ":counters";
-            Map<String, String> counters = jedis.hgetAll(countersKey);
-            if (counters != null && !counters.isEmpty()) {
-                metadata.put("maps-completed", counters.getOrDefault("maps_completed", "0"));
-                metadata.put("reduces-completed", counters.getOrDefault("reduces_completed", "0"));
-            }
-            
-            // Get job state if available
-            String state = jedis.get("gridmr:jobs:" + jobId + ":state");
-            if (state != null) {
-                metadata.put("job-state", state);
-            }
-            
-            // Store the result in S3
-            String s3Key = s3Utils.storeJobResultWithMetadata(jobId, output, metadata);
-            
-            // Store S3 location back in Redis for reference
-            jedis.set("gridmr:jobs:" + jobId + ":s3_location", s3Key);
-            
-            System.out.println("[REDIS-S3] Job result stored at S3: " + s3Key);
-            
-            s3Utils.close();
-            
-        } catch (Exception e) {
-            System.err.println("[REDIS-S3 ERROR] Failed to store result in S3: " + e.getMessage());
-        }
+    public void saveResultLocation(String jobId, String s3Key) {
+        submit(p -> p.set("gridmr:jobs:" + jobId + ":s3_location", s3Key));
     }
+
+    // --- Map output cache ---
+    public void saveMapOutput(String cacheKey, byte[] records, long ttlSeconds) {
+        byte[] key = ("gridmr:mapcache:" + cacheKey).getBytes(StandardCharsets.UTF_8);
+        submitDroppable(p -> p.setex(key, ttlSeconds, records));
+    }
+
+    public byte[] loadMapOutput(String cacheKey) {
+        return jedis.get(("gridmr:mapcache:" + cacheKey).getBytes(StandardCharsets.UTF_8));
+    }
+
+    /**
+     * Stop the writer, flush what is still queued and close the connection pool.
+     */
     @Override
     public void close() {
+        if (writer != null) {
+            writer.shutdown();
+            try {
+                writer.awaitTermination(5, TimeUnit.SECONDS);
+            } catch (InterruptedException e) {
+                Thread.currentThread().interrupt();
+            }
+            flush(true);
+        }
         try {
-            if (jedis != null) jedis.close();
+            jedis.close();
         } catch (Exception ignored) {
         }
     }
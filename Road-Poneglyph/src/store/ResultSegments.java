@@ -0,0 +1,177 @@
+package store;
+
+import java.io.*;
+import java.nio.channels.Channels;
+import java.nio.channels.FileChannel;
+import java.nio.channels.WritableByteChannel;
+import java.nio.charset.StandardCharsets;
+import java.nio.file.*;
+import java.util.*;
+import java.util.stream.Stream;
+
+/**
+ * Final output of one job, one file per reduce partition.
+ * <p>
+ * Each reduce output is written to {@code RESULT_DIR/<job>/part-NNNNN} when
+ * it arrives, so the result is never assembled in memory. Reading it (all
+ * partitions, one partition, or a byte range of either) streams straight
+ * from those files in partition order.
+ */
+public class ResultSegments {
+    private final Path dir;
+
+    public ResultSegments(String jobId, Path root) {
+        this.dir = root.resolve(jobId);
+    }
+
+    /**
+     * Empty segments under RESULT_DIR (default ./out) for a new job. Segments
+     * left by an earlier job with the same id are deleted, so they never end
+     * up in this job's result.
+     */
+    public static ResultSegments fromEnv(String jobId) throws IOException {
+        ResultSegments result = new ResultSegments(jobId, Paths.get(System.getenv().getOrDefault("RESULT_DIR", "out")));
+        result.clear();
+        return result;
+    }
+
+    /**
+     * Delete every segment (and leftover temporary file) of this job.
+     */
+    public void clear() throws IOException {
+        if (!Files.isDirectory(dir)) return;
+        try (Stream<Path> files = Files.list(dir)) {
+            for (Path p : (Iterable<Path>) files::iterator) {
+                String name = p.getFileName().toString();
+                if (name.startsWith("part-")) Files.deleteIfExists(p);
+            }
+        }
+    }
+
+    public Path dir() {
+        return dir;
+    }
+
+    private Path segment(int partition) {
+        return dir.resolve(String.format("part-%05d", partition));
+    }
+
+    /**
+     * Store the output of a partition ("k\tv" lines), replacing any earlier one.
+     * The file appears atomically, so readers never see a partial segment.
+     */
+    public void write(int partition, String output) throws IOException {
+        Files.createDirectories(dir);
+        Path tmp = dir.resolve(String.format("part-%05d.%d.tmp", partition, Thread.currentThread().getId()));
+        try (Writer w = Files.newBufferedWriter(tmp, StandardCharsets.UTF_8)) {
+            w.write(output);
+            if (!output.isEmpty() && !output.endsWith("\n")) w.write('\n');
+        }
+        Files.move(tmp, segment(partition), StandardCopyOption.REPLACE_EXISTING, StandardCopyOption.ATOMIC_MOVE);
+    }
+
+    /**
+     * Partitions that have a segment, in ascending order.
+     */
+    public List<Integer> partitions() throws IOException {
+        if (!Files.isDirectory(dir)) return List.of();
+        List<Integer> out = new ArrayList<>();
+        try (Stream<Path> files = Files.list(dir)) {
+            files.map(p -> p.getFileName().toString())
+                    .filter(n -> n.matches("part-\\d+"))
+                    .forEach(n -> out.add(Integer.parseInt(n.substring("part-".length()))));
+        }
+        Collections.sort(out);
+        return out;
+    }
+
+    public boolean has(int partition) {
+        return Files.exists(segment(partition));
+    }
+
+    public long size(int partition) throws IOException {
+        return Files.size(segment(partition));
+    }
+
+    /**
+     * Bytes of the selected partition, or of all partitions when {@code partition} is null.
+     */
+    public long bytes(Integer partition) throws IOException {
+        if (partition != null) return size(partition.intValue());
+        long total = 0;
+        for (int p : partitions()) total += size(p);
+        return total;
+    }
+
+    /**
+     * Copy {@code length} bytes starting at {@code offset} of the selected
+     * partition (or of all partitions concatenated) to {@code out}.
+     */
+    public void transferTo(OutputStream out, Integer partition, long offset, long length) throws IOException {
+        List<Integer> parts = partition != null ? List.of(partition) : partitions();
+        WritableByteChannel target = Channels.newChannel(out);
+        long skip = offset;
+        long left = length;
+        for (int p : parts) {
+            if (left <= 0) break;
+            try (FileChannel ch = FileChannel.open(segment(p), StandardOpenOption.READ)) {
+                long size = ch.size();
+                if (skip >= size) {
+                    skip -= size;
+                    continue;
+                }
+                long pos = skip;
+                long end = Math.min(size, skip + left);
+                while (pos < end) pos += ch.transferTo(pos, end - pos, target);
+                left -= end - skip;
+                skip = 0;
+            }
+        }
+        out.flush();
+    }
+
+    /**
+     * All partitions concatenated, for consumers that need a single stream.
+     */
+    public InputStream open() throws IOException {
+        List<InputStream> streams = new ArrayList<>();
+        for (int p : partitions()) streams.add(new BufferedInputStream(Files.newInputStream(segment(p))));
+        return new SequenceInputStream(Collections.enumeration(streams));
+    }
+
+    public String read(int partition) throws IOException {
+        return Files.readString(segment(partition), StandardCharsets.UTF_8);
+    }
+
+    /**
+     * Remove the lines of the given keys from every segment, rewriting only
+     * the segments that contained some. Returns the removed records as {key, value}.
+     */
+    public List<String[]> extractKeys(Set<String> keys) throws IOException {
+        List<String[]> removed = new ArrayList<>();
+        for (int p : partitions()) {
+            Path seg = segment(p);
+            Path tmp = dir.resolve(seg.getFileName() + ".extract.tmp");
+            int before = removed.size();
+            try (BufferedReader r = Files.newBufferedReader(seg, StandardCharsets.UTF_8);
+                 Writer w = Files.newBufferedWriter(tmp, StandardCharsets.UTF_8)) {
+                String line;
+                while ((line = r.readLine()) != null) {
+                    int tab = line.indexOf('\t');
+                    if (tab >= 0 && keys.contains(line.substring(0, tab))) {
+                        removed.add(new String[]{line.substring(0, tab), line.substring(tab + 1)});
+                    } else if (!line.isEmpty()) {
+                        w.write(line);
+                        w.write('\n');
+                    }
+                }
+            }
+            if (removed.size() > before) {
+                Files.move(tmp, seg, StandardCopyOption.REPLACE_EXISTING, StandardCopyOption.ATOMIC_MOVE);
+            } else {
+                Files.deleteIfExists(tmp);
+            }
+        }
+        return removed;
+    }
+}
@@ -0,0 +1,168 @@
+package store;
+
+import model.JobCtx;
+import utils.S3Utils;
+
+import java.io.InputStream;
+import java.util.HashMap;
+import java.util.Map;
+import java.util.Set;
+import java.util.concurrent.ConcurrentHashMap;
+import java.util.concurrent.ExecutorService;
+import java.util.concurrent.Executors;
+import java.util.concurrent.TimeUnit;
+import java.util.concurrent.atomic.AtomicLong;
+
+/**
+ * Uploads finished job results to S3 off the completion path.
+ * <p>
+ * One long-lived {@link S3Utils} (pooled connections) is shared by every
+ * upload. Jobs are queued on a single background thread and streamed from
+ * their result segments as a multipart upload, so neither the request that
+ * finishes a job nor the upload itself holds the result in memory. Each run
+ * of a job is uploaded at most once; a failed upload is retried with backoff.
+ * A job id is "uploading" from submit until its upload ends, and a new run
+ * with that id must wait for it (its segments would be cleared under it).
+ */
+public class ResultUploader implements AutoCloseable {
+    private static final int MAX_ATTEMPTS = 3;
+
+    private final S3Utils s3;
+    private final RedisStore redis; // null = don't record the S3 location
+    private final int partBytes;
+    private final Set<String> uploading = ConcurrentHashMap.newKeySet(); // job ids queued or streaming
+    private final ExecutorService executor = Executors.newSingleThreadExecutor(r -> {
+        Thread t = new Thread(r, "s3-uploader");
+        t.setDaemon(true);
+        return t;
+    });
+    private final AtomicLong submitted = new AtomicLong();
+    private final AtomicLong uploaded = new AtomicLong();
+    private final AtomicLong failed = new AtomicLong();
+
+    public ResultUploader(S3Utils s3, RedisStore redis, int partBytes) {
+        this.s3 = s3;
+        this.redis = redis;
+        this.partBytes = partBytes;
+    }
+
+    /**
+     * Uploader for the bucket configured in the environment (see
+     * {@link S3Utils#fromEnvironment()}), or null when S3 is not configured or
+     * the bucket is not reachable. Part size from S3_UPLOAD_PART_MB (default 8,
+     * minimum 5).
+     */
+    public static ResultUploader fromEnvOrNull(RedisStore redis) {
+        S3Utils s3 = S3Utils.fromEnvironment();
+        if (s3 == null) {
+            System.out.println("[S3] S3 storage not configured - results stay local");
+            return null;
+        }
+        if (!s3.isBucketAccessible()) {
+            System.err.println("[S3] Bucket not accessible - S3 upload disabled");
+            s3.close();
+            return null;
+        }
+        int partMb = 8;
+        try {
+            partMb = Integer.parseInt(System.getenv().getOrDefault("S3_UPLOAD_PART_MB", "8"));
+        } catch (NumberFormatException e) {
+            System.err.println("[S3 WARN] Invalid S3_UPLOAD_PART_MB, using 8");
+        }
+        int partBytes = Math.max(S3Utils.MIN_PART_BYTES, partMb * 1024 * 1024);
+        System.out.println("[S3] Uploading results in the background (" + (partBytes >> 20) + "MB parts)");
+        return new ResultUploader(s3, redis, partBytes);
+    }
+
+    /**
+     * Queue the upload of a finished job's result. Returns false if this run
+     * of the job was already submitted.
+     */
+    public boolean submit(JobCtx ctx) {
+        if (!ctx.uploadSubmitted.compareAndSet(false, true)) return false;
+        String jobId = ctx.spec.job_id;
+        uploading.add(jobId);
+        submitted.incrementAndGet();
+        executor.execute(() -> {
+            try {
+                upload(ctx);
+            } finally {
+                uploading.remove(jobId);
+            }
+        });
+        return true;
+    }
+
+    /**
+     * Whether a result of {@code jobId} is queued or being uploaded.
+     */
+    public boolean isUploading(String jobId) {
+        return uploading.contains(jobId);
+    }
+
+    private void upload(JobCtx ctx) {
+        String jobId = ctx.spec.job_id;
+        for (int attempt = 1; attempt <= MAX_ATTEMPTS; attempt++) {
+            try {
+                Map<String, String> metadata = new HashMap<>();
+                metadata.put("job-type", "mapreduce");
+                metadata.put("maps-completed", String.valueOf(ctx.completedMaps.get()));
+                metadata.put("reduces-completed", String.valueOf(ctx.completedReduces.get()));
+                long size = ctx.result.bytes(null);
+                metadata.put("final-output-size", String.valueOf(size));
+
+                String s3Key;
+                try (InputStream in = ctx.result.open()) {
+                    s3Key = s3.storeJobResultMultipart(jobId, in, size, metadata, partBytes);
+                }
+                ctx.s3Key = s3Key;
+                if (redis != null) redis.saveResultLocation(jobId, s3Key);
+                uploaded.incrementAndGet();
+
+                String presignedUrl = s3.generatePresignedUrl(s3Key, 24 * 60);
+                if (presignedUrl != null) {
+                    System.out.println("[S3] Temporary access URL (24h): " + presignedUrl);
+                }
+                return;
+            } catch (Exception e) {
+                System.err.println("[S3 ERROR] Upload of job " + jobId + " failed (attempt " + attempt + "/"
+                        + MAX_ATTEMPTS + "): " + e.getMessage());
+                if (attempt < MAX_ATTEMPTS) {
+                    try {
+                        Thread.sleep(1000L << attempt);
+                    } catch (InterruptedException ie) {
+                        Thread.currentThread().interrupt();
+                        break;
+                    }
+                }
+            }
+        }
+        failed.incrementAndGet();
+    }
+
+    public Map<String, Long> stats() {
+        return Map.of("submitted", submitted.get(), "uploading", (long) uploading.size(),
+                "uploaded", uploaded.get(), "failed", failed.get());
+    }
+
+    /**
+     * Let queued uploads finish (up to {@code timeoutSeconds}), then release the client.
+     */
+    public void close(long timeoutSeconds) {
+        executor.shutdown();
+        try {
+            if (!executor.awaitTermination(timeoutSeconds, TimeUnit.SECONDS)) {
+                System.err.println("[S3 WARN] Uploads still running at shutdown");
+                executor.shutdownNow();
+            }
+        } catch (InterruptedException e) {
+            Thread.currentThread().interrupt();
+        }
+        s3.close();
+    }
+
+    @Override
+    public void close() {
+        close(30);
+    }
+}
@@ -4,18 +4,76 @@ import com.google.gson.Gson;
 import org.eclipse.paho.client.mqttv3.*;
 
 import java.nio.charset.StandardCharsets;
+import java.util.ArrayList;
+import java.util.LinkedHashMap;
+import java.util.List;
 import java.util.Map;
 import java.util.UUID;
+import java.util.concurrent.ArrayBlockingQueue;
+import java.util.concurrent.BlockingQueue;
+import java.util.concurrent.Executors;
+import java.util.concurrent.ScheduledExecutorService;
+import java.util.concurrent.TimeUnit;
+import java.util.concurrent.atomic.AtomicLong;
+import java.util.concurrent.atomic.LongAdder;
+import java.util.function.Supplier;
 
+/**
+ * MQTT telemetry of the master. Publishing never blocks the caller: messages
+ * go into a bounded buffer that a background thread drains in batches to the
+ * broker, and are dropped (and counted) when the buffer is full or the broker
+ * is down. Task activity is aggregated by {@link SnapshotAggregator} and
+ * published every {@code MQTT_SNAPSHOT_MS}; the per-task event topics are
+ * only sent with {@code MQTT_EVENTS=1}, and then at most
+ * {@code MQTT_EVENT_RATE} per second.
+ */
 public final class MqttClientManager implements AutoCloseable {
     private static final Gson GSON = new Gson();
 
+    /** Where the publisher thread delivers messages; false when it could not. */
+    @FunctionalInterface
+    public interface Sink {
+        boolean publish(String topic, byte[] payload) throws Exception;
+    }
+
+    /**
+     * Pipeline settings: buffered messages, messages per batch, snapshot
+     * interval, whether per-task event topics are published and their rate.
+     */
+    public record Settings(int buffer, int batch, long snapshotMs, boolean events, int eventRate) {
+        public static Settings fromEnv() {
+            return new Settings(
+                    Integer.parseInt(System.getenv().getOrDefault("MQTT_BUFFER", "10000")),
+                    Integer.parseInt(System.getenv().getOrDefault("MQTT_BATCH", "256")),
+                    Long.parseLong(System.getenv().getOrDefault("MQTT_SNAPSHOT_MS", "1000")),
+                    "1".equals(System.getenv().getOrDefault("MQTT_EVENTS", "0")),
+                    Integer.parseInt(System.getenv().getOrDefault("MQTT_EVENT_RATE", "200")));
+        }
+    }
+
+    private record Outgoing(String topic, Object payload) {
+    }
+
     private final String broker;
     private final String username;
     private final String password;
     private final MqttClient client;
     private final MqttConnectOptions opts;
 
+    private final Settings settings;
+    private final SnapshotAggregator snapshots = new SnapshotAggregator();
+    private final BlockingQueue<Outgoing> outbox;
+    private final Sink sink;
+    private final Thread publisher;
+    private final ScheduledExecutorService snapshotter;
+    private final AtomicLong published = new AtomicLong();
+    private final LongAdder dropped = new LongAdder();
+    private final LongAdder rateLimited = new LongAdder();
+    private long droppedLogged;
+    // Token bucket for the per-task event topics
+    private double eventTokens;
+    private long eventRefillNanos = System.nanoTime();
+
     private MqttClientManager(String broker, String username, String password) {
         this.broker = broker;
         this.username = username;
@@ -46,6 +104,29 @@ public final class MqttClientManager implements AutoCloseable {
             System.out.println("[MQTT] Initial connect failed (" + first.getMessage() + "). Will retry in background.");
             startBackgroundReconnect();
         }
+
+        this.settings = Settings.fromEnv();
+        this.outbox = new ArrayBlockingQueue<>(Math.max(1, settings.buffer()));
+        this.sink = this::send;
+        this.publisher = startPublisher();
+        this.snapshotter = startSnapshots();
+    }
+
+    /**
+     * A manager without a broker that hands every message to {@code sink} on
+     * the publisher thread, for benchmarks.
+     */
+    public MqttClientManager(Sink sink, Settings settings) {
+        this.broker = null;
+        this.username = null;
+        this.password = null;
+        this.client = null;
+        this.opts = null;
+        this.settings = settings;
+        this.outbox = new ArrayBlockingQueue<>(Math.max(1, settings.buffer()));
+        this.sink = sink;
+        this.publisher = startPublisher();
+        this.snapshotter = startSnapshots();
     }
 
     public static MqttClientManager fromEnvOrNull() {
@@ -82,23 +163,138 @@ public final class MqttClientManager implements AutoCloseable {
         return client != null && client.isConnected();
     }
 
+    /**
+     * Queues a message for the publisher thread; dropped when the buffer is
+     * full. The payload is serialized later, so it must not be modified
+     * after this call.
+     */
     public void publishJson(String topic, Object payload) {
-        if (!isConnected()) {
-            System.out.println("[MQTT] Not connected. Dropping publish to " + topic);
+        if (!outbox.offer(new Outgoing(topic, payload))) dropped.increment();
+    }
+
+    /**
+     * Per-task event: only published with MQTT_EVENTS=1 and within the event
+     * rate. The payload is only built when it will be sent.
+     */
+    public void publishEvent(String topic, Supplier<Object> payload) {
+        if (!settings.events()) return;
+        if (!takeEventToken()) {
+            rateLimited.increment();
             return;
         }
-        try {
-            byte[] bytes = GSON.toJson(payload).getBytes(StandardCharsets.UTF_8);
-            MqttMessage msg = new MqttMessage(bytes);
-            msg.setQos(0);
-            client.publish(topic, msg);
-        } catch (Exception e) {
-            System.out.println("[MQTT] Publish failed: " + e.getMessage());
+        publishJson(topic, payload.get());
+    }
+
+    /** Per-job and per-worker counters published as snapshots. */
+    public SnapshotAggregator snapshots() {
+        return snapshots;
+    }
+
+    /** Pipeline counters, also part of every scheduler snapshot. */
+    public Map<String, Object> stats() {
+        Map<String, Object> out = new LinkedHashMap<>();
+        out.put("published", published.get());
+        out.put("dropped", dropped.sum());
+        out.put("rateLimited", rateLimited.sum());
+        out.put("buffered", outbox.size());
+        out.put("events", settings.events());
+        return out;
+    }
+
+    private synchronized boolean takeEventToken() {
+        long now = System.nanoTime();
+        int rate = Math.max(1, settings.eventRate());
+        eventTokens = Math.min(rate, eventTokens + (now - eventRefillNanos) * rate / 1e9);
+        eventRefillNanos = now;
+        if (eventTokens < 1) return false;
+        eventTokens -= 1;
+        return true;
+    }
+
+    private boolean send(String topic, byte[] payload) throws MqttException {
+        if (!isConnected()) return false;
+        MqttMessage msg = new MqttMessage(payload);
+        msg.setQos(0);
+        client.publish(topic, msg);
+        return true;
+    }
+
+    private Thread startPublisher() {
+        Thread t = new Thread(() -> {
+            List<Outgoing> batch = new ArrayList<>(Math.max(1, settings.batch()));
+            while (true) {
+                try {
+                    batch.add(outbox.take());
+                } catch (InterruptedException e) {
+                    break;
+                }
+                outbox.drainTo(batch, Math.max(1, settings.batch()) - 1);
+                deliver(batch);
+                batch.clear();
+            }
+        }, "mqtt-publisher");
+        t.setDaemon(true);
+        t.start();
+        return t;
+    }
+
+    private void deliver(List<Outgoing> batch) {
+        for (Outgoing m : batch) {
+            try {
+                if (sink.publish(m.topic(), GSON.toJson(m.payload()).getBytes(StandardCharsets.UTF_8))) {
+                    published.incrementAndGet();
+                } else {
+                    dropped.increment();
+                }
+            } catch (Exception e) {
+                dropped.increment();
+                System.out.println("[MQTT] Publish failed: " + e.getMessage());
+            }
+        }
+    }
+
+    private ScheduledExecutorService startSnapshots() {
+        ScheduledExecutorService ses = Executors.newSingleThreadScheduledExecutor(r -> {
+            Thread t = new Thread(r, "mqtt-snapshots");
+            t.setDaemon(true);
+            return t;
+        });
+        long every = Math.max(50, settings.snapshotMs());
+        ses.scheduleAtFixedRate(() -> {
+            try {
+                publishSnapshots(every);
+            } catch (RuntimeException e) {
+                System.err.println("[MQTT] Snapshot failed: " + e.getMessage());
+            }
+        }, every, every, TimeUnit.MILLISECONDS);
+        return ses;
+    }
+
+    private void publishSnapshots(long intervalMs) {
+        for (Map.Entry<String, Object> e : snapshots.drain(intervalMs, stats()).entrySet()) {
+            publishJson(e.getKey(), e.getValue());
+        }
+        long d = dropped.sum();
+        if (d > droppedLogged) {
+            System.out.println("[MQTT] Dropped " + (d - droppedLogged) + " messages (buffer full or broker down)");
+            droppedLogged = d;
         }
     }
 
     @Override
     public void close() {
+        snapshotter.shutdownNow();
+        // Give the publisher a moment to send what is still buffered (final job states)
+        long deadline = System.currentTimeMillis() + 2_000;
+        while (!outbox.isEmpty() && System.currentTimeMillis() < deadline) {
+            try {
+                Thread.sleep(20);
+            } catch (InterruptedException e) {
+                Thread.currentThread().interrupt();
+                break;
+            }
+        }
+        publisher.interrupt();
         try {
             if (client != null && client.isConnected()) client.disconnect();
         } catch (Exception ignored) {
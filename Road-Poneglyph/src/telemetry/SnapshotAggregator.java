@@ -0,0 +1,179 @@
+package telemetry;
+
+import java.util.ArrayList;
+import java.util.LinkedHashMap;
+import java.util.List;
+import java.util.Map;
+import java.util.concurrent.ConcurrentHashMap;
+import java.util.concurrent.atomic.AtomicInteger;
+import java.util.concurrent.atomic.LongAdder;
+import java.util.function.Supplier;
+
+/**
+ * Task activity of the master, counted per job and per worker and published
+ * by {@link MqttClientManager} as periodic snapshots instead of one MQTT
+ * message per task. Counters are deltas since the previous snapshot and
+ * jobs/workers without activity in an interval are left out. Recording is a
+ * few adder increments, cheap enough for the dispatch path.
+ * <p>
+ * Best effort: an increment that races with a snapshot may be counted in
+ * the next interval or, rarely, not at all.
+ */
+public final class SnapshotAggregator {
+    public static final String SCHEDULER_TOPIC = "gridmr/snapshot/scheduler";
+    public static final String JOBS_TOPIC = "gridmr/snapshot/jobs";
+    public static final String WORKERS_TOPIC = "gridmr/snapshot/workers";
+
+    private static class Counters {
+        final LongAdder assigned = new LongAdder();
+        final LongAdder completed = new LongAdder();
+        final LongAdder taskMs = new LongAdder();
+
+        void completed(long durationMs) {
+            completed.increment();
+            taskMs.add(durationMs);
+        }
+
+        void put(Map<String, Object> out) {
+            long done = completed.sum();
+            out.put("assigned", assigned.sum());
+            out.put("completed", done);
+            out.put("avgTaskMs", done > 0 ? taskMs.sum() / done : 0);
+        }
+    }
+
+    private static final class JobCounters extends Counters {
+        final LongAdder queued = new LongAdder();
+        final AtomicInteger mapsCompleted = new AtomicInteger(-1);
+        final AtomicInteger reducesCompleted = new AtomicInteger(-1);
+        volatile int maps = -1;
+        volatile int reduces = -1;
+    }
+
+    private final ConcurrentHashMap<String, JobCounters> jobs = new ConcurrentHashMap<>();
+    private final ConcurrentHashMap<String, Counters> workers = new ConcurrentHashMap<>();
+    private final LongAdder queued = new LongAdder();
+    private final LongAdder assigned = new LongAdder();
+    private final LongAdder completed = new LongAdder();
+    private final LongAdder recovered = new LongAdder();
+    private final LongAdder speculated = new LongAdder();
+    private volatile Supplier<Map<String, Object>> schedulerStats;
+
+    private JobCounters job(String jobId) {
+        return jobs.computeIfAbsent(jobId, k -> new JobCounters());
+    }
+
+    private Counters worker(String workerId) {
+        return workers.computeIfAbsent(workerId, k -> new Counters());
+    }
+
+    public void taskQueued(String jobId) {
+        queued.increment();
+        job(jobId).queued.increment();
+    }
+
+    public void taskAssigned(String jobId, String workerId) {
+        assigned.increment();
+        job(jobId).assigned.increment();
+        worker(workerId).assigned.increment();
+    }
+
+    public void taskCompleted(String jobId, String workerId, long durationMs) {
+        completed.increment();
+        job(jobId).completed(durationMs);
+        worker(workerId).completed(durationMs);
+    }
+
+    public void taskRecovered() {
+        recovered.increment();
+    }
+
+    public void taskSpeculated() {
+        speculated.increment();
+    }
+
+    /** Map results the master has ingested for a job, out of {@code maps}. */
+    public void mapsCompleted(String jobId, int done, int maps) {
+        JobCounters c = job(jobId);
+        c.mapsCompleted.accumulateAndGet(done, Math::max);
+        c.maps = maps;
+    }
+
+    public void reducesCompleted(String jobId, int done, int reduces) {
+        JobCounters c = job(jobId);
+        c.reducesCompleted.accumulateAndGet(done, Math::max);
+        c.reduces = reduces;
+    }
+
+    /** Scheduler state (queues, workers) included whole in every scheduler snapshot. */
+    public void setSchedulerStats(Supplier<Map<String, Object>> source) {
+        this.schedulerStats = source;
+    }
+
+    /**
+     * Snapshots for the interval that just ended, by topic, resetting the
+     * counters. The scheduler snapshot is always there; the jobs and workers
+     * ones only when some job or worker had activity.
+     */
+    Map<String, Object> drain(long intervalMs, Map<String, Object> telemetry) {
+        long ts = System.currentTimeMillis();
+        Map<String, Object> out = new LinkedHashMap<>();
+
+        Map<String, Object> interval = new LinkedHashMap<>();
+        interval.put("ms", intervalMs);
+        interval.put("queued", queued.sumThenReset());
+        interval.put("assigned", assigned.sumThenReset());
+        interval.put("completed", completed.sumThenReset());
+        interval.put("recovered", recovered.sumThenReset());
+        interval.put("speculated", speculated.sumThenReset());
+        Map<String, Object> scheduler = new LinkedHashMap<>();
+        scheduler.put("ts", ts);
+        scheduler.put("interval", interval);
+        scheduler.put("telemetry", telemetry);
+        Supplier<Map<String, Object>> stats = schedulerStats;
+        if (stats != null) {
+            try {
+                scheduler.put("scheduler", stats.get());
+            } catch (RuntimeException e) {
+                System.err.println("[MQTT] Scheduler snapshot failed: " + e.getMessage());
+            }
+        }
+        out.put(SCHEDULER_TOPIC, scheduler);
+
+        List<Map<String, Object>> jobList = new ArrayList<>();
+        for (String jobId : jobs.keySet()) {
+            JobCounters c = jobs.remove(jobId);
+            if (c == null) continue;
+            Map<String, Object> j = new LinkedHashMap<>();
+            j.put("jobId", jobId);
+            j.put("queued", c.queued.sum());
+            c.put(j);
+            if (c.mapsCompleted.get() >= 0) {
+                j.put("mapsCompleted", c.mapsCompleted.get());
+                j.put("maps", c.maps);
+            }
+            if (c.reducesCompleted.get() >= 0) {
+                j.put("reducesCompleted", c.reducesCompleted.get());
+                j.put("reduces", c.reduces);
+            }
+            jobList.add(j);
+        }
+        if (!jobList.isEmpty()) {
+            out.put(JOBS_TOPIC, Map.of("ts", ts, "intervalMs", intervalMs, "jobs", jobList));
+        }
+
+        List<Map<String, Object>> workerList = new ArrayList<>();
+        for (String workerId : workers.keySet()) {
+            Counters c = workers.remove(workerId);
+            if (c == null) continue;
+            Map<String, Object> w = new LinkedHashMap<>();
+            w.put("workerId", workerId);
+            c.put(w);
+            workerList.add(w);
+        }
+        if (!workerList.isEmpty()) {
+            out.put(WORKERS_TOPIC, Map.of("ts", ts, "intervalMs", intervalMs, "workers", workerList));
+        }
+        return out;
+    }
+}
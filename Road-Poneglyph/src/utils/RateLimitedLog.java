@@ -0,0 +1,33 @@
+package utils;
+
+import java.util.Map;
+import java.util.concurrent.ConcurrentHashMap;
+import java.util.concurrent.atomic.AtomicLong;
+
+/**
+ * Prints at most one line per key and interval; the next line that gets
+ * through reports how many were suppressed in between. Meant for messages on
+ * per-request paths (task polling, dispatch) that would otherwise flood stdout.
+ */
+public class RateLimitedLog {
+    private final long intervalMs;
+    private final Map<String, AtomicLong> lastPrinted = new ConcurrentHashMap<>();
+    private final Map<String, AtomicLong> suppressed = new ConcurrentHashMap<>();
+
+    public RateLimitedLog(long intervalMs) {
+        this.intervalMs = intervalMs;
+    }
+
+    public void info(String key, String message) {
+        long now = System.currentTimeMillis();
+        AtomicLong last = lastPrinted.computeIfAbsent(key, k -> new AtomicLong(Long.MIN_VALUE / 2));
+        long prev = last.get();
+        AtomicLong dropped = suppressed.computeIfAbsent(key, k -> new AtomicLong());
+        if (now - prev < intervalMs || !last.compareAndSet(prev, now)) {
+            dropped.incrementAndGet();
+            return;
+        }
+        long n = dropped.getAndSet(0);
+        System.out.println(n > 0 ? message + " (+" + n + " similar suppressed)" : message);
+    }
+}
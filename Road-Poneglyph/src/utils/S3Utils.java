@@ -2,23 +2,43 @@ package utils;
 
 import software.amazon.awssdk.auth.credentials.DefaultCredentialsProvider;
 import software.amazon.awssdk.core.sync.RequestBody;
+import software.amazon.awssdk.http.apache.ApacheHttpClient;
 import software.amazon.awssdk.regions.Region;
 import software.amazon.awssdk.services.s3.S3Client;
+import software.amazon.awssdk.services.s3.S3Configuration;
 import software.amazon.awssdk.services.s3.model.*;
+import software.amazon.awssdk.services.s3.presigner.S3Presigner;
 
+import java.io.ByteArrayInputStream;
+import java.io.IOException;
+import java.io.InputStream;
+import java.net.URI;
 import java.nio.charset.StandardCharsets;
+import java.time.Duration;
 import java.time.LocalDateTime;
 import java.time.format.DateTimeFormatter;
+import java.util.ArrayList;
+import java.util.List;
 
 /**
  * Utility class for storing Map-Reduce results in AWS S3.
  * Provides methods to upload job results and manage S3 operations.
+ * <p>
+ * One instance is meant to live as long as the process: it owns a pooled,
+ * keep-alive HTTP client and a presigner, both released by {@link #close()}.
  */
 public class S3Utils {
 
+    /**
+     * S3 rejects multipart parts smaller than this (except the last one).
+     */
+    public static final int MIN_PART_BYTES = 5 * 1024 * 1024;
+
     private final S3Client s3Client;
+    private final S3Presigner presigner;
     private final String bucketName;
     private final String basePath;
+    private final URI endpoint; // null = AWS
 
     /**
      * Constructor for S3Utils
@@ -28,13 +48,41 @@ public class S3Utils {
      * @param basePath   Base path prefix for all stored objects (e.g., "mapreduce-results/")
      */
     public S3Utils(String bucketName, Region region, String basePath) {
+        this(bucketName, region, basePath, null, 16);
+    }
+
+    /**
+     * Constructor for S3Utils against an S3-compatible endpoint (MinIO,
+     * LocalStack...), addressed path-style
+     *
+     * @param bucketName     The S3 bucket name where results will be stored
+     * @param region         AWS region for the bucket
+     * @param basePath       Base path prefix for all stored objects
+     * @param endpoint       Endpoint override, or null for AWS
+     * @param maxConnections Size of the HTTP connection pool
+     */
+    public S3Utils(String bucketName, Region region, String basePath, URI endpoint, int maxConnections) {
         this.bucketName = bucketName;
         this.basePath = basePath.endsWith("/") ? basePath : basePath + "/";
+        this.endpoint = endpoint;
 
-        this.s3Client = S3Client.builder()
+        var builder = S3Client.builder()
                 .region(region)
                 .credentialsProvider(DefaultCredentialsProvider.create())
-                .build();
+                .httpClientBuilder(ApacheHttpClient.builder()
+                        .maxConnections(maxConnections)
+                        .tcpKeepAlive(true)
+                        .connectionMaxIdleTime(Duration.ofSeconds(60)));
+        var presignerBuilder = S3Presigner.builder()
+                .region(region)
+                .credentialsProvider(DefaultCredentialsProvider.create());
+        if (endpoint != null) {
+            S3Configuration pathStyle = S3Configuration.builder().pathStyleAccessEnabled(true).build();
+            builder.endpointOverride(endpoint).serviceConfiguration(pathStyle);
+            presignerBuilder.endpointOverride(endpoint).serviceConfiguration(pathStyle);
+        }
+        this.s3Client = builder.build();
+        this.presigner = presignerBuilder.build();
     }
 
     /**
@@ -129,6 +177,128 @@ public class S3Utils {
         }
     }
 
+    /**
+     * Store Map-Reduce job result read from a stream of known length, so the
+     * result never has to be held in memory
+     *
+     * @param jobId    The job identifier
+     * @param in       The result content
+     * @param length   Number of bytes {@code in} provides
+     * @param metadata Additional metadata to store with the object
+     * @return The S3 object key where the result was stored
+     * @throws S3Exception if upload fails
+     */
+    public String storeJobResultStream(String jobId, InputStream in, long length, java.util.Map<String, String> metadata) throws S3Exception {
+        String timestamp = LocalDateTime.now().format(DateTimeFormatter.ofPattern("yyyy-MM-dd_HH-mm-ss"));
+        String objectKey = basePath + "jobs/" + jobId + "/" + timestamp + "_result.txt";
+
+        try {
+            java.util.Map<String, String> fullMetadata = new java.util.HashMap<>();
+            fullMetadata.put("job-id", jobId);
+            fullMetadata.put("timestamp", timestamp);
+            fullMetadata.put("content-length", String.valueOf(length));
+            fullMetadata.putAll(metadata);
+
+            PutObjectRequest putRequest = PutObjectRequest.builder()
+                    .bucket(bucketName)
+                    .key(objectKey)
+                    .contentType("text/plain")
+                    .metadata(fullMetadata)
+                    .build();
+
+            PutObjectResponse response = s3Client.putObject(putRequest, RequestBody.fromInputStream(in, length));
+
+            System.out.println("[S3] Successfully stored job result with metadata: s3://" + bucketName + "/" + objectKey);
+            System.out.println("[S3] ETag: " + response.eTag());
+
+            return objectKey;
+
+        } catch (S3Exception e) {
+            System.err.println("[S3 ERROR] Failed to store job result for " + jobId + ": " + e.getMessage());
+            throw e;
+        }
+    }
+
+    /**
+     * Store Map-Reduce job result read from a stream of known length as a
+     * multipart upload. Only one part is buffered at a time; results that fit
+     * in a single part go out as a plain PUT. A failed upload is aborted so
+     * no orphaned parts are left in the bucket.
+     *
+     * @param jobId     The job identifier
+     * @param in        The result content
+     * @param length    Number of bytes {@code in} provides
+     * @param metadata  Additional metadata to store with the object
+     * @param partBytes Part size (at least {@link #MIN_PART_BYTES})
+     * @return The S3 object key where the result was stored
+     * @throws S3Exception if upload fails
+     * @throws IOException if reading {@code in} fails
+     */
+    public String storeJobResultMultipart(String jobId, InputStream in, long length,
+                                          java.util.Map<String, String> metadata, int partBytes) throws IOException {
+        partBytes = Math.max(MIN_PART_BYTES, partBytes);
+        if (length <= partBytes) return storeJobResultStream(jobId, in, length, metadata);
+
+        String timestamp = LocalDateTime.now().format(DateTimeFormatter.ofPattern("yyyy-MM-dd_HH-mm-ss"));
+        String objectKey = basePath + "jobs/" + jobId + "/" + timestamp + "_result.txt";
+
+        java.util.Map<String, String> fullMetadata = new java.util.HashMap<>();
+        fullMetadata.put("job-id", jobId);
+        fullMetadata.put("timestamp", timestamp);
+        fullMetadata.put("content-length", String.valueOf(length));
+        fullMetadata.putAll(metadata);
+
+        String uploadId = s3Client.createMultipartUpload(CreateMultipartUploadRequest.builder()
+                .bucket(bucketName)
+                .key(objectKey)
+                .contentType("text/plain")
+                .metadata(fullMetadata)
+                .build()).uploadId();
+        try {
+            List<CompletedPart> parts = new ArrayList<>();
+            byte[] buf = new byte[partBytes];
+            long left = length;
+            for (int partNumber = 1; left > 0; partNumber++) {
+                int n = in.readNBytes(buf, 0, (int) Math.min(buf.length, left));
+                if (n <= 0) throw new IOException("result stream ended " + left + " bytes early");
+                UploadPartResponse part = s3Client.uploadPart(UploadPartRequest.builder()
+                                .bucket(bucketName)
+                                .key(objectKey)
+                                .uploadId(uploadId)
+                                .partNumber(partNumber)
+                                .contentLength((long) n)
+                                .build(),
+                        RequestBody.fromInputStream(new ByteArrayInputStream(buf, 0, n), n));
+                parts.add(CompletedPart.builder().partNumber(partNumber).eTag(part.eTag()).build());
+                left -= n;
+            }
+            CompleteMultipartUploadResponse response = s3Client.completeMultipartUpload(CompleteMultipartUploadRequest.builder()
+                    .bucket(bucketName)
+                    .key(objectKey)
+                    .uploadId(uploadId)
+                    .multipartUpload(CompletedMultipartUpload.builder().parts(parts).build())
+                    .build());
+
+            System.out.println("[S3] Successfully stored job result (" + parts.size() + " parts): s3://"
+                    + bucketName + "/" + objectKey);
+            System.out.println("[S3] ETag: " + response.eTag());
+            return objectKey;
+
+        } catch (IOException | RuntimeException e) {
+            System.err.println("[S3 ERROR] Multipart upload failed for " + jobId + ": " + e.getMessage());
+            try {
+                s3Client.abortMultipartUpload(AbortMultipartUploadRequest.builder()
+                        .bucket(bucketName)
+                        .key(objectKey)
+                        .uploadId(uploadId)
+                        .build());
+            } catch (RuntimeException abortError) {
+                System.err.println("[S3 WARN] Could not abort upload " + uploadId + ": " + abortError.getMessage());
+            }
+            throw e;
+        }
+    }
+
     /**
      * Check if a bucket exists and is accessible
      *
@@ -183,6 +353,9 @@ public class S3Utils {
      * @return The public URL string
      */
     public String getPublicUrl(String objectKey) {
+        if (endpoint != null) {
+            return endpoint.toString().replaceAll("/+$", "") + "/" + bucketName + "/" + objectKey;
+        }
         return String.format("https://%s.s3.%s.amazonaws.com/%s",
                 bucketName, s3Client.serviceClientConfiguration().region().id(), objectKey);
     }
@@ -196,10 +369,6 @@ public class S3Utils {
      */
     public String generatePresignedUrl(String objectKey, int durationMinutes) {
         try {
-            // Create an S3Presigner using the default region and credentials
-            software.amazon.awssdk.services.s3.presigner.S3Presigner presigner =
-                    software.amazon.awssdk.services.s3.presigner.S3Presigner.create();
-
             // Create a GetObjectRequest to be pre-signed
             GetObjectRequest getObjectRequest = GetObjectRequest.builder()
                     .bucket(bucketName)
@@ -217,9 +386,6 @@ public class S3Utils {
             software.amazon.awssdk.services.s3.presigner.model.PresignedGetObjectRequest presignedRequest =
                     presigner.presignGetObject(presignRequest);
 
-            // Close the presigner to free resources
-            presigner.close();
-
             return presignedRequest.url().toString();
 
         } catch (Exception e) {
@@ -232,6 +398,9 @@ public class S3Utils {
      * Close the S3 client and release resources
      */
     public void close() {
+        if (presigner != null) {
+            presigner.close();
+        }
         if (s3Client != null) {
             s3Client.close();
         }
@@ -243,6 +412,8 @@ public class S3Utils {
      * - AWS_S3_BUCKET: The S3 bucket name
      * - AWS_S3_BASE_PATH: Base path for storing results (optional, defaults to "mapreduce-results/")
      * - AWS_REGION: AWS region (optional, defaults to us-east-1)
+     * - AWS_S3_ENDPOINT: S3-compatible endpoint, e.g. http://localhost:9000 for MinIO (optional)
+     * - AWS_S3_MAX_CONNECTIONS: HTTP connection pool size (optional, defaults to 16)
      *
      * @return Configured S3Utils instance or null if required environment variables are missing
      */
@@ -268,6 +439,19 @@ public class S3Utils {
             }
         }
 
-        return new S3Utils(bucketName, region, basePath);
+        URI endpoint = null;
+        String endpointStr = System.getenv("AWS_S3_ENDPOINT");
+        if (endpointStr != null && !endpointStr.trim().isEmpty()) {
+            endpoint = URI.create(endpointStr.trim());
+        }
+
+        int maxConnections = 16;
+        try {
+            maxConnections = Integer.parseInt(System.getenv().getOrDefault("AWS_S3_MAX_CONNECTIONS", "16"));
+        } catch (NumberFormatException e) {
+            System.err.println("[S3 WARN] Invalid AWS_S3_MAX_CONNECTIONS. Using default: 16");
+        }
+
+        return new S3Utils(bucketName, region, basePath, endpoint, Math.max(1, maxConnections));
     }
 }
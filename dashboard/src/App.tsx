@@ -11,8 +11,8 @@ import { Card, CardContent, CardHeader, CardTitle } from "@/components/ui/card";
 import { Activity, BarChart3, FileText, Workflow } from "lucide-react";
 
 function App() {
-  const { isConnected, jobs, recentMessages, error } = useMqtt();
-  const { schedulerStats, isLoading: schedulerLoading, error: schedulerError, lastUpdate } = useScheduler();
+  const { isConnected, jobs, recentMessages, schedulerSnapshot, error } = useMqtt();
+  const { schedulerStats, isLoading: schedulerLoading, error: schedulerError, lastUpdate } = useScheduler(schedulerSnapshot);
 
   const activeJobs = Array.from(jobs.values()).filter(
     (job) => job.state === "RUNNING"
@@ -1,13 +1,21 @@
 import { useEffect, useState, useCallback } from "react";
 import mqtt from "mqtt";
 import type { MqttClient } from "mqtt";
-import type { MqttMessage, JobProgress, WorkerNode } from "@/types/mqtt";
+import type {
+  MqttMessage,
+  JobProgress,
+  WorkerNode,
+  SchedulerSnapshot,
+  JobsSnapshot,
+  WorkersSnapshot,
+} from "@/types/mqtt";
 
 interface UseMqttReturn {
   isConnected: boolean;
   jobs: Map<string, JobProgress>;
   workers: Map<string, WorkerNode>;
   recentMessages: MqttMessage[];
+  schedulerSnapshot: SchedulerSnapshot | null;
   error: string | null;
 }
 
@@ -15,8 +23,10 @@ export const useMqtt = (): UseMqttReturn => {
   const [, setClient] = useState<MqttClient | null>(null);
   const [isConnected, setIsConnected] = useState(false);
   const [jobs, setJobs] = useState<Map<string, JobProgress>>(new Map());
-  const [workers] = useState<Map<string, WorkerNode>>(new Map());
+  const [workers, setWorkers] = useState<Map<string, WorkerNode>>(new Map());
   const [recentMessages, setRecentMessages] = useState<MqttMessage[]>([]);
+  const [schedulerSnapshot, setSchedulerSnapshot] =
+    useState<SchedulerSnapshot | null>(null);
   const [error, setError] = useState<string | null>(null);
 
   const addMessage = useCallback((message: MqttMessage) => {
@@ -51,6 +61,51 @@ export const useMqtt = (): UseMqttReturn => {
     []
   );
 
+  // Progress counters of the jobs active in the last snapshot interval; the
+  // state stays whatever the job/created and state events said.
+  const applyJobsSnapshot = useCallback((snapshot: JobsSnapshot) => {
+    setJobs((prev) => {
+      const newJobs = new Map(prev);
+      for (const job of snapshot.jobs) {
+        const existing = newJobs.get(job.jobId) ?? {
+          jobId: job.jobId,
+          totalMaps: 0,
+          completedMaps: 0,
+          totalReduces: 0,
+          completedReduces: 0,
+          state: "RUNNING" as const,
+          startTime: snapshot.ts,
+        };
+        newJobs.set(job.jobId, {
+          ...existing,
+          totalMaps: job.maps ?? existing.totalMaps,
+          completedMaps: Math.max(existing.completedMaps, job.mapsCompleted ?? 0),
+          totalReduces: job.reduces ?? existing.totalReduces,
+          completedReduces: Math.max(
+            existing.completedReduces,
+            job.reducesCompleted ?? 0
+          ),
+        });
+      }
+      return newJobs;
+    });
+  }, []);
+
+  const applyWorkersSnapshot = useCallback((snapshot: WorkersSnapshot) => {
+    setWorkers((prev) => {
+      const newWorkers = new Map(prev);
+      for (const worker of snapshot.workers) {
+        newWorkers.set(worker.workerId, {
+          id: worker.workerId,
+          type: "worker",
+          status: worker.assigned > worker.completed ? "busy" : "online",
+          lastSeen: snapshot.ts,
+        });
+      }
+      return newWorkers;
+    });
+  }, []);
+
   useEffect(() => {
     // Use environment variables with fallbacks for development
     const mqttHost = import.meta.env.VITE_MQTT_HOST || "localhost";
@@ -90,7 +145,15 @@ export const useMqtt = (): UseMqttReturn => {
 
         if (topicParts[0] !== "gridmr") return;
 
-        if (topicParts[1] === "job") {
+        if (topicParts[1] === "snapshot") {
+          if (topicParts[2] === "scheduler") {
+            setSchedulerSnapshot(data);
+          } else if (topicParts[2] === "jobs") {
+            applyJobsSnapshot(data);
+          } else if (topicParts[2] === "workers") {
+            applyWorkersSnapshot(data);
+          }
+        } else if (topicParts[1] === "job") {
           if (topicParts[2] === "created") {
             const mqttMessage: MqttMessage = { type: "job/created", data };
             addMessage(mqttMessage);
@@ -156,13 +219,14 @@ export const useMqtt = (): UseMqttReturn => {
         mqttClient.end();
       }
     };
-  }, [addMessage, updateJob]);
+  }, [addMessage, updateJob, applyJobsSnapshot, applyWorkersSnapshot]);
 
   return {
     isConnected,
     jobs,
     workers,
     recentMessages,
+    schedulerSnapshot,
     error,
   };
 };
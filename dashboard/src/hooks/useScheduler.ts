@@ -1,4 +1,9 @@
-import { useEffect, useState, useCallback } from "react";
+import { useEffect, useState, useCallback, useRef } from "react";
+import type { SchedulerSnapshot } from "@/types/mqtt";
+
+// HTTP polling is only the fallback when no MQTT snapshot arrived lately
+const POLL_INTERVAL_MS = 3000;
+const SNAPSHOT_STALE_MS = 10000;
 
 interface WorkerDetail {
   id: string;
@@ -6,6 +11,13 @@ interface WorkerDetail {
   isHealthy: boolean;
   activeTasks: number;
   capacity: number;
+  usableSlots: number;
+  cores: number;
+  loadAverage: number;
+  memoryAvailableMb: number;
+  diskFreeMb: number;
+  queueDepth: number;
+  slotUtilization: number[];
   completedTasks: number;
   loadPercentage: number;
   loadScore: number;
@@ -24,6 +36,7 @@ interface SchedulerStats {
   queueSizes: {
     map: number;
     reduce: number;
+    step: number;
   };
   avgWorkerLoad: number;
   workers: WorkerDetail[];
@@ -37,11 +50,14 @@ interface UseSchedulerReturn {
   lastUpdate: Date | null;
 }
 
-export const useScheduler = (): UseSchedulerReturn => {
+export const useScheduler = (
+  snapshot: SchedulerSnapshot | null = null
+): UseSchedulerReturn => {
   const [schedulerStats, setSchedulerStats] = useState<SchedulerStats | null>(null);
   const [isLoading, setIsLoading] = useState(true);
   const [error, setError] = useState<string | null>(null);
   const [lastUpdate, setLastUpdate] = useState<Date | null>(null);
+  const lastSnapshotAt = useRef(0);
 
   const fetchSchedulerStats = useCallback(async () => {
     try {
@@ -64,12 +80,26 @@ export const useScheduler = (): UseSchedulerReturn => {
     }
   }, []);
 
+  // Live stats from the master's gridmr/snapshot/scheduler messages
+  useEffect(() => {
+    if (!snapshot?.scheduler) return;
+    lastSnapshotAt.current = Date.now();
+    setSchedulerStats(snapshot.scheduler as SchedulerStats);
+    setLastUpdate(new Date(snapshot.ts));
+    setError(null);
+    setIsLoading(false);
+  }, [snapshot]);
+
   useEffect(() => {
     // Initial fetch
     fetchSchedulerStats();
 
-    // Set up polling interval (every 3 seconds)
-    const interval = setInterval(fetchSchedulerStats, 3000);
+    // Poll while MQTT snapshots are not coming in
+    const interval = setInterval(() => {
+      if (Date.now() - lastSnapshotAt.current > SNAPSHOT_STALE_MS) {
+        fetchSchedulerStats();
+      }
+    }, POLL_INTERVAL_MS);
 
     // Cleanup interval on unmount
     return () => {
@@ -54,3 +54,60 @@ export type MqttMessage =
   | { type: "reduce/completed"; data: ReduceCompleted }
   | { type: "shuffle/partitions"; data: ShufflePartitions }
   | { type: "job/state"; data: JobState };
+
+// Periodic snapshots of the master (gridmr/snapshot/*). Counters are deltas
+// over the last interval; per-task topics are only sent with MQTT_EVENTS=1.
+export interface SnapshotInterval {
+  ms: number;
+  queued: number;
+  assigned: number;
+  completed: number;
+  recovered: number;
+  speculated: number;
+}
+
+export interface TelemetryStats {
+  published: number;
+  dropped: number;
+  rateLimited: number;
+  buffered: number;
+  events: boolean;
+}
+
+export interface SchedulerSnapshot {
+  ts: number;
+  interval: SnapshotInterval;
+  telemetry: TelemetryStats;
+  scheduler?: unknown; // same shape as GET /api/scheduler/stats
+}
+
+export interface JobSnapshot {
+  jobId: string;
+  queued: number;
+  assigned: number;
+  completed: number;
+  avgTaskMs: number;
+  mapsCompleted?: number;
+  maps?: number;
+  reducesCompleted?: number;
+  reduces?: number;
+}
+
+export interface JobsSnapshot {
+  ts: number;
+  intervalMs: number;
+  jobs: JobSnapshot[];
+}
+
+export interface WorkerSnapshot {
+  workerId: string;
+  assigned: number;
+  completed: number;
+  avgTaskMs: number;
+}
+
+export interface WorkersSnapshot {
+  ts: number;
+  intervalMs: number;
+  workers: WorkerSnapshot[];
+}